@@ -0,0 +1,364 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import ctypes
+import ctypes.util
+import io
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator
+
+from PIL import Image
+
+import metrics
+from limiter import WORKERS, OverloadedError
+from upload_buffer import Buffer
+
+# Without a configured or cgroup limit, assume the smallest hosted instance
+DEFAULT_MEMORY_MB = 512
+# Share of the ceiling that admitted jobs may use; the rest is interpreter,
+# libraries and allocator slack
+MEMORY_FRACTION = float(os.getenv("ADMISSION_MEMORY_FRACTION", "0.7"))
+# Estimated CPU-seconds of work in flight per core
+CPU_SECONDS_PER_CORE = float(os.getenv("ADMISSION_CPU_SECONDS_PER_CORE", "8"))
+
+# Cost model, calibrated with the simulation below
+JOB_OVERHEAD = 8 << 20
+# The upload is copied for rendering, per-sheet splits and floor crops
+COPIES_PER_BYTE = 3
+# Rendered PDF raster plus resized working copies
+BYTES_PER_PIXEL = 6
+# Decoded RGB image, its greyscale copy and PIL's block slack
+IMAGE_BYTES_PER_PIXEL = 7
+# Raw model result and fingerprint cells kept per page
+BYTES_PER_PAGE = 256 << 10
+CPU_PER_PAGE = 0.05
+CPU_PER_MEGAPIXEL = 0.03
+# Long side of the largest raster rendered from a PDF page (fingerprints)
+PDF_RENDER_SIZE = 1024
+# PDF pages rendered at the same time
+PDF_PAGES_IN_FLIGHT = int(os.getenv("MODEL_PAGE_CONCURRENCY", "4"))
+
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c"))
+    _malloc_trim = _libc.malloc_trim
+except (OSError, AttributeError, TypeError):
+    _malloc_trim = None
+
+
+class AdmissionRejected(OverloadedError):
+    """The memory/CPU budget is committed and the admission queue is full or too slow"""
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes, or 0 where unknown"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def release_memory() -> None:
+    """Hand freed heap pages back to the OS (glibc keeps them otherwise)"""
+    if _malloc_trim is not None:
+        _malloc_trim(0)
+
+
+def memory_ceiling() -> int:
+    """Instance memory limit: ADMISSION_MEMORY_MB, else the cgroup limit, else DEFAULT_MEMORY_MB"""
+    configured = os.getenv("ADMISSION_MEMORY_MB")
+    if configured:
+        return int(float(configured) * (1 << 20))
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        # Unlimited cgroups report "max" or a huge page-aligned number
+        if value.isdigit() and int(value) < 1 << 50:
+            return int(value)
+    return DEFAULT_MEMORY_MB << 20
+
+
+def estimate_cost(buffer: Buffer, mime_type: str) -> Dict[str, Any]:
+    """Peak memory (bytes) and CPU (seconds) a parse of this upload is expected to take.
+
+    Reads only the PDF page tree or the image header; nothing is rendered.
+    """
+    size = len(buffer)
+    pages, pixels, raster = 1, 0, 0
+    try:
+        if mime_type == "application/pdf":
+            import fitz
+
+            peak_pixels = 0
+            with fitz.open(stream=buffer, filetype="pdf") as doc:
+                pages = max(doc.page_count, 1)
+                for page in doc:
+                    w, h = page.rect.width, page.rect.height
+                    scale = PDF_RENDER_SIZE / max(w, h, 1)
+                    page_pixels = int(w * scale * h * scale)
+                    pixels += page_pixels
+                    peak_pixels = max(peak_pixels, page_pixels)
+            raster = peak_pixels * min(pages, PDF_PAGES_IN_FLIGHT) * BYTES_PER_PIXEL
+        elif mime_type.startswith("image/"):
+            with Image.open(io.BytesIO(buffer)) as image:
+                pixels = image.width * image.height
+                raster = pixels * IMAGE_BYTES_PER_PIXEL
+    except Exception as e:
+        # Unreadable here means unreadable for the parser too; charge the bytes only
+        print(f"⚠️ Could not size upload for admission: {e}", file=sys.stderr)
+    return {
+        "bytes": size,
+        "pages": pages,
+        "pixels": pixels,
+        "memory": JOB_OVERHEAD + COPIES_PER_BYTE * size + raster + BYTES_PER_PAGE * pages,
+        "cpu": CPU_PER_PAGE * pages + CPU_PER_MEGAPIXEL * pixels / 1e6,
+    }
+
+
+class AdmissionController:
+    """Admits parse jobs against a process-wide memory and CPU budget.
+
+    Jobs are admitted in arrival order while their estimated cost fits the
+    remaining budget and the measured RSS is under the ceiling. The rest
+    wait in a FIFO queue of at most `max_queue` jobs for up to `max_wait`
+    seconds; beyond either bound they are rejected with a retry hint so the
+    API can answer 429. A job larger than the whole budget runs alone.
+    """
+
+    def __init__(self, memory_budget: int, cpu_budget: float, rss_limit: int = 0,
+                 max_queue: int = 16, max_wait: float = 30.0, poll: float = 0.25):
+        self.memory_budget = memory_budget
+        self.cpu_budget = cpu_budget
+        self.rss_limit = rss_limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.poll = poll
+        self.memory_used = 0
+        self.cpu_used = 0.0
+        self.running = 0
+        self.queue: deque = deque()
+        self.job_seconds = 10.0
+        self.condition = threading.Condition()
+        self.stats = {"admitted": 0, "queued": 0, "shed": 0, "timed_out": 0}
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        # Worker processes share the instance's memory and cores equally
+        ceiling = memory_ceiling() // WORKERS
+        # Imports and caches already resident are not available to jobs
+        budget = max(int(ceiling * MEMORY_FRACTION) - current_rss(), 64 << 20)
+        return cls(
+            memory_budget=budget,
+            cpu_budget=CPU_SECONDS_PER_CORE * (os.cpu_count() or 1) / WORKERS,
+            rss_limit=int(ceiling * MEMORY_FRACTION),
+            max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "16")),
+            max_wait=float(os.getenv("ADMISSION_MAX_WAIT", "30")),
+        )
+
+    def saturated(self) -> bool:
+        """True when a new job would be rejected right away"""
+        with self.condition:
+            return len(self.queue) >= self.max_queue
+
+    def retry_after(self) -> float:
+        with self.condition:
+            return self._retry_after()
+
+    def _retry_after(self) -> float:
+        """Rough time for the queue ahead to drain"""
+        return max(self.job_seconds * (len(self.queue) + 1) / max(self.running, 1), 1.0)
+
+    def _fits(self, cost: Dict[str, Any]) -> bool:
+        if self.running == 0:
+            return True
+        if self.memory_used + cost["memory"] > self.memory_budget or self.cpu_used + cost["cpu"] > self.cpu_budget:
+            return False
+        return not self.rss_limit or current_rss() < self.rss_limit
+
+    def _admit(self, cost: Dict[str, Any]) -> Dict[str, Any]:
+        self.memory_used += cost["memory"]
+        self.cpu_used += cost["cpu"]
+        self.running += 1
+        self.stats["admitted"] += 1
+        return {"cost": cost, "start": time.monotonic()}
+
+    def acquire(self, cost: Dict[str, Any]) -> Dict[str, Any]:
+        """Block until the job fits the budget; raise AdmissionRejected when it cannot"""
+        with self.condition:
+            if not self.queue and self._fits(cost):
+                return self._admit(cost)
+            if len(self.queue) >= self.max_queue:
+                self.stats["shed"] += 1
+                metrics.increment("admission_shed")
+                raise AdmissionRejected("Admission queue is full", retry_after=self._retry_after())
+            ticket = object()
+            self.queue.append(ticket)
+            self.stats["queued"] += 1
+            deadline = time.monotonic() + self.max_wait
+            try:
+                # RSS falls without a release to notify us, so poll as well
+                while self.queue[0] is not ticket or not self._fits(cost):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["timed_out"] += 1
+                        metrics.increment("admission_shed")
+                        raise AdmissionRejected("Timed out waiting for capacity", retry_after=self._retry_after())
+                    self.condition.wait(min(remaining, self.poll))
+            finally:
+                self.queue.remove(ticket)
+                self.condition.notify_all()
+            metrics.observe("admission_wait_seconds", self.max_wait - (deadline - time.monotonic()))
+            return self._admit(cost)
+
+    def release(self, ticket: Dict[str, Any]) -> None:
+        with self.condition:
+            cost = ticket["cost"]
+            self.memory_used -= cost["memory"]
+            self.cpu_used -= cost["cpu"]
+            self.running -= 1
+            self.job_seconds = 0.8 * self.job_seconds + 0.2 * (time.monotonic() - ticket["start"])
+        # Decoded rasters are freed by now; without a trim RSS stays at its high-water mark
+        release_memory()
+        with self.condition:
+            self.condition.notify_all()
+
+    @contextmanager
+    def admit(self, cost: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        ticket = self.acquire(cost)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.condition:
+            return {
+                **self.stats,
+                "running": self.running,
+                "waiting": len(self.queue),
+                "memoryUsedMb": round(self.memory_used / (1 << 20), 1),
+                "memoryBudgetMb": round(self.memory_budget / (1 << 20), 1),
+                "cpuUsed": round(self.cpu_used, 2),
+                "cpuBudget": self.cpu_budget,
+                "rssMb": round(current_rss() / (1 << 20), 1),
+            }
+
+
+# Shared by every upload in the process
+ADMISSION = AdmissionController.from_env()
+
+
+def _synthetic_pdf(pages: int, scan_pages: int = 0) -> bytes:
+    """Drawing-like PDF; scan_pages embed a raster the size of an A1 scan"""
+    import fitz
+    import numpy as np
+
+    rng = np.random.default_rng(pages)
+    scan = None
+    if scan_pages:
+        noise = rng.integers(200, 256, size=(1800, 2600), dtype=np.uint8)
+        buf = io.BytesIO()
+        Image.fromarray(noise).save(buf, format="PNG")
+        scan = buf.getvalue()
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=2384, height=1684)
+        shape = page.new_shape()
+        for x0, y0, x1, y1 in rng.uniform(50, 2300, size=(400, 4)):
+            shape.draw_line((x0, y0), (x1, y0 if i % 2 else y1))
+        shape.finish(width=1.5)
+        shape.commit()
+        page.insert_text((100, 1600), f"GROUND FLOOR PLAN {i}", fontsize=24)
+        if i < scan_pages:
+            page.insert_image(page.rect, stream=scan)
+    return doc.tobytes(deflate=True)
+
+
+def _synthetic_scan(size=(7000, 5000)) -> bytes:
+    """Photographed A1 sheet: small on disk, over 100 MB once decoded"""
+    from PIL import ImageDraw
+    import numpy as np
+
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for x0, y0, x1 in np.random.default_rng(0).integers(0, size[0], size=(2000, 3)).tolist():
+        draw.line((x0, y0 % size[1], x1, y0 % size[1]), fill="black", width=3)
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _job(buffer: bytes, mime_type: str, model_seconds: float) -> None:
+    """Local part of a parse: fingerprints, per-sheet splits, held page results"""
+    from fingerprint import fingerprint_document
+    from revisions import split_pdf
+
+    pages = fingerprint_document(buffer, mime_type)
+    sheets = split_pdf(buffer, list(range(len(pages)))) if mime_type == "application/pdf" else [buffer]
+    results = [bytearray(BYTES_PER_PAGE // 2) for _ in sheets]
+    time.sleep(model_seconds)
+    del sheets, results
+
+
+# Soak test: python admission.py [load_multiplier] [seconds] [on|off]
+if __name__ == "__main__":
+    import random
+
+    multiplier = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 60
+    enabled = (sys.argv[3] if len(sys.argv) > 3 else "on") == "on"
+    # Nominal load: two uploads in flight at once
+    clients = 2 * multiplier
+    documents = [
+        ("application/pdf", _synthetic_pdf(12)),
+        ("application/pdf", _synthetic_pdf(60)),
+        ("application/pdf", _synthetic_pdf(120, scan_pages=10)),
+        ("image/png", _synthetic_scan()),
+    ]
+    ceiling = memory_ceiling()
+    controller = AdmissionController.from_env()
+    if not enabled:
+        controller = AdmissionController(1 << 62, float("inf"), max_queue=1 << 30)
+    print(f"📦 Documents: {', '.join(f'{len(d) >> 20} MB' for _, d in documents)}; ceiling {ceiling >> 20} MB, "
+          f"job budget {controller.memory_budget >> 20} MB, baseline RSS {current_rss() >> 20} MB")
+
+    peak = [current_rss()]
+    outcomes = {"done": 0, "shed": 0}
+    stop = time.monotonic() + duration
+
+    def monitor():
+        while time.monotonic() < stop + 5:
+            peak[0] = max(peak[0], current_rss())
+            time.sleep(0.01)
+
+    def client(seed: int):
+        rng = random.Random(seed)
+        while time.monotonic() < stop:
+            mime_type, data = rng.choice(documents)
+            cost = estimate_cost(data, mime_type)
+            try:
+                with controller.admit(cost):
+                    _job(data, mime_type, model_seconds=rng.uniform(0.5, 2.0))
+                outcomes["done"] += 1
+            except AdmissionRejected as e:
+                outcomes["shed"] += 1
+                time.sleep(min(e.retry_after, 2.0))
+
+    threads = [threading.Thread(target=monitor)] + [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    verdict = "✅ under" if peak[0] < ceiling else "❌ OVER"
+    print(f"⏱️ {clients} clients ({multiplier}x nominal) for {duration:.0f}s, admission {'on' if enabled else 'off'}: "
+          f"{outcomes['done']} jobs done, {outcomes['shed']} shed with 429; peak RSS {peak[0] >> 20} MB "
+          f"{verdict} the {ceiling >> 20} MB ceiling; stats {controller.stats}")
@@ -0,0 +1,581 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import io
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+import metrics
+import store
+from upload_buffer import Buffer
+
+try:
+    import pytesseract
+except ImportError:  # raster sheets are then calibrated from their DPI and scale note only
+    pytesseract = None
+
+CALIBRATION_ENABLED = os.getenv("CALIBRATION", "1") == "1"
+# Dimension strings that must agree before their scale is trusted
+MIN_DIMENSIONS = int(os.getenv("CALIBRATION_MIN_DIMENSIONS", "3"))
+# Estimates within this relative spread agree; derived scales this close to a standard one snap to it
+AGREEMENT = 0.03
+# Scans below this DPI (or without one) carry no usable paper size
+MIN_SCAN_DPI = 100
+# Long side raster sheets are read at
+OCR_SIZE = 3000
+# Calibrations kept in memory, by page fingerprint
+CACHE_SIZE = 512
+# Dimension values outside this range (metres) are labels, levels or room numbers
+MIN_LENGTH, MAX_LENGTH = 0.3, 100.0
+# A dimension line must be this long (page units) and within this many text heights of its label
+MIN_LINE = 5.0
+LABEL_DISTANCE = 2.5
+# Model geometry this many times larger than the sheet was given in the wrong unit
+UNIT_ERROR_FACTOR = 5.0
+# Heights, thicknesses and opening sizes above this (metres) came in that same unit
+MAX_HEIGHT = 10.0
+
+POINT_METRES = 0.0254 / 72
+STANDARD_SCALES = (1, 2, 5, 10, 20, 25, 50, 75, 100, 125, 150, 200, 250, 500, 1000, 1250, 2500)
+SHEET_SIZES = {"A0": (841, 1189), "A1": (594, 841), "A2": (420, 594), "A3": (297, 420), "A4": (210, 297)}
+
+SCALE_NOTE = re.compile(r"(?<![\d.:/])1\s*:\s*(\d{1,4})(?![\d:])(?:\s*(?:@|at)\s*(A[0-4]))?", re.IGNORECASE)
+DIMENSION = re.compile(r"(\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?)\s*(mm|cm|m)?", re.IGNORECASE)
+BAR_LABEL = re.compile(r"(\d{1,3}(?:\.\d+)?)\s*(mm|m)?", re.IGNORECASE)
+UNITS = {"mm": 0.001, "cm": 0.01, "m": 1.0}
+
+# Calibrations are cached per (content hash, page) of the upload they were found on
+PageKey = Tuple[str, int]
+
+_cache: "OrderedDict[PageKey, Dict[str, Any]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+# A word: (x0, y0, x1, y1, text); a line: (x0, y0, x1, y1), horizontal or vertical
+Word = Tuple[float, float, float, float, str]
+
+
+def parse_length(text: str, unit: Optional[str] = None) -> Optional[float]:
+    """Metres in a dimension string: "3600", "3,600 mm", "3.60", "3.6m", "360cm".
+
+    Without a unit, whole numbers are millimetres and decimals metres, the
+    usual convention on architectural drawings.
+    """
+    match = DIMENSION.fullmatch(text.strip())
+    if not match:
+        return None
+    number, suffix = match.groups()
+    suffix = (suffix or unit or ("m" if "." in number else "mm")).lower()
+    value = float(number.replace(",", "")) * UNITS[suffix]
+    return value if MIN_LENGTH <= value <= MAX_LENGTH else None
+
+
+def _dimension_words(words: List[Word]) -> List[Tuple[Word, float]]:
+    """Words holding a length, with a unit written as the next word ("3600 mm") taken into account"""
+    out = []
+    for i, word in enumerate(words):
+        following = words[i + 1][4].lower() if i + 1 < len(words) else ""
+        value = parse_length(word[4], following if following in UNITS else None)
+        if value is not None:
+            out.append((word, value))
+    return out
+
+
+def _orthogonal(lines: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Horizontal and vertical lines as (position, lo, hi) rows"""
+    if not len(lines):
+        empty = np.zeros((0, 3))
+        return empty, empty
+    x0, y0, x1, y1 = lines.T
+    length = np.hypot(x1 - x0, y1 - y0)
+    horizontal = (np.abs(y1 - y0) <= 0.5) & (length >= MIN_LINE)
+    vertical = (np.abs(x1 - x0) <= 0.5) & (length >= MIN_LINE)
+    return (
+        np.column_stack([(y0 + y1)[horizontal] / 2, np.minimum(x0, x1)[horizontal], np.maximum(x0, x1)[horizontal]]),
+        np.column_stack([(x0 + x1)[vertical] / 2, np.minimum(y0, y1)[vertical], np.maximum(y0, y1)[vertical]]),
+    )
+
+
+def match_dimensions(words: List[Word], lines: np.ndarray) -> List[float]:
+    """Metres per page unit from each dimension string and the dimension line it labels.
+
+    A label sits beside its line, parallel to it and roughly centred on it;
+    the nearest such line within a few text heights is taken.
+    """
+    horizontal, vertical = _orthogonal(lines)
+    estimates = []
+    for (x0, y0, x1, y1, _), value in _dimension_words(words):
+        upright = (y1 - y0) > 1.5 * (x1 - x0)  # rotated text labels a vertical line
+        candidates = vertical if upright else horizontal
+        if not len(candidates):
+            continue
+        across, along = ((x0 + x1) / 2, (y0 + y1) / 2) if upright else ((y0 + y1) / 2, (x0 + x1) / 2)
+        size = (x1 - x0) if upright else (y1 - y0)
+        label = (y1 - y0) if upright else (x1 - x0)
+        position, lo, hi = candidates.T
+        length = hi - lo
+        near = ((np.abs(position - across) <= LABEL_DISTANCE * size) & (lo <= along) & (along <= hi)
+                & (length >= label) & (np.abs((lo + hi) / 2 - along) <= 0.25 * length))
+        if near.any():
+            best = np.flatnonzero(near)[np.argmin(np.abs(position[near] - across))]
+            estimates.append(value / length[best])
+    return estimates
+
+
+def consensus(estimates: Sequence[float]) -> Optional[Tuple[float, int]]:
+    """Median of the largest group of agreeing estimates, and its size"""
+    if not len(estimates):
+        return None
+    values = np.sort(np.log(np.asarray(estimates, dtype=np.float64)))
+    ends = np.searchsorted(values, values + np.log1p(AGREEMENT), side="right")
+    counts = ends - np.arange(len(values))
+    best = int(np.argmax(counts))
+    return float(np.exp(np.median(values[best:ends[best]]))), int(counts[best])
+
+
+def scale_bar(words: List[Word]) -> Optional[float]:
+    """Metres per page unit from a labelled scale bar ("0 1 2 5m" evenly along a baseline)"""
+    labels = []
+    for x0, y0, x1, y1, text in words:
+        match = BAR_LABEL.fullmatch(text.strip())
+        if match:
+            # Labels are centred on their ticks; a unit suffix ("5m") shifts the centre of the number
+            centre = x0 + (x1 - x0) * len(match.group(1)) / len(text.strip()) / 2
+            labels.append((centre, y1, y1 - y0, float(match.group(1)), (match.group(2) or "").lower()))
+    labels.sort(key=lambda label: (label[1], label[0]))
+    rows, row = [], []
+    for label in labels:
+        if row and abs(label[1] - row[-1][1]) > 0.5 * label[2]:
+            rows.append(row)
+            row = []
+        row.append(label)
+    rows.append(row)
+
+    for row in rows:
+        row.sort()
+        starts = [i for i, label in enumerate(row) if label[3] == 0]
+        for start in starts:
+            run = [row[start]]
+            for label in row[start + 1:]:
+                if label[3] <= run[-1][3]:
+                    break
+                run.append(label)
+            if len(run) < 3:
+                continue
+            x, value = np.array([r[0] for r in run]), np.array([r[3] for r in run])
+            slope, offset = np.polyfit(value, x, 1)
+            if slope <= 0 or np.abs(x - (slope * value + offset)).max() > AGREEMENT * (x[-1] - x[0]):
+                continue
+            unit = next((r[4] for r in run if r[4]), "m")
+            return UNITS[unit] / slope
+    return None
+
+
+def scale_note(text: str) -> Optional[Tuple[int, Optional[str]]]:
+    """Most frequent standard scale written on the sheet ("SCALE 1:100 @ A1"), with its sheet size"""
+    notes = [(int(d), (s or "").upper() or None) for d, s in SCALE_NOTE.findall(text) if int(d) in STANDARD_SCALES]
+    if not notes:
+        return None
+    counts: Dict[Tuple[int, Optional[str]], int] = {}
+    for note in notes:
+        counts[note] = counts.get(note, 0) + 1
+    # A plan and its details differ in scale; the plan is usually the largest denominator
+    return max(counts, key=lambda note: (counts[note], note[0]))
+
+
+def _snap(metres_per_unit: float, paper: Optional[float]) -> Tuple[float, Optional[int]]:
+    """Scale denominator of a measured scale, snapped to the standard scale it is close to"""
+    if not paper:
+        return metres_per_unit, None
+    denominator = metres_per_unit / paper
+    nearest = min(STANDARD_SCALES, key=lambda s: abs(s - denominator))
+    if abs(nearest - denominator) <= AGREEMENT * nearest:
+        return nearest * paper, nearest
+    return metres_per_unit, int(round(denominator))
+
+
+def calibrate_sheet(words: List[Word], lines: np.ndarray, text: str, size: Tuple[float, float],
+                    paper: Optional[float], unit: str) -> Optional[Dict[str, Any]]:
+    """Page-unit-to-metre transform of one sheet from its text and lines.
+
+    paper is metres of paper per page unit (known for PDFs and scans with a
+    DPI), which turns a scale note into a transform. Dimension strings win
+    over a scale bar, and both over a note unless they confirm it.
+    """
+    dimensions = consensus(match_dimensions(words, lines)) if words else None
+    bar = scale_bar(words) if words else None
+    note = scale_note(text)
+    noted = None
+    if note and paper:
+        denominator, sheet = note
+        noted = paper * denominator
+        if sheet and sheet in SHEET_SIZES:
+            # "1:100 @ A1" printed on another paper size
+            stated = SHEET_SIZES[sheet][1] / 1000
+            actual = max(size) * paper
+            if abs(actual - stated) > 0.05 * stated:
+                noted *= stated / actual
+    measured = [m for m in (dimensions[0] if dimensions and dimensions[1] >= MIN_DIMENSIONS else None, bar) if m]
+
+    if noted and any(abs(m - noted) <= 0.05 * noted for m in measured):
+        method, metres_per_unit, confidence = "scale_note", noted, 1.0
+    elif dimensions and dimensions[1] >= MIN_DIMENSIONS:
+        method, metres_per_unit = "dimensions", dimensions[0]
+        confidence = round(dimensions[1] / max(len(_dimension_words(words)), 1), 3)
+    elif bar:
+        method, metres_per_unit, confidence = "scale_bar", bar, 0.8
+    elif noted:
+        method, metres_per_unit, confidence = "scale_note", noted, 0.6
+    else:
+        return None
+    if method != "scale_note":
+        metres_per_unit, _ = _snap(metres_per_unit, paper)
+    return {
+        "method": method,
+        "metresPerUnit": float(metres_per_unit),
+        "unit": unit,
+        "pageSize": [round(float(size[0]), 2), round(float(size[1]), 2)],
+        "scale": int(round(metres_per_unit / paper)) if paper else None,
+        "confidence": confidence,
+        "evidence": {
+            "dimensions": dimensions[1] if dimensions else 0,
+            "scaleBar": bar is not None,
+            "scaleNote": f"1:{note[0]}" if note else None,
+        },
+    }
+
+
+def _pdf_lines(page) -> np.ndarray:
+    lines = []
+    for path in page.get_cdrawings():
+        for item in path["items"]:
+            if item[0] == "l":
+                (x0, y0), (x1, y1) = item[1], item[2]
+                lines.append((x0, y0, x1, y1))
+            elif item[0] == "re":
+                x0, y0, x1, y1 = item[1]
+                lines += [(x0, y0, x1, y0), (x0, y1, x1, y1), (x0, y0, x0, y1), (x1, y0, x1, y1)]
+    return np.array(lines, dtype=np.float64).reshape(-1, 4)
+
+
+def _calibrate_pdf_page(page) -> Optional[Dict[str, Any]]:
+    words = [w[:5] for w in page.get_text("words", sort=True)]
+    text = " ".join(w[4] for w in words)
+    # Vector paths are only needed to measure dimension strings
+    lines = _pdf_lines(page) if len(_dimension_words(words)) >= MIN_DIMENSIONS else np.zeros((0, 4))
+    return calibrate_sheet(words, lines, text, (page.rect.width, page.rect.height), POINT_METRES, "pt")
+
+
+def _ocr_words(gray: np.ndarray, scale: float) -> List[Word]:
+    """Words of a raster sheet, in pixels of the original image"""
+    if pytesseract is None:
+        return []
+    try:
+        data = pytesseract.image_to_data(Image.fromarray(gray), output_type=pytesseract.Output.DICT)
+    except Exception as e:  # tesseract binary missing or failing
+        print(f"⚠️ OCR unavailable for calibration: {e}", file=sys.stderr)
+        return []
+    return [
+        (left / scale, top / scale, (left + width) / scale, (top + height) / scale, text)
+        for left, top, width, height, text, conf in zip(data["left"], data["top"], data["width"], data["height"],
+                                                       data["text"], data["conf"])
+        if text.strip() and float(conf) > 0
+    ]
+
+
+def _raster_lines(gray: np.ndarray, scale: float) -> np.ndarray:
+    import cv2
+
+    ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+    lines = cv2.HoughLinesP(ink, 1, np.pi / 2, threshold=40, minLineLength=20, maxLineGap=2)
+    return np.zeros((0, 4)) if lines is None else lines.reshape(-1, 4).astype(np.float64) / scale
+
+
+def _calibrate_image(buffer: Buffer) -> Optional[Dict[str, Any]]:
+    image = Image.open(io.BytesIO(buffer))
+    dpi = (image.info.get("dpi") or (0, 0))[0]
+    paper = 0.0254 / dpi if dpi and dpi >= MIN_SCAN_DPI else None
+    size = image.size
+    scale = min(1.0, OCR_SIZE / max(size))
+    image.draft("L", (int(size[0] * scale), int(size[1] * scale)))
+    gray = image.convert("L")
+    if max(gray.size) > OCR_SIZE:
+        gray = gray.resize((int(size[0] * scale), int(size[1] * scale)), Image.BOX)
+    scale = gray.size[0] / size[0]
+    gray = np.asarray(gray)
+    words = _ocr_words(gray, scale)
+    text = " ".join(w[4] for w in words)
+    lines = _raster_lines(gray, scale) if len(_dimension_words(words)) >= MIN_DIMENSIONS else np.zeros((0, 4))
+    return calibrate_sheet(words, lines, text, size, paper, "px")
+
+
+def _cached(keys: Sequence[PageKey]) -> Optional[Dict[str, Any]]:
+    """Calibration stored for any of the keys (the page's own first)"""
+    for key in keys:
+        with _cache_lock:
+            if key in _cache:
+                _cache.move_to_end(key)
+                return _cache[key]
+    for key in keys:
+        stored = store.get_calibration(*key)
+        if stored is not None:
+            _remember(keys[0], stored)
+            return stored
+    return None
+
+
+def _remember(key: PageKey, value: Dict[str, Any]) -> None:
+    with _cache_lock:
+        _cache[key] = value
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def calibrate(buffer: Buffer, mime_type: str, keys: Sequence[Sequence[PageKey]]) -> List[Optional[Dict[str, Any]]]:
+    """Transform of every page, cached by (content hash, page).
+
+    keys[i] are the keys page i may be cached under: its own, then that of
+    the sheet it revises in the same project, so a revision reuses the scale
+    found on the previous one. Pages without a detectable scale map to None.
+    """
+    if not CALIBRATION_ENABLED:
+        return [None] * len(keys)
+    found = [_cached(page_keys) for page_keys in keys]
+    missing = [i for i, value in enumerate(found) if value is None]
+    if missing:
+        start = time.perf_counter()
+        try:
+            if mime_type == "application/pdf":
+                import fitz
+
+                with fitz.open(stream=bytes(buffer), filetype="pdf") as doc:
+                    computed = [_calibrate_pdf_page(doc[i]) for i in missing]
+            else:
+                computed = [_calibrate_image(buffer)]
+        except Exception as e:
+            print(f"⚠️ Could not calibrate pages: {e}", file=sys.stderr)
+            computed = [None] * len(missing)
+        metrics.observe("calibration_seconds", time.perf_counter() - start)
+        for i, value in zip(missing, computed):
+            # Sheets without a scale are remembered too, so they are not searched again
+            found[i] = value or {"method": None}
+            metrics.increment("calibrations", method=found[i]["method"] or "none")
+            _remember(keys[i][0], found[i])
+            store.save_calibration(*keys[i][0], found[i])
+    return [value if value.get("method") else None for value in found]
+
+
+def region_size(calibration: Dict[str, Any], clip: Optional[Sequence[float]] = None) -> Tuple[float, float]:
+    """Page units spanned by a clip box (fractions of the page), or by the whole page"""
+    width, height = calibration["pageSize"]
+    if clip is None:
+        return width, height
+    x0, y0, x1, y1 = clip
+    return (x1 - x0) * width, (y1 - y0) * height
+
+
+def metres_per_pixel(calibration: Dict[str, Any], raster_size: Sequence[int],
+                     clip: Optional[Sequence[float]] = None) -> float:
+    """Metres per pixel of a raster of the page (or of a region of it)"""
+    return calibration["metresPerUnit"] * max(region_size(calibration, clip)) / max(raster_size)
+
+
+def scale_hint(calibration: Optional[Dict[str, Any]], clip: Optional[Sequence[float]] = None) -> str:
+    """Prompt section stating the sheet's scale, or "" when unknown"""
+    if not calibration:
+        return ""
+    width, height = (v * calibration["metresPerUnit"] for v in region_size(calibration, clip))
+    source = {"scale_note": "the scale note", "dimensions": "its dimension strings",
+              "scale_bar": "its scale bar"}[calibration["method"]]
+    scale = f"1:{calibration['scale']}, so " if calibration["scale"] else ""
+    per_mm = f"1 mm on paper is {calibration['scale'] / 1000:g} m; " if calibration["scale"] else ""
+    return f"""
+### 📏 DRAWING SCALE (measured from {source}):
+- {scale}{per_mm}the drawing area shown is {width:.1f} m wide and {height:.1f} m high
+- Use this to convert measured lengths to meters; written dimensions take precedence where present
+"""
+
+
+def _scale_value(value: Any, factor: float) -> Any:
+    """value / factor, keeping strings as strings"""
+    if isinstance(value, bool) or value in (None, ""):
+        return value
+    if isinstance(value, (int, float)):
+        return round(value / factor, 4)
+    try:
+        return str(round(float(value) / factor, 4))
+    except (TypeError, ValueError):
+        return value
+
+
+def _geometry(result: Dict[str, Any]):
+    """(container, key) of every plan-measured length in a raw result"""
+    for room in result.get("rooms") or []:
+        if not isinstance(room, dict):
+            continue
+        yield from ((room, "length"), (room, "width"))
+        connectivity = room.get("wallConnectivity") or {}
+        position = connectivity.get("position")
+        if isinstance(position, dict):
+            yield from ((position, "x"), (position, "y"))
+        for wall in (connectivity.get("walls") or {}).values():
+            if isinstance(wall, dict):
+                yield from ((wall, "length"), (wall, "sharedLength"))
+                for opening in wall.get("openings") or []:
+                    if isinstance(opening, dict) and isinstance(opening.get("position"), dict):
+                        yield opening["position"], "fromStart"
+    for wall in result.get("walls") or []:
+        if isinstance(wall, dict):
+            for key in ("start", "end"):
+                if isinstance(wall.get(key), list):
+                    yield from ((wall[key], i) for i in range(len(wall[key])))
+    for element in result.get("verticalElements") or []:
+        if isinstance(element, dict):
+            for key, fields in (("position", ("x", "y")), ("size", ("length", "width"))):
+                if isinstance(element.get(key), dict):
+                    yield from ((element[key], field) for field in fields)
+
+
+def _heights(result: Dict[str, Any]):
+    """(container, key) of every height, thickness and opening size in a raw result"""
+    for room in result.get("rooms") or []:
+        if not isinstance(room, dict):
+            continue
+        yield room, "height"
+        for wall in ((room.get("wallConnectivity") or {}).get("walls") or {}).values():
+            if not isinstance(wall, dict):
+                continue
+            yield from ((wall, "height"), (wall, "thickness"))
+            for opening in wall.get("openings") or []:
+                if not isinstance(opening, dict):
+                    continue
+                if isinstance(opening.get("size"), dict):
+                    yield from ((opening["size"], "width"), (opening["size"], "height"))
+                if isinstance(opening.get("position"), dict):
+                    yield opening["position"], "fromFloor"
+    for wall in result.get("walls") or []:
+        if isinstance(wall, dict):
+            yield from ((wall, "height"), (wall, "thickness"))
+    for element in result.get("verticalElements") or []:
+        if isinstance(element, dict):
+            yield element, "height"
+            if isinstance(element.get("size"), dict):
+                yield element["size"], "height"
+
+
+def _too_tall(value: Any) -> bool:
+    try:
+        return float(value) > MAX_HEIGHT
+    except (TypeError, ValueError):
+        return False
+
+
+def check_units(result: Any, calibration: Optional[Dict[str, Any]], clip: Optional[Sequence[float]] = None) -> Any:
+    """Rescale plan geometry given in millimetres or centimetres, judged against the sheet's real size.
+
+    Rooms cannot be larger than the area the sheet shows; geometry several
+    times larger is divided by the power of ten that makes it fit. Heights,
+    thicknesses and opening sizes are divided too where they are too large
+    to be metres; the model may have read those from a schedule in metres.
+    """
+    if not calibration or not isinstance(result, dict) or "error" in result:
+        return result
+    extent = max(region_size(calibration, clip)) * calibration["metresPerUnit"]
+    rooms = [r for r in result.get("rooms") or [] if isinstance(r, dict)]
+    largest = max([_largest(r) for r in rooms] or [0.0])
+    if largest <= UNIT_ERROR_FACTOR * extent:
+        return result
+    factor = next((f for f in (10, 100, 1000) if largest / f <= 1.2 * extent), None)
+    if factor is None:
+        return result
+    for container, key in list(_geometry(result)):
+        if isinstance(container, list) or key in container:
+            container[key] = _scale_value(container[key], factor)
+    for container, key in list(_heights(result)):
+        if key in container and _too_tall(container[key]):
+            container[key] = _scale_value(container[key], factor)
+    result["unitCorrection"] = factor
+    metrics.increment("calibration_unit_corrections")
+    print(f"📏 Plan geometry was {factor}x the {extent:.1f} m sheet; rescaled", file=sys.stderr)
+    return result
+
+
+def _largest(room: Dict[str, Any]) -> float:
+    values = []
+    for key in ("length", "width"):
+        try:
+            values.append(float(room.get(key)))
+        except (TypeError, ValueError):
+            pass
+    return max(values or [0.0])
+
+
+def page_scales(calibrations: List[Optional[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Per-page scale report for the result"""
+    return [
+        {"page": number, "method": c["method"], "scale": f"1:{c['scale']}" if c["scale"] else None,
+         "metresPerUnit": round(c["metresPerUnit"], 8), "unit": c["unit"], "confidence": c["confidence"]}
+        for number, c in enumerate(calibrations, start=1) if c
+    ]
+
+
+def _synthetic_sheet(rng: np.random.Generator, denominator: int, note: bool, bar: bool, dimensions: int):
+    """A4-landscape PDF with dimension chains, a scale bar and/or a scale note at 1:denominator"""
+    import fitz
+
+    doc = fitz.open()
+    page = doc.new_page(width=842, height=595)
+    per_metre = 1 / (POINT_METRES * denominator)
+    for i in range(dimensions):
+        metres = float(rng.choice([0.9, 1.2, 2.4, 2.7, 3.0, 3.6, 4.2, 4.8]))
+        length = metres * per_metre
+        x, y = 40 + rng.uniform(0, 842 - 80 - length), 60 + 20 * (i % 20)
+        page.draw_line((x, y), (x + length, y), width=0.3)
+        page.insert_text((x + length / 2 - 8, y - 2), f"{metres * 1000:.0f}", fontsize=6)
+        page.insert_text((x + 5, y + 12), f"{rng.integers(1, 40)}", fontsize=6)  # noise: labels, numbers
+    if bar:
+        for value in (0, 1, 2, 5):
+            page.insert_text((600 + value * per_metre - 2, 560), f"{value}{'m' if value == 5 else ''}", fontsize=6)
+        page.draw_rect(fitz.Rect(600, 562, 600 + 5 * per_metre, 566))
+    if note:
+        page.insert_text((600, 580), f"SCALE 1:{denominator} @ A4", fontsize=8)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+# Benchmark: python calibration.py [n_sheets]
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    store.DB_PATH = store.Path(os.getenv("CALIBRATION_BENCH_DB", "data/bench_calibration.db"))
+    outcomes: Dict[str, List[Tuple[bool, float]]] = {}
+    for i in range(n):
+        denominator = int(rng.choice([50, 100, 200]))
+        note, bar, dimensions = (True, False, 0), (False, True, 0), (False, False, int(rng.integers(4, 30)))
+        for label, (has_note, has_bar, count) in (("note", note), ("bar", bar), ("dimensions", dimensions)):
+            data = _synthetic_sheet(rng, denominator, has_note, has_bar, count)
+            with _cache_lock:
+                _cache.clear()
+            start = time.perf_counter()
+            key = (f"{int(rng.integers(1, 2 ** 62)):064x}", 0)
+            found = calibrate(data, "application/pdf", [[key]])[0]
+            elapsed = time.perf_counter() - start
+            correct = bool(found) and abs(found["metresPerUnit"] - POINT_METRES * denominator) <= 0.01 * POINT_METRES * denominator
+            outcomes.setdefault(label, []).append((correct, elapsed))
+    for label, results in outcomes.items():
+        times = sorted(t for _, t in results)
+        print(f"⏱️ {label:10s} {sum(c for c, _ in results)}/{len(results)} sheets calibrated to within 1%, "
+              f"p50 {times[len(times) // 2] * 1000:.1f} ms")
+    start = time.perf_counter()
+    for _ in range(1000):
+        calibrate(b"", "application/pdf", [[key]])
+    print(f"⏱️ cached lookup {(time.perf_counter() - start) * 1000:.1f} µs")
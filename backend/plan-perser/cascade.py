@@ -0,0 +1,181 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import os
+import random
+import sys
+import time
+from typing import Dict, Any, Callable, List, Optional, Sequence
+
+import metrics
+from limiter import OverloadedError
+from quantities import _to_float
+
+# Cheapest first; a plan only reaches the next tier when the previous answer fails checks
+MODEL_TIERS = [t.strip() for t in os.getenv(
+    "MODEL_TIERS", "gemini-2.5-flash-lite,gemini-2.5-flash,gemini-2.5-pro"
+).split(",") if t.strip()]
+# PDFs above this size (multi-sheet sets) skip the first tier
+LARGE_DOCUMENT_BYTES = int(os.getenv("CASCADE_LARGE_DOCUMENT_BYTES", str(5 * 1024 * 1024)))
+# Sections that must be non-empty for an answer to be accepted
+REQUIRED_SECTIONS = [s.strip() for s in os.getenv("CASCADE_REQUIRED_SECTIONS", "rooms").split(",") if s.strip()]
+# Relative tolerance of the area / wall-length cross-checks
+AREA_TOLERANCE = float(os.getenv("CASCADE_AREA_TOLERANCE", "0.3"))
+# Share of rooms allowed to fail a per-room check before escalating
+ROOM_FAILURE_RATIO = float(os.getenv("CASCADE_ROOM_FAILURE_RATIO", "0.2"))
+
+LIST_SECTIONS = (
+    "rooms", "walls", "earthworks", "concreteStructures", "reinforcement",
+    "roofing", "plumbing", "electrical", "finishes", "verticalElements",
+)
+SIDE_DIMENSION = {"north": "length", "south": "length", "east": "width", "west": "width"}
+
+
+def start_tier(data_size: int, mime_type: str) -> int:
+    """Index of the first tier to try for a document"""
+    if len(MODEL_TIERS) > 1 and mime_type == "application/pdf" and data_size > LARGE_DOCUMENT_BYTES:
+        return 1
+    return 0
+
+
+def validate(result: Any, required: Optional[Sequence[str]] = None) -> List[str]:
+    """Problems that justify asking a stronger model, as "<reason>: <detail>" strings.
+
+    An explicit {"error": ...} answer (a blank or non-plan sheet) is final:
+    a stronger model would only say the same for more money.
+    """
+    if not isinstance(result, dict):
+        return ["schema: response is not a JSON object"]
+    required = REQUIRED_SECTIONS if required is None else required
+    if "error" in result:
+        return []
+
+    problems = []
+    for section in LIST_SECTIONS:
+        if section in result and not isinstance(result[section], list):
+            problems.append(f"schema: {section} is not a list")
+    for section in required:
+        if not result.get(section):
+            problems.append(f"empty: {section} missing or empty")
+    if problems:
+        return problems
+
+    rooms = result.get("rooms") or []
+    bad_dims = bad_walls = 0
+    floor_area = 0.0
+    for room in rooms:
+        if not isinstance(room, dict):
+            bad_dims += 1
+            continue
+        length, width = _to_float(room.get("length")), _to_float(room.get("width"))
+        if length <= 0 or width <= 0:
+            bad_dims += 1
+            continue
+        floor_area += length * width
+        walls = (room.get("wallConnectivity") or {}).get("walls") or {}
+        for side, dimension in SIDE_DIMENSION.items():
+            wall_length = _to_float((walls.get(side) or {}).get("length"))
+            expected = length if dimension == "length" else width
+            if wall_length and abs(wall_length - expected) > AREA_TOLERANCE * expected:
+                bad_walls += 1
+                break
+
+    if rooms and bad_dims / len(rooms) > ROOM_FAILURE_RATIO:
+        problems.append(f"schema: {bad_dims}/{len(rooms)} rooms without usable length/width")
+    if rooms and bad_walls / len(rooms) > ROOM_FAILURE_RATIO:
+        problems.append(f"crosscheck: {bad_walls}/{len(rooms)} rooms with wall lengths that disagree with their size")
+
+    # Rooms are net of walls and circulation, so some gap to the gross area is expected
+    total_area = _to_float(result.get("totalArea"))
+    if total_area > 0 and floor_area > 0 and abs(floor_area - total_area) > AREA_TOLERANCE * max(total_area, floor_area):
+        problems.append(f"crosscheck: room areas sum to {floor_area:.1f} m² but totalArea is {total_area:.1f} m²")
+    return problems
+
+
+def run_cascade(call: Callable[[str], Dict[str, Any]], data_size: int, mime_type: str,
+                required: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Call the tiers in order until an answer passes validation.
+
+    The last tier's answer is returned even if it still has problems, so a
+    plan is never rejected only because the checks are strict. Quota
+    errors are not escalated: a stronger model would hit the same limits.
+    """
+    tiers = MODEL_TIERS[start_tier(data_size, mime_type):]
+    for index, model_name in enumerate(tiers):
+        last = index == len(tiers) - 1
+        start = time.monotonic()
+        try:
+            result = call(model_name)
+            problems = validate(result, required)
+        except OverloadedError:
+            raise
+        except RuntimeError as e:
+            if last:
+                raise
+            result, problems = None, [f"error: {e}"]
+        metrics.observe("model_tier_latency_seconds", time.monotonic() - start, tier=model_name)
+        metrics.increment("model_tier_calls", tier=model_name)
+
+        if not problems or last:
+            if isinstance(result, dict) and "error" in result:
+                metrics.increment("cascade_model_errors", tier=model_name)
+            elif problems:
+                metrics.increment("cascade_exhausted")
+                print(f"⚠️ Accepting {model_name} answer with problems: {'; '.join(problems)}", file=sys.stderr)
+            if isinstance(result, dict):
+                result["analysis_model"] = model_name
+            return result
+
+        metrics.increment("model_escalations", tier=model_name, reason=problems[0].split(":")[0])
+        print(f"🔼 Escalating from {model_name} to {tiers[index + 1]}: {'; '.join(problems)}", file=sys.stderr)
+
+
+def escalation_rates() -> Dict[str, float]:
+    """Share of calls per tier that were escalated to the next tier"""
+    rates = {}
+    for model_name in MODEL_TIERS:
+        calls = metrics.count("model_tier_calls", tier=model_name)
+        if calls:
+            escalated = sum(
+                metrics.count("model_escalations", tier=model_name, reason=reason)
+                for reason in ("schema", "empty", "crosscheck", "error")
+            )
+            rates[model_name] = round(escalated / calls, 4)
+    return rates
+
+
+# Simulation: python cascade.py [plans]
+if __name__ == "__main__":
+    plans = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    # (latency s, chance of a usable answer on a simple plan, on a complex plan)
+    profile = {
+        MODEL_TIERS[0]: (4, 0.95, 0.4),
+        MODEL_TIERS[min(1, len(MODEL_TIERS) - 1)]: (12, 0.99, 0.8),
+        MODEL_TIERS[-1]: (40, 0.99, 0.97),
+    }
+    good = {"rooms": [{"length": "4", "width": "3", "wallConnectivity": {"walls": {"north": {"length": 4}}}}],
+            "totalArea": 14}
+    bad = {"rooms": [{"length": "4", "width": "3", "wallConnectivity": {"walls": {"north": {"length": 9}}}}],
+           "totalArea": 60}
+
+    for mode in ("strongest only", "cascade"):
+        metrics.reset()
+        simulated = 0.0
+        accepted = 0
+        for i in range(plans):
+            complex_plan = random.random() < 0.2
+
+            def fake_call(model_name: str) -> Dict[str, Any]:
+                global simulated
+                latency, p_simple, p_complex = profile[model_name]
+                simulated += latency
+                ok = random.random() < (p_complex if complex_plan else p_simple)
+                return dict(good if ok else bad)
+
+            if mode == "cascade":
+                result = run_cascade(fake_call, 100_000, "image/png")
+            else:
+                result = fake_call(MODEL_TIERS[-1])
+            accepted += not validate(result)
+        print(f"⏱️ {mode:15s} mean latency {simulated / plans:5.1f} s  valid {accepted}/{plans}  "
+              f"escalation {escalation_rates()}", file=sys.stderr)
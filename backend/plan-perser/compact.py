@@ -0,0 +1,270 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import copy
+import gzip
+import sys
+import time
+from typing import Dict, Any, Optional, Tuple
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPACT_VERSION = 1
+COMPACT_MEDIA_TYPE = "application/vnd.plan.compact+json"
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+# Brotli quality 5 compresses close to 11 at a fraction of the CPU
+BROTLI_QUALITY = 5
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _intern(table: Dict[str, Any], record: Dict[str, Any]) -> str:
+    """Key of record in an id-keyed table, adding it if new.
+
+    A record is stored under its own id, without the id field. A different
+    record with an id already taken, or a record without an id, is stored
+    whole under "<id>~<n>".
+    """
+    record_id = record.get("id")
+    body = {k: v for k, v in record.items() if k != "id"}
+    if isinstance(record_id, str) and record_id and "~" not in record_id:
+        existing = table.get(record_id)
+        if existing is None:
+            table[record_id] = body
+            return record_id
+        if existing == body:
+            return record_id
+    base = record_id if isinstance(record_id, str) else ""
+    n = 2
+    while True:
+        key = f"{base}~{n}"
+        existing = table.get(key)
+        if existing is None:
+            table[key] = record
+            return key
+        if existing == record:
+            return key
+        n += 1
+
+
+def _record(table: Dict[str, Any], key: str) -> Dict[str, Any]:
+    return dict(table[key]) if "~" in key else {"id": key, **table[key]}
+
+
+def _columnar(table: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """{key: record} as {"columns": [field lists], "rows": {key: [column set, *values]}}.
+
+    Records with the same fields in the same order share a column list, so
+    field names are sent once per shape instead of once per record.
+    """
+    shapes: Dict[Tuple[str, ...], int] = {}
+    rows = {}
+    for key, record in table.items():
+        fields = tuple(record)
+        shape = shapes.setdefault(fields, len(shapes))
+        rows[key] = [shape, *record.values()]
+    return {"columns": [list(fields) for fields in shapes], "rows": rows}
+
+
+def _rows(table: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    columns = table.get("columns") or []
+    return {key: dict(zip(columns[row[0]], row[1:])) for key, row in (table.get("rows") or {}).items()}
+
+
+def to_compact(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalised copy of a result: walls and openings as id-referenced tables.
+
+    rooms[].wallConnectivity.walls.<side> becomes a key of "roomWalls", whose
+    openings are keys of "openings"; the top-level walls list becomes the
+    "walls" table. A door shared by two rooms, or a side wall repeated
+    across pages, is stored once, and tables are columnar. Every other
+    section is passed through.
+    """
+    compact = {k: v for k, v in result.items() if k not in ("rooms", "walls")}
+    walls: Dict[str, Any] = {}
+    room_walls: Dict[str, Any] = {}
+    openings: Dict[str, Any] = {}
+
+    for wall in result.get("walls") or []:
+        if isinstance(wall, dict):
+            _intern(walls, wall)
+
+    rooms = []
+    for room in result.get("rooms") or []:
+        sides = (room.get("wallConnectivity") or {}).get("walls") if isinstance(room, dict) else None
+        if not isinstance(sides, dict):
+            rooms.append(room)
+            continue
+        refs = {}
+        for side, wall in sides.items():
+            if not isinstance(wall, dict):
+                refs[side] = wall
+                continue
+            if isinstance(wall.get("openings"), list):
+                wall = {**wall, "openings": [
+                    _intern(openings, o) if isinstance(o, dict) else o for o in wall["openings"]
+                ]}
+            refs[side] = _intern(room_walls, wall)
+        rooms.append({**room, "wallConnectivity": {**room["wallConnectivity"], "walls": refs}})
+
+    if "rooms" in result:
+        compact["rooms"] = rooms
+    if "walls" in result:
+        compact["walls"] = _columnar(walls)
+    compact["roomWalls"] = _columnar(room_walls)
+    compact["openings"] = _columnar(openings)
+    compact["format"] = {"name": "compact", "version": COMPACT_VERSION}
+    return compact
+
+
+def from_compact(compact: Dict[str, Any]) -> Dict[str, Any]:
+    """Nested result back from its compact form"""
+    result = {k: v for k, v in compact.items() if k not in ("walls", "roomWalls", "openings", "format")}
+    room_walls, openings = _rows(compact.get("roomWalls") or {}), _rows(compact.get("openings") or {})
+    if "walls" in compact:
+        walls = _rows(compact["walls"])
+        result["walls"] = [_record(walls, key) for key in walls]
+    rooms = []
+    for room in compact.get("rooms") or []:
+        sides = (room.get("wallConnectivity") or {}).get("walls") if isinstance(room, dict) else None
+        if not isinstance(sides, dict):
+            rooms.append(room)
+            continue
+        nested = {}
+        for side, ref in sides.items():
+            if not isinstance(ref, str) or ref not in room_walls:
+                nested[side] = ref
+                continue
+            wall = _record(room_walls, ref)
+            if isinstance(wall.get("openings"), list):
+                wall["openings"] = [_record(openings, o) if isinstance(o, str) and o in openings else o
+                                    for o in wall["openings"]]
+            nested[side] = wall
+        rooms.append({**room, "wallConnectivity": {**room["wallConnectivity"], "walls": nested}})
+    if "rooms" in compact:
+        result["rooms"] = rooms
+    return result
+
+
+def wants_compact(request: Request) -> bool:
+    """Compact shape only when asked for, by ?format=compact or the Accept header"""
+    return request.query_params.get("format") == "compact" or COMPACT_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _encodings(accept_encoding: str) -> Dict[str, float]:
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return accepted
+
+
+def compress(body: bytes, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    """Body in the best encoding the client accepts: br, then gzip, else identity"""
+    if len(body) < MIN_COMPRESS_BYTES:
+        return body, None
+    accepted = _encodings(accept_encoding)
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if accepted.get("gzip", 0) > 0:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), "gzip"
+    return body, None
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {t.strip() for t in header.split(",")}
+    return "*" in tags or etag in tags or etag.removeprefix("W/") in {t.removeprefix("W/") for t in tags}
+
+
+def json_response(request: Request, data: Any, etag: Optional[str] = None, compact: bool = False,
+                  status_code: int = 200) -> Response:
+    """orjson-serialised, content-negotiated response; data is already compacted if compact"""
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if etag:
+        headers["ETag"] = etag
+        headers["Cache-Control"] = "private, no-cache"
+    body, encoding = compress(orjson.dumps(data, option=ORJSON_OPTIONS), request.headers.get("accept-encoding", ""))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    media_type = COMPACT_MEDIA_TYPE if compact else "application/json"
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept, Accept-Encoding"})
+
+
+def _synthetic_result(n_rooms: int) -> Dict[str, Any]:
+    """Large parse result: rooms with four side walls, shared doors, top-level walls"""
+    rooms, walls = [], []
+    for r in range(n_rooms):
+        sides = {}
+        for side in ("north", "south", "east", "west"):
+            wall_id = f"wall_{r}_{side}"
+            openings = [{"id": f"door_{min(r, r + 1)}_{side}", "type": "door", "connectsTo": f"room_{r + 1}",
+                         "size": {"width": 0.9, "height": 2.1}, "position": {"fromStart": 1.0, "fromFloor": 0.0}}]
+            if side == "south":
+                openings.append({"id": f"window_{r}", "type": "window", "size": {"width": 1.2, "height": 1.2},
+                                 "position": {"fromStart": 2.0, "fromFloor": 1.0}})
+            sides[side] = {"id": wall_id, "type": "shared" if side == "north" else "external",
+                           "sharedWith": f"room_{r + 1}", "sharedLength": 4.0, "openings": openings,
+                           "length": 4.0, "height": 2.7, "grossArea": 10.8, "netArea": 8.91}
+            walls.append({"id": wall_id, "floor": r // 50, "start": [r % 50 * 4.0, r // 50 * 3.5],
+                          "end": [r % 50 * 4.0 + 4.0, r // 50 * 3.5], "thickness": "0.2", "height": "2.7",
+                          "blockType": "Standard Block", "connectedRooms": [f"room_{r}"], "isShared": False})
+        rooms.append({"roomType": "Bedroom", "room_name": f"Room {r}", "length": "4.0", "width": "3.5",
+                      "height": "2.7", "floor": r // 50, "blockType": "Standard Block", "plaster": "Both Sides",
+                      "wallConnectivity": {"roomId": f"room_{r}", "position": {"x": r % 50 * 4.0, "y": 0.0},
+                                           "walls": sides, "connectedRooms": [f"room_{r + 1}"]}})
+    # Multi-page sets repeat the sheets' shared walls on every page they appear
+    return {"rooms": rooms + copy.deepcopy(rooms[: n_rooms // 4]), "walls": walls, "floors": n_rooms // 50 + 1}
+
+
+# Benchmark: python compact.py [n_rooms]
+if __name__ == "__main__":
+    import json
+
+    from fastapi.encoders import jsonable_encoder
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    result = _synthetic_result(n)
+    assert from_compact(to_compact(result)) == result
+
+    def timed(fn, repeat=5):
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = fn()
+            best = min(best, time.perf_counter() - t0)
+        return out, best * 1000
+
+    legacy, legacy_ms = timed(lambda: json.dumps(jsonable_encoder(result)).encode())
+    nested, nested_ms = timed(lambda: orjson.dumps(result, option=ORJSON_OPTIONS))
+    compact, compact_ms = timed(lambda: orjson.dumps(to_compact(result), option=ORJSON_OPTIONS))
+    print(f"⏱️ {n} rooms: FastAPI default {legacy_ms:.1f} ms, orjson nested {nested_ms:.1f} ms, "
+          f"compact + orjson {compact_ms:.1f} ms")
+    for label, body in (("nested", nested), ("compact", compact)):
+        gz, gz_ms = timed(lambda: gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), 3)
+        line = f"📦 {label:8s} {len(body) / 1024:8.0f} KB raw, {len(gz) / 1024:6.0f} KB gzip ({gz_ms:.0f} ms)"
+        if brotli is not None:
+            br, br_ms = timed(lambda: brotli.compress(body, quality=BROTLI_QUALITY), 3)
+            line += f", {len(br) / 1024:6.0f} KB br ({br_ms:.0f} ms)"
+        print(line)
@@ -0,0 +1,518 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import os
+import sys
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import metrics
+import raster
+from quantities import _to_float, _endpoints
+from upload_buffer import Buffer
+from walls import merge_segments
+
+# off: skip; shadow: detect and record agreement with the model; hints: also describe the layout in the prompt
+CV_MODE = os.getenv("CV_MODE", "off")
+# Long side of the raster walls and rooms are detected on
+CV_SIZE = int(os.getenv("CV_SIZE", "2000"))
+# Thinnest and thickest stroke that can be a wall, as shares of CV_SIZE (thinner lines are annotation)
+MIN_WALL_THICKNESS = float(os.getenv("CV_MIN_WALL_THICKNESS", "0.002"))
+MAX_WALL_THICKNESS = float(os.getenv("CV_MAX_WALL_THICKNESS", "0.015"))
+# Shortest wall, as a share of CV_SIZE
+MIN_WALL_LENGTH = float(os.getenv("CV_MIN_WALL_LENGTH", "0.02"))
+# Gaps between wall ends of this many wall thicknesses are door or window openings
+MIN_OPENING = 2.0
+MAX_OPENING = 14.0
+# Smallest room, as a share of the drawing's extent
+MIN_ROOM_SHARE = float(os.getenv("CV_MIN_ROOM_SHARE", "0.004"))
+# Share of a hollow wall's length its edge lines must cover
+EDGE_COVERAGE = 0.85
+# Share of a door symbol's pixels on the swing arc, and of the quarter circle it must cover
+ARC_SHARE = 0.35
+ARC_COVERAGE = 0.6
+# Walls this close to horizontal/vertical are left to the orthogonal pass
+DIAGONAL_MIN_DEG = 5.0
+# Rooms listed in the prompt hint
+HINT_ROOMS = 40
+
+
+def binarize(gray: np.ndarray) -> np.ndarray:
+    """Ink mask (255 = ink) of a greyscale page, Otsu-thresholded"""
+    gray = np.ascontiguousarray(gray)
+    if np.median(gray) < 128:
+        gray = 255 - gray  # dark-background CAD export
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    return ink
+
+
+def _square(size: int) -> np.ndarray:
+    return cv2.getStructuringElement(cv2.MORPH_RECT, (size, size))
+
+
+def _orthogonal_walls(mask: np.ndarray, min_len: int, max_thickness: int,
+                      ink: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+    """Horizontal and vertical walls: long runs of the mask, one box per connected run.
+
+    With ink the mask holds closed-up line pairs, and a box only counts as a
+    (hollow) wall when two separate lines of ink run its full length; text
+    lines closed into bars do not.
+    """
+    walls = []
+    for axis in (0, 1):
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (min_len, 1) if axis == 0 else (1, min_len))
+        runs = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(runs, connectivity=4)
+        for x, y, w, h, _ in stats[1:]:
+            thickness = h if axis == 0 else w
+            if thickness > max_thickness:
+                continue
+            if ink is not None:
+                box = ink[y:y + h, x:x + w] > 0
+                coverage = (box if axis == 0 else box.T).mean(axis=1)
+                lines = np.flatnonzero(coverage >= EDGE_COVERAGE)
+                if not len(lines) or lines[-1] - lines[0] < max(2, thickness // 3):
+                    continue
+            if axis == 0:
+                centre = float(y + (h - 1) / 2)
+                start, end = [float(x), centre], [float(x + w - 1), centre]
+            else:
+                centre = float(x + (w - 1) / 2)
+                start, end = [centre, float(y)], [centre, float(y + h - 1)]
+            walls.append({"start": start, "end": end, "thickness": int(thickness),
+                          "box": [int(x), int(y), int(w), int(h)]})
+    return walls
+
+
+def _flanked(wall: Dict[str, Any], solid: np.ndarray, reach: int) -> bool:
+    """Whether solid wall continues beyond both ends of a segment, along its axis"""
+    x, y, w, h = wall["box"]
+    if wall["start"][1] == wall["end"][1]:
+        band, lo, hi = solid[y:y + h, :], x, x + w
+    else:
+        band, lo, hi = solid[:, x:x + w].T, y, y + h
+    return bool(band[:, max(lo - reach, 0):lo].any() and band[:, hi:hi + reach].any())
+
+
+def _diagonal_walls(residue: np.ndarray, min_len: int, thickness: int) -> List[Dict[str, Any]]:
+    """Sloped walls by probabilistic Hough on what the orthogonal pass left, merged per line"""
+    lines = cv2.HoughLinesP(residue, 1, np.pi / 180, threshold=min_len, minLineLength=min_len, maxLineGap=thickness)
+    if lines is None:
+        return []
+    coords = lines.reshape(-1, 4).astype(np.float64)
+    angle = np.degrees(np.arctan2(coords[:, 3] - coords[:, 1], coords[:, 2] - coords[:, 0])) % 90.0
+    coords = coords[(angle > DIAGONAL_MIN_DEG) & (angle < 90.0 - DIAGONAL_MIN_DEG)]
+    if not len(coords):
+        return []
+    # The edges of one thick stroke come back as several parallel lines
+    canonical = merge_segments(coords, np.zeros(len(coords)), float(thickness))
+    distance = cv2.distanceTransform(residue, cv2.DIST_L2, 3)
+    walls = []
+    for group in np.unique(canonical):
+        members = coords[canonical == group]
+        x0, y0, x1, y1 = members[np.argmax(np.hypot(members[:, 2] - members[:, 0], members[:, 3] - members[:, 1]))]
+        direction = np.array([x1 - x0, y1 - y0]) / max(np.hypot(x1 - x0, y1 - y0), 1e-9)
+        points = members.reshape(-1, 2)
+        along = (points - [x0, y0]) @ direction
+        start, end = np.array([x0, y0]) + along.min() * direction, np.array([x0, y0]) + along.max() * direction
+        mx, my = np.clip(((start + end) / 2).round().astype(int), 0, [residue.shape[1] - 1, residue.shape[0] - 1])
+        walls.append({
+            "start": start.round(1).tolist(),
+            "end": end.round(1).tolist(),
+            "thickness": max(int(round(2 * distance[my, mx])), 1),
+        })
+    return walls
+
+
+def _door_arcs(thin: np.ndarray, min_size: int, max_size: int) -> List[Dict[str, Any]]:
+    """Door symbols: a leaf line and a quarter-circle swing around a hinge at a box corner"""
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(thin, connectivity=8)
+    arcs = []
+    for i in range(1, n):
+        x, y, w, h, _ = stats[i]
+        if not (min_size <= max(w, h) <= max_size) or not 0.6 <= w / h <= 1.6:
+            continue
+        ys, xs = np.nonzero(labels[y:y + h, x:x + w] == i)
+        radius = max(w, h) - 1
+        tolerance = max(2.0, 0.08 * radius)
+        best = None
+        for cx, cy in ((0, 0), (w - 1, 0), (0, h - 1), (w - 1, h - 1)):
+            on_arc = np.abs(np.hypot(xs - cx, ys - cy) - radius) < tolerance
+            share = float(on_arc.mean())
+            if best is None or share > best[0]:
+                best = (share, cx, cy, on_arc)
+        share, cx, cy, on_arc = best
+        if share < ARC_SHARE:
+            continue
+        angles = np.degrees(np.arctan2(np.abs(ys[on_arc] - cy), np.abs(xs[on_arc] - cx)))
+        if np.count_nonzero(np.bincount(np.minimum(angles // 10, 8).astype(int), minlength=9)) / 9 < ARC_COVERAGE:
+            continue
+        arcs.append({"hinge": [int(x + cx), int(y + cy)], "radius": int(radius)})
+    return arcs
+
+
+def _segment_distance(point, start, end) -> float:
+    p, a, b = np.asarray(point, float), np.asarray(start, float), np.asarray(end, float)
+    t = np.clip((p - a) @ (b - a) / max((b - a) @ (b - a), 1e-9), 0.0, 1.0)
+    return float(np.hypot(*(p - a - t * (b - a))))
+
+
+def _openings(barrier: np.ndarray, thin: np.ndarray, walls: List[Dict[str, Any]], arcs: List[Dict[str, Any]],
+              thickness: int) -> List[Dict[str, Any]]:
+    """Gaps from each wall end to the next wall along its axis, classified by what is drawn in them"""
+    height, width = barrier.shape
+    max_gap = int(MAX_OPENING * thickness)
+    found = {}
+    for wall in walls:
+        x, y, w, h = wall["box"]
+        axis = 0 if wall["start"][1] == wall["end"][1] else 1
+        across = int(round(wall["start"][1] if axis == 0 else wall["start"][0]))
+        line = barrier[across, :] if axis == 0 else barrier[:, across]
+        lo, hi = (x, x + w) if axis == 0 else (y, y + h)
+        for direction in (-1, 1):
+            if direction == 1:
+                ray = line[hi:min(hi + max_gap, len(line))]
+            else:
+                ray = line[max(lo - max_gap, 0):lo][::-1]
+            hits = np.flatnonzero(ray)
+            if not len(hits) or hits[0] == 0:
+                continue
+            gap = int(hits[0])
+            start, end = (hi, hi + gap) if direction == 1 else (lo - gap, lo)
+            key = (axis, across // max(thickness, 1), start // 2, end // 2)
+            if key not in found:
+                found[key] = (axis, across, start, end, wall["thickness"])
+
+    openings = []
+    for axis, across, start, end, wall_thickness in found.values():
+        half = max(wall_thickness // 2, 1)
+        a0, a1 = max(across - half, 0), min(across + half + 1, height if axis == 0 else width)
+        region = thin[a0:a1, start:end] if axis == 0 else thin[start:end, a0:a1].T
+        ends = ([start, across], [end, across]) if axis == 0 else ([across, start], [across, end])
+        gap = end - start
+        kind = "opening"
+        if gap >= MIN_OPENING * thickness:
+            # Windows are drawn as parallel thin lines spanning the gap
+            spanning = (region > 0).mean(axis=1) >= 0.8 if region.size else np.zeros(0, bool)
+            strokes = int(np.count_nonzero(np.diff(np.r_[0, spanning.astype(np.int8)]) == 1))
+            # A door's hinge sits on the gap (next to the wall end, or further in beside a short stub)
+            near_hinge = any(
+                _segment_distance(arc["hinge"], *ends) <= 1.5 * wall_thickness + 2
+                and 0.6 * gap <= arc["radius"] <= 1.4 * gap
+                for arc in arcs
+            )
+            kind = "door" if near_hinge else "window" if strokes >= 2 else "opening"
+        openings.append({"type": kind, "start": [float(v) for v in ends[0]], "end": [float(v) for v in ends[1]],
+                         "width": gap, "thickness": wall_thickness})
+    return openings
+
+
+def _rooms(barrier: np.ndarray, openings: List[Dict[str, Any]], thickness: int) -> List[Dict[str, Any]]:
+    """Enclosed spaces: wall mask with openings bridged, exterior flood-filled from the border"""
+    closed = barrier.copy()
+    for opening in openings:
+        (x0, y0), (x1, y1) = opening["start"], opening["end"]
+        cv2.line(closed, (int(x0), int(y0)), (int(x1), int(y1)), 255, thickness=max(opening["thickness"], 1))
+    free = np.pad(cv2.bitwise_not(closed), 1, constant_values=255)
+    cv2.floodFill(free, None, (0, 0), 0)
+    free = free[1:-1, 1:-1]
+
+    ys, xs = np.nonzero(barrier)
+    if not len(xs):
+        return []
+    extent = (xs.max() - xs.min() + 1) * (ys.max() - ys.min() + 1)
+    n, labels, stats, centroids = cv2.connectedComponentsWithStats(free, connectivity=4)
+    rooms = []
+    for i in range(1, n):
+        x, y, w, h, area = stats[i]
+        if area < MIN_ROOM_SHARE * extent or min(w, h) < 2 * thickness:
+            continue
+        mask = (labels[y:y + h, x:x + w] == i).astype(np.uint8)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        outline = cv2.approxPolyDP(max(contours, key=cv2.contourArea), max(thickness, 2), True).reshape(-1, 2)
+        rooms.append({
+            "polygon": (outline + [x, y]).tolist(),
+            "area": int(area),
+            "bbox": [int(x), int(y), int(x + w), int(y + h)],
+            "centroid": [round(float(c), 1) for c in centroids[i]],
+        })
+    rooms.sort(key=lambda r: (r["bbox"][1] // max(thickness * 4, 1), r["bbox"][0]))
+    for n, room in enumerate(rooms, 1):
+        room["id"] = f"cv_room_{n}"
+    return rooms
+
+
+def detect(gray: np.ndarray) -> Dict[str, Any]:
+    """Walls, openings and rooms of one page, in pixels of a raster with CV_SIZE on the long side"""
+    start = time.perf_counter()
+    scale = CV_SIZE / max(gray.shape)
+    if scale < 1:
+        gray = cv2.resize(np.ascontiguousarray(gray), None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    size = max(gray.shape)
+    min_thickness = max(2, round(size * MIN_WALL_THICKNESS))
+    max_thickness = max(min_thickness + 1, round(size * MAX_WALL_THICKNESS))
+    min_len = max(8, round(size * MIN_WALL_LENGTH))
+
+    ink = binarize(gray)
+    # Solid walls survive opening with a wall-thick square; hollow ones (line pairs) are closed first
+    solid = cv2.morphologyEx(ink, cv2.MORPH_OPEN, _square(min_thickness))
+    hollow = cv2.morphologyEx(cv2.morphologyEx(ink, cv2.MORPH_CLOSE, _square(min_thickness * 3)),
+                              cv2.MORPH_OPEN, _square(min_thickness))
+    hollow = cv2.bitwise_and(hollow, cv2.bitwise_not(cv2.dilate(solid, _square(min_thickness))))
+
+    walls = _orthogonal_walls(solid, min_len, max_thickness)
+    windows = []
+    for wall in _orthogonal_walls(hollow, min_len, max_thickness, ink):
+        # Line pairs between two solid walls are windows drawn in the wall
+        (windows if _flanked(wall, solid, 2 * max_thickness) else walls).append(wall)
+    barrier = np.zeros_like(ink)
+    for wall in walls + windows:
+        x, y, w, h = wall["box"]
+        barrier[y:y + h, x:x + w] = 255
+    thickness = int(np.median([w["thickness"] for w in walls])) if walls else min_thickness
+    residue = cv2.bitwise_and(solid, cv2.bitwise_not(cv2.dilate(barrier, _square(3))))
+    diagonal = _diagonal_walls(residue, min_len, thickness)
+    for wall in diagonal:
+        cv2.line(barrier, tuple(int(v) for v in wall["start"]), tuple(int(v) for v in wall["end"]), 255,
+                 thickness=wall["thickness"])
+
+    # Annotation strokes: ink off the walls, including wall stubs too short to be walls
+    thin = cv2.bitwise_and(ink, cv2.bitwise_not(cv2.dilate(cv2.bitwise_or(barrier, solid), _square(3))))
+    arcs = _door_arcs(thin, int(MIN_OPENING * thickness), int(MAX_OPENING * thickness * 1.2))
+    openings = _openings(barrier, thin, walls, arcs, thickness)
+    rooms = _rooms(barrier, openings, thickness)
+
+    for wall in walls:
+        del wall["box"]
+    openings = [o for o in openings if o["type"] != "opening" or o["width"] >= MIN_OPENING * thickness]
+    openings += [{"type": "window", "start": w["start"], "end": w["end"], "thickness": w["thickness"],
+                  "width": int(max(w["box"][2], w["box"][3]))} for w in windows]
+    elapsed = time.perf_counter() - start
+    metrics.observe("cv_detect_seconds", elapsed)
+    return {
+        "size": [int(gray.shape[1]), int(gray.shape[0])],
+        "wallThickness": thickness,
+        "walls": walls + diagonal,
+        "openings": openings,
+        "rooms": rooms,
+        "elapsedMs": round(elapsed * 1000, 2),
+    }
+
+
+def to_metres(detection: Dict[str, Any], metres_per_px: float) -> Dict[str, Any]:
+    """Add metric sizes to a detection, given its page's calibration"""
+    detection["metresPerPixel"] = metres_per_px
+    for wall in detection["walls"]:
+        wall["lengthM"] = round(float(np.hypot(wall["end"][0] - wall["start"][0],
+                                               wall["end"][1] - wall["start"][1])) * metres_per_px, 3)
+    for opening in detection["openings"]:
+        opening["widthM"] = round(opening["width"] * metres_per_px, 3)
+    for room in detection["rooms"]:
+        room["areaM2"] = round(room["area"] * metres_per_px ** 2, 2)
+    return detection
+
+
+def detect_document(buffer: Buffer, mime_type: str, max_pages: Optional[int] = 1) -> List[Dict[str, Any]]:
+    """Detections for the first pages of an image or PDF, or [] if it cannot be rendered"""
+    try:
+        return [detect(gray) for gray in raster.pages(buffer, mime_type, CV_SIZE, max_pages)]
+    except Exception as e:
+        print(f"⚠️ Could not detect walls: {e}", file=sys.stderr)
+        return []
+
+
+def layout_hints(detections: List[Dict[str, Any]]) -> str:
+    """Prompt section describing the detected layout, or "" when nothing useful was found"""
+    if not detections or not detections[0]["rooms"]:
+        return ""
+    detection = detections[0]
+    width, height = detection["size"]
+    rooms = detection["rooms"][:HINT_ROOMS]
+    scale = detection.get("metresPerPixel")
+    boxes = "; ".join(
+        f"[{x0 / width:.2f}, {y0 / height:.2f}, {x1 / width:.2f}, {y1 / height:.2f}]"
+        + (f" ≈ {(x1 - x0) * scale:.1f} x {(y1 - y0) * scale:.1f} m" if scale else "")
+        for x0, y0, x1, y1 in (room["bbox"] for room in rooms)
+    )
+    kinds = [o["type"] for o in detection["openings"]]
+    return f"""
+### 📐 DETECTED LAYOUT (automatic line detection; may miss or split spaces):
+- {len(detection["rooms"])} enclosed spaces, as [left, top, right, bottom] fractions of the sheet: {boxes}
+- {len(detection["walls"])} wall segments, {kinds.count("door")} door swings and {kinds.count("window")} windows in the walls
+- Treat each enclosed space as a candidate room: confirm it against its label and dimensions, and look for rooms this list missed
+"""
+
+
+def _shares(areas: List[float]) -> np.ndarray:
+    total = sum(areas)
+    return np.array(sorted(areas, reverse=True)) / total if total > 0 else np.zeros(0)
+
+
+def agreement(detections: List[Dict[str, Any]], result: Dict[str, Any]) -> Dict[str, Any]:
+    """How well detected rooms, walls and openings match a model result.
+
+    Detections are in pixels and results in metres, so rooms are compared
+    by their share of the total floor area (largest against largest), and
+    wall length after scaling by the ratio of total room areas.
+    """
+    cv_areas = [float(room["area"]) for d in detections for room in d["rooms"]]
+    rooms = [r for r in result.get("rooms") or [] if isinstance(r, dict)]
+    model_areas = [a for a in (_to_float(r.get("length")) * _to_float(r.get("width")) for r in rooms) if a > 0]
+    cv_shares, model_shares = _shares(cv_areas), _shares(model_areas)
+    n = max(len(cv_shares), len(model_shares))
+    area_agreement = None
+    if len(cv_shares) and len(model_shares):
+        difference = np.abs(np.pad(cv_shares, (0, n - len(cv_shares))) - np.pad(model_shares, (0, n - len(model_shares))))
+        area_agreement = round(1 - 0.5 * float(difference.sum()), 4)
+
+    length_ratio = None
+    # Walls the model gave no coordinates for have no length to compare
+    model_walls = [e for e in (_endpoints(w) for w in result.get("walls") or [] if isinstance(w, dict))
+                   if e is not None and np.isfinite(e).all()]
+    model_length = sum(np.hypot(x1 - x0, y1 - y0) for x0, y0, x1, y1 in model_walls)
+    if cv_areas and model_areas and model_length > 0:
+        metres_per_px = np.sqrt(sum(model_areas) / sum(cv_areas))
+        cv_length = sum(np.hypot(w["end"][0] - w["start"][0], w["end"][1] - w["start"][1])
+                        for d in detections for w in d["walls"])
+        length_ratio = round(float(cv_length * metres_per_px / model_length), 3)
+
+    model_openings = {
+        opening.get("id") or id(opening)
+        for room in rooms
+        for wall in ((room.get("wallConnectivity") or {}).get("walls") or {}).values() if isinstance(wall, dict)
+        for opening in wall.get("openings") or [] if isinstance(opening, dict)
+    }
+    # With a calibrated scale the total floor area can be compared directly
+    area_ratio = None
+    if model_areas and detections and all(d.get("metresPerPixel") for d in detections):
+        area_ratio = round(sum(r["areaM2"] for d in detections for r in d["rooms"]) / sum(model_areas), 3)
+    return {
+        "rooms": {"detected": len(cv_areas), "model": len(model_areas), "areaAgreement": area_agreement,
+                  "areaRatio": area_ratio},
+        "walls": {"detected": sum(len(d["walls"]) for d in detections), "lengthRatio": length_ratio},
+        "openings": {"detected": sum(len(d["openings"]) for d in detections), "model": len(model_openings)},
+    }
+
+
+def record_agreement(detections: List[Dict[str, Any]], result: Any) -> None:
+    if not detections or not isinstance(result, dict) or "error" in result:
+        return
+    scores = agreement(detections, result)
+    metrics.observe("cv_room_count_error", abs(scores["rooms"]["detected"] - scores["rooms"]["model"]))
+    if scores["rooms"]["areaAgreement"] is not None:
+        metrics.observe("cv_room_area_agreement", scores["rooms"]["areaAgreement"])
+    if scores["rooms"]["areaRatio"] is not None:
+        metrics.observe("cv_room_area_ratio", scores["rooms"]["areaRatio"])
+
+
+def _split(rng: np.random.Generator, box: Tuple[int, int, int, int], min_side: int) -> List[Tuple]:
+    """Guillotine-split a box into rooms; returns leaf boxes and the split walls"""
+    x0, y0, x1, y1 = box
+    w, h = x1 - x0, y1 - y0
+    axis = 0 if w >= h else 1
+    if max(w, h) < 2 * min_side or (rng.random() < 0.25 and max(w, h) < 3 * min_side):
+        return [("room", box)]
+    cut = int(rng.integers(min_side, (w if axis == 0 else h) - min_side + 1))
+    if axis == 0:
+        first, second, wall = (x0, y0, x0 + cut, y1), (x0 + cut, y0, x1, y1), (x0 + cut, y0, x0 + cut, y1)
+    else:
+        first, second, wall = (x0, y0, x1, y0 + cut), (x0, y0 + cut, x1, y1), (x0, y0 + cut, x1, y0 + cut)
+    return [("wall", wall)] + _split(rng, first, min_side) + _split(rng, second, min_side)
+
+
+def _synthetic_plan(rng: np.random.Generator, size=(1400, 2000), metres_per_px: float = 0.01):
+    """Drawn plan with solid walls, door swings, windows and labels, and the rooms it shows"""
+    page = np.full(size, 255, np.uint8)
+    outer = (150, 150, size[1] - 150, size[0] - 150)
+    t = 10
+    parts = _split(rng, outer, 260)
+    x0, y0, x1, y1 = outer
+    cv2.rectangle(page, (x0 - t // 2, y0 - t // 2), (x1 + t // 2, y1 + t // 2), 0, thickness=t)
+    door = 85
+    for kind, (a, b, c, d) in parts:
+        if kind != "wall":
+            continue
+        cv2.line(page, (a, b), (c, d), 0, thickness=t)
+        # One door per interior wall: cut the gap, draw leaf and swing
+        if a == c:
+            at = int(rng.integers(b + 2 * t, d - door - 2 * t))
+            page[at:at + door, a - t // 2 - 1:a + t // 2 + 2] = 255
+            cv2.line(page, (a, at), (a + door, at), 0, 1)
+            cv2.ellipse(page, (a, at), (door, door), 0, 0, 90, 0, 1)
+        else:
+            at = int(rng.integers(a + 2 * t, c - door - 2 * t))
+            page[b - t // 2 - 1:b + t // 2 + 2, at:at + door] = 255
+            cv2.line(page, (at, b), (at, b + door), 0, 1)
+            cv2.ellipse(page, (at, b), (door, door), 0, 0, 90, 0, 1)
+    # Windows in the top and bottom exterior walls
+    for wx in rng.integers(x0 + 60, x1 - 200, 3):
+        for wy in (y0, y1):
+            page[wy - t // 2 - 1:wy + t // 2 + 2, wx:wx + 120] = 255
+            for offset in (-t // 2, 0, t // 2):
+                page[wy + offset, wx:wx + 120] = 0
+    rooms = []
+    for kind, (a, b, c, d) in parts:
+        if kind == "room":
+            cv2.putText(page, f"ROOM {len(rooms) + 1}", ((a + c) // 2 - 50, (b + d) // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.8, 0, 2)
+            cv2.putText(page, f"{(c - a) * metres_per_px:.1f} x {(d - b) * metres_per_px:.1f}",
+                        ((a + c) // 2 - 50, (b + d) // 2 + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, 0, 1)
+            rooms.append({"length": (c - a - t) * metres_per_px, "width": (d - b - t) * metres_per_px})
+    walls = [{"start": [a * metres_per_px, b * metres_per_px], "end": [c * metres_per_px, d * metres_per_px]}
+             for kind, (a, b, c, d) in parts if kind == "wall"]
+    walls += [{"start": [p * metres_per_px for p in s], "end": [p * metres_per_px for p in e]}
+              for s, e in (((x0, y0), (x1, y0)), ((x1, y0), (x1, y1)), ((x1, y1), (x0, y1)), ((x0, y1), (x0, y0)))]
+    return page, {"rooms": rooms, "walls": walls}
+
+
+def _report(label: str, timings: List[float], scores: List[Dict[str, Any]]) -> None:
+    timings = sorted(timings)
+    exact = sum(s["rooms"]["detected"] == s["rooms"]["model"] for s in scores)
+    areas = [s["rooms"]["areaAgreement"] for s in scores if s["rooms"]["areaAgreement"] is not None]
+    ratios = [s["walls"]["lengthRatio"] for s in scores if s["walls"]["lengthRatio"] is not None]
+    print(f"⏱️ {label}: {len(timings)} pages, detect p50 {timings[len(timings) // 2] * 1000:.0f} ms, "
+          f"max {timings[-1] * 1000:.0f} ms; room count exact {exact}/{len(scores)}, "
+          f"area agreement mean {np.mean(areas) if areas else float('nan'):.3f}, "
+          f"wall length ratio median {np.median(ratios) if ratios else float('nan'):.2f}")
+
+
+# Benchmark: python cv_detect.py [golden_corpus]
+# Without a corpus, synthetic plans are scored against the rooms they were drawn from;
+# with one, each plan's recorded model output (see golden.py) is the reference.
+if __name__ == "__main__":
+    timings, scores = [], []
+    if len(sys.argv) > 1:
+        import fixtures
+        from golden import parse_plan
+        from parser import MIME_TYPES
+
+        corpus = sys.argv[1]
+        fixtures.MODE, fixtures.FIXTURE_DIR, fixtures.REPLAY_SPEED = "replay", os.path.join(corpus, "fixtures"), 0.0
+        for name in sorted(os.listdir(os.path.join(corpus, "plans"))):
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in MIME_TYPES:
+                continue
+            path = os.path.join(corpus, "plans", name)
+            with open(path, "rb") as f:
+                data = f.read()
+            detections = detect_document(data, MIME_TYPES[ext], None)
+            timings += [d["elapsedMs"] / 1000 for d in detections]
+            try:
+                result = parse_plan(path)[0]
+            except Exception as e:
+                print(f"⚠️ {name}: no recorded model output ({e})")
+                continue
+            scores.append(agreement(detections, result))
+            print(f"{name}: {scores[-1]}")
+        _report("corpus", timings, scores)
+    else:
+        rng = np.random.default_rng(0)
+        for _ in range(30):
+            page, truth = _synthetic_plan(rng)
+            detection = detect(page)
+            timings.append(detection["elapsedMs"] / 1000)
+            scores.append(agreement([detection], truth))
+        _report("synthetic", timings, scores)
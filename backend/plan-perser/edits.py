@@ -0,0 +1,233 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import copy
+import sys
+import time
+from typing import Dict, Any, Callable, List, Sequence, Set, Tuple
+
+from floors import group_floors
+from geometry import build_connectivity
+from normalize import normalize_enums
+from quantities import recompute_quantities
+from takeoff import SECTIONS as TAKEOFF_SECTIONS, _items, _settings
+from walls import link_room_walls, merge_walls
+
+Path = Tuple[str, ...]
+
+# Sections computed entirely from the rest of the result; edits go to their inputs
+DERIVED_SECTIONS = {"connectivity", "floorPlans", "verticalStacks"}
+
+
+class Step:
+    """One derivation over the result: what it reads, what it runs after, what it rewrites"""
+
+    def __init__(self, name: str, inputs: Sequence[str], after: Sequence[str], writes: Sequence[str],
+                 run: Callable[[Dict[str, Any]], Any]):
+        self.name = name
+        self.inputs = [tuple(p.split("/")) for p in inputs]
+        self.after = tuple(after)
+        self.writes = tuple(writes)
+        self.run = run
+
+
+# In dependency order. Input patterns use "*" for one path segment and "**" for any rest.
+STEPS = [
+    Step("normalize", ["**"], [], [], normalize_enums),
+    Step("walls", ["walls/*/start", "walls/*/end", "walls/*/floor", "walls/*/thickness", "walls/*"], [],
+         ["walls"], merge_walls),
+    Step("connectivity", [
+        "rooms/*", "rooms/*/length", "rooms/*/width", "rooms/*/height", "rooms/*/floor", "rooms/*/id",
+        "rooms/*/wallConnectivity/position/**", "rooms/*/wallConnectivity/roomId",
+        "rooms/*/wallConnectivity/walls/*/openings/**",
+    ], [], ["rooms", "connectivity"], build_connectivity),
+    # Connectivity creates the walls of positioned rooms, so they are linked afterwards
+    Step("links", ["rooms/*/wallConnectivity/walls/**", "walls/**"], ["walls", "connectivity"],
+         ["rooms"], link_room_walls),
+    Step("quantities", ["rooms/**", "walls/**"], ["walls", "connectivity", "links"],
+         ["rooms", "walls", "connectivity"], recompute_quantities),
+    # Floor plans carry copies of their rooms and walls
+    Step("floors", ["rooms/**", "walls/**", "verticalElements/**"], ["walls", "connectivity", "links", "quantities"],
+         ["floorPlans", "verticalStacks", "floors", "verticalElements"], group_floors),
+]
+
+
+def parse_pointer(pointer: str) -> Path:
+    """JSON pointer ("/rooms/0/length") as a tuple of segments"""
+    if pointer == "":
+        return ()
+    if not pointer.startswith("/"):
+        raise ValueError(f"Invalid JSON pointer: {pointer!r}")
+    return tuple(p.replace("~1", "/").replace("~0", "~") for p in pointer[1:].split("/"))
+
+
+def _resolve(doc: Any, path: Path) -> Tuple[Any, str]:
+    """Parent container and final key of a path"""
+    if not path:
+        raise ValueError("Cannot edit the whole document")
+    parent = doc
+    for segment in path[:-1]:
+        if isinstance(parent, list):
+            parent = parent[_index(parent, segment)]
+        elif isinstance(parent, dict) and segment in parent:
+            parent = parent[segment]
+        else:
+            raise ValueError(f"Path not found: /{'/'.join(path)}")
+    return parent, path[-1]
+
+
+def _index(items: List[Any], segment: str, append: bool = False) -> int:
+    if append and segment == "-":
+        return len(items)
+    if not segment.isdigit() or int(segment) >= len(items) + (1 if append else 0):
+        raise ValueError(f"Invalid list index: {segment}")
+    return int(segment)
+
+
+def _get(doc: Any, path: Path) -> Any:
+    parent, key = _resolve(doc, path)
+    if isinstance(parent, list):
+        return parent[_index(parent, key)]
+    if isinstance(parent, dict) and key in parent:
+        return parent[key]
+    raise ValueError(f"Path not found: /{'/'.join(path)}")
+
+
+def apply_patch(doc: Dict[str, Any], operations: List[Dict[str, Any]]) -> List[Path]:
+    """Apply JSON Patch operations (add, remove, replace, move, copy, test) in place.
+
+    Returns the paths written, for finding the derived values to refresh.
+    Raises ValueError on a malformed operation or a failed test.
+    """
+    touched = []
+    for op in operations:
+        if not isinstance(op, dict) or "op" not in op or "path" not in op:
+            raise ValueError(f"Invalid patch operation: {op!r}")
+        kind, path = op["op"], parse_pointer(op["path"])
+        if path and path[0] in DERIVED_SECTIONS:
+            raise ValueError(f"/{path[0]} is derived from the other sections and cannot be edited")
+        if kind == "test":
+            if _get(doc, path) != op.get("value"):
+                raise ValueError(f"Test failed at {op['path']}")
+            continue
+        if kind in ("move", "copy"):
+            source = parse_pointer(op.get("from", ""))
+            value = copy.deepcopy(_get(doc, source))
+            if kind == "move":
+                _remove(doc, source)
+                touched.append(source)
+            _add(doc, path, value)
+        elif kind == "add":
+            _add(doc, path, copy.deepcopy(op.get("value")))
+        elif kind == "remove":
+            _remove(doc, path)
+        elif kind == "replace":
+            _get(doc, path)
+            parent, key = _resolve(doc, path)
+            parent[_index(parent, key) if isinstance(parent, list) else key] = copy.deepcopy(op.get("value"))
+        else:
+            raise ValueError(f"Unsupported patch operation: {kind}")
+        touched.append(path)
+    return touched
+
+
+def _add(doc: Any, path: Path, value: Any) -> None:
+    parent, key = _resolve(doc, path)
+    if isinstance(parent, list):
+        parent.insert(_index(parent, key, append=True), value)
+    elif isinstance(parent, dict):
+        parent[key] = value
+    else:
+        raise ValueError(f"Cannot add below a value: /{'/'.join(path)}")
+
+
+def _remove(doc: Any, path: Path) -> None:
+    parent, key = _resolve(doc, path)
+    if isinstance(parent, list):
+        del parent[_index(parent, key)]
+    elif isinstance(parent, dict) and key in parent:
+        del parent[key]
+    else:
+        raise ValueError(f"Path not found: /{'/'.join(path)}")
+
+
+def _matches(pattern: Path, path: Path) -> bool:
+    """Whether an edit at path can change a value the pattern reads.
+
+    Editing a parent (a whole room) touches every field below it.
+    """
+    for i, segment in enumerate(pattern):
+        if segment == "**" or i >= len(path):
+            return True
+        if segment != "*" and segment != path[i]:
+            return False
+    return len(path) == len(pattern)
+
+
+def plan_steps(touched: List[Path]) -> List[Step]:
+    """Steps whose inputs were edited, plus every step that runs after one of them"""
+    dirty: Set[str] = set()
+    for step in STEPS:
+        if any(_matches(p, path) for p in step.inputs for path in touched) \
+                or any(name in dirty for name in step.after):
+            dirty.add(step.name)
+    return [step for step in STEPS if step.name in dirty]
+
+
+def edit_result(result: Dict[str, Any], operations: List[Dict[str, Any]],
+                overrides: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Patch a stored result in place and refresh only what depends on the edits.
+
+    Returns the steps run, the top-level sections that changed (to write
+    back) and take-off totals of the trades whose inputs changed.
+    """
+    start = time.perf_counter()
+    touched = apply_patch(result, operations)
+    steps = plan_steps(touched)
+    edited = {path[0] for path in touched}
+    changed = set(edited)
+    for step in steps:
+        step.run(result)
+        changed.update(step.writes)
+
+    settings = _settings(overrides)
+    totals = {}
+    for name, section, compute in TAKEOFF_SECTIONS:
+        if section in changed:
+            totals[name] = compute(_items(result, section), settings)[1]
+    return {
+        "recomputed": [step.name for step in steps],
+        "changed": sorted(s for s in changed if s in result),
+        "removed": sorted(s for s in edited if s not in result),
+        "takeoff": totals,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+# Benchmark: python edits.py [n_rooms]
+if __name__ == "__main__":
+    from geometry import _synthetic_plan
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    plan = _synthetic_plan(n, max(n // 50, 1))
+    plan["concreteStructures"] = [{"id": "slab_1", "element": "slab", "length": "10", "width": "8", "height": "0.15"}]
+    build_connectivity(plan)
+    recompute_quantities(plan)
+    group_floors(plan)
+    edits = {
+        "room size": [{"op": "replace", "path": "/rooms/3/length", "value": "5.2"}],
+        "opening added": [{"op": "add", "path": "/rooms/3/wallConnectivity/walls/south/openings/-",
+                           "value": {"id": "window_new", "type": "window", "size": {"width": 1.2, "height": 1.2}}}],
+        "wall thickness": [{"op": "add", "path": "/rooms/3/thickness", "value": "0.15"}],
+        "slab depth": [{"op": "replace", "path": "/concreteStructures/0/height", "value": "0.2"}],
+    }
+    for label, ops in edits.items():
+        timings = []
+        for _ in range(20):
+            doc = copy.deepcopy(plan)
+            t0 = time.perf_counter()
+            report = edit_result(doc, ops)
+            timings.append(time.perf_counter() - t0)
+        timings.sort()
+        print(f"⏱️ {label:15s} {n} rooms: p50 {timings[len(timings) // 2] * 1000:.2f} ms, "
+              f"steps {report['recomputed']}, trades {list(report['takeoff'])}")
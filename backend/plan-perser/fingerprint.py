@@ -0,0 +1,121 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import sys
+import zlib
+from typing import Dict, Any, List
+
+import numpy as np
+from PIL import Image
+
+import raster
+from upload_buffer import Buffer
+
+# Long side of the raster fingerprints are computed on
+FINGERPRINT_SIZE = 1024
+# Ink is counted per CELL x CELL pixel block of that raster
+CELL = 8
+# Changed cells are reported per tile of TILE_CELLS x TILE_CELLS cells
+TILE_CELLS = 16
+HASH_SIDE = 8
+INK_CONTRAST = 40
+# A cell changed when its ink count moved by more than this many pixels and share
+CELL_MIN_DELTA = 2
+CELL_MIN_SHARE = 0.15
+
+
+def dhash(gray: np.ndarray) -> int:
+    """64-bit difference hash: sign of horizontal gradients on a 9x8 box-filtered thumbnail"""
+    small = np.asarray(
+        Image.fromarray(np.ascontiguousarray(gray)).resize((HASH_SIDE + 1, HASH_SIDE), Image.BOX),
+        dtype=np.int16,
+    )
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def ink_cells(gray: np.ndarray) -> np.ndarray:
+    """Ink pixel count per CELL x CELL block, on a raster with a fixed long side"""
+    h, w = gray.shape
+    scale = FINGERPRINT_SIZE / max(h, w)
+    size = (max(CELL, round(w * scale / CELL) * CELL), max(CELL, round(h * scale / CELL) * CELL))
+    page = np.asarray(Image.fromarray(np.ascontiguousarray(gray)).resize(size, Image.BOX), dtype=np.int16)
+    ink = page < np.percentile(page, 90) - INK_CONTRAST
+    ch, cw = page.shape[0] // CELL, page.shape[1] // CELL
+    return ink.reshape(ch, CELL, cw, CELL).sum(axis=(1, 3)).astype(np.uint8)
+
+
+def page_fingerprint(gray: np.ndarray) -> Dict[str, Any]:
+    """Whole-page hash to recognise the sheet, ink cells to find what changed on it"""
+    return {"hash": dhash(gray), "cells": ink_cells(gray)}
+
+
+def fingerprint_document(buffer: Buffer, mime_type: str) -> List[Dict[str, Any]]:
+    """Fingerprints of every page, or [] if the document cannot be rendered"""
+    try:
+        return [page_fingerprint(gray) for gray in raster.pages(buffer, mime_type, FINGERPRINT_SIZE)]
+    except Exception as e:
+        # Without fingerprints the document is analysed as a whole
+        print(f"⚠️ Could not fingerprint pages: {e}", file=sys.stderr)
+        return []
+
+
+def encode_cells(cells: np.ndarray) -> bytes:
+    return zlib.compress(np.array(cells.shape, dtype="<u2").tobytes() + cells.tobytes(), 6)
+
+
+def decode_cells(blob: bytes) -> np.ndarray:
+    raw = zlib.decompress(blob)
+    h, w = np.frombuffer(raw[:4], dtype="<u2")
+    return np.frombuffer(raw[4:], dtype=np.uint8).reshape(h, w)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def to_signed(value: int) -> int:
+    """Unsigned 64-bit hash as SQLite's signed INTEGER"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def from_signed(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def tile_count(cells: np.ndarray) -> int:
+    h, w = cells.shape
+    return -(-h // TILE_CELLS) * -(-w // TILE_CELLS)
+
+
+def cell_similarity(old: np.ndarray, new: np.ndarray) -> float:
+    """Correlation of ink cells after a 3x3 box blur, tolerant to a few pixels of shift"""
+    if old.shape != new.shape:
+        return 0.0
+
+    def blurred(cells: np.ndarray) -> np.ndarray:
+        padded = np.pad(cells.astype(np.float32), 1)
+        h, w = cells.shape
+        return sum(padded[r:r + h, c:c + w] for r in range(3) for c in range(3)).ravel()
+
+    a, b = blurred(old), blurred(new)
+    a, b = a - a.mean(), b - b.mean()
+    denominator = float(np.sqrt((a * a).sum() * (b * b).sum()))
+    return float((a * b).sum() / denominator) if denominator else float(np.array_equal(old, new))
+
+
+def changed_tiles(old: np.ndarray, new: np.ndarray) -> List[List[float]]:
+    """Boxes [x0, y0, x1, y1] (fractions of the page) of tiles with edited cells"""
+    if old.shape != new.shape:
+        return [[0.0, 0.0, 1.0, 1.0]]
+    a, b = old.astype(np.int16), new.astype(np.int16)
+    delta = np.abs(a - b)
+    changed = (delta > CELL_MIN_DELTA) & (delta > CELL_MIN_SHARE * np.maximum(a, b))
+    h, w = changed.shape
+    boxes = []
+    for r in range(0, h, TILE_CELLS):
+        for c in range(0, w, TILE_CELLS):
+            if changed[r:r + TILE_CELLS, c:c + TILE_CELLS].any():
+                boxes.append([round(c / w, 4), round(r / h, 4),
+                              round(min(c + TILE_CELLS, w) / w, 4), round(min(r + TILE_CELLS, h) / h, 4)])
+    return boxes
@@ -0,0 +1,167 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Dict, Any, Iterator
+
+import metrics
+
+# "record" saves every model response, "replay" serves saved ones instead of calling the API
+MODE = os.getenv("FIXTURE_MODE", "off")
+FIXTURE_DIR = os.getenv("FIXTURE_DIR", "fixtures")
+# Replayed latency as a multiple of the recorded one; 0 replays instantly
+REPLAY_SPEED = float(os.getenv("FIXTURE_REPLAY_SPEED", "1"))
+# Replay a response recorded with an older prompt when none matches the current one
+ALLOW_STALE = os.getenv("FIXTURE_ALLOW_STALE", "1") == "1"
+
+
+def _hash(data) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _path(file_hash: str, model_name: str, prompt_hash: str) -> str:
+    return os.path.join(FIXTURE_DIR, f"{file_hash[:32]}-{model_name}-{prompt_hash[:12]}.json")
+
+
+def _key(parts, model_name: str) -> Dict[str, Any]:
+    """Fixture identity of a model call made with [prompt, file part]"""
+    prompt, file_part = parts
+    return {
+        "fileHash": _hash(file_part["data"]),
+        "promptHash": _hash(prompt.encode()),
+        "model": model_name,
+        "mimeType": file_part["mime_type"],
+    }
+
+
+def save(key: Dict[str, Any], response: str, chunks, latency: float) -> str:
+    """Write one recorded response; chunks are (seconds since the call, text) pairs"""
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    path = _path(key["fileHash"], key["model"], key["promptHash"])
+    fixture = {
+        **key,
+        "recordedAt": time.time(),
+        "response": response,
+        "timing": {
+            "ttft": chunks[0][0] if chunks else latency,
+            "latency": latency,
+            "chunks": [[round(offset, 4), len(text)] for offset, text in chunks],
+        },
+    }
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(fixture, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+    return path
+
+
+def load(key: Dict[str, Any]) -> Dict[str, Any]:
+    """Recorded response for a call; one from an older prompt if allowed, else RuntimeError"""
+    path = _path(key["fileHash"], key["model"], key["promptHash"])
+    if not os.path.exists(path):
+        candidates = glob.glob(_path(key["fileHash"], key["model"], "*"))
+        if not candidates or not ALLOW_STALE:
+            metrics.increment("fixture_missing")
+            raise RuntimeError(f"No recorded {key['model']} response for file {key['fileHash'][:12]}")
+        # Prompt edited since recording: the newest response still exercises post-processing
+        path = max(candidates, key=os.path.getmtime)
+        metrics.increment("fixture_stale")
+        print(f"⚠️ Replaying {os.path.basename(path)} recorded with a different prompt", file=sys.stderr)
+    with open(path, encoding="utf-8") as f:
+        fixture = json.load(f)
+    metrics.increment("fixture_replayed")
+    return fixture
+
+
+class _Chunk:
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _chunk_text(chunk) -> str:
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+
+class RecordingModel:
+    """A Gemini model whose completed streamed responses are saved as fixtures"""
+
+    def __init__(self, model, model_name: str):
+        self.model = model
+        self.model_name = model_name
+
+    def generate_content(self, parts, **kwargs) -> Iterator[Any]:
+        key = _key(parts, self.model_name)
+        start = time.monotonic()
+        chunks = []
+        for chunk in self.model.generate_content(parts, **kwargs):
+            chunks.append((time.monotonic() - start, _chunk_text(chunk)))
+            yield chunk
+        # Only reached when the stream completed (not cancelled by a hedge)
+        save(key, "".join(text for _, text in chunks), chunks, time.monotonic() - start)
+        metrics.increment("fixture_recorded")
+
+
+class ReplayModel:
+    """Stand-in for a Gemini model that streams recorded responses at their recorded pace"""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def generate_content(self, parts, **kwargs) -> Iterator[_Chunk]:
+        fixture = load(_key(parts, self.model_name))
+        return self._stream(fixture)
+
+    @staticmethod
+    def _stream(fixture: Dict[str, Any]) -> Iterator[_Chunk]:
+        response = fixture["response"]
+        chunks = fixture["timing"]["chunks"] or [[fixture["timing"]["latency"], len(response)]]
+        start = time.monotonic()
+        position = 0
+        for offset, length in chunks:
+            delay = offset * REPLAY_SPEED - (time.monotonic() - start)
+            if delay > 0:
+                time.sleep(delay)
+            yield _Chunk(response[position:position + length])
+            position += length
+
+
+def model_for(model_name: str, load_model) -> Any:
+    """Model to stream from: recorded in replay mode, else load_model() (wrapped to record)"""
+    if MODE == "replay":
+        return ReplayModel(model_name)
+    model = load_model()
+    return RecordingModel(model, model_name) if MODE == "record" else model
+
+
+def summary() -> Dict[str, float]:
+    return {kind: metrics.count(f"fixture_{kind}") for kind in ("recorded", "replayed", "stale", "missing")}
+
+
+# Benchmark: python fixtures.py [n_chunks]
+if __name__ == "__main__":
+    import tempfile
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    FIXTURE_DIR = tempfile.mkdtemp()
+    text = json.dumps({"rooms": [{"roomType": "Bedroom", "length": "4", "width": "3"}] * n})
+    parts = ["prompt", {"mime_type": "application/pdf", "data": b"%PDF-1.7 plan"}]
+    step = max(len(text) // n, 1)
+    save(_key(parts, "model"), text, [(i * 0.001, text[i * step:(i + 1) * step] if i < n - 1 else text[i * step:])
+                                      for i in range(n)], n * 0.001)
+    for speed in (1.0, 0.0):
+        REPLAY_SPEED = speed
+        start = time.perf_counter()
+        replayed = "".join(c.text for c in ReplayModel("model").generate_content(parts))
+        assert replayed == text
+        print(f"⏱️ Replayed {n} chunks ({len(text) / 1024:.0f} KB, recorded over {n * 0.001:.2f}s) "
+              f"at speed {speed:g} in {time.perf_counter() - start:.3f}s")
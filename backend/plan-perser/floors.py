@@ -0,0 +1,322 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import os
+import re
+import sys
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from geometry import room_id
+from quantities import _to_float
+from upload_buffer import Buffer
+
+# Vertical elements of neighbouring floors within this many metres are one stack
+VERTICAL_TOLERANCE = float(os.getenv("FLOOR_VERTICAL_TOLERANCE", "0.6"))
+# Sheets holding several labelled floors are cut into one region per floor
+SPLIT_REGIONS = os.getenv("FLOOR_SPLIT_REGIONS", "1") == "1"
+# Sections whose items belong to a single floor
+FLOOR_SECTIONS = ("rooms", "walls", "verticalElements")
+# Raster size of the ink check that places labels above or below their drawings
+INK_PROBE_SIZE = 256
+
+_ORDINALS = {
+    "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5,
+    "sixth": 6, "seventh": 7, "eighth": 8, "ninth": 9, "tenth": 10,
+}
+_NAMES = {-1: "Basement", 0: "Ground Floor", **{n: f"{w.title()} Floor" for w, n in _ORDINALS.items()}}
+LABEL_PATTERN = re.compile(
+    r"\b(basement|lower\s+ground(?:\s+floor)?|ground(?:\s+floor)?|"
+    r"(?:" + "|".join(_ORDINALS) + r"|\d{1,2}(?:st|nd|rd|th))\s+floor|level\s+-?\d{1,2})"
+    r"\s+(?:plan|layout)s?\b",
+    re.IGNORECASE,
+)
+VERTICAL_TYPES = {
+    "column": "column", "pillar": "column", "pier": "column",
+    "stair": "staircase", "stairs": "staircase", "staircase": "staircase", "stairwell": "staircase",
+    "riser": "riser", "service riser": "riser", "duct": "riser", "shaft": "riser",
+    "lift": "lift-shaft", "elevator": "lift-shaft", "lift shaft": "lift-shaft", "lift-shaft": "lift-shaft",
+}
+
+
+def floor_level(label: str) -> Optional[int]:
+    """Level number of a floor label (0 = ground, -1 = basement)"""
+    words = " ".join(label.lower().split())
+    if words.startswith(("basement", "lower ground")):
+        return -1
+    if words.startswith("ground"):
+        return 0
+    if words.startswith("level"):
+        return int(words.split()[1])
+    first = words.split()[0]
+    if first in _ORDINALS:
+        return _ORDINALS[first]
+    match = re.match(r"\d+", first)
+    return int(match.group()) if match else None
+
+
+def floor_name(level: int) -> str:
+    if level in _NAMES:
+        return _NAMES[level]
+    if level < 0:
+        return f"Basement {-level}"
+    return f"Level {level}"
+
+
+def _labels(page) -> Dict[int, Tuple[List[float], str]]:
+    """Largest label per floor level on a PDF page: (bbox, text)"""
+    found: Dict[int, Tuple[float, List[float], str]] = {}
+    for block in page.get_text("dict")["blocks"]:
+        lines = block.get("lines") or []
+        spans = [span for line in lines for span in line["spans"]]
+        if not spans:
+            continue
+        text = " ".join(" ".join(span["text"] for span in line["spans"]) for line in lines)
+        size = max(span["size"] for span in spans)
+        for match in LABEL_PATTERN.finditer(text):
+            level = floor_level(match.group(1))
+            if level is not None and size > found.get(level, (0.0,))[0]:
+                found[level] = (size, list(block["bbox"]), match.group(0))
+    return {level: (bbox, text) for level, (_, bbox, text) in found.items()}
+
+
+def _ink_profile(page, axis: int) -> np.ndarray:
+    import fitz
+
+    zoom = INK_PROBE_SIZE / max(page.rect.width, page.rect.height, 1)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    gray = np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    return (gray < 160).mean(axis=1 - axis)
+
+
+def _regions(page, labels: Dict[int, Tuple[List[float], str]]) -> List[Dict[str, Any]]:
+    """One clip box (fractions of the page) per labelled floor.
+
+    Side-by-side drawings are split halfway between their (centred) labels.
+    Stacked drawings are split at the labels themselves, after checking on a
+    small raster whether the labels sit above or below their drawings.
+    """
+    width, height = page.rect.width, page.rect.height
+    items = [(level, bbox) for level, (bbox, _) in labels.items()]
+    xs = np.array([(b[0] + b[2]) / 2 / width for _, b in items])
+    ys = np.array([(b[1] + b[3]) / 2 / height for _, b in items])
+    axis = 0 if np.ptp(xs) >= np.ptp(ys) else 1
+    order = np.argsort(xs if axis == 0 else ys)
+    items = [items[i] for i in order]
+
+    if axis == 0:
+        centres = np.sort(xs)
+        cuts = ((centres[:-1] + centres[1:]) / 2).tolist()
+    else:
+        profile = _ink_profile(page, 1)
+        first_top, last_bottom = items[0][1][1] / height, items[-1][1][3] / height
+        above = profile[:int(first_top * len(profile))].sum()
+        below = profile[int(last_bottom * len(profile)):].sum()
+        if above >= below:  # labels under their drawings: each region ends at its label
+            cuts = [b[3] / height for _, b in items[:-1]]
+        else:
+            cuts = [b[1] / height for _, b in items[1:]]
+
+    bounds = [0.0] + [round(c, 4) for c in cuts] + [1.0]
+    regions = []
+    for (level, _), start, end in zip(items, bounds[:-1], bounds[1:]):
+        clip = [start, 0.0, end, 1.0] if axis == 0 else [0.0, start, 1.0, end]
+        regions.append({"level": level, "label": labels[level][1], "clip": clip})
+    return regions
+
+
+def detect_floors(buffer: Buffer, indices: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """Floor regions of the given PDF pages, from labels in their text layer.
+
+    A page with one labelled floor gets a single full-page region; pages
+    without labels (scans, details, schedules) are left out, as are
+    multi-floor pages when SPLIT_REGIONS is off.
+    """
+    import fitz
+
+    floors = {}
+    with fitz.open(stream=bytes(buffer), filetype="pdf") as doc:
+        for index in indices:
+            page = doc[index]
+            labels = _labels(page)
+            if not labels or (len(labels) > 1 and (page.rotation or not SPLIT_REGIONS)):
+                continue  # multi-floor sheets not split here are left to the model's own floors
+            if len(labels) == 1:
+                level = min(labels)
+                floors[index] = [{"level": level, "label": labels[level][1], "clip": None}]
+            else:
+                floors[index] = _regions(page, labels)
+    return floors
+
+
+def crop_pdf(buffer: Buffer, index: int, clips: List[List[float]]) -> List[bytes]:
+    """Single-page vector PDFs showing only the given regions of a page"""
+    import fitz
+
+    out = []
+    with fitz.open(stream=bytes(buffer), filetype="pdf") as doc:
+        rect = doc[index].rect
+        for x0, y0, x1, y1 in clips:
+            clip = fitz.Rect(rect.x0 + x0 * rect.width, rect.y0 + y0 * rect.height,
+                             rect.x0 + x1 * rect.width, rect.y0 + y1 * rect.height)
+            with fitz.open() as single:
+                single.new_page(width=clip.width, height=clip.height).show_pdf_page(
+                    fitz.Rect(0, 0, clip.width, clip.height), doc, index, clip=clip)
+                out.append(single.tobytes(garbage=1, deflate=True, no_new_id=True))
+    return out
+
+
+def tag_floor(result: Any, level: int) -> Any:
+    """Put every room, wall and vertical element of a result on a floor"""
+    if isinstance(result, dict) and "error" not in result:
+        for section in FLOOR_SECTIONS:
+            for item in result.get(section) or []:
+                if isinstance(item, dict):
+                    item["floor"] = level
+    return result
+
+
+def _level(item: Dict[str, Any]) -> int:
+    return int(_to_float(item.get("floor"), 0.0))
+
+
+def _origins(rooms: List[Dict[str, Any]]) -> Dict[int, np.ndarray]:
+    """South-west corner of the positioned rooms on each floor"""
+    corners: Dict[int, List[Tuple[float, float]]] = {}
+    for room in rooms:
+        position = (room.get("wallConnectivity") or {}).get("position")
+        if isinstance(position, dict):
+            corners.setdefault(_level(room), []).append((_to_float(position.get("x")), _to_float(position.get("y"))))
+    return {level: np.min(np.array(points), axis=0) for level, points in corners.items()}
+
+
+def align_vertical(elements: List[Dict[str, Any]], origins: Dict[int, np.ndarray],
+                   tolerance: float = VERTICAL_TOLERANCE) -> List[Dict[str, Any]]:
+    """Chain columns, stairs, risers and lift shafts floor by floor into stacks.
+
+    Floors analysed separately have their own origin, so positions are
+    compared after moving each floor's room footprint onto the lowest one.
+    Each element is matched to the nearest open stack of its type within
+    tolerance, nearest pairs first; unmatched elements start a new stack.
+    """
+    reference = origins[min(origins)] if origins else np.zeros(2)
+    by_floor: Dict[Tuple[str, int], List[int]] = {}
+    points = np.zeros((len(elements), 2))
+    for i, element in enumerate(elements):
+        position = element.get("position") or {}
+        kind = VERTICAL_TYPES.get(str(element.get("type") or "").strip().lower(), element.get("type") or "other")
+        element["type"] = kind
+        offset = reference - origins.get(_level(element), reference)
+        points[i] = (_to_float(position.get("x")) + offset[0], _to_float(position.get("y")) + offset[1])
+        by_floor.setdefault((kind, _level(element)), []).append(i)
+
+    stacks: List[Dict[str, Any]] = []
+    for kind, level in sorted(by_floor, key=lambda key: key[1]):
+        members = by_floor[(kind, level)]
+        open_stacks = [s for s in stacks if s["type"] == kind and s["floors"][-1] < level]
+        matched = set()
+        if open_stacks:
+            tops = np.array([points[s["members"][-1]] for s in open_stacks])
+            distance = np.linalg.norm(points[members][:, None, :] - tops[None, :, :], axis=2)
+            used_stacks = set()
+            for flat in np.argsort(distance, axis=None):
+                e, s = divmod(int(flat), len(open_stacks))
+                if distance[e, s] > tolerance:
+                    break
+                if e in matched or s in used_stacks:
+                    continue
+                matched.add(e)
+                used_stacks.add(s)
+                open_stacks[s]["members"].append(members[e])
+                open_stacks[s]["floors"].append(level)
+        for e, index in enumerate(members):
+            if e not in matched:
+                stacks.append({"type": kind, "floors": [level], "members": [index]})
+
+    out = []
+    for number, stack in enumerate(stacks, start=1):
+        stack_id = f"stack_{number}"
+        ids = []
+        for index in stack["members"]:
+            elements[index]["stackId"] = stack_id
+            ids.append(elements[index].get("id") or f"{stack['type']}_{index + 1}")
+        x, y = points[stack["members"]].mean(axis=0)
+        out.append({
+            "id": stack_id, "type": stack["type"], "floors": stack["floors"], "elements": ids,
+            "position": {"x": round(float(x), 2), "y": round(float(y), 2)},
+        })
+    return out
+
+
+def group_floors(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-floor index of rooms, walls and vertical elements, and vertical stacks across floors"""
+    if not isinstance(result, dict) or "error" in result:
+        return result
+    rooms = [r for r in result.get("rooms") or [] if isinstance(r, dict)]
+    walls = [w for w in result.get("walls") or [] if isinstance(w, dict)]
+    elements = [e for e in result.get("verticalElements") or [] if isinstance(e, dict)]
+
+    plans: Dict[int, Dict[str, Any]] = {}
+
+    def plan(item: Dict[str, Any]) -> Dict[str, Any]:
+        level = _level(item)
+        entry = plans.setdefault(level, {
+            "level": level, "name": floor_name(level), "rooms": [], "walls": [],
+            "verticalElements": [], "roomArea": 0.0, "sourcePages": [],
+        })
+        page = item.get("sourcePage")
+        if page is not None and page not in entry["sourcePages"]:
+            entry["sourcePages"].append(page)
+        return entry
+
+    for index, room in enumerate(rooms):
+        entry = plan(room)
+        entry["rooms"].append(room_id(room, index))
+        entry["roomArea"] += _to_float(room.get("length")) * _to_float(room.get("width"))
+    for wall in walls:
+        if wall.get("id"):
+            plan(wall)["walls"].append(wall["id"])
+
+    stacks = align_vertical(elements, _origins(rooms)) if elements else []
+    for element in elements:
+        plan(element)["verticalElements"].append(element.get("id") or element.get("stackId"))
+
+    for entry in plans.values():
+        entry["roomArea"] = round(entry["roomArea"], 2)
+        entry["sourcePages"].sort()
+    result["floorPlans"] = [plans[level] for level in sorted(plans)]
+    result["verticalStacks"] = stacks
+    if len(plans) > 1:
+        result["floors"] = max(int(_to_float(result.get("floors"), 1)), len(plans))
+    return result
+
+
+def _synthetic_building(n_floors: int, per_floor: int, rng: np.random.Generator) -> Dict[str, Any]:
+    rooms, elements = [], []
+    grid = [(x, y) for x in np.arange(0, 40, 6.0) for y in np.arange(0, 30, 6.0)][:per_floor]
+    for level in range(n_floors):
+        # Each floor drawn with its own origin, as separate model calls return it
+        shift = rng.uniform(-5, 5, size=2)
+        rooms.append({"room_name": f"Hall {level}", "length": "40", "width": "30", "floor": level,
+                      "wallConnectivity": {"roomId": f"f{level}_hall",
+                                           "position": {"x": float(shift[0]), "y": float(shift[1])}}})
+        for k, (x, y) in enumerate(grid):
+            jitter = rng.normal(0, 0.1, size=2)
+            elements.append({"id": f"f{level}_col_{k}", "type": "Column" if k % 7 else "stairs", "floor": level,
+                             "position": {"x": x + shift[0] + jitter[0], "y": y + shift[1] + jitter[1]}})
+    return {"rooms": rooms, "walls": [], "verticalElements": elements}
+
+
+# Benchmark: python floors.py [floors] [elements_per_floor]
+if __name__ == "__main__":
+    n_floors = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    per_floor = int(sys.argv[2]) if len(sys.argv) > 2 else 35
+    building = _synthetic_building(n_floors, per_floor, np.random.default_rng(0))
+    start = time.perf_counter()
+    group_floors(building)
+    elapsed = time.perf_counter() - start
+    full = sum(len(s["floors"]) == n_floors for s in building["verticalStacks"])
+    print(f"⏱️ Aligned {len(building['verticalElements'])} vertical elements on {n_floors} floors "
+          f"into {len(building['verticalStacks'])} stacks ({full} full height) in {elapsed * 1000:.1f} ms")
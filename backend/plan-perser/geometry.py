@@ -0,0 +1,217 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import math
+import sys
+import time
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+from quantities import _to_float, DEFAULT_HEIGHT
+
+# Rooms are measured to their inner faces, so walls of neighbouring rooms sit
+# up to one wall thickness apart.
+SNAP_TOLERANCE = 0.3
+MIN_SHARED_LENGTH = 0.05
+
+
+def room_id(room: Dict[str, Any], index: int) -> str:
+    """Stable room id, preferring the one the model assigned"""
+    return (room.get("wallConnectivity") or {}).get("roomId") or f"room_{index + 1}"
+
+
+def _room_segments(rooms: List[Dict[str, Any]]):
+    """Build one axis-aligned segment per room side for positioned rooms"""
+    segments = []  # (room idx, side, floor, x1, y1, x2, y2)
+    for idx, room in enumerate(rooms):
+        if not isinstance(room, dict):
+            continue
+        position = (room.get("wallConnectivity") or {}).get("position")
+        if not isinstance(position, dict):
+            continue
+        x0, y0 = _to_float(position.get("x")), _to_float(position.get("y"))
+        x1, y1 = x0 + _to_float(room.get("length")), y0 + _to_float(room.get("width"))
+        floor = _to_float(room.get("floor"), 0.0)
+        segments.append((idx, "south", floor, x0, y0, x1, y0))
+        segments.append((idx, "north", floor, x0, y1, x1, y1))
+        segments.append((idx, "west", floor, x0, y0, x0, y1))
+        segments.append((idx, "east", floor, x1, y0, x1, y1))
+    return segments
+
+
+def find_shared_segments(coords: np.ndarray, floors: np.ndarray, owners: np.ndarray,
+                         tolerance: float = SNAP_TOLERANCE) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Find collinear overlapping segment pairs via an STRtree.
+
+    coords is (n, 4) of axis-aligned x1, y1, x2, y2. Returns (i, j, overlap)
+    for pairs with i < j, on the same floor, owned by different owners.
+    """
+    if len(coords) < 2:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+
+    # Envelope-only tree query; the exact collinearity/overlap test below is
+    # cheaper in NumPy than GEOS distance predicates.
+    lines = shapely.linestrings(coords.reshape(-1, 2, 2))
+    tree = STRtree(lines)
+    xmin = np.minimum(coords[:, 0], coords[:, 2]) - tolerance
+    ymin = np.minimum(coords[:, 1], coords[:, 3]) - tolerance
+    xmax = np.maximum(coords[:, 0], coords[:, 2]) + tolerance
+    ymax = np.maximum(coords[:, 1], coords[:, 3]) + tolerance
+    i, j = tree.query(shapely.box(xmin, ymin, xmax, ymax))
+
+    keep = (i < j) & (floors[i] == floors[j]) & (owners[i] != owners[j])
+    i, j = i[keep], j[keep]
+
+    horizontal = np.abs(coords[:, 1] - coords[:, 3]) <= np.abs(coords[:, 0] - coords[:, 2])
+    same_axis = horizontal[i] == horizontal[j]
+    i, j = i[same_axis], j[same_axis]
+
+    # Project onto the segment axis: (offset across, start along, end along)
+    across = np.where(horizontal, coords[:, 1], coords[:, 0])
+    lo = np.where(horizontal, np.minimum(coords[:, 0], coords[:, 2]), np.minimum(coords[:, 1], coords[:, 3]))
+    hi = np.where(horizontal, np.maximum(coords[:, 0], coords[:, 2]), np.maximum(coords[:, 1], coords[:, 3]))
+
+    collinear = np.abs(across[i] - across[j]) <= tolerance
+    overlap = np.minimum(hi[i], hi[j]) - np.maximum(lo[i], lo[j])
+    keep = collinear & (overlap >= MIN_SHARED_LENGTH)
+    return i[keep], j[keep], overlap[keep]
+
+
+def _efficiency(rooms: List[Dict[str, Any]], segments, shared_length_total: float,
+                connected: np.ndarray) -> Dict[str, float]:
+    """Layout efficiency scores, each in [0, 1].
+
+    spaceUtilization: room floor area over the per-floor bounding box area.
+    wallEfficiency: fraction of room perimeter that is a shared partition.
+    connectivityScore: fraction of rooms with at least one neighbour.
+    """
+    coords = np.array([s[3:] for s in segments], dtype=np.float64)
+    floors = np.array([s[2] for s in segments])
+    perimeter = float(np.hypot(coords[:, 2] - coords[:, 0], coords[:, 3] - coords[:, 1]).sum())
+
+    room_area = 0.0
+    bbox_area = 0.0
+    for floor in np.unique(floors):
+        c = coords[floors == floor]
+        bbox_area += float((c[:, [0, 2]].max() - c[:, [0, 2]].min()) * (c[:, [1, 3]].max() - c[:, [1, 3]].min()))
+    for idx in {s[0] for s in segments}:
+        room_area += _to_float(rooms[idx].get("length")) * _to_float(rooms[idx].get("width"))
+
+    return {
+        "spaceUtilization": round(min(room_area / bbox_area, 1.0), 2) if bbox_area else 0.0,
+        "wallEfficiency": round(min(2 * shared_length_total / perimeter, 1.0), 2) if perimeter else 0.0,
+        "connectivityScore": round(float(connected.mean()), 2) if len(connected) else 0.0,
+    }
+
+
+def build_connectivity(result: Dict[str, Any], tolerance: float = SNAP_TOLERANCE) -> Dict[str, Any]:
+    """Derive shared walls, room positions and efficiency from room geometry.
+
+    Rewrites rooms[].wallConnectivity wall types/sharing and the top-level
+    connectivity block in place. Areas are left to recompute_quantities.
+    Results without room positions are returned unchanged.
+    """
+    rooms = result.get("rooms") or []
+    segments = _room_segments(rooms)
+    if not segments:
+        return result
+
+    coords = np.array([s[3:] for s in segments], dtype=np.float64)
+    floors = np.array([s[2] for s in segments], dtype=np.float64)
+    owners = np.array([s[0] for s in segments], dtype=np.int64)
+    seg_i, seg_j, overlap = find_shared_segments(coords, floors, owners, tolerance)
+
+    ids = {idx: room_id(rooms[idx], idx) for idx in set(owners.tolist())}
+
+    # Reset sides to external, then mark the shared ones
+    side_walls: Dict[Tuple[int, str], Dict[str, Any]] = {}
+    for idx, side, _, x1, y1, x2, y2 in segments:
+        connectivity = rooms[idx].setdefault("wallConnectivity", {})
+        connectivity.setdefault("roomId", ids[idx])
+        walls = connectivity.setdefault("walls", {})
+        wall = walls.get(side)
+        if not isinstance(wall, dict):
+            wall = walls[side] = {"openings": []}
+        wall.setdefault("id", f"wall_{ids[idx]}_{side}")
+        wall["type"] = "external"
+        wall["length"] = round(math.hypot(x2 - x1, y2 - y1), 2)
+        wall.setdefault("height", _to_float(rooms[idx].get("height"), DEFAULT_HEIGHT))
+        wall.pop("sharedWith", None)
+        wall.pop("sharedLength", None)
+        connectivity["connectedRooms"] = []
+        side_walls[(idx, side)] = wall
+
+    # Longest neighbour per side becomes sharedWith; overlaps accumulate
+    best: Dict[Tuple[int, str], float] = {}
+    shared_walls = []
+    for a, b, length in zip(seg_i.tolist(), seg_j.tolist(), overlap.tolist()):
+        room_a, side_a = segments[a][0], segments[a][1]
+        room_b, side_b = segments[b][0], segments[b][1]
+        wall_a, wall_b = side_walls[(room_a, side_a)], side_walls[(room_b, side_b)]
+        for room, side, wall, other in ((room_a, side_a, wall_a, room_b), (room_b, side_b, wall_b, room_a)):
+            wall["type"] = "shared"
+            wall["sharedLength"] = round(min(wall.get("sharedLength", 0.0) + length, wall["length"]), 2)
+            if length > best.get((room, side), 0.0):
+                best[(room, side)] = length
+                wall["sharedWith"] = ids[other]
+            connected = rooms[room]["wallConnectivity"]["connectedRooms"]
+            if ids[other] not in connected:
+                connected.append(ids[other])
+
+        opening_ids = [
+            o.get("id") for o in (wall_a.get("openings") or []) + (wall_b.get("openings") or [])
+            if isinstance(o, dict) and o.get("id") and o.get("connectsTo") in (ids[room_a], ids[room_b])
+        ]
+        shared_walls.append({
+            "id": f"shared_{ids[room_a]}_{ids[room_b]}_{side_a}",
+            "room1Id": ids[room_a],
+            "room2Id": ids[room_b],
+            "wall1Id": wall_a["id"],
+            "wall2Id": wall_b["id"],
+            "sharedLength": round(length, 2),
+            "openings": list(dict.fromkeys(opening_ids)),
+        })
+
+    connected_rooms = np.zeros(len(rooms), dtype=bool)
+    connected_rooms[owners[seg_i]] = True
+    connected_rooms[owners[seg_j]] = True
+    positioned = np.unique(owners)
+
+    result["connectivity"] = {
+        "sharedWalls": shared_walls,
+        "roomPositions": {
+            ids[idx]: dict(rooms[idx]["wallConnectivity"]["position"]) for idx in positioned.tolist()
+        },
+        "totalSharedArea": 0.0,
+        "efficiency": _efficiency(rooms, segments, float(overlap.sum()), connected_rooms[positioned]),
+    }
+    return result
+
+
+def _synthetic_plan(n_rooms: int, floors: int = 1) -> Dict[str, Any]:
+    per_floor = max(n_rooms // floors, 1)
+    side = int(np.ceil(np.sqrt(per_floor)))
+    rooms = []
+    for r in range(n_rooms):
+        k = r % per_floor
+        rooms.append({
+            "length": "4.0", "width": "3.5", "height": "2.7", "floor": r // per_floor,
+            "wallConnectivity": {"roomId": f"room_{r + 1}", "position": {"x": (k % side) * 4.2, "y": (k // side) * 3.7}},
+        })
+    return {"rooms": rooms}
+
+
+# Benchmark: python geometry.py [n_rooms] [floors]
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_floors = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    plan = _synthetic_plan(n, n_floors)
+    start = time.perf_counter()
+    build_connectivity(plan)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"⏱️ Built connectivity for {n} rooms on {n_floors} floors "
+          f"({len(plan['connectivity']['sharedWalls'])} shared walls) in {elapsed:.1f} ms")
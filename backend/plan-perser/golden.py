@@ -0,0 +1,184 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Set, Tuple
+
+import fixtures
+import metrics
+from cascade import LIST_SECTIONS
+from parser import MIME_TYPES, parse_document
+from quantities import _to_float, recompute_quantities
+from upload_buffer import map_file
+
+# Relative change of a golden total that fails the check
+TOTAL_TOLERANCE = 0.01
+
+# Corpus layout: <corpus>/plans/* are parsed, <corpus>/fixtures holds the recorded
+# model responses and <corpus>/golden/<plan>.json the accepted output of each plan
+
+
+def schema(value: Any, path: str = "") -> Set[str]:
+    """Output shape as "path: type" strings; list items share a "[]" path"""
+    if isinstance(value, dict):
+        if not value:
+            return {f"{path}: object"}
+        out = set()
+        for key, item in value.items():
+            out |= schema(item, f"{path}.{key}" if path else key)
+        return out
+    if isinstance(value, list):
+        out = {f"{path}: list"}
+        for item in value:
+            out |= schema(item, f"{path}[]")
+        return out
+    if value is None:
+        kind = "null"
+    elif isinstance(value, bool):
+        kind = "bool"
+    elif isinstance(value, (int, float)):
+        kind = "number"
+    else:
+        kind = "string"
+    return {f"{path}: {kind}"}
+
+
+def totals(result: Dict[str, Any]) -> Dict[str, float]:
+    """Headline quantities of a result, compared against the golden ones"""
+    rooms = [r for r in result.get("rooms") or [] if isinstance(r, dict)]
+    room_walls = [w for r in rooms for w in ((r.get("wallConnectivity") or {}).get("walls") or {}).values()
+                  if isinstance(w, dict)]
+    return {
+        "floorArea": round(sum(_to_float(r.get("length")) * _to_float(r.get("width")) for r in rooms), 2),
+        "grossWallArea": round(sum(_to_float(w.get("grossArea")) for w in room_walls), 2),
+        "netWallArea": round(sum(_to_float(w.get("netArea")) for w in room_walls), 2),
+        "openingArea": round(sum(_to_float(o.get("area")) for w in room_walls
+                                 for o in w.get("openings") or [] if isinstance(o, dict)), 2),
+        "planWallArea": round(sum(_to_float(w.get("area")) for w in result.get("walls") or [] if isinstance(w, dict)), 2),
+        "sharedArea": round(_to_float((result.get("connectivity") or {}).get("totalSharedArea")), 2),
+    }
+
+
+def quantity_problems(result: Dict[str, Any]) -> List[str]:
+    """Derived quantities that do not follow from the geometry they were derived from"""
+    problems = []
+    recomputed = recompute_quantities(copy.deepcopy(result))
+    if recomputed != result:
+        changed = sorted(changed_totals(totals(recomputed), totals(result)))
+        problems.append(f"derived quantities change when recomputed: {', '.join(changed) or 'per-wall values'}")
+    for room in result.get("rooms") or []:
+        walls = ((room.get("wallConnectivity") or {}).get("walls") or {}) if isinstance(room, dict) else {}
+        for side, wall in walls.items():
+            if isinstance(wall, dict) and _to_float(wall.get("netArea")) > _to_float(wall.get("grossArea")) + 1e-6:
+                problems.append(f"{room.get('room_name') or room.get('roomType')} {side} wall: netArea > grossArea")
+    return problems
+
+
+def changed_totals(current: Dict[str, float], golden: Dict[str, float]) -> List[str]:
+    return [key for key in set(current) | set(golden)
+            if abs(current.get(key, 0.0) - golden.get(key, 0.0)) > TOTAL_TOLERANCE * max(abs(golden.get(key, 0.0)), 1.0)]
+
+
+def parse_plan(path: str) -> Tuple[Dict[str, Any], int, float]:
+    """Result, page count and seconds for one corpus file"""
+    start = time.perf_counter()
+    with open(path, "rb") as f, map_file(f) as view:
+        result, pages = parse_document(view, os.path.basename(path))
+    return result, max(len(pages), 1), time.perf_counter() - start
+
+
+def snapshot(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "schema": sorted(schema(result)),
+        "sections": {s: len(result[s]) for s in LIST_SECTIONS if isinstance(result.get(s), list)},
+        "totals": totals(result),
+    }
+
+
+def compare(current: Dict[str, Any], golden: Dict[str, Any]) -> List[str]:
+    """Differences between a plan's output and its golden snapshot"""
+    problems = []
+    added = sorted(set(current["schema"]) - set(golden["schema"]))
+    removed = sorted(set(golden["schema"]) - set(current["schema"]))
+    if added:
+        problems.append(f"schema added: {', '.join(added[:10])}{' …' if len(added) > 10 else ''}")
+    if removed:
+        problems.append(f"schema removed: {', '.join(removed[:10])}{' …' if len(removed) > 10 else ''}")
+    for section in sorted(set(current["sections"]) | set(golden["sections"])):
+        was, now = golden["sections"].get(section, 0), current["sections"].get(section, 0)
+        if was != now:
+            problems.append(f"{section}: {was} → {now} items")
+    for key in sorted(changed_totals(current["totals"], golden["totals"])):
+        problems.append(f"{key}: {golden['totals'].get(key)} → {current['totals'].get(key)}")
+    return problems
+
+
+def run(corpus: str, update: bool = False, workers: int = 4) -> bool:
+    """Parse every corpus plan and check it; in record mode write its golden snapshot"""
+    plans = sorted(p for p in (os.path.join(corpus, "plans", n) for n in os.listdir(os.path.join(corpus, "plans")))
+                   if os.path.splitext(p)[1].lower() in MIME_TYPES)
+    golden_dir = os.path.join(corpus, "golden")
+    os.makedirs(golden_dir, exist_ok=True)
+    write = update or fixtures.MODE == "record"
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [(path, pool.submit(parse_plan, path)) for path in plans]
+        outcomes = []
+        for path, future in futures:
+            try:
+                outcomes.append((path, *future.result()))
+            except Exception as e:
+                outcomes.append((path, {"error": f"{type(e).__name__}: {e}"}, 0, 0.0))
+    elapsed = time.perf_counter() - start
+
+    failed = 0
+    for path, result, pages, seconds in outcomes:
+        name = os.path.basename(path)
+        golden_path = os.path.join(golden_dir, f"{name}.json")
+        problems = [f"error: {result['error']}"] if "error" in result else quantity_problems(result)
+        current = snapshot(result)
+        if write and "error" not in result:
+            with open(golden_path, "w", encoding="utf-8") as f:
+                json.dump(current, f, indent=1)
+        elif os.path.exists(golden_path):
+            with open(golden_path, encoding="utf-8") as f:
+                problems += compare(current, json.load(f))
+        else:
+            problems.append("no golden snapshot (run with --update)")
+        failed += bool(problems)
+        print(f"{'❌' if problems else '✅'} {name} ({pages} pages, {seconds:.2f}s)")
+        for problem in problems:
+            print(f"   {problem}")
+
+    latencies = sorted(seconds for _, _, _, seconds in outcomes)
+    total_pages = sum(pages for _, _, pages, _ in outcomes)
+    if latencies:
+        print(f"⏱️ {len(outcomes)} plans, {total_pages} pages in {elapsed:.2f}s: "
+              f"{len(outcomes) / elapsed:.2f} plans/s, {total_pages / elapsed:.2f} pages/s, "
+              f"p50 {latencies[len(latencies) // 2]:.2f}s, max {latencies[-1]:.2f}s ({workers} workers)")
+    print(f"📼 Fixtures: {fixtures.summary()}")
+    return not failed
+
+
+# Golden corpus: python golden.py <corpus> [--record] [--update] [--speed 0] [--workers 4]
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description="Check parser output against a recorded golden corpus")
+    args.add_argument("corpus")
+    args.add_argument("--record", action="store_true", help="call the live API, saving responses and snapshots")
+    args.add_argument("--update", action="store_true", help="accept the current output as golden")
+    args.add_argument("--speed", type=float, default=fixtures.REPLAY_SPEED, help="replayed latency multiple")
+    args.add_argument("--workers", type=int, default=4)
+    options = args.parse_args()
+
+    fixtures.MODE = "record" if options.record else "replay"
+    fixtures.FIXTURE_DIR = os.path.join(options.corpus, "fixtures")
+    fixtures.REPLAY_SPEED = options.speed
+    metrics.reset()
+    sys.exit(0 if run(options.corpus, options.update, options.workers) else 1)
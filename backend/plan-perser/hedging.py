@@ -0,0 +1,165 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable
+
+import metrics
+
+HEDGE_ENABLED = os.getenv("MODEL_HEDGE", "0") == "1"
+# Fire the duplicate once the primary is slower than this percentile of
+# recent calls (first token or completion, whichever is known)
+HEDGE_PERCENTILE = float(os.getenv("MODEL_HEDGE_PERCENTILE", "95"))
+# At most this share of calls may be hedged (extra cost cap)
+HEDGE_BUDGET = float(os.getenv("MODEL_HEDGE_BUDGET", "0.05"))
+# Delays used until enough latency samples exist
+HEDGE_DEFAULT_TTFT = float(os.getenv("MODEL_HEDGE_DEFAULT_TTFT", "45"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("MODEL_HEDGE_DEFAULT_DELAY", "120"))
+MIN_SAMPLES = 20
+
+
+class Cancelled(Exception):
+    """Raised inside a losing attempt once the other attempt has won"""
+
+
+class Attempt:
+    """Cancellation and first-token signals handed to each attempt"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.cancel = threading.Event()
+        self.first_token = threading.Event()
+
+    def check(self) -> None:
+        if self.cancel.is_set():
+            raise Cancelled()
+
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("MODEL_HEDGE_WORKERS", "32")), thread_name_prefix="hedge")
+_recent = deque(maxlen=1000)  # True for hedged calls
+_recent_lock = threading.Lock()
+
+
+def _budget_allows() -> bool:
+    with _recent_lock:
+        if not _recent:
+            return HEDGE_BUDGET > 0
+        return sum(_recent) / len(_recent) < HEDGE_BUDGET
+
+
+def _record(hedged: bool) -> None:
+    with _recent_lock:
+        _recent.append(hedged)
+
+
+def hedge_delays(**labels):
+    """(time-to-first-token, completion) thresholds from recent latency"""
+    ttft = metrics.percentile("model_ttft_seconds", HEDGE_PERCENTILE, min_samples=MIN_SAMPLES, **labels)
+    total = metrics.percentile("model_latency_seconds", HEDGE_PERCENTILE, min_samples=MIN_SAMPLES, **labels)
+    return ttft or HEDGE_DEFAULT_TTFT, total or HEDGE_DEFAULT_DELAY
+
+
+def _run(fn: Callable[[Attempt], Any], attempt: Attempt):
+    start = time.monotonic()
+    result = fn(attempt)
+    return result, time.monotonic() - start
+
+
+def hedged_call(fn: Callable[[Attempt], Any], **labels) -> Any:
+    """Run fn, firing one duplicate if it is slow; the first valid result wins.
+
+    fn receives an Attempt and should set attempt.first_token when output
+    starts and call attempt.check() while streaming so the loser stops
+    early. fn must raise on invalid output so the other attempt can win.
+    labels select the latency series (e.g. model=...) the delays come from.
+    """
+    start = time.monotonic()
+    primary = Attempt(0)
+    futures = {_executor.submit(_run, fn, primary): primary}
+    ttft_delay, total_delay = hedge_delays(**labels)
+
+    # Phase 1: wait for the primary, watching for a late first token
+    hedge = None
+    while hedge is None:
+        elapsed = time.monotonic() - start
+        threshold = total_delay if primary.first_token.is_set() else min(ttft_delay, total_delay)
+        done, _ = wait(futures, timeout=max(threshold - elapsed, 0.0))
+        if done:
+            future = next(iter(done))
+            _record(False)
+            result, _ = future.result()
+            return result
+        if time.monotonic() - start < threshold:
+            continue
+        if not _budget_allows():
+            metrics.increment("hedge_skipped_budget")
+            _record(False)
+            result, _ = next(iter(futures)).result()
+            return result
+        hedge = Attempt(1)
+        futures[_executor.submit(_run, fn, hedge)] = hedge
+        _record(True)
+        metrics.increment("hedge_fired")
+        print(f"🪁 Hedging model call after {time.monotonic() - start:.1f}s", file=sys.stderr)
+
+    # Phase 2: first valid completion wins, the other is cancelled
+    pending = set(futures)
+    last_error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result, _ = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            winner = futures[future]
+            for other in pending:
+                futures[other].cancel.set()
+                other.cancel()
+            metrics.increment("hedge_won" if winner.index else "hedge_primary_won")
+            metrics.observe("hedge_win_seconds", time.monotonic() - start)
+            return result
+    raise last_error
+
+
+# Simulation: python hedging.py [calls]
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+
+    def fake_model(attempt: Attempt):
+        # 3% of calls stall for a long time; the rest take ~0.1 s
+        slow = random.random() < 0.03
+        duration = random.uniform(1.0, 2.0) if slow else random.uniform(0.05, 0.15)
+        time.sleep(duration * 0.2)
+        attempt.first_token.set()
+        t = 0.0
+        while t < duration * 0.8:
+            attempt.check()
+            time.sleep(0.01)
+            t += 0.01
+        return {"rooms": []}
+
+    for mode in ("baseline", "hedged"):
+        metrics.reset()
+        _recent.clear()
+        latencies = []
+        for _ in range(calls):
+            t0 = time.monotonic()
+            if mode == "hedged":
+                hedged_call(fake_model)
+            else:
+                _run(fake_model, Attempt(0))
+            latency = time.monotonic() - t0
+            latencies.append(latency)
+            metrics.observe("model_latency_seconds", latency)
+        latencies.sort()
+        p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+        print(f"⏱️ {mode:8s} p50 {p50 * 1000:7.1f} ms  p99 {p99 * 1000:7.1f} ms  "
+              f"hedged {metrics.count('hedge_fired'):.0f}/{calls} calls")
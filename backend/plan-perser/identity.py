@@ -0,0 +1,93 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import hashlib
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+import metrics
+from scheduler import DEFAULT_TIER
+
+# The app's Supabase project: access tokens are checked against it and tiers read from its profiles table
+SUPABASE_URL = (os.getenv("SUPABASE_URL") or os.getenv("VITE_SUPABASE_URL") or "").rstrip("/")
+SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY") or os.getenv("VITE_SUPABASE_ANON_KEY") or ""
+# Verified identities are reused this long, so a tier change applies within a minute
+CACHE_SECONDS = float(os.getenv("IDENTITY_CACHE_SECONDS", "60"))
+CACHE_SIZE = 10_000
+TIMEOUT = 5.0
+# Tenants of callers without a verified token
+ANONYMOUS_PREFIX = "ip:"
+
+
+class Unauthorized(ValueError):
+    """The bearer token was rejected by the auth server"""
+
+
+_cache: Dict[str, Tuple[float, str, str]] = {}
+_cache_lock = threading.Lock()
+
+
+def _lookup(token: str) -> Tuple[str, str]:
+    """(user id, subscription tier) of a Supabase access token"""
+    headers = {"apikey": SUPABASE_ANON_KEY, "Authorization": f"Bearer {token}"}
+    with httpx.Client(base_url=SUPABASE_URL, headers=headers, timeout=TIMEOUT) as client:
+        response = client.get("/auth/v1/user")
+        if response.status_code in (401, 403):
+            raise Unauthorized("Invalid or expired access token")
+        response.raise_for_status()
+        user_id = response.json()["id"]
+        # Read with the user's own token, so row-level security applies
+        response = client.get("/rest/v1/profiles", params={"id": f"eq.{user_id}", "select": "tier"})
+        response.raise_for_status()
+        rows = response.json()
+    return user_id, (rows[0].get("tier") if rows else None) or DEFAULT_TIER
+
+
+def resolve(authorization: Optional[str], client_host: Optional[str]) -> Tuple[str, str]:
+    """(tenant, tier) for scheduling, from a verified identity only.
+
+    Without a bearer token, or while the auth server cannot be reached, the
+    caller is an anonymous free-tier tenant keyed by client address. Raises
+    Unauthorized for a token the auth server rejects.
+    """
+    anonymous = (f"{ANONYMOUS_PREFIX}{client_host or 'unknown'}", DEFAULT_TIER)
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return anonymous
+    if not SUPABASE_URL or not SUPABASE_ANON_KEY:
+        print("⚠️ SUPABASE_URL/SUPABASE_ANON_KEY not set, scheduling every caller as anonymous", file=sys.stderr)
+        return anonymous
+
+    key = hashlib.sha256(token.strip().encode()).hexdigest()
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None and cached[0] > now:
+        metrics.increment("identity_cache_hits")
+        return cached[1], cached[2]
+
+    try:
+        tenant, tier = _lookup(token.strip())
+    except Unauthorized:
+        metrics.increment("identity_rejected")
+        raise
+    except (httpx.HTTPError, KeyError, ValueError) as e:
+        metrics.increment("identity_errors")
+        print(f"⚠️ Could not verify caller, scheduling as anonymous: {e}", file=sys.stderr)
+        return anonymous
+    with _cache_lock:
+        if len(_cache) >= CACHE_SIZE:
+            for stale in [k for k, v in _cache.items() if v[0] <= now] or list(_cache)[:CACHE_SIZE // 10]:
+                _cache.pop(stale, None)
+        _cache[key] = (now + CACHE_SECONDS, tenant, tier)
+    return tenant, tier
+
+
+def is_verified(tenant: str) -> bool:
+    """Whether a tenant from resolve is a signed-in user rather than an anonymous address"""
+    return not tenant.startswith(ANONYMOUS_PREFIX)
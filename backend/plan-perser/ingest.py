@@ -0,0 +1,725 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import csv
+import io
+import itertools
+import os
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from xml.parsers import expat
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from normalize import normalize_enums
+from upload_buffer import Buffer
+
+SCHEDULE_EXTENSIONS = {".csv", ".txt", ".xlsx"}
+# Rows parsed and aggregated at a time; bounds memory whatever the file size
+CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "20000"))
+# Rows read per file (all sheets); the rest are skipped and the result marked truncated
+MAX_ROWS = int(os.getenv("INGEST_MAX_ROWS", "1000000"))
+# Leading rows searched for the header (schedules often have a title block above it)
+HEADER_SCAN_ROWS = 30
+SNIFF_BYTES = 64 * 1024
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+# Canonical field -> header spellings, compared after _header() cleaning
+HEADERS: Dict[str, Tuple[str, ...]] = {
+    "mark": ("mark", "ref", "ref no", "reference", "tag", "code", "item no", "no", "id", "door no", "window no"),
+    "description": ("description", "item", "item description", "element", "fixture", "fitting", "product",
+                    "name", "point", "luminaire", "door type", "window type"),
+    "type": ("type", "room type", "kind", "model"),
+    "category": ("category", "trade", "section", "finish type"),
+    "room": ("room", "room name", "location", "space", "area name", "zone", "position"),
+    "floor": ("floor", "level", "storey", "story", "floor level"),
+    "length": ("length", "l", "run", "total length"),
+    "width": ("width", "w", "breadth"),
+    "height": ("height", "h", "ceiling height"),
+    "size": ("size", "dimensions", "opening size", "door size", "window size", "w x h"),
+    "area": ("area", "floor area", "sqm", "m2", "net area"),
+    "quantity": ("qty", "quantity", "count", "no off", "nr", "number", "nos", "total"),
+    "unit": ("unit", "uom", "units"),
+    "material": ("material", "finish", "frame", "frame material", "specification", "spec", "glazing"),
+    "rating": ("rating", "amps", "amp", "current", "breaker"),
+    "wattage": ("watts", "wattage", "lamp", "power rating"),
+    "circuit": ("circuit", "cct", "circuit no", "way"),
+    "system": ("system", "service", "system type"),
+    "diameter": ("diameter", "dia", "dn", "pipe size", "cable size", "csa"),
+}
+# Room finish schedules: one column per finish category
+FINISH_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "flooring": ("floor finish", "flooring", "floors", "floor finishes"),
+    "wall-finishes": ("wall finish", "walls", "wall", "wall finishes"),
+    "ceiling": ("ceiling", "ceiling finish", "ceilings"),
+    "paint": ("paint", "painting", "decoration"),
+}
+_LOOKUP = {spelling: field for field, spellings in HEADERS.items() for spelling in spellings}
+_LOOKUP.update({spelling: f"finish:{category}" for category, spellings in FINISH_COLUMNS.items() for spelling in spellings})
+
+# Row kinds, tried in order on a row's description/type/category text
+KINDS: List[Tuple[str, "re.Pattern"]] = [(kind, re.compile(pattern)) for kind, pattern in (
+    ("door", r"\bdoors?\b|\bdoorset|\bgate\b"),
+    ("window", r"\bwindows?\b|\bcasement|\blouvres?\b|\bglazed panel|\bskylight"),
+    ("board", r"distribution board|consumer unit|\bdb\b|panel ?board|\bmcb board"),
+    ("outlet", r"socket|switch|outlet|data point|\brj45|tv point|\btv\b|\busb\b|telephone|\bgpo\b|dimmer|isolator"),
+    ("lighting", r"light|lamp|luminaire|downlight|fluorescent|halogen|flood|bulkhead|pendant|chandelier"),
+    ("cable", r"cable|\bnym|\bswa\b|cat ?6|\bfib(re|er)\b|coax|\bwiring\b|twin (and|&) earth"),
+    ("fixture", r"\bwc\b|water closet|toilet|urinal|basin|lavatory|\bsink|shower|\bbath|bidet|floor drain|gully"
+                r"|cleanout|rodding|\btaps?\b|hose|cistern|mixer"),
+    ("pipe", r"\bpipes?\b|piping|\bupvc\b|\bppr\b|\bhdpe\b|\bgi pipe|copper tube"),
+    ("finish", r"\btil(e|es|ing)\b|paint|emulsion|plaster|screed|skirting|ceiling|gypsum|flooring|carpet|vinyl"
+               r"|laminate|terrazzo|cladding|wallpaper|render|parquet"),
+)]
+# Sheet or file names that say what an unlabelled row is
+HINTS = [(kind, re.compile(pattern)) for kind, pattern in (
+    ("door", r"door"), ("window", r"window"), ("lighting", r"light"), ("outlet", r"socket|power|electrical"),
+    ("fixture", r"sanitary|plumbing|fixture"), ("finish", r"finish"),
+)]
+_MARK_KIND = re.compile(r"^\s*(d|dr|w|wn)[-_ ]?\d", re.IGNORECASE)
+_WATTS = re.compile(r"(\d+(?:\.\d+)?)\s*w\b", re.IGNORECASE)
+_SIZE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:mm|m)?\s*[x×*]\s*(\d+(?:\.\d+)?)")
+
+FINISH_CATEGORIES = [
+    ("flooring", re.compile(r"floor|screed|carpet|vinyl|laminate|terrazzo|parquet|skirting")),
+    ("ceiling", re.compile(r"ceiling|gypsum|soffit")),
+    ("paint", re.compile(r"paint|emulsion|enamel|gloss")),
+    ("joinery", re.compile(r"joinery|cabinet|wardrobe|shelv")),
+    ("wall-finishes", re.compile(r"wall|plaster|render|cladding|wallpaper|til")),
+]
+STANDARD_SIZES = {
+    "door": ["0.9 × 2.1 m", "1.0 × 2.1 m", "1.2 × 2.4 m"],
+    "window": ["1.2 × 1.2 m", "1.5 × 1.2 m", "2.0 × 1.5 m"],
+}
+TEXT_FIELDS = ("mark", "description", "type", "category", "room", "floor", "unit", "material", "circuit", "system")
+NUMBER_FIELDS = ("length", "width", "height", "area", "quantity", "rating", "wattage", "diameter")
+# Rows that describe the same item are summed into one output entry
+KEY_FIELDS = ("kind", "mark", "description", "type", "category", "room", "floor", "unit", "material",
+              "circuit", "system", "width", "height", "rating", "wattage", "diameter")
+SUM_FIELDS = ("quantity", "area", "length")
+# Stands in for an empty numeric key field
+MISSING = -1.0
+
+
+def is_schedule(filename: Optional[str]) -> bool:
+    return os.path.splitext(filename or "")[1].lower() in SCHEDULE_EXTENSIONS
+
+
+class _Reader(io.RawIOBase):
+    """Seekable file over a buffer, so pandas and zipfile read it without a copy"""
+
+    def __init__(self, buffer: Buffer):
+        self.view = memoryview(buffer).cast("B")
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        n = min(len(target), len(self.view) - self.position)
+        target[:n] = self.view[self.position:self.position + n]
+        self.position += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: len(self.view)}[whence]
+        self.position = max(base + offset, 0)
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+
+def _header(cell: Any) -> str:
+    """Header text without units, punctuation or case: "Width (mm)" -> "width" """
+    text = re.sub(r"[\(\[].*?[\)\]]", " ", str(cell or "").lower())
+    return re.sub(r"[^a-z0-9]+", " ", text).strip()
+
+
+def _unit_scale(cell: Any) -> Optional[float]:
+    """Metres per unit stated in a header, e.g. 0.001 for "Width (mm)"; None if not stated"""
+    text = str(cell or "").lower()
+    if re.search(r"\bmm\b", text):
+        return 0.001
+    if re.search(r"\bcm\b", text):
+        return 0.01
+    if re.search(r"\bm\b", text):
+        return 1.0
+    return None
+
+
+def map_columns(row: List[Any]) -> Dict[str, int]:
+    """Canonical field -> column index for a header row; the first column claiming a field wins"""
+    columns: Dict[str, int] = {}
+    for index, cell in enumerate(row):
+        field = _LOOKUP.get(_header(cell))
+        if field and field not in columns:
+            columns[field] = index
+    return columns
+
+
+def find_header(rows: List[List[Any]]) -> Tuple[int, Dict[str, int]]:
+    """Index and column mapping of the row naming the most known fields"""
+    best, best_columns = -1, {}
+    for index, row in enumerate(rows[:HEADER_SCAN_ROWS]):
+        columns = map_columns(row)
+        if len(columns) > len(best_columns):
+            best, best_columns = index, columns
+    if len(best_columns) < 2:
+        raise ValueError("No schedule header found: expected columns such as Mark, Description, Room, Qty, Width")
+    return best, best_columns
+
+
+def layout(columns: Dict[str, int]) -> str:
+    """"rooms" for a room (finish) schedule, "items" for door/window/point/fixture lists and BOQ extracts"""
+    dimensioned = "area" in columns or ("length" in columns and "width" in columns)
+    if "room" in columns and dimensioned and "description" not in columns and "quantity" not in columns:
+        return "rooms"
+    if "description" in columns or "type" in columns or "mark" in columns:
+        return "items"
+    raise ValueError("Unrecognised schedule layout: no description, type or room column")
+
+
+def _classify(text: str) -> str:
+    for kind, pattern in KINDS:
+        if pattern.search(text):
+            return kind
+    return ""
+
+
+def _numbers(series: pd.Series, decimal_comma: bool = False) -> pd.Series:
+    """Numbers in schedule cells, ignoring units.
+
+    A comma is a decimal point in ;-separated files ("1.234,5") or before 1-2
+    final digits ("0,9"), and groups thousands in "1,234.5"; other commas give NaN.
+    """
+    cleaned = series.astype(str).str.replace(r"[^0-9.,\-]", "", regex=True)
+    comma = cleaned.str.contains(",", regex=False)
+    if not comma.any():
+        return pd.to_numeric(cleaned, errors="coerce")
+    as_decimal = cleaned.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    if decimal_comma:
+        decimal = cleaned.str.fullmatch(r"-?(?:\d{1,3}(?:\.\d{3})+|\d*),\d+")
+        fixed = as_decimal.where(decimal, "")
+    else:
+        decimal = cleaned.str.fullmatch(r"-?\d*,\d{1,2}")
+        thousands = cleaned.str.fullmatch(r"-?\d{1,3}(?:,\d{3})+(?:\.\d+)?")
+        fixed = as_decimal.where(decimal, cleaned.str.replace(",", "", regex=False).where(thousands, ""))
+    return pd.to_numeric(cleaned.where(~comma, fixed), errors="coerce")
+
+
+def _metres(values: pd.Series, scale: Optional[float]) -> pd.Series:
+    """Lengths in metres; columns without a stated unit and values over 50 are taken as mm"""
+    if scale is not None:
+        return values * scale
+    return values.where(~(values > 50), values / 1000)
+
+
+class _Totals:
+    """Running sums per item key, merged chunk by chunk"""
+
+    def __init__(self):
+        self.items: Dict[Tuple, List[float]] = {}
+        self.rooms: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.rows = 0
+        self.unmatched = 0
+        self.layouts: List[Dict[str, Any]] = []
+        self.truncated = False
+
+    def add(self, frame: pd.DataFrame) -> None:
+        # NaN keys would never compare equal across chunks
+        keys = [f for f in KEY_FIELDS if f in NUMBER_FIELDS]
+        frame = frame.assign(**{f: frame[f].fillna(MISSING) for f in keys})
+        grouped = frame.groupby(list(KEY_FIELDS), sort=False)[list(SUM_FIELDS)].sum(min_count=1)
+        for key, sums in zip(grouped.index, grouped.itertuples(index=False)):
+            entry = self.items.get(key)
+            if entry is None:
+                self.items[key] = list(sums)
+            else:
+                for i, value in enumerate(sums):
+                    if not np.isnan(value):
+                        entry[i] = value if np.isnan(entry[i]) else entry[i] + value
+
+
+def _frame(rows, columns: Dict[str, int], scales: Dict[str, Optional[float]],
+           decimal_comma: bool = False) -> pd.DataFrame:
+    """Rows of one chunk (a list of rows or a positional frame) as a frame of canonical fields"""
+    raw = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows, dtype=object)
+    frame = pd.DataFrame(index=raw.index)
+    for field in TEXT_FIELDS:
+        if field in columns and columns[field] in raw:
+            frame[field] = raw[columns[field]].fillna("").astype(str).str.strip()
+        else:
+            frame[field] = ""
+    for field in NUMBER_FIELDS:
+        if field in columns and columns[field] in raw:
+            frame[field] = _numbers(raw[columns[field]], decimal_comma)
+        else:
+            frame[field] = np.nan
+    if "size" in columns and columns["size"] in raw:
+        size = raw[columns["size"]].fillna("").astype(str).str.extract(_SIZE)
+        frame["width"] = frame["width"].fillna(pd.to_numeric(size[0], errors="coerce"))
+        frame["height"] = frame["height"].fillna(pd.to_numeric(size[1], errors="coerce"))
+    for field in ("length", "width", "height"):
+        frame[field] = _metres(frame[field], scales.get(field) or scales.get("size")).round(3)
+    for category in FINISH_COLUMNS:
+        index = columns.get(f"finish:{category}")
+        frame[f"finish:{category}"] = raw[index].fillna("").astype(str).str.strip() if index in raw else ""
+    return frame
+
+
+def _add_items(frame: pd.DataFrame, hint: str, totals: _Totals) -> None:
+    text = (frame["description"] + " " + frame["type"] + " " + frame["category"]).str.lower()
+    # Schedules repeat a handful of descriptions: classify each distinct text once
+    codes, uniques = pd.factorize(text)
+    kinds = np.array([_classify(t) for t in uniques] + [""], dtype=object)[codes]
+    kind = pd.Series(kinds, index=frame.index)
+    by_mark = frame["mark"].str.extract(_MARK_KIND, expand=False).str.lower().str[0].map({"d": "door", "w": "window"})
+    kind = kind.where(kind != "", by_mark.fillna(""))
+    if hint:
+        kind = kind.where(kind != "", hint)
+    blank = (frame["description"] == "") & (frame["type"] == "") & (frame["mark"] == "")
+    kind = kind.where(~blank, "")
+
+    frame = frame.assign(kind=kind)
+    totals.unmatched += int((kind == "").sum() - blank.sum())
+    frame = frame[kind != ""].copy()
+    # Individual points are counted, not listed: marks only identify door and window types
+    frame.loc[~frame["kind"].isin(("door", "window")), "mark"] = ""
+    frame["quantity"] = frame["quantity"].fillna(1.0)
+    # "LED downlight 9W"
+    watts = pd.to_numeric(frame["description"].str.extract(_WATTS, expand=False), errors="coerce")
+    frame["wattage"] = frame["wattage"].fillna(watts.where(frame["kind"] == "lighting"))
+    totals.add(frame)
+
+
+def _add_rooms(frame: pd.DataFrame, totals: _Totals) -> None:
+    area = frame["area"].fillna(frame["length"] * frame["width"])
+    for row, room_area in zip(frame.itertuples(index=False), area.tolist()):
+        name = row.room
+        if not name:
+            continue
+        room = totals.rooms.setdefault((name.lower(), row.floor), {
+            "roomType": row.type or name,
+            "room_name": name,
+            "floor": int(_numbers(pd.Series([row.floor])).fillna(0).iloc[0]) if row.floor else 0,
+            "length": "" if np.isnan(row.length) else str(row.length),
+            "width": "" if np.isnan(row.width) else str(row.width),
+            "height": "" if np.isnan(row.height) else str(row.height),
+            "doors": [],
+            "windows": [],
+        })
+        if not np.isnan(room_area):
+            room["area"] = str(round(room_area, 2))
+    finishes = [c for c in frame.columns if c.startswith("finish:")]
+    if not finishes:
+        return
+    for category_column in finishes:
+        material = frame[category_column]
+        rows = frame[material != ""].assign(
+            kind="finish", category=category_column.split(":", 1)[1], material=material[material != ""],
+            description=material[material != ""], unit="m²", mark="",
+            area=area[material != ""], quantity=area[material != ""],
+        )
+        if category_column == "finish:wall-finishes":
+            # Wall finishes cover the room perimeter, not its floor area
+            perimeter = 2 * (rows["length"] + rows["width"])
+            wall_area = perimeter * rows["height"].fillna(2.7)
+            rows = rows.assign(area=wall_area, quantity=wall_area)
+        rows = rows.assign(length=np.nan)
+        totals.add(rows)
+
+
+def _rows_csv(buffer: Buffer, filename: str) -> Iterator[Tuple[str, Any, List[List[Any]], bool]]:
+    """(sheet name, chunk iterator, leading rows, decimal comma) for a delimited text file.
+
+    A ;-separated file comes from a locale that writes decimals with a comma.
+    """
+    head = bytes(buffer[:SNIFF_BYTES])
+    if head.startswith((b"\xff\xfe", b"\xfe\xff")):
+        encoding = "utf-16"
+    else:
+        try:
+            head[:-4].decode("utf-8")
+            encoding = "utf-8-sig"
+        except UnicodeDecodeError:
+            encoding = "cp1252"
+    sample = head.decode(encoding, errors="ignore")
+    try:
+        delimiter = csv.Sniffer().sniff(sample[:16384], delimiters=",;\t|").delimiter
+    except csv.Error:
+        delimiter = "\t" if sample.count("\t") > sample.count(",") else ","
+    leading = list(csv.reader(io.StringIO(sample), delimiter=delimiter))[:HEADER_SCAN_ROWS]
+
+    def chunks(skip: int) -> Iterator[pd.DataFrame]:
+        reader = pd.read_csv(
+            io.BufferedReader(_Reader(buffer)), sep=delimiter, header=None, skiprows=skip, dtype=str,
+            chunksize=CHUNK_ROWS, encoding=encoding, encoding_errors="replace", on_bad_lines="skip",
+            skip_blank_lines=True, engine="c",
+        )
+        yield from reader
+
+    yield os.path.splitext(filename)[0], chunks, leading, delimiter == ";"
+
+
+def _column(ref: str) -> int:
+    """Zero-based column of a cell reference: "C12" -> 2"""
+    index = 0
+    for char in ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+def _xlsx_value(kind: Optional[str], text: str, shared: List[str]) -> Any:
+    if kind in ("inlineStr", "str", "e"):
+        return text
+    if not text:
+        return None
+    if kind == "s":
+        return shared[int(text)]
+    if kind == "b":
+        return text == "1"
+    try:
+        number = float(text)
+    except ValueError:
+        return text
+    return int(number) if number.is_integer() else number
+
+
+def _xlsx_rows(f, shared: Optional[List[str]]) -> Iterator[List[Any]]:
+    """Cell values of a worksheet row by row; with shared None, the strings of a sharedStrings part.
+
+    Parsed with expat callbacks rather than an element tree: no objects
+    are built per cell, so memory stays flat and large sheets parse a few
+    times faster.
+    """
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    done: List[Any] = []
+    state: Dict[str, Any] = {"row": [], "ref": None, "kind": None, "text": [], "capture": False, "position": 0}
+
+    def start(name, attrs):
+        name = name.rpartition(":")[2]
+        if name == "c":
+            state.update(ref=attrs.get("r"), kind=attrs.get("t"), text=[])
+        elif name in ("v", "t"):
+            state["capture"] = True
+        elif name in ("row", "si"):
+            state.update(row=[], text=[], position=0)
+
+    def end(name):
+        name = name.rpartition(":")[2]
+        if name in ("v", "t"):
+            state["capture"] = False
+        elif name == "c":
+            row = state["row"]
+            column = _column(state["ref"]) if state["ref"] else state["position"]
+            row.extend([None] * (column - len(row)))
+            row.append(_xlsx_value(state["kind"], "".join(state["text"]), shared))
+            state["position"] = len(row)
+        elif name == "row":
+            done.append(state["row"])
+        elif name == "si":
+            done.append("".join(state["text"]))
+
+    def text(data):
+        if state["capture"]:
+            state["text"].append(data)
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = text
+    while True:
+        block = f.read(256 * 1024)
+        parser.Parse(block, not block)
+        yield from done
+        done.clear()
+        if not block:
+            return
+
+
+def _rows_xlsx(buffer: Buffer) -> Iterator[Tuple[str, Any, List[List[Any]], bool]]:
+    """(sheet name, chunk iterator, leading rows, decimal comma) for each worksheet, streamed.
+
+    Reads the workbook XML directly, without a spreadsheet library.
+    """
+    try:
+        book = zipfile.ZipFile(io.BufferedReader(_Reader(buffer)))
+        workbook = ET.fromstring(book.read("xl/workbook.xml"))
+        rels = ET.fromstring(book.read("xl/_rels/workbook.xml.rels"))
+    except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+        raise ValueError(f"Unreadable spreadsheet: {e}")
+    with book:
+        targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+        shared: List[str] = []
+        if "xl/sharedStrings.xml" in book.namelist():
+            with book.open("xl/sharedStrings.xml") as f:
+                shared = list(_xlsx_rows(f, None))
+        for sheet in workbook.iter(f"{_NS}sheet"):
+            target = targets.get(sheet.get(f"{_REL_NS}id"), "")
+            path = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+            if path not in book.namelist():
+                continue
+            rows = _xlsx_rows(book.open(path), shared)
+            leading = list(itertools.islice(rows, HEADER_SCAN_ROWS))
+
+            def chunks(skip: int, rows=rows, leading=leading) -> Iterator[List[List[Any]]]:
+                batch = leading[skip:]
+                for row in rows:
+                    batch.append(row)
+                    if len(batch) >= CHUNK_ROWS:
+                        yield batch
+                        batch = []
+                if batch:
+                    yield batch
+
+            yield sheet.get("name", path), chunks, leading, False
+
+
+def _entries(totals: _Totals) -> Dict[str, Any]:
+    """Aggregated items as result sections in the parser's schema"""
+    openings, finishes = [], []
+    electrical: Dict[str, Dict[str, Any]] = {}
+    plumbing: Dict[str, Dict[str, Any]] = {}
+    rooms = {name: room for (name, _), room in totals.rooms.items()}
+    counters: Dict[str, int] = {}
+    used = set()
+
+    def next_id(prefix: str) -> str:
+        counters[prefix] = counters.get(prefix, 0) + 1
+        return f"{prefix}_{counters[prefix]}"
+
+    def number(value: float, default: float = 0.0) -> float:
+        return default if np.isnan(value) or value == MISSING else round(float(value), 3)
+
+    for key, (quantity, area, length) in totals.items.items():
+        item = dict(zip(KEY_FIELDS, key))
+        kind, name = item["kind"], item["description"] or item["type"] or item["mark"]
+        count = int(round(number(quantity, 1.0)))
+        location = item["room"]
+        if kind in ("door", "window"):
+            width, height = number(item["width"]), number(item["height"])
+            size = f"{width:g} × {height:g} m"
+            mark_id = item["mark"] if item["mark"] and item["mark"] not in used else ""
+            used.add(item["mark"])
+            openings.append({
+                "id": mark_id or next_id(f"{item['mark'] or kind}"), "type": kind, "mark": item["mark"], "description": name,
+                "size": {"width": width, "height": height}, "count": count, "location": location,
+                "material": item["material"],
+            })
+            room = rooms.get(location.lower())
+            if room is not None:
+                standard = size in STANDARD_SIZES[kind]
+                room[f"{kind}s"].append({
+                    "sizeType": "standard" if standard else "custom",
+                    "standardSize": size if standard else "",
+                    "custom": {"height": str(height), "width": str(width), "price": ""},
+                    "type": item["type"] or name,
+                    "count": count,
+                })
+        elif kind in ("outlet", "lighting", "board", "cable"):
+            system_type = item["system"] or ("lighting" if kind == "lighting" else "power")
+            system = electrical.setdefault(system_type.lower(), {
+                "id": next_id("elec"), "name": system_type.replace("-", " ").title(), "systemType": system_type, "cables": [],
+                "outlets": [], "lighting": [], "distributionBoards": [], "protectionDevices": [], "voltage": 230,
+            })
+            if kind == "outlet":
+                system["outlets"].append({
+                    "id": next_id("outlet"), "type": name, "count": count, "location": location,
+                    "circuit": item["circuit"], "rating": number(item["rating"], 13), "gang": 1, "mounting": "flush",
+                })
+            elif kind == "lighting":
+                system["lighting"].append({
+                    "id": next_id("light"), "type": name, "count": count, "location": location,
+                    "circuit": item["circuit"], "wattage": number(item["wattage"], 12), "controlType": "switch",
+                    "emergency": "emergency" in name.lower(),
+                })
+            elif kind == "board":
+                system["distributionBoards"].append({
+                    "id": item["mark"] or next_id("db"), "type": "main" if "main" in name.lower() else "sub",
+                    "circuits": count, "rating": number(item["rating"], 63), "mounting": "surface", "accessories": [],
+                })
+            else:
+                system["cables"].append({
+                    "id": next_id("cable"), "type": item["type"] or name, "size": number(item["diameter"], 2.5),
+                    "length": number(length, number(quantity) if item["unit"].lower() in ("m", "lm") else 0.0),
+                    "quantity": count, "circuit": item["circuit"], "protection": "",
+                    "installationMethod": "concealed",
+                })
+        elif kind in ("fixture", "pipe"):
+            system_type = item["system"] or ("water-supply" if kind == "pipe" else "drainage")
+            system = plumbing.setdefault(system_type.lower(), {
+                "id": next_id("plumb"), "name": system_type.replace("-", " ").title(), "systemType": system_type,
+                "pipes": [], "fixtures": [], "tanks": [], "pumps": [], "fittings": [],
+            })
+            if kind == "fixture":
+                system["fixtures"].append({
+                    "id": next_id("fixture"), "type": item["type"] or name, "count": count, "location": location,
+                    "quality": "standard", "connections": {"waterSupply": True, "drainage": True, "vent": False},
+                })
+            else:
+                system["pipes"].append({
+                    "id": next_id("pipe"), "material": item["material"] or name, "diameter": number(item["diameter"]),
+                    "length": number(length, number(quantity) if item["unit"].lower() in ("m", "lm") else 0.0),
+                    "quantity": count,
+                })
+        elif kind == "finish":
+            category = item["category"].lower()
+            if category not in dict(FINISH_CATEGORIES):
+                text = f"{item['category']} {name}".lower()
+                category = next((c for c, pattern in FINISH_CATEGORIES if pattern.search(text)), "wall-finishes")
+            finish_area = number(area, number(quantity) if item["unit"].lower() in ("m2", "m²", "sqm") else 0.0)
+            finishes.append({
+                "id": next_id("finish"), "category": category, "type": name, "material": item["material"] or name,
+                "area": round(finish_area, 2), "unit": item["unit"] or "m²",
+                "quantity": round(number(quantity, finish_area), 2), "location": location,
+            })
+
+    return {
+        "rooms": list(rooms.values()),
+        "openings": openings,
+        "electrical": list(electrical.values()),
+        "plumbing": list(plumbing.values()),
+        "finishes": finishes,
+    }
+
+
+def ingest_schedule(buffer: Buffer, filename: str) -> Dict[str, Any]:
+    """Rooms, openings, electrical, plumbing and finishes from a CSV/TXT/XLSX schedule, without the model.
+
+    Each sheet's header row is found among its first rows and its columns
+    mapped onto known fields. Rows are read CHUNK_ROWS at a time, classified
+    by their description, and summed per distinct item, so memory is
+    bounded by the number of distinct items rather than rows.
+    """
+    start = time.monotonic()
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext not in SCHEDULE_EXTENSIONS:
+        raise ValueError(f"Unsupported schedule type: {ext}. Supported types: {', '.join(sorted(SCHEDULE_EXTENSIONS))}")
+    sheets = _rows_xlsx(buffer) if ext == ".xlsx" else _rows_csv(buffer, filename)
+    totals = _Totals()
+    errors = []
+    for sheet_name, chunks, leading, decimal_comma in sheets:
+        try:
+            header, columns = find_header(leading)
+            kind = layout(columns)
+        except ValueError as e:
+            errors.append(f"{sheet_name}: {e}")
+            continue
+        header_row = leading[header]
+        scales = {field: _unit_scale(header_row[index]) for field, index in columns.items()}
+        hint = next((k for k, pattern in HINTS if pattern.search(f"{sheet_name} {filename}".lower())), "")
+        title = " ".join(str(c) for row in leading[:header] for c in row if c).lower()
+        hint = hint or next((k for k, pattern in HINTS if pattern.search(title)), "")
+        totals.layouts.append({"sheet": sheet_name, "layout": kind, "columns": sorted(columns)})
+        for rows in chunks(header + 1):
+            if totals.rows >= MAX_ROWS:
+                totals.truncated = True
+                break
+            rows = rows[:MAX_ROWS - totals.rows]
+            totals.rows += len(rows)
+            frame = _frame(rows, columns, scales, decimal_comma)
+            if kind == "rooms":
+                _add_rooms(frame, totals)
+            else:
+                _add_items(frame, hint, totals)
+    if not totals.layouts:
+        raise ValueError("; ".join(errors) or "Empty schedule")
+
+    result = _entries(totals)
+    if not any(result.values()):
+        return {"error": "No schedule rows recognised"}
+    normalize_enums(result)
+    result["analysis_method"] = "schedule_ingest"
+    result["schedule"] = {
+        "rows": totals.rows,
+        "unmatchedRows": totals.unmatched,
+        "truncated": totals.truncated,
+        "sheets": totals.layouts,
+    }
+    elapsed = time.monotonic() - start
+    metrics.observe("ingest_seconds", elapsed)
+    print(f"📊 Ingested {totals.rows} schedule rows from {filename} in {elapsed:.2f}s", file=sys.stderr)
+    return result
+
+
+def _synthetic_csv(n_rows: int) -> bytes:
+    """Mixed BOQ-style point list: doors, windows, sockets, lights, fixtures and finishes"""
+    items = [
+        ("D01", "Flush door", "", "900", "2100", "Hardwood"), ("W02", "Casement window", "", "1200", "1200", "Aluminium"),
+        ("", "13A twin switched socket", "", "", "", ""), ("", "LED downlight 12W", "", "", "", ""),
+        ("", "Wash hand basin", "", "", "", "Vitreous china"), ("", "Ceramic floor tiles", "Flooring", "", "", "Ceramic"),
+        ("", "Emulsion paint to walls", "Paint", "", "", "Emulsion"), ("", "uPVC pipe 110mm", "", "", "", "uPVC"),
+    ]
+    out = io.StringIO()
+    out.write("PROJECT X - BILL OF QUANTITIES EXTRACT\n\n")
+    out.write("Mark,Description,Category,Width (mm),Height (mm),Material,Location,Qty,Unit\n")
+    for i in range(n_rows):
+        mark, description, category, width, height, material = items[i % len(items)]
+        unit = "m2" if category else "nr"
+        out.write(f"{mark},{description},{category},{width},{height},{material},Room {i % 40},{1 + i % 3},{unit}\n")
+    return out.getvalue().encode()
+
+
+def _synthetic_xlsx(n_rows: int) -> bytes:
+    """Door schedule workbook with shared strings, as spreadsheet programs write it"""
+    strings = ["DOOR SCHEDULE", "Ref", "Type", "Size", "Frame", "Room", "No off", "Panel", "900 x 2100", "Timber"]
+    strings += [f"D{i:02d}" for i in range(12)] + [f"Room {i}" for i in range(40)]
+    index = {text: i for i, text in enumerate(strings)}
+
+    def row(number: int, values: List[Any]) -> str:
+        cells = "".join(
+            f'<c r="{chr(65 + i)}{number}" t="s"><v>{index[v]}</v></c>' if isinstance(v, str)
+            else f'<c r="{chr(65 + i)}{number}"><v>{v}</v></c>' for i, v in enumerate(values))
+        return f'<row r="{number}">{cells}</row>'
+
+    rows = [row(1, ["DOOR SCHEDULE"]), row(2, ["Ref", "Type", "Size", "Frame", "Room", "No off"])]
+    rows += [row(i + 3, [f"D{i % 12:02d}", "Panel", "900 x 2100", "Timber", f"Room {i % 40}", 1]) for i in range(n_rows)]
+    ns = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as book:
+        book.writestr("xl/workbook.xml", f'<workbook {ns} xmlns:r="http://schemas.openxmlformats.org/officeDocument/'
+                                         f'2006/relationships"><sheets><sheet name="Door schedule" sheetId="1" '
+                                         f'r:id="rId1"/></sheets></workbook>')
+        book.writestr("xl/_rels/workbook.xml.rels", '<Relationships xmlns="http://schemas.openxmlformats.org/package/'
+                                                    '2006/relationships"><Relationship Id="rId1" '
+                                                    'Target="worksheets/sheet1.xml"/></Relationships>')
+        book.writestr("xl/sharedStrings.xml", f'<sst {ns}>' + "".join(f"<si><t>{t}</t></si>" for t in strings) + "</sst>")
+        book.writestr("xl/worksheets/sheet1.xml", f'<worksheet {ns}><sheetData>{"".join(rows)}</sheetData></worksheet>')
+    return out.getvalue()
+
+
+# Benchmark: python ingest.py [rows]
+if __name__ == "__main__":
+    import tracemalloc
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    data = _synthetic_csv(n)
+    start = time.perf_counter()
+    result = ingest_schedule(memoryview(data), "boq.csv")
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    ingest_schedule(memoryview(data), "boq.csv")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    sizes = {k: len(v) for k, v in result.items() if isinstance(v, list)}
+    print(f"⏱️ {n} rows ({len(data) / 1024 / 1024:.1f} MB CSV) in {elapsed:.2f}s, "
+          f"peak Python allocations {peak / 1024 / 1024:.1f} MB; {sizes}; {result['schedule']['unmatchedRows']} unmatched")
+
+    xlsx = _synthetic_xlsx(n // 2)
+    start = time.perf_counter()
+    result = ingest_schedule(memoryview(xlsx), "doors.xlsx")
+    print(f"⏱️ {n // 2} XLSX rows ({len(xlsx) / 1024 / 1024:.1f} MB) in {time.perf_counter() - start:.2f}s; "
+          f"{len(result['openings'])} door entries")
@@ -0,0 +1,191 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import asyncio
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, Any, Optional, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+import metrics
+import store
+from limiter import OverloadedError
+
+# A job whose worker stops renewing its lease this long is taken over
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "30"))
+# Longest a duplicate upload waits for another worker's run of the same file
+WAIT_SECONDS = float(os.getenv("JOB_WAIT_SECONDS", "300"))
+POLL_SECONDS = 0.25
+
+
+class JobPending(OverloadedError):
+    """The same file is still being analysed by another request"""
+
+
+class Job:
+    """This request's lease on analysing one upload; shared with every worker through the store"""
+
+    def __init__(self, content_hash: str, owner: str):
+        self.content_hash = content_hash
+        self.owner = owner
+        self.finished = False
+
+    async def stage(self, name: str) -> None:
+        """Publish the pipeline stage the job has reached"""
+        await run_in_threadpool(store.update_job, self.content_hash, self.owner, name)
+
+    def finish(self, analysis_id: Optional[str] = None, error: Optional[str] = None) -> None:
+        """Done with the stored analysis, or failed; waiting duplicates then serve it or run themselves"""
+        if self.finished:
+            return
+        self.finished = True
+        with _held_lock:
+            _held.discard((self.content_hash, self.owner))
+        store.finish_job(self.content_hash, self.owner, analysis_id, error)
+
+
+_held: Set[Tuple[str, str]] = set()
+_held_lock = threading.Lock()
+_heartbeat_pid: Optional[int] = None
+
+
+def _heartbeat() -> None:
+    while True:
+        time.sleep(LEASE_SECONDS / 3)
+        with _held_lock:
+            leases = list(_held)
+        if not leases:
+            continue
+        try:
+            store.renew_jobs(leases, time.time() + LEASE_SECONDS)
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not renew {len(leases)} job leases: {e}", file=sys.stderr)
+
+
+def _hold(job: Job) -> None:
+    """Keep the job's lease renewed while this process works on it"""
+    global _heartbeat_pid
+    with _held_lock:
+        _held.add((job.content_hash, job.owner))
+        if _heartbeat_pid != os.getpid():
+            _heartbeat_pid = os.getpid()
+            threading.Thread(target=_heartbeat, name="job-heartbeat", daemon=True).start()
+
+
+async def acquire(content_hash: str, filename: Optional[str] = None) -> Tuple[Optional[Job], Optional[str]]:
+    """(job, None) when this request should analyse the upload, or (None, analysis_id)
+    once another request, in any worker, has stored its analysis of the same file.
+
+    Waits while the other run is alive; takes over when it failed or its
+    worker died. Raises JobPending after WAIT_SECONDS.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    deadline = time.monotonic() + WAIT_SECONDS
+    waited_since = None
+    while True:
+        current = await run_in_threadpool(
+            store.claim_job, content_hash, owner, time.time() + LEASE_SECONDS, filename
+        )
+        if current is None:
+            if waited_since is not None:
+                metrics.increment("job_takeovers")
+            job = Job(content_hash, owner)
+            _hold(job)
+            return job, None
+        if current["status"] == "done":
+            if waited_since is not None:
+                metrics.observe("job_wait", time.monotonic() - waited_since)
+            metrics.increment("job_duplicates_served")
+            return None, current["analysis_id"]
+        if waited_since is None:
+            waited_since = time.monotonic()
+            metrics.increment("job_waits")
+            print(f"⏳ {filename} is already being analysed by {current['owner']}, waiting", file=sys.stderr)
+        if time.monotonic() >= deadline:
+            raise JobPending(f"{filename} is still being analysed", retry_after=LEASE_SECONDS)
+        await asyncio.sleep(POLL_SECONDS)
+
+
+def status(content_hash: str) -> Optional[Dict[str, Any]]:
+    """Public view of a job: status, stage, timings and the analysis once done.
+
+    Which worker runs it and under what filename stay private.
+    """
+    job = store.get_job(content_hash)
+    if job is None:
+        return None
+    now = time.time()
+    if job["status"] == "running" and job["expires_at"] < now:
+        job["status"] = "abandoned"
+    job["elapsed"] = round((job["updated_at"] if job["status"] != "running" else now) - job["started_at"], 3)
+    return {k: v for k, v in job.items() if k not in ("expires_at", "owner", "filename")}
+
+
+# Benchmark: python jobs.py [uploads] [rows]
+if __name__ == "__main__":
+    import concurrent.futures
+    import subprocess
+    import tempfile
+
+    import httpx
+
+    from ingest import _synthetic_csv
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    clients = 16
+    base = _synthetic_csv(rows)
+    print(f"🖥️ {os.cpu_count()} CPUs; {n} schedule uploads of {len(base) / 1024 / 1024:.1f} MB, "
+          f"{clients} concurrent clients")
+
+    def upload(url: str, data: bytes) -> Dict[str, Any]:
+        response = httpx.post(f"{url}/api/plan/upload", files={"file": ("schedule.csv", data, "text/csv")},
+                              timeout=600)
+        response.raise_for_status()
+        return response.json()
+
+    baseline = None
+    for workers in (1, 2, 4, 8):
+        port = 8700 + workers
+        url = f"http://127.0.0.1:{port}"
+        db = os.path.join(tempfile.mkdtemp(), "analyses.db")
+        # Every client is the same anonymous tenant: let it fill all slots and the queue
+        env = {**os.environ, "ANALYSIS_DB": db, "WEB_CONCURRENCY": str(workers), "PRECHECK_MODE": "off",
+               "SCHEDULER_TENANT_MAX_RUNNING": "Free=64", "SCHEDULER_MAX_QUEUE_PER_TENANT": "64"}
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            env=env, cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            for _ in range(600):
+                try:
+                    httpx.get(f"{url}/api/metrics", timeout=1)
+                    break
+                except httpx.HTTPError:
+                    time.sleep(0.1)
+            uploads = [base + f"\nBench row {i},1,1\n".encode() for i in range(n + clients)]
+            with concurrent.futures.ThreadPoolExecutor(clients) as pool:
+                # Warm every worker (imports, pandas) before timing
+                list(pool.map(lambda i: upload(url, uploads[n + i]), range(clients)))
+                start = time.perf_counter()
+                list(pool.map(lambda i: upload(url, uploads[i]), range(n)))
+                elapsed = time.perf_counter() - start
+
+                # Single flight: the same new file from every client, across all workers
+                fresh = base + b"\nSingle flight,1,1\n"
+                ids = set(r["analysis_id"] for r in pool.map(lambda i: upload(url, fresh), range(clients)))
+            stored = sqlite3.connect(db).execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        finally:
+            server.terminate()
+            server.wait()
+        rate = n / elapsed
+        baseline = baseline or rate
+        print(f"⏱️ {workers} worker(s): {rate:6.1f} uploads/s, speed-up {rate / baseline:.2f}x; "
+              f"{clients} duplicate uploads -> {len(ids)} analysis id(s), {stored} analyses stored "
+              f"(expected {n + clients + 1})")
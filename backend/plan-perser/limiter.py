@@ -0,0 +1,309 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import os
+import random
+import sys
+import threading
+import time
+from typing import Any, Callable, Optional
+
+
+class OverloadedError(RuntimeError):
+    """The model quota or local queue is exhausted; retry later"""
+
+    def __init__(self, message: str, retry_after: float = 5.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Saturated(OverloadedError):
+    """Too many calls already waiting for a slot"""
+
+
+class RateLimited(OverloadedError):
+    """The model API kept answering 429 after all retries"""
+
+
+# uvicorn worker processes (uvicorn reads the same variable); the API quota is split between them
+WORKERS = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+
+_RATE_LIMIT_ERRORS = {"ResourceExhausted", "TooManyRequests"}
+_TRANSIENT_ERRORS = _RATE_LIMIT_ERRORS | {
+    "ServiceUnavailable", "InternalServerError", "DeadlineExceeded", "GatewayTimeout",
+    "Aborted", "ConnectionError", "Timeout", "TimeoutError", "RetryError",
+}
+
+
+_TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def _error_names(error: BaseException):
+    return {cls.__name__ for cls in type(error).__mro__}
+
+
+def _status(error: BaseException) -> Optional[int]:
+    """HTTP status of an API error: google.api_core's code, or the failed response's status"""
+    for value in (getattr(error, "code", None), getattr(error, "status_code", None),
+                  getattr(getattr(error, "response", None), "status_code", None)):
+        if isinstance(value, int) and 100 <= value < 600:  # grpc's code() is a method, not a status
+            return int(value)
+    return None
+
+
+def is_rate_limit(error: BaseException) -> bool:
+    return bool(_error_names(error) & _RATE_LIMIT_ERRORS) or _status(error) == 429
+
+
+def is_transient(error: BaseException) -> bool:
+    return bool(_error_names(error) & _TRANSIENT_ERRORS) or _status(error) in _TRANSIENT_STATUS
+
+
+class TokenBucket:
+    """Refilling budget of `rate` units per minute with a burst of `capacity`"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        with self.lock:
+            self._refill(time.monotonic())
+            missing = min(amount, self.capacity) - self.tokens
+            return max(missing / self.rate, 0.0) if self.rate else float("inf")
+
+    def take(self, amount: float, timeout: float) -> None:
+        """Block until `amount` is available, or raise Saturated past timeout"""
+        amount = min(amount, self.capacity)
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate if self.rate else float("inf")
+            if now + wait > deadline:
+                raise Saturated("Model quota budget exhausted", retry_after=wait)
+            time.sleep(min(wait, 1.0))
+
+
+class ModelGate:
+    """Process-wide AIMD concurrency limit, quota buckets and retry for model calls.
+
+    The concurrency limit grows by ~1 per window of successful calls and is
+    halved on a 429 (or cut 10% when latency exceeds the target). Callers
+    beyond the limit queue up to `max_queue`; past that they are rejected
+    immediately so the API can answer 429 instead of piling up work. A call
+    gives up once `deadline` seconds have passed across its attempts, queue
+    and quota waits and backoff.
+    """
+
+    def __init__(self, max_concurrency: int = 8, min_concurrency: int = 1, rpm: float = 60,
+                 tpm: float = 1_000_000, max_queue: int = 32, queue_timeout: float = 60.0,
+                 max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 30.0,
+                 latency_target: float = 90.0, deadline: float = 300.0):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.latency_target = latency_target
+        self.deadline = deadline
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.condition = threading.Condition()
+        self.stats = {"calls": 0, "retries": 0, "rate_limited": 0, "rejected": 0}
+
+    @classmethod
+    def from_env(cls) -> "ModelGate":
+        return cls(
+            max_concurrency=max(int(os.getenv("MODEL_MAX_CONCURRENCY", "8")) // WORKERS, 1),
+            rpm=float(os.getenv("MODEL_RPM", "60")) / WORKERS,
+            tpm=float(os.getenv("MODEL_TPM", "1000000")) / WORKERS,
+            max_queue=int(os.getenv("MODEL_MAX_QUEUE", "32")),
+            queue_timeout=float(os.getenv("MODEL_QUEUE_TIMEOUT", "60")),
+            max_retries=int(os.getenv("MODEL_MAX_RETRIES", "4")),
+            latency_target=float(os.getenv("MODEL_LATENCY_TARGET", "90")),
+            deadline=float(os.getenv("MODEL_DEADLINE", "300")),
+        )
+
+    def saturated(self) -> bool:
+        """True when a new call would be rejected right away"""
+        with self.condition:
+            return self.waiting >= self.max_queue
+
+    def retry_after(self) -> float:
+        return max(self.requests.wait_time(1), self.base_delay)
+
+    def _acquire(self, timeout: float) -> None:
+        with self.condition:
+            if self.in_flight >= int(self.limit) and self.waiting >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise Saturated("Model call queue is full", retry_after=self.retry_after())
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + timeout
+                while self.in_flight >= int(self.limit):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["rejected"] += 1
+                        raise Saturated("Timed out waiting for a model call slot", retry_after=self.retry_after())
+                    self.condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+
+    def _release(self) -> None:
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def _on_success(self, latency: float) -> None:
+        with self.condition:
+            if latency > self.latency_target:
+                self.limit = max(self.min_concurrency, self.limit * 0.9)
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / max(self.limit, 1.0))
+            self.condition.notify_all()
+
+    def _on_rate_limited(self) -> None:
+        with self.condition:
+            self.stats["rate_limited"] += 1
+            self.limit = max(self.min_concurrency, self.limit / 2)
+
+    def _wait_budget(self, deadline: float) -> float:
+        """How long a queue or quota wait may block: the queue timeout, capped by the call's deadline"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self.stats["rejected"] += 1
+            raise Saturated("Model call deadline exceeded", retry_after=self.retry_after())
+        return min(self.queue_timeout, remaining)
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, fn: Callable[[], Any], tokens: float = 0) -> Any:
+        """Run fn under the gate, retrying transient failures with backoff until the deadline"""
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            # Quota first: a call waiting on the buckets must not hold a concurrency slot
+            self.requests.take(1, self._wait_budget(deadline))
+            if tokens:
+                self.tokens.take(tokens, self._wait_budget(deadline))
+            self._acquire(self._wait_budget(deadline))
+            try:
+                self.stats["calls"] += 1
+                start = time.monotonic()
+                try:
+                    result = fn()
+                except Exception as e:
+                    rate_limited = is_rate_limit(e)
+                    if rate_limited:
+                        self._on_rate_limited()
+                    delay = self._backoff(attempt)
+                    if not is_transient(e) or attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                        if rate_limited:
+                            raise RateLimited(f"Model rate limit: {e}", retry_after=self.retry_after()) from e
+                        raise
+                    print(f"🔁 Transient model error ({type(e).__name__}), retry {attempt + 1} in {delay:.1f}s",
+                          file=sys.stderr)
+                else:
+                    self._on_success(time.monotonic() - start)
+                    return result
+            finally:
+                self._release()
+            self.stats["retries"] += 1
+            time.sleep(delay)
+            attempt += 1
+
+
+def estimate_tokens(prompt: str, data_size: int, mime_type: str) -> int:
+    """Rough input token estimate for the TPM bucket"""
+    prompt_tokens = len(prompt) // 4
+    if mime_type == "application/pdf":
+        # ~258 tokens per page; assume ~100 KB per drawing page
+        return prompt_tokens + 258 * max(1, data_size // 100_000)
+    return prompt_tokens + 258
+
+
+# Shared by every model call in the process
+MODEL_GATE = ModelGate.from_env()
+
+
+class _ResourceExhausted(RuntimeError):
+    """Shaped like google.api_core's 429 error"""
+    code = 429
+
+
+class _FakeBackend:
+    """Local stand-in for the model API that answers 429 above its capacity"""
+
+    def __init__(self, capacity: int, latency: float):
+        self.capacity = capacity
+        self.latency = latency
+        self.active = 0
+        self.lock = threading.Lock()
+        self.served = 0
+        self.throttled = 0
+
+    def __call__(self):
+        with self.lock:
+            self.active += 1
+            over = self.active > self.capacity
+        try:
+            if over:
+                with self.lock:
+                    self.throttled += 1
+                raise _ResourceExhausted("Resource has been exhausted (e.g. check quota).")
+            time.sleep(self.latency * random.uniform(0.5, 1.5))
+            with self.lock:
+                self.served += 1
+            return {"rooms": []}
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+# Simulation: python limiter.py [clients] [backend_capacity]
+if __name__ == "__main__":
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    capacity = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    backend = _FakeBackend(capacity, latency=0.05)
+    gate = ModelGate(max_concurrency=16, rpm=60_000, max_queue=64, queue_timeout=30,
+                     base_delay=0.02, max_delay=0.5, max_retries=6)
+    outcomes = {"ok": 0, "overloaded": 0}
+
+    def client():
+        for _ in range(5):
+            try:
+                gate.call(backend)
+                outcomes["ok"] += 1
+            except OverloadedError:
+                outcomes["overloaded"] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    print(f"⏱️ {clients * 5} calls in {elapsed:.2f}s: {outcomes['ok']} ok, {outcomes['overloaded']} rejected; "
+          f"backend throttled {backend.throttled} attempts; final limit {gate.limit:.1f} (capacity {capacity}); "
+          f"stats {gate.stats}")
@@ -1,13 +1,38 @@
 # © 2025 Jeff. All rights reserved.
 # Unauthorized copying, distribution, or modification of this file is strictly prohibited.
 
-import uuid
-import subprocess
-import json
+import hashlib
 import os
-from pathlib import Path
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import uuid
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Body, Header, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import identity
+import jobs
+import metrics
+import phash_index
+import precheck
+import profiling
+import raster
+import store
+from admission import ADMISSION, AdmissionRejected, estimate_cost
+from cascade import escalation_rates
+from compact import etag_matches, json_response, not_modified, to_compact, wants_compact
+from edits import edit_result
+from fingerprint import fingerprint_document
+from ingest import ingest_schedule, is_schedule
+from limiter import MODEL_GATE, WORKERS, OverloadedError
+from parser import MIME_TYPES, parse_document, resolve_mime_type
+from revisions import DIFF_SECTIONS, diff_results
+from scheduler import SCHEDULER, QueueFull
+from takeoff import stream_takeoff, takeoff
+from upload_buffer import open_upload
 
 app = FastAPI(title="Plan Parser API")
 
@@ -19,9 +44,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
-
 ALLOWED_EXTENSIONS = {
     'jpg', 'jpeg', 'png', 'pdf', 'dwg', 'dxf', 'rvt', 'ifc',
     'pln', 'zip', 'csv', 'xlsx', 'txt'
@@ -38,6 +60,83 @@ ALLOWED_MIME_TYPES = {
     'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
 }
 
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """Profile a request when an admin asks (X-Profile: 1 or ?profile=1, with the
+    admin token in X-Admin-Token) or when an upload is sampled; stored under its request id"""
+    requested = request.headers.get("x-profile") == "1" or request.query_params.get("profile") == "1"
+    token = request.headers.get("x-admin-token")
+    reason = profiling.should_profile(requested, token, sampled=request.url.path == "/api/plan/upload")
+    if reason is None:
+        return await call_next(request)
+    request_id = request.headers.get("x-request-id") or str(uuid.uuid4())
+    profile = profiling.start(request_id, reason)
+    try:
+        response = await call_next(request)
+    finally:
+        data = profiling.finish(profile)
+        await run_in_threadpool(store.save_profile, request_id, data)
+    response.headers["X-Profile-Id"] = request_id
+    return response
+
+
+def require_admin(token: Optional[str]) -> None:
+    if not profiling.authorized(token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def respond(request: Request, data: Dict[str, Any], etag: Optional[str] = None):
+    """orjson response, gzip/brotli-encoded as accepted, compact on request"""
+    compact = wants_compact(request)
+    return json_response(request, to_compact(data) if compact else data, etag=etag, compact=compact)
+
+
+def require_tenant(request: Request, authorization: Optional[str]) -> str:
+    """Verified tenant of the caller; 401 for anonymous callers and rejected tokens"""
+    try:
+        tenant, _ = identity.resolve(authorization, request.client.host if request.client else None)
+    except identity.Unauthorized as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+    if not identity.is_verified(tenant):
+        raise HTTPException(status_code=401, detail="Sign in required", headers={"WWW-Authenticate": "Bearer"})
+    return tenant
+
+
+def copy_marker(source_id: str, similarity: float, owner: Optional[str]) -> Dict[str, Any]:
+    """near_duplicate section of a result served from another analysis.
+
+    Names the source only to its own owner, whose ids it would otherwise reveal.
+    """
+    exists, source_owner = store.get_owner(source_id)
+    marker = {"similarity": similarity}
+    if exists and owner is not None and source_owner == owner:
+        marker["analysis_id"] = source_id
+    return marker
+
+
+def serve_stored(analysis_id: str, content_hash: str, project_id: Optional[str],
+                 owner: Optional[str], filename: str) -> Optional[Dict[str, Any]]:
+    """A stored analysis of the same file, to answer an upload with; None once it is gone.
+
+    An analysis from another project or tenant is saved again under the
+    uploader's, without its revision details, so the project lists it and
+    its next revision can reuse its sheets.
+    """
+    cached = store.get_analysis(analysis_id)
+    if cached is None:
+        return None
+    metadata = store.get_metadata(analysis_id)
+    _, stored_owner = store.get_owner(analysis_id)
+    if metadata is not None and (metadata["project_id"], stored_owner) != (project_id, owner):
+        cached.pop("revision", None)
+        # Marked as a copy, so the near-duplicate index keeps only the original
+        cached["near_duplicate"] = copy_marker(analysis_id, 1.0, owner)
+        analysis_id = store.save_analysis(cached, content_hash, project_id, filename,
+                                          pages=store.get_pages(analysis_id), owner=owner)
+        metrics.increment("project_copies")
+    return {**cached, "analysis_id": analysis_id}
+
+
 def validate_file_type(filename: str, content_type: str) -> bool:
     """Validate file against allowed extensions and MIME types"""
     if not filename:
@@ -56,7 +155,8 @@ def validate_file_type(filename: str, content_type: str) -> bool:
     return True
 
 @app.post("/api/plan/upload")
-async def parse_plan(file: UploadFile = File(...)):
+async def parse_plan(request: Request, file: UploadFile = File(...), project_id: Optional[str] = Form(None),
+                     force: bool = Form(False), authorization: Optional[str] = Header(None)):
     # Validate file type
     print(f"📁 Received file: {file.filename}, Content-Type: {file.content_type}")
     if not validate_file_type(file.filename, file.content_type):
@@ -64,66 +164,402 @@ async def parse_plan(file: UploadFile = File(...)):
             status_code=400, 
             detail="Unsupported file type"
         )
-    
-    file_id = str(uuid.uuid4())
-    file_path = UPLOAD_DIR / f"{file_id}_{file.filename}"
 
+    # Shed load before touching the upload when the model queue is full
+    if (MODEL_GATE.saturated() and not is_schedule(file.filename)) or ADMISSION.saturated():
+        raise HTTPException(
+            status_code=429,
+            detail="Too many plans in analysis, please retry shortly",
+            headers={"Retry-After": str(int(max(MODEL_GATE.retry_after(), ADMISSION.retry_after())) + 1)}
+        )
+
+    # 🪪 Tenant and tier come from the verified access token, never from client headers
     try:
-        contents = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(contents)
-
-        # 🔍 DEBUG: Check if file exists
-        if not os.path.exists(file_path):
-            raise HTTPException(status_code=500, detail="File save failed")
-
-        # 🚀 Run your Python parser
-        result = subprocess.run(
-            ["python", "parser.py", str(file_path)],
-            capture_output=True,
-            text=True,
-            timeout=300,
-            cwd=os.path.dirname(os.path.abspath(__file__))
+        tenant, tier = await run_in_threadpool(
+            identity.resolve, authorization, request.client.host if request.client else None
         )
+    except identity.Unauthorized as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
 
-        # Clean up file
-        os.remove(file_path)
-
-        # Handle subprocess result
-        if result.returncode != 0:
-            print(f"❌ Parser failed with return code {result.returncode}")
-            print(f"STDERR: {result.stderr}")
-            print(f"STDOUT: {result.stdout}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Parser script error: {result.stderr[:200]}"
-            )
+    # 🔐 Analyses are owned by verified tenants; projects and revisions need one
+    owner = tenant if identity.is_verified(tenant) else None
+    if project_id:
+        if owner is None:
+            raise HTTPException(status_code=401, detail="Sign in to upload to a project",
+                                headers={"WWW-Authenticate": "Bearer"})
+        if not await run_in_threadpool(store.claim_project, project_id, owner):
+            raise HTTPException(status_code=403, detail="Project belongs to another account")
+
+    ticket = slot = job = None
+    finished_id = failure = None
+    try:
+        # Zero-copy view of the spooled upload (memoryview or mmap)
+        with open_upload(file.file) as buffer:
+            # ♻️ Identical file already analysed: serve the stored result
+            content_hash = hashlib.sha256(buffer).hexdigest()
+            cached_id = store.find_by_hash(content_hash, project_id, owner)
+            if cached_id:
+                cached = serve_stored(cached_id, content_hash, project_id, owner, file.filename)
+                if cached is not None:
+                    print(f"♻️ Serving stored analysis {cached_id}")
+                    return respond(request, cached)
+
+            # 🔒 One request per file across all workers; duplicates wait for its result
+            try:
+                with profiling.span("job.wait", sample=False):
+                    job, done_id = await jobs.acquire(content_hash, file.filename)
+            except jobs.JobPending as e:
+                raise HTTPException(
+                    status_code=429,
+                    detail="This file is still being analysed, please retry shortly",
+                    headers={"Retry-After": str(int(e.retry_after) + 1)}
+                )
+            if done_id:
+                cached = serve_stored(done_id, content_hash, project_id, owner, file.filename)
+                if cached is None:
+                    raise RuntimeError(f"Job for {content_hash[:12]} finished without stored analysis {done_id}")
+                print(f"♻️ Serving analysis {done_id} of a concurrent upload")
+                return respond(request, cached)
+
+            # 🎟️ Wait for a parser slot, paying tiers first
+            try:
+                with profiling.span("scheduler.wait", sample=False):
+                    slot = await SCHEDULER.acquire(tenant, tier)
+            except QueueFull as e:
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many plans queued for your plan tier, please retry shortly",
+                    headers={"Retry-After": str(int(e.retry_after) + 1)}
+                )
 
-        # Try to parse JSON
-        output = result.stdout.strip()
-        print(f"📄 Parser output: {output}")
-
-        try:
-            parsed_data = json.loads(output)
-            return parsed_data
-        except json.JSONDecodeError as e:
-            print(f"❌ Invalid JSON from parser: {e}")
-            print(f"Raw output: >>>{output}<<<")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Parser returned invalid JSON: {str(e)}"
+            # 🧮 Wait for memory and CPU headroom before rendering anything
+            await job.stage("admission")
+            cost = await run_in_threadpool(
+                estimate_cost, buffer, MIME_TYPES.get(os.path.splitext(file.filename)[1].lower(), "")
             )
+            try:
+                with profiling.span("admission.wait", sample=False):
+                    ticket = await run_in_threadpool(ADMISSION.acquire, cost)
+            except AdmissionRejected as e:
+                print(f"🧮 Admission rejected {file.filename} ({cost['memory'] >> 20} MB, {cost['pages']} pages): {e}")
+                raise HTTPException(
+                    status_code=429,
+                    detail="Server is busy with large documents, please retry shortly",
+                    headers={"Retry-After": str(int(e.retry_after) + 1)}
+                )
 
-    except Exception as e:
-        # Make sure file is cleaned up
-        if os.path.exists(file_path):
+            # 📊 Door/window, electrical and finish schedules are read without the model
+            if is_schedule(file.filename):
+                try:
+                    parsed_data = await run_in_threadpool(
+                        profiling.traced("ingest", ingest_schedule), buffer, file.filename
+                    )
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+                if "error" not in parsed_data:
+                    parsed_data["analysis_id"] = finished_id = store.save_analysis(
+                        parsed_data, content_hash, project_id, file.filename, owner=owner
+                    )
+                else:
+                    failure = parsed_data["error"]
+                return respond(request, parsed_data)
+
+            # 🔎 Reject non-drawings before spending a model call
+            decision = None
+            if precheck.PRECHECK_MODE != "off":
+                await job.stage("precheck")
+                decision = await run_in_threadpool(profiling.traced("precheck", precheck.check_upload), buffer, file.filename)
+                if not decision["ok"]:
+                    print(f"🔎 Precheck rejected {file.filename}: {decision['reason']} {decision['features']}")
+                    if precheck.PRECHECK_MODE == "enforce" and not force:
+                        raise HTTPException(
+                            status_code=422,
+                            detail=f"Upload does not look like a construction drawing ({decision['reason']})"
+                        )
+
+            # 🖼️ Fingerprint the sheets once, for near-duplicates and revisions
             try:
-                os.remove(file_path)
-                print(f"🧹 Cleaned up broken file: {file_path}")
-            except:
-                pass
+                mime_type = resolve_mime_type(file.filename, decision["mime_type"] if decision else None)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            await job.stage("fingerprint")
+            pages = await run_in_threadpool(profiling.traced("fingerprint", fingerprint_document), buffer, mime_type)
+
+            # 🪞 Same drawings as a stored analysis (re-scan, other DPI, recompressed)
+            near = await run_in_threadpool(profiling.traced("near_duplicate", phash_index.find_near_duplicate), pages)
+            if near:
+                near_id, similarity, stored_pages = near
+                cached = store.get_analysis(near_id)
+                if cached is not None:
+                    print(f"🪞 Near-duplicate of {near_id} (similarity {similarity:.3f})")
+                    metrics.increment("near_duplicate_hits")
+                    cached.pop("revision", None)
+                    cached["near_duplicate"] = copy_marker(near_id, round(similarity, 4), owner)
+                    pages = [{**page, "data": old["data"]} for page, old in zip(pages, stored_pages)]
+                    finished_id = store.save_analysis(cached, content_hash, project_id, file.filename,
+                                                      pages=pages, owner=owner)
+                    return respond(request, {**cached, "analysis_id": finished_id})
+
+            # 📑 Latest revision of the same project: unchanged sheets are reused
+            previous_id = store.latest_with_pages(project_id, owner) if project_id else None
+            previous_pages = store.get_pages(previous_id) if previous_id else None
+
+            # 🚀 Run the parser in-process, off the event loop
+            await job.stage("parse")
+            try:
+                parsed_data, pages = await run_in_threadpool(
+                    profiling.traced("parse", parse_document), buffer, file.filename, mime_type, previous_pages, pages
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            except OverloadedError as e:
+                print(f"🚦 Model overloaded: {e}")
+                raise HTTPException(
+                    status_code=429,
+                    detail="Model capacity exhausted, please retry shortly",
+                    headers={"Retry-After": str(int(e.retry_after) + 1)}
+                )
+            except RuntimeError as e:
+                print(f"❌ Parser failed: {e}")
+                raise HTTPException(status_code=500, detail=f"Parser error: {str(e)[:200]}")
+
+        if decision:
+            precheck.record_outcome(decision, parsed_data)
+        if isinstance(parsed_data, dict) and "error" not in parsed_data:
+            if "revision" in parsed_data:
+                previous = {section: store.get_section(previous_id, section) for section in DIFF_SECTIONS}
+                parsed_data["revision"]["previousAnalysisId"] = previous_id
+                parsed_data["revision"]["changes"] = diff_results(previous, parsed_data)
+            with profiling.span("store.save"):
+                analysis_id = finished_id = store.save_analysis(
+                    parsed_data, content_hash, project_id, file.filename, pages=pages, owner=owner
+                )
+            phash_index.register(analysis_id, pages)
+            parsed_data["analysis_id"] = analysis_id
+            profiling.annotate(analysis_id=analysis_id, filename=file.filename)
+        elif isinstance(parsed_data, dict):
+            failure = parsed_data["error"]
+        return respond(request, parsed_data) if isinstance(parsed_data, dict) else parsed_data
 
+    except HTTPException as e:
+        failure = str(e.detail)
+        raise
+    except Exception as e:
+        failure = f"{type(e).__name__}: {e}"
         print(f"💥 Unexpected error: {type(e).__name__}: {e}")
         import traceback
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        if ticket is not None:
+            ADMISSION.release(ticket)
+        if slot is not None:
+            SCHEDULER.release(slot)
+        if job is not None:
+            await run_in_threadpool(job.finish, finished_id, failure)
+
+
+@app.post("/api/plan/thumbnails")
+async def create_thumbnails(file: UploadFile = File(...)):
+    """Render low-resolution previews of every page (up to THUMBNAIL_MAX_PAGES) for the upload screen.
+
+    Returns their URLs; they stay in the raster cache until evicted, after
+    which they answer 404 and the file has to be posted again.
+    """
+    if not validate_file_type(file.filename, file.content_type):
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+    mime_type = MIME_TYPES.get(os.path.splitext(file.filename)[1].lower())
+    if mime_type is None:
+        raise HTTPException(status_code=400, detail="Previews are only available for PDFs and images")
+    if ADMISSION.saturated():
+        raise HTTPException(
+            status_code=429,
+            detail="Too many plans in analysis, please retry shortly",
+            headers={"Retry-After": str(int(ADMISSION.retry_after()) + 1)}
+        )
+
+    ticket = None
+    try:
+        with open_upload(file.file) as buffer:
+            # 🧮 Previews render pages too: wait for memory and CPU headroom like an analysis
+            cost = await run_in_threadpool(estimate_cost, buffer, mime_type)
+            try:
+                ticket = await run_in_threadpool(ADMISSION.acquire, cost)
+            except AdmissionRejected as e:
+                print(f"🧮 Admission rejected previews of {file.filename} ({cost['memory'] >> 20} MB, {cost['pages']} pages): {e}")
+                raise HTTPException(
+                    status_code=429,
+                    detail="Server is busy with large documents, please retry shortly",
+                    headers={"Retry-After": str(int(e.retry_after) + 1)}
+                )
+            key, count = await run_in_threadpool(
+                profiling.traced("thumbnails", raster.thumbnails), buffer, mime_type
+            )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"⚠️ Could not render previews of {file.filename}: {e}")
+        raise HTTPException(status_code=400, detail="Could not read the document")
+    finally:
+        if ticket is not None:
+            ADMISSION.release(ticket)
+    return {
+        "content_hash": key,
+        "pages": count,
+        "thumbnails": [f"/api/plan/thumbnails/{key}/{page}.png" for page in range(count)],
+    }
+
+
+@app.get("/api/plan/thumbnails/{content_hash}/{page}.png")
+def get_thumbnail(content_hash: str, page: int):
+    """A page preview rendered by POST /api/plan/thumbnails"""
+    png = raster.thumbnail(content_hash.lower(), page)
+    if png is None:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    return Response(png, media_type="image/png", headers={"Cache-Control": "private, max-age=86400, immutable"})
+
+
+@app.get("/api/plan/analyses/{analysis_id}")
+def get_analysis(analysis_id: str, request: Request):
+    """Stored analysis, without re-running the model.
+
+    ?format=compact (or Accept: application/vnd.plan.compact+json) returns
+    walls and openings as id-referenced tables. Revalidates with ETag.
+    """
+    digest = store.digest(analysis_id)
+    if digest is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    etag = f'W/"{digest}-{"compact" if wants_compact(request) else "nested"}"'
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    result = store.get_analysis(analysis_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    return respond(request, {**result, "analysis_id": analysis_id}, etag=etag)
+
+
+@app.patch("/api/plan/analyses/{analysis_id}")
+def patch_analysis(analysis_id: str, request: Request, operations: List[Dict[str, Any]] = Body(...),
+                   authorization: Optional[str] = Header(None)):
+    """Apply JSON Patch edits to a stored analysis owned by the caller.
+
+    Only the derived values downstream of the edited fields are recomputed;
+    returns the sections that changed and the take-off totals they affect.
+    """
+    tenant = require_tenant(request, authorization)
+    exists, owner = store.get_owner(analysis_id)
+    if not exists:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    if owner != tenant:
+        raise HTTPException(status_code=403, detail="Analysis belongs to another account")
+    edited: Dict[str, Any] = {}
+
+    def edit(result: Dict[str, Any]) -> Dict[str, Any]:
+        edited["result"] = result
+        return edit_result(result, operations)
+
+    try:
+        report = store.update_analysis(analysis_id, edit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if report is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    return {
+        "analysis_id": analysis_id,
+        "recomputed": report["recomputed"],
+        "sections": {section: edited["result"][section] for section in report["changed"]},
+        "removed": report["removed"],
+        "takeoff": report["takeoff"],
+        "elapsed_ms": report["elapsed_ms"],
+    }
+
+
+@app.post("/api/plan/analyses/{analysis_id}/takeoff")
+def get_takeoff(analysis_id: str, settings: Optional[Dict[str, Any]] = Body(None), stream: bool = True):
+    """Blocks, mortar, plaster, concrete, rebar and roofing quantities of a stored analysis.
+
+    Streams NDJSON (one line per element, then a totals line per trade);
+    settings override the QS defaults (wastage, mortar ratio, covers, ...).
+    """
+    result = store.get_analysis(analysis_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    if not stream:
+        return {"analysis_id": analysis_id, **takeoff(result, settings)}
+    return StreamingResponse(stream_takeoff(result, settings), media_type="application/x-ndjson")
+
+
+@app.get("/api/plan/analyses/{analysis_id}/{section}")
+def get_analysis_section(analysis_id: str, section: str, request: Request):
+    """A single section (rooms, walls, plumbing, ...) of a stored analysis"""
+    digest = store.digest(analysis_id, section)
+    if digest is None:
+        raise HTTPException(status_code=404, detail="Section not found")
+    etag = f'W/"{digest}"'
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    data = store.get_section(analysis_id, section)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Section not found")
+    return json_response(request, {"analysis_id": analysis_id, "section": section, "data": data}, etag=etag)
+
+
+@app.get("/api/plan/projects/{project_id}/analyses")
+def list_project_analyses(project_id: str, request: Request, limit: int = 50,
+                          authorization: Optional[str] = Header(None)):
+    """Stored analyses for one of the caller's projects, newest first"""
+    tenant = require_tenant(request, authorization)
+    owner = store.project_owner(project_id)
+    if owner is not None and owner != tenant:
+        raise HTTPException(status_code=403, detail="Project belongs to another account")
+    return {"project_id": project_id, "analyses": store.list_project(project_id, tenant, limit=min(limit, 500))}
+
+
+@app.get("/api/plan/jobs/{content_hash}")
+def get_job(content_hash: str):
+    """Status and stage of the analysis of a file, by the SHA-256 of its content (which only its uploaders know)"""
+    job = jobs.status(content_hash.lower())
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/api/metrics")
+def get_metrics():
+    """Metrics of the worker process that answers: model latency percentiles, hedging and limiter counters"""
+    snapshot = metrics.snapshot()
+    snapshot["worker"] = {"pid": os.getpid(), "workers": WORKERS}
+    snapshot["escalationRates"] = escalation_rates()
+    snapshot["modelGate"] = {**MODEL_GATE.stats, "limit": round(MODEL_GATE.limit, 2), "inFlight": MODEL_GATE.in_flight}
+    snapshot["admission"] = ADMISSION.snapshot()
+    snapshot["scheduler"] = SCHEDULER.snapshot()
+    return snapshot
+
+
+@app.get("/api/admin/jobs")
+def list_jobs(status: str = "running", limit: int = 50, x_admin_token: Optional[str] = Header(None)):
+    """Uploads being analysed (or done/failed) across every worker, most recently updated first"""
+    require_admin(x_admin_token)
+    return {"jobs": store.list_jobs(status, limit=min(limit, 500))}
+
+
+@app.get("/api/admin/profiles")
+def list_profiles(limit: int = 50, x_admin_token: Optional[str] = Header(None)):
+    """Recent request profiles (without samples)"""
+    require_admin(x_admin_token)
+    return {"profiles": store.list_profiles(limit=min(limit, 500))}
+
+
+@app.get("/api/admin/profiles/{request_id}")
+def get_profile(request_id: str, format: str = "collapsed", x_admin_token: Optional[str] = Header(None)):
+    """A request profile: folded stacks for flamegraph.pl/speedscope (default), or spans and samples as JSON"""
+    require_admin(x_admin_token)
+    data = store.get_profile(request_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "json":
+        return data
+    return PlainTextResponse(
+        profiling.collapsed(data),
+        headers={"Content-Disposition": f'attachment; filename="{request_id}.folded"'}
+    )
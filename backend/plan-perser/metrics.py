@@ -0,0 +1,80 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import threading
+from collections import defaultdict, deque
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+
+# Samples kept per histogram series for percentile estimates
+WINDOW = 2048
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple], float] = defaultdict(float)
+_histograms: Dict[Tuple[str, Tuple], deque] = {}
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, Tuple]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def increment(name: str, value: float = 1.0, **labels) -> None:
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    key = _key(name, labels)
+    with _lock:
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = deque(maxlen=WINDOW)
+        series.append(value)
+
+
+def count(name: str, **labels) -> float:
+    with _lock:
+        return _counters.get(_key(name, labels), 0.0)
+
+
+def percentile(name: str, q: float, min_samples: int = 1, **labels) -> Optional[float]:
+    """q-th percentile of the recent window, or None with too few samples"""
+    with _lock:
+        series = _histograms.get(_key(name, labels))
+        samples = list(series) if series else []
+    if len(samples) < min_samples or not samples:
+        return None
+    return float(np.percentile(samples, q))
+
+
+def _label(name: str, labels: Tuple) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+def snapshot() -> Dict[str, Any]:
+    """Counters and p50/p90/p99 of every histogram series"""
+    with _lock:
+        counters = {_label(n, l): v for (n, l), v in _counters.items()}
+        histograms = {_label(n, l): list(s) for (n, l), s in _histograms.items()}
+    summary = {}
+    for label, samples in histograms.items():
+        if not samples:
+            continue
+        p50, p90, p99 = np.percentile(samples, [50, 90, 99]).tolist()
+        summary[label] = {
+            "count": len(samples),
+            "mean": round(float(np.mean(samples)), 4),
+            "p50": round(p50, 4),
+            "p90": round(p90, 4),
+            "p99": round(p99, 4),
+        }
+    return {"counters": counters, "histograms": summary}
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
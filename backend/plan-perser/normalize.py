@@ -0,0 +1,461 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import re
+import sys
+import time
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+# Canonical enum values (value, label) shared with the frontend calculators
+CATALOGS: Dict[str, List[Tuple[str, str]]] = {
+    "plumbing_system": [
+        ("water-supply", "Water Supply"), ("drainage", "Drainage"), ("sewage", "Sewage"),
+        ("rainwater", "Rainwater"), ("hot-water", "Hot Water"), ("fire-fighting", "Fire Fighting"),
+        ("gas-piping", "Gas Piping"), ("irrigation", "Irrigation"),
+    ],
+    "pipe_material": [
+        ("PVC-u", "uPVC"), ("PVC-c", "cPVC"), ("copper", "Copper"), ("PEX", "PEX"),
+        ("galvanized-steel", "Galvanized Steel"), ("HDPE", "HDPE"), ("PPR", "PPR"),
+        ("cast-iron", "Cast Iron"), ("vitrified-clay", "Vitrified Clay"),
+    ],
+    "fixture_type": [
+        ("water-closet", "Water Closet"), ("urinal", "Urinal"), ("lavatory", "Lavatory"),
+        ("kitchen-sink", "Kitchen Sink"), ("shower", "Shower"), ("bathtub", "Bathtub"),
+        ("bidet", "Bidet"), ("floor-drain", "Floor Drain"), ("cleanout", "Cleanout"),
+        ("hose-bib", "Hose Bib"),
+    ],
+    "quality": [("standard", "Standard"), ("premium", "Premium"), ("luxury", "Luxury")],
+    "electrical_system": [
+        ("lighting", "Lighting"), ("power", "Power"), ("data", "Data"), ("security", "Security"),
+        ("cctv", "CCTV"), ("fire-alarm", "Fire Alarm"), ("access-control", "Access Control"),
+        ("av-systems", "AV Systems"), ("emergency-lighting", "Emergency Lighting"),
+        ("renewable-energy", "Renewable Energy"),
+    ],
+    "cable_type": [
+        ("NYM-J", "NYM-J"), ("PVC/PVC", "PVC/PVC"), ("XLPE", "XLPE"), ("MICC", "MICC"),
+        ("SWA", "Steel Wire Armoured"), ("Data-CAT6", "CAT6"), ("Ethernet", "Ethernet"),
+        ("Fiber-Optic", "Fiber Optic"), ("Coaxial", "Coaxial"),
+    ],
+    "outlet_type": [
+        ("power-socket", "Power Socket"), ("light-switch", "Light Switch"),
+        ("dimmer-switch", "Dimmer Switch"), ("data-port", "Data Port"), ("tv-point", "TV Point"),
+        ("telephone", "Telephone"), ("usb-charger", "USB Charger"), ("gpo", "GPO"),
+    ],
+    "lighting_type": [
+        ("led-downlight", "LED Downlight"), ("fluorescent", "Fluorescent"), ("halogen", "Halogen"),
+        ("emergency-light", "Emergency Light"), ("floodlight", "Floodlight"),
+        ("street-light", "Street Light"), ("decorative", "Decorative"),
+    ],
+    "installation_method": [
+        ("surface", "Surface"), ("concealed", "Concealed"), ("underground", "Underground"),
+        ("trunking", "Trunking"),
+    ],
+    "control_type": [("switch", "Switch"), ("dimmer", "Dimmer"), ("sensor", "Sensor"), ("smart", "Smart")],
+    "mounting": [("surface", "Surface"), ("flush", "Flush")],
+    "rebar_element": [
+        ("slab", "Slab"), ("beam", "Beam"), ("column", "Column"), ("foundation", "Foundation"),
+        ("strip-footing", "Strip Footing"), ("tank", "Tank"),
+    ],
+    "rebar_size": [
+        ("Y8", "8mm"), ("Y10", "10mm"), ("Y12", "12mm"), ("Y16", "16mm"), ("Y20", "20mm"), ("Y25", "25mm"),
+    ],
+    "reinforcement_type": [("individual_bars", "Individual Bars"), ("mesh", "Mesh")],
+    "footing_type": [("isolated", "Isolated"), ("strip", "Strip"), ("combined", "Combined")],
+    "tank_type": [
+        ("septic", "Septic"), ("underground", "Underground"), ("overhead", "Overhead"),
+        ("water", "Water"), ("circular", "Circular"),
+    ],
+    "concrete_category": [("substructure", "Substructure"), ("superstructure", "Superstructure")],
+    "concrete_element": [
+        (v, v.replace("-", " ").title()) for v in (
+            "slab", "beam", "column", "foundation", "septic-tank", "underground-tank", "staircase",
+            "ring-beam", "strip-footing", "raft-foundation", "pile-cap", "water-tank", "ramp",
+            "retaining-wall", "culvert", "swimming-pool", "paving", "kerb", "drainage-channel",
+            "manhole", "inspection-chamber", "soak-pit", "soakaway",
+        )
+    ],
+    "roof_type": [
+        ("flat", "Flat Roof"), ("pitched", "Pitched Roof"), ("gable", "Gable Roof"), ("hip", "Hip Roof"),
+        ("mansard", "Mansard Roof"), ("butterfly", "Butterfly Roof"), ("skillion", "Skillion Roof"),
+    ],
+    "roof_material": [
+        ("concrete-tiles", "Concrete Tiles"), ("clay-tiles", "Clay Tiles"), ("metal-sheets", "Metal Sheets"),
+        ("box-profile", "Box Profile"), ("thatch", "Thatch"), ("slate", "Slate"),
+        ("asphalt-shingles", "Asphalt Shingles"), ("green-roof", "Green Roof"), ("membrane", "Membrane"),
+    ],
+    "timber_size": [
+        ("50x25", "50mm x 25mm"), ("50x50", "50mm x 50mm"), ("75x50", "75mm x 50mm"),
+        ("100x50", "100mm x 50mm"), ("100x75", "100mm x 75mm"), ("150x50", "150mm x 50mm"),
+        ("200x50", "200mm x 50mm"),
+    ],
+    "timber_grade": [("standard", "Standard Grade"), ("structural", "Structural Grade"), ("premium", "Premium Grade")],
+    "timber_treatment": [
+        ("untreated", "Untreated"), ("pressure-treated", "Pressure Treated"), ("fire-retardant", "Fire Retardant"),
+    ],
+    "timber_type": [
+        ("rafter", "Rafter"), ("wall-plate", "Wall Plate"), ("ridge-board", "Ridge Board"), ("purlin", "Purlin"),
+        ("battens", "Battens"), ("truss", "Truss"), ("joist", "Joist"),
+    ],
+    "underlayment": [
+        ("felt-30", "30# Felt Underlayment"), ("felt-40", "40# Felt Underlayment"),
+        ("synthetic", "Synthetic Underlayment"), ("rubberized", "Rubberized Asphalt"),
+        ("breathable", "Breathable Membrane"),
+    ],
+    "insulation": [
+        ("glass-wool", "Glass Wool Batts"), ("rock-wool", "Rock Wool"), ("eps", "Expanded Polystyrene"),
+        ("xps", "Extruded Polystyrene"), ("polyurethane", "Polyurethane Foam"), ("reflective-foil", "Reflective Foil"),
+    ],
+    "gutter_type": [("PVC", "PVC Gutter"), ("Galvanized Steel", "Galvanized Steel Gutter"), ("Aluminum", "Aluminum Gutter"), ("Copper", "Copper Gutter")],
+    "downpipe_type": [("PVC", "PVC Downpipe"), ("Galvanized Steel", "Galvanized Steel Downpipe"), ("Aluminum", "Aluminum Downpipe"), ("Copper", "Copper Downpipe")],
+    "flashing_type": [("PVC", "PVC Flashing"), ("Galvanized Steel", "Galvanized Steel Flashing"), ("Aluminum", "Aluminum Flashing"), ("Copper", "Copper Flashing")],
+    "fascia_type": [("PVC", "PVC Fascia"), ("Painted Wood", "Painted Wood Fascia"), ("Aluminum", "Aluminum Fascia"), ("Composite", "Composite Fascia")],
+    "soffit_type": [("PVC", "PVC Soffit"), ("Aluminum", "Aluminum Soffit"), ("Composite", "Composite Soffit"), ("Metal", "Metal Soffit")],
+    "finish_category": [
+        ("flooring", "Flooring"), ("ceiling", "Ceiling"), ("wall-finishes", "Wall Finishes"),
+        ("paint", "Paint"), ("joinery", "Joinery"),
+    ],
+}
+
+COMMON_MATERIALS: Dict[str, List[str]] = {
+    "flooring": ["Ceramic Tiles", "Porcelain Tiles", "Hardwood", "Laminate", "Vinyl", "Carpet", "Polished Concrete", "Terrazzo"],
+    "ceiling": ["Gypsum Board", "PVC", "Acoustic Tiles", "Exposed Concrete", "Suspended Grid", "Wood Panels"],
+    "wall-finishes": ["Wallpaper", "Stone Cladding", "Tile Cladding", "Wood Paneling"],
+    "paint": ["Emulsion", "Enamel", "Weatherproof", "Textured", "Metallic"],
+    "joinery": ["Solid Wood", "Plywood", "MDF", "Melamine", "Laminate"],
+}
+for _category, _materials in COMMON_MATERIALS.items():
+    CATALOGS[f"finish_material:{_category}"] = [(m, m) for m in _materials]
+
+# Free-form names the model (and drawings) commonly use for canonical values
+SYNONYMS: Dict[str, Dict[str, str]] = {
+    "fixture_type": {
+        "toilet": "water-closet", "wc": "water-closet", "w c": "water-closet", "closet": "water-closet",
+        "basin": "lavatory", "wash basin": "lavatory", "wash hand basin": "lavatory", "whb": "lavatory",
+        "hand basin": "lavatory", "sink": "kitchen-sink", "kitchen sink": "kitchen-sink", "bath": "bathtub",
+        "tub": "bathtub", "bath tub": "bathtub", "shower tray": "shower", "fd": "floor-drain", "gully": "floor-drain",
+        "floor gully": "floor-drain", "rodding eye": "cleanout", "tap": "hose-bib", "garden tap": "hose-bib",
+        "bib tap": "hose-bib",
+    },
+    "pipe_material": {
+        "upvc": "PVC-u", "pvc": "PVC-u", "u pvc": "PVC-u", "cpvc": "PVC-c", "c pvc": "PVC-c", "gi": "galvanized-steel",
+        "galvanised steel": "galvanized-steel", "galvanized iron": "galvanized-steel", "polyethylene": "HDPE",
+        "polypropylene": "PPR", "ppr c": "PPR", "ci": "cast-iron", "clay": "vitrified-clay",
+    },
+    "plumbing_system": {
+        "cold water": "water-supply", "water": "water-supply", "supply": "water-supply", "waste": "drainage",
+        "foul": "sewage", "soil": "sewage", "storm water": "rainwater", "stormwater": "rainwater",
+        "hot": "hot-water", "fire": "fire-fighting", "hydrant": "fire-fighting", "gas": "gas-piping",
+    },
+    "lighting_type": {
+        "led light": "led-downlight", "led": "led-downlight", "downlight": "led-downlight", "down light": "led-downlight",
+        "recessed light": "led-downlight", "tube light": "fluorescent", "fluorescent tube": "fluorescent",
+        "exit light": "emergency-light", "emergency": "emergency-light", "flood light": "floodlight",
+        "security light": "floodlight", "pendant": "decorative", "chandelier": "decorative", "wall light": "decorative",
+    },
+    "outlet_type": {
+        "socket": "power-socket", "socket outlet": "power-socket", "power outlet": "power-socket", "13a socket": "power-socket",
+        "switch": "light-switch", "switch socket": "power-socket", "dimmer": "dimmer-switch", "data": "data-port",
+        "rj45": "data-port", "network point": "data-port", "tv": "tv-point", "tv outlet": "tv-point",
+        "phone": "telephone", "usb": "usb-charger", "general power outlet": "gpo",
+    },
+    "cable_type": {
+        "cat6": "Data-CAT6", "cat 6": "Data-CAT6", "fibre": "Fiber-Optic", "fibre optic": "Fiber-Optic",
+        "fiber": "Fiber-Optic", "coax": "Coaxial", "armoured": "SWA", "armored": "SWA", "twin and earth": "PVC/PVC",
+        "pvc insulated": "PVC/PVC", "mineral insulated": "MICC",
+    },
+    "electrical_system": {
+        "lights": "lighting", "sockets": "power", "small power": "power", "alarm": "fire-alarm",
+        "fire detection": "fire-alarm", "solar": "renewable-energy", "pv": "renewable-energy", "audio visual": "av-systems",
+        "network": "data", "ict": "data", "cameras": "cctv",
+    },
+    "installation_method": {"recessed": "concealed", "chased": "concealed", "flush": "concealed", "buried": "underground", "conduit": "concealed", "exposed": "surface"},
+    "roof_material": {
+        "iron sheets": "metal-sheets", "mabati": "metal-sheets", "corrugated iron": "metal-sheets", "ibr": "box-profile",
+        "roof tiles": "concrete-tiles", "clay roof tiles": "clay-tiles", "shingles": "asphalt-shingles",
+        "bitumen": "membrane", "torch on": "membrane", "makuti": "thatch",
+    },
+    "roof_type": {"hipped": "hip", "mono pitch": "skillion", "lean to": "skillion", "shed": "skillion", "gabled": "gable"},
+    "rebar_size": {"t8": "Y8", "t10": "Y10", "t12": "Y12", "t16": "Y16", "t20": "Y20", "t25": "Y25",
+                   "d8": "Y8", "d10": "Y10", "d12": "Y12", "d16": "Y16", "d20": "Y20", "d25": "Y25", "r8": "Y8"},
+    "reinforcement_type": {"bars": "individual_bars", "rebar": "individual_bars", "brc": "mesh", "a142": "mesh", "fabric": "mesh"},
+    "timber_type": {"rafters": "rafter", "batten": "battens", "purlins": "purlin", "trusses": "truss", "joists": "joist", "ridge": "ridge-board"},
+    "insulation": {"fibreglass": "glass-wool", "fiberglass": "glass-wool", "mineral wool": "rock-wool", "polystyrene": "eps", "foil": "reflective-foil"},
+    "gutter_type": {"upvc": "PVC", "galvanised": "Galvanized Steel", "aluminium": "Aluminum"},
+    "downpipe_type": {"upvc": "PVC", "galvanised": "Galvanized Steel", "aluminium": "Aluminum"},
+    "flashing_type": {"upvc": "PVC", "galvanised": "Galvanized Steel", "aluminium": "Aluminum"},
+    "fascia_type": {"timber": "Painted Wood", "wood": "Painted Wood", "aluminium": "Aluminum"},
+    "soffit_type": {"aluminium": "Aluminum", "steel": "Metal"},
+    "finish_category": {"floor": "flooring", "floors": "flooring", "ceilings": "ceiling", "wall finish": "wall-finishes",
+                        "walls": "wall-finishes", "painting": "paint", "doors": "joinery", "cabinets": "joinery"},
+    "finish_material:flooring": {"tiles": "Ceramic Tiles", "ceramic": "Ceramic Tiles", "porcelain": "Porcelain Tiles",
+                                 "timber": "Hardwood", "wood": "Hardwood", "screed": "Polished Concrete", "pvc": "Vinyl"},
+    "finish_material:ceiling": {"gypsum": "Gypsum Board", "plasterboard": "Gypsum Board", "soffit": "Exposed Concrete",
+                                "t bar": "Suspended Grid", "timber": "Wood Panels"},
+    "finish_material:paint": {"silk": "Emulsion", "vinyl silk": "Emulsion", "gloss": "Enamel", "exterior": "Weatherproof"},
+    "finish_material:joinery": {"hardwood": "Solid Wood", "timber": "Solid Wood", "ply": "Plywood"},
+}
+
+# Result fields to normalize: path (with "*" for list items) -> catalog
+FIELDS: List[Tuple[Tuple[str, ...], str]] = [
+    (("plumbing", "*", "systemType"), "plumbing_system"),
+    (("plumbing", "*", "pipes", "*", "material"), "pipe_material"),
+    (("plumbing", "*", "fixtures", "*", "type"), "fixture_type"),
+    (("plumbing", "*", "fixtures", "*", "quality"), "quality"),
+    (("electrical", "*", "systemType"), "electrical_system"),
+    (("electrical", "*", "cables", "*", "type"), "cable_type"),
+    (("electrical", "*", "cables", "*", "installationMethod"), "installation_method"),
+    (("electrical", "*", "outlets", "*", "type"), "outlet_type"),
+    (("electrical", "*", "outlets", "*", "mounting"), "mounting"),
+    (("electrical", "*", "lighting", "*", "type"), "lighting_type"),
+    (("electrical", "*", "lighting", "*", "controlType"), "control_type"),
+    (("electrical", "*", "distributionBoards", "*", "mounting"), "mounting"),
+    (("roofing", "*", "type"), "roof_type"),
+    (("roofing", "*", "material"), "roof_material"),
+    (("roofing", "*", "covering", "material"), "roof_material"),
+    (("roofing", "*", "covering", "underlayment"), "underlayment"),
+    (("roofing", "*", "covering", "insulation", "type"), "insulation"),
+    (("roofing", "*", "timbers", "*", "type"), "timber_type"),
+    (("roofing", "*", "timbers", "*", "size"), "timber_size"),
+    (("roofing", "*", "timbers", "*", "grade"), "timber_grade"),
+    (("roofing", "*", "timbers", "*", "treatment"), "timber_treatment"),
+    (("roofing", "*", "accessories", "gutterType"), "gutter_type"),
+    (("roofing", "*", "accessories", "downpipeType"), "downpipe_type"),
+    (("roofing", "*", "accessories", "flashingType"), "flashing_type"),
+    (("roofing", "*", "accessories", "fasciaType"), "fascia_type"),
+    (("roofing", "*", "accessories", "soffitType"), "soffit_type"),
+    (("reinforcement", "*", "element"), "rebar_element"),
+    (("reinforcement", "*", "reinforcementType"), "reinforcement_type"),
+    (("reinforcement", "*", "footingType"), "footing_type"),
+    (("reinforcement", "*", "tankType"), "tank_type"),
+    (("reinforcement", "*", "category"), "concrete_category"),
+    (("concreteStructures", "*", "element"), "concrete_element"),
+    (("concreteStructures", "*", "category"), "concrete_category"),
+    (("finishes", "*", "category"), "finish_category"),
+] + [
+    (("reinforcement", "*", key), "rebar_size")
+    for key in ("mainBarSize", "distributionBarSize", "stirrupSize", "tieSize", "stemVerticalBarSize",
+                "stemHorizontalBarSize", "wallVerticalBarSize", "wallHorizontalBarSize", "baseMainBarSize",
+                "baseDistributionBarSize", "coverMainBarSize", "coverDistributionBarSize")
+]
+
+FUZZY_THRESHOLD = 0.6
+# Fuzzy score the best value must lead any other value by
+FUZZY_MARGIN = 0.1
+# Share of a value's characters a partial (phrase within the value) match must account for
+PHRASE_COVERAGE = 0.5
+# Sizes differ by a digit or two, so a near miss is a different size, not a typo
+EXACT_ONLY = {"timber_size", "rebar_size"}
+
+
+def _key(value: str) -> str:
+    return re.sub(r"[^a-z0-9#]+", " ", value.lower()).strip()
+
+
+def _grams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class EnumIndex:
+    """Exact, synonym, phrase and trigram-fuzzy lookup for one enum catalog"""
+
+    def __init__(self, values: List[Tuple[str, str]], synonyms: Dict[str, str], fuzzy: bool = True):
+        self.fuzzy = fuzzy
+        self.exact: Dict[str, str] = {}
+        for value, label in values:
+            for text in (value, label):
+                self.exact[_key(text)] = value
+                self.exact[_key(text).replace(" ", "")] = value
+        self.synonyms = {_key(k): v for k, v in synonyms.items()}
+
+        # Fuzzy candidates: every exact and synonym key, via an inverted trigram index
+        self.candidates: List[Tuple[str, str, int]] = []
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for key, value in list(self.exact.items()) + list(self.synonyms.items()):
+            grams = _grams(key)
+            for gram in grams:
+                self.postings[gram].append(len(self.candidates))
+            self.candidates.append((key, value, len(grams)))
+
+    def match(self, raw: str) -> Tuple[Optional[str], str]:
+        """Return (canonical value or None, match method)"""
+        key = _key(raw)
+        if not key:
+            return None, "none"
+        if key in self.exact:
+            return self.exact[key], "exact"
+        if key.replace(" ", "") in self.exact:
+            return self.exact[key.replace(" ", "")], "exact"
+        if key in self.synonyms:
+            return self.synonyms[key], "synonym"
+
+        value = self._phrase(key)
+        if value is not None:
+            return value, "phrase"
+        if not self.fuzzy:
+            return None, "none"
+
+        grams = _grams(key)
+        hits: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for candidate in self.postings.get(gram, ()):
+                hits[candidate] += 1
+        scores: Dict[str, float] = {}
+        for candidate, common in hits.items():
+            _, value, size = self.candidates[candidate]
+            scores[value] = max(scores.get(value, 0.0), 2.0 * common / (len(grams) + size))
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        if not ranked or ranked[0][1] < FUZZY_THRESHOLD:
+            return None, "none"
+        if len(ranked) > 1 and ranked[0][1] - ranked[1][1] < FUZZY_MARGIN:
+            return None, "none"  # two values about as close: leave it to a person
+        return ranked[0][0], "fuzzy"
+
+    def _phrase(self, key: str) -> Optional[str]:
+        """Value named by phrases inside key ("copper pipe", "LED floodlight"), or None.
+
+        Longer phrases win over shorter ones and exact names over synonyms;
+        the phrases naming the winning value must cover PHRASE_COVERAGE of the key.
+        """
+        tokens = key.split()
+        found = []
+        for n in range(len(tokens) - 1, 0, -1):
+            for start in range(len(tokens) - n + 1):
+                phrase = " ".join(tokens[start:start + n])
+                for table, rank in ((self.exact, 0), (self.synonyms, 1)):
+                    value = table.get(phrase) or table.get(phrase.replace(" ", ""))
+                    if value is not None:
+                        found.append((-n, -len(phrase), rank, start, value))
+                        break
+        if not found:
+            return None
+
+        taken = [False] * len(tokens)
+        covered: Dict[str, int] = defaultdict(int)
+        best = None
+        for neg_n, _, _, start, value in sorted(found):
+            span = range(start, start - neg_n)
+            if any(taken[i] for i in span):
+                continue
+            for i in span:
+                taken[i] = True
+                covered[value] += len(tokens[i])
+            best = best or value
+        if covered[best] < PHRASE_COVERAGE * sum(map(len, tokens)):
+            return None
+        return best
+
+
+# Built once at import
+INDEXES: Dict[str, EnumIndex] = {
+    name: EnumIndex(values, SYNONYMS.get(name, {}), fuzzy=name not in EXACT_ONLY) for name, values in CATALOGS.items()
+}
+
+
+@lru_cache(maxsize=8192)
+def normalize_value(catalog: str, raw: str) -> Tuple[Optional[str], str]:
+    """Map a free-form value onto a catalog's canonical enum value"""
+    index = INDEXES.get(catalog)
+    if index is None:
+        return None, "none"
+    return index.match(raw)
+
+
+def _walk(node: Any, path: Tuple[str, ...]):
+    """Yield (parent dict, key) for every value addressed by path"""
+    if not path:
+        return
+    head, rest = path[0], path[1:]
+    if head == "*":
+        if isinstance(node, list):
+            for item in node:
+                yield from _walk(item, rest)
+        return
+    if not isinstance(node, dict) or head not in node:
+        return
+    if not rest:
+        yield node, head
+    else:
+        yield from _walk(node[head], rest)
+
+
+def normalize_enums(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Snap enum-typed fields of a parse result to their canonical values, in place.
+
+    Values that cannot be matched are left as the model wrote them.
+    """
+    if not isinstance(result, dict):
+        return result
+    unmatched = 0
+    for path, catalog in FIELDS:
+        for parent, key in _walk(result, path):
+            value = parent[key]
+            if not isinstance(value, str) or not value:
+                continue
+            canonical, _ = normalize_value(catalog, value)
+            if canonical is None:
+                unmatched += 1
+            else:
+                parent[key] = canonical
+
+    # Finish materials depend on the (already normalized) category
+    for finish in result.get("finishes") or []:
+        if isinstance(finish, dict) and isinstance(finish.get("material"), str):
+            canonical, _ = normalize_value(f"finish_material:{finish.get('category')}", finish["material"])
+            if canonical is not None:
+                finish["material"] = canonical
+
+    if unmatched:
+        print(f"⚠️ {unmatched} enum values did not match a known value", file=sys.stderr)
+    return result
+
+
+# Labelled samples of raw model/drawing text: (catalog, raw, expected)
+_SAMPLES = [
+    ("fixture_type", "toilet", "water-closet"), ("fixture_type", "WC", "water-closet"),
+    ("fixture_type", "Wash Hand Basin", "lavatory"), ("fixture_type", "Kitchen Sink", "kitchen-sink"),
+    ("fixture_type", "bath tub", "bathtub"), ("fixture_type", "Floor Drains", "floor-drain"),
+    ("fixture_type", "showers", "shower"), ("fixture_type", "Urinals", "urinal"),
+    ("pipe_material", "uPVC", "PVC-u"), ("pipe_material", "Galvanised Steel", "galvanized-steel"),
+    ("pipe_material", "copper pipe", "copper"), ("pipe_material", "PPR-C", "PPR"),
+    ("lighting_type", "LED light", "led-downlight"), ("lighting_type", "LED Downlights", "led-downlight"),
+    ("lighting_type", "Fluorescent Tube", "fluorescent"), ("lighting_type", "Flood Light", "floodlight"),
+    ("outlet_type", "13A Socket", "power-socket"), ("outlet_type", "Light switch", "light-switch"),
+    ("outlet_type", "TV outlet", "tv-point"), ("outlet_type", "USB charger", "usb-charger"),
+    ("cable_type", "CAT 6", "Data-CAT6"), ("cable_type", "nym j", "NYM-J"), ("cable_type", "Fibre Optic", "Fiber-Optic"),
+    ("roof_material", "Iron Sheets", "metal-sheets"), ("roof_material", "Clay tiles", "clay-tiles"),
+    ("roof_material", "Box profile sheets", "box-profile"), ("roof_type", "Hipped", "hip"),
+    ("timber_size", "50 x 25", "50x25"), ("timber_size", "100mm x 50mm", "100x50"), ("timber_size", "150X50", "150x50"),
+    ("timber_type", "Rafters", "rafter"), ("timber_treatment", "pressure treated", "pressure-treated"),
+    ("underlayment", "Breathable membrane", "breathable"), ("insulation", "Rockwool", "rock-wool"),
+    ("rebar_size", "T12", "Y12"), ("rebar_size", "y16", "Y16"), ("rebar_size", "12mm", "Y12"),
+    ("reinforcement_type", "BRC mesh", "mesh"), ("concrete_element", "Ring Beam", "ring-beam"),
+    ("concrete_element", "Pile caps", "pile-cap"), ("finish_category", "Wall Finishes", "wall-finishes"),
+    ("finish_material:flooring", "ceramic floor tiles", "Ceramic Tiles"), ("finish_material:ceiling", "Gypsum", "Gypsum Board"),
+    ("gutter_type", "uPVC", "PVC"), ("gutter_type", "aluminium", "Aluminum"),
+    # Phrases naming more than one value, and values the catalog does not have (None: leave unchanged)
+    ("lighting_type", "LED floodlight", "floodlight"), ("installation_method", "Surface conduit", "surface"),
+    ("finish_material:flooring", "Vinyl tiles", "Vinyl"), ("finish_material:flooring", "Marble tiles", None),
+    ("fixture_type", "Shower mixer tap", "shower"), ("timber_size", "100x100", None), ("timber_size", "75x75", None),
+    ("rebar_size", "Y32", None), ("rebar_size", "32mm", None), ("pipe_material", "stainless steel", None),
+]
+
+# Benchmark: python normalize.py [iterations]
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    per_catalog: Dict[str, List[float]] = defaultdict(list)
+    correct = 0
+    for catalog, raw, expected in _SAMPLES:
+        index = INDEXES[catalog]
+        start = time.perf_counter()
+        for _ in range(iterations):
+            value, method = index.match(raw)
+        per_catalog[catalog].append((time.perf_counter() - start) / iterations * 1e6)
+        correct += value == expected
+        if value != expected:
+            print(f"❌ {catalog}: {raw!r} -> {value!r} ({method}), expected {expected!r}")
+    for catalog, timings in sorted(per_catalog.items()):
+        print(f"⏱️ {catalog:28s} {sum(timings) / len(timings):6.2f} µs/value (uncached)")
+    print(f"✅ Accuracy: {correct}/{len(_SAMPLES)} ({correct / len(_SAMPLES):.0%})")
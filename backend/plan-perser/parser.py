@@ -5,11 +5,33 @@ import sys
 import json
 import os
 import re
-from typing import Dict, Any, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
 from dotenv import load_dotenv
 
+# Loaded before the local modules, which read their settings at import time
 load_dotenv()
 
+import cv_detect
+import fixtures
+import metrics
+import profiling
+import raster
+from calibration import calibrate, check_units, metres_per_pixel, page_scales, scale_hint
+from cascade import MODEL_TIERS, run_cascade
+from fingerprint import fingerprint_document
+from floors import crop_pdf, detect_floors, group_floors, tag_floor
+from geometry import build_connectivity
+from hedging import HEDGE_ENABLED, Attempt, hedged_call
+from ingest import ingest_schedule, is_schedule
+from limiter import MODEL_GATE, OverloadedError, estimate_tokens
+from normalize import normalize_enums
+from quantities import recompute_quantities
+from revisions import changed_regions, merge_pages, plan_work, split_pdf
+from upload_buffer import Buffer, map_file
+from walls import link_room_walls, merge_walls
+
 # Configuration
 DEFAULT_HEIGHT = "2.7"
 DEFAULT_THICKNESS = "0.2"
@@ -19,80 +41,119 @@ DEFAULT_PLASTER = "Both Sides"
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
 GEMINI_ENABLED = bool(GEMINI_API_KEY)
 
-def call_gemini(file_path: str, prompt: str) -> Optional[Dict[str, Any]]:
-    """Call Gemini API with proper error handling"""
-    if not GEMINI_ENABLED:
-        raise RuntimeError("Gemini API key not found. Set GEMINI_API_KEY or GOOGLE_API_KEY environment variable.")
+MIME_TYPES = {
+    '.pdf': 'application/pdf',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png'
+}
+SUPPORTED_EXTENSIONS = list(MIME_TYPES)
+REQUEST_TIMEOUT = 300
+# Sheets of one document analysed at the same time
+PAGE_CONCURRENCY = int(os.getenv("MODEL_PAGE_CONCURRENCY", "4"))
+
+def _parse_json_response(text: str) -> Dict[str, Any]:
+    """Extract the JSON object from a model response"""
+    cleaned = text.strip().replace('```json', '').replace('```', '').strip()
     
+    # Try to parse JSON
     try:
-        import google.generativeai as genai
-    except ImportError as e:
-        raise RuntimeError(f"Google Generative AI library not installed: {e}")
+        result = json.loads(cleaned)
+        print("✅ Successfully parsed Gemini response", file=sys.stderr)
+        return result
+    except json.JSONDecodeError:
+        # Try to extract JSON from text
+        m = re.search(r'\{.*\}', cleaned, re.DOTALL)
+        if m:
+            try:
+                result = json.loads(m.group())
+                print("✅ Successfully extracted JSON from response", file=sys.stderr)
+                return result
+            except Exception:
+                pass
+        raise RuntimeError("Gemini returned non-JSON response")
+
+def _stream_text(model, model_name: str, parts, attempt: Optional[Attempt] = None) -> str:
+    """Stream a response, signalling the first token and stopping if cancelled"""
+    start = time.monotonic()
+    metrics.increment("model_calls", model=model_name)
+    chunks = []
+    response = model.generate_content(parts, stream=True, request_options={"timeout": REQUEST_TIMEOUT})
+    for chunk in response:
+        if not chunks:
+            metrics.observe("model_ttft_seconds", time.monotonic() - start, model=model_name)
+            if attempt:
+                attempt.first_token.set()
+        if attempt:
+            attempt.check()
+        try:
+            chunks.append(chunk.text)
+        except ValueError:
+            # Chunk without text parts (finish reason / safety metadata only)
+            chunks.append("")
+    metrics.observe("model_latency_seconds", time.monotonic() - start, model=model_name)
+    return "".join(chunks)
+
+def call_gemini(file_data: Buffer, mime_type: str, prompt: str, model_name: str = MODEL_TIERS[0]) -> Optional[Dict[str, Any]]:
+    """Call Gemini API with proper error handling (or replay a recorded response)"""
+    if not GEMINI_ENABLED and fixtures.MODE != "replay":
+        raise RuntimeError("Gemini API key not found. Set GEMINI_API_KEY or GOOGLE_API_KEY environment variable.")
     
-    try:
+    def load_model():
+        try:
+            import google.generativeai as genai
+        except ImportError as e:
+            raise RuntimeError(f"Google Generative AI library not installed: {e}")
         genai.configure(api_key=GEMINI_API_KEY)
-        
-        # Use the most stable model
-        model_name = "gemini-2.5-flash"
+        return genai.GenerativeModel(model_name)
+    
+    try:
         print(f"🔄 Using model: {model_name}", file=sys.stderr)
-        model = genai.GenerativeModel(model_name)
-        
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"File not found: {file_path}")
-        
-        print(f"📤 Processing file: {os.path.basename(file_path)}", file=sys.stderr)
-        
-        # Read file as binary data
-        with open(file_path, 'rb') as f:
-            file_data = f.read()
+        model = fixtures.model_for(model_name, load_model)
         
-        # Get file extension and set MIME type
-        ext = os.path.splitext(file_path)[1].lower()
-        mime_type = {
-            '.pdf': 'application/pdf',
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png'
-        }.get(ext, 'application/octet-stream')
-        
-        # Create file parts for the model
+        # Create file parts for the model (the SDK's protobuf needs bytes,
+        # so this is the only copy of the upload)
         file_part = {
             "mime_type": mime_type,
-            "data": file_data
+            "data": bytes(file_data)
         }
+        tokens = estimate_tokens(prompt, len(file_data), mime_type)
         
         print("⏳ Waiting for Gemini response...", file=sys.stderr)
         
-        # Generate content with file data
-        response = model.generate_content([prompt, file_part])
+        # Generate content with file data, under the shared quota/concurrency gate
+        def attempt_call(attempt: Optional[Attempt] = None) -> Dict[str, Any]:
+            text = MODEL_GATE.call(lambda: _stream_text(model, model_name, [prompt, file_part], attempt), tokens=tokens)
+            if not text:
+                raise RuntimeError("Gemini returned empty response")
+            return _parse_json_response(text)
         
-        if response and response.text:
-            cleaned = response.text.strip().replace('```json', '').replace('```', '').strip()
-            
-            # Try to parse JSON
-            try:
-                result = json.loads(cleaned)
-                print("✅ Successfully parsed Gemini response", file=sys.stderr)
-                return result
-            except json.JSONDecodeError:
-                # Try to extract JSON from text
-                m = re.search(r'\{.*\}', cleaned, re.DOTALL)
-                if m:
-                    try:
-                        result = json.loads(m.group())
-                        print("✅ Successfully extracted JSON from response", file=sys.stderr)
-                        return result
-                    except Exception:
-                        pass
-                raise RuntimeError("Gemini returned non-JSON response")
-        else:
-            raise RuntimeError("Gemini returned empty response")
+        if HEDGE_ENABLED:
+            return hedged_call(attempt_call, model=model_name)
+        return attempt_call()
         
+    except OverloadedError:
+        raise
     except Exception as e:
         raise RuntimeError(f"Gemini API call failed: {e}")
 
-def analyze_with_gemini(file_path: str) -> Dict[str, Any]:
-    """Analyze construction document using Gemini only"""
+def postprocess(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Connectivity and derived areas are computed locally from the raw geometry"""
+    for step in (normalize_enums, merge_walls, build_connectivity, link_room_walls,
+                 recompute_quantities, group_floors):
+        with profiling.span(f"postprocess.{step.__name__}"):
+            step(result)
+    return result
+
+def analyze_with_gemini(file_data: Buffer, mime_type: str, raw: bool = False,
+                        required: Optional[Sequence[str]] = None, hints: str = "") -> Dict[str, Any]:
+    """Analyze construction document using Gemini only.
+
+    With raw the unprocessed model result is returned, for sheets that are
+    merged before post-processing. required overrides the sections the
+    cascade insists on (sheets of a set may hold only schedules or details).
+    hints are appended to the prompt (the detected layout of the sheet).
+    """
     GEMINI_PROMPT = """
 You are an expert architectural AI analyzing construction drawings and plans with extreme attention to detail.
 (Keep output EXACTLY as JSON matching the requested schema. If no rooms detected, respond with {"error":"No rooms found"}.)
@@ -104,6 +165,7 @@ Analyze this construction document and extract ALL available information about:
 - Look for room labels, dimensions, and layout information
 - Note any specific room names or numbers
 - Identify shared walls between rooms and map them according to the json structure filling in all required data based on the plan
+- Give every room its wallConnectivity.position: the south-west (bottom-left) corner in meters, x to the east along "length", y to the north along "width". Shared walls, room positions and layout efficiency ("connectivity") are derived from these positions, so do not output a "connectivity" block
 - Pay special attention to room boundaries and labels within floor plans
 - Identify if rooms are marked as "Master Bedroom", "Bedroom 1", "Bedroom 2", etc.
 - Identify en-suite bathrooms vs shared bathrooms
@@ -125,22 +187,11 @@ Analyze this construction document and extract ALL available information about:
 - commonOutletRatings = [6, 10, 13, 16, 20, 25, 32, 40, 45, 63];
 
 **Reinforcement:** 
-- ElementTypes =
-  | "slab"
-  | "beam"
-  | "column"
-  | "foundation"
-  | "strip-footing"
-  | "tank";
+- ElementTypes = "slab" | "beam" | "column" | "foundation" | "strip-footing" | "tank";
 - RebarSize = "Y8" | "Y10" | "Y12" | "Y16" | "Y20" | "Y25";
 - ReinforcementType = "individual_bars" | "mesh";
 - FootingType = "isolated" | "strip" | "combined";
-- TankType =
-  | "septic"
-  | "underground"
-  | "overhead"
-  | "water"
-  | "circular";
+- TankType = "septic" | "underground" | "overhead" | "water" | "circular";
 - TankWallType = "walls" | "base" | "cover" | "all";
 - Be deifinate between the reinforcement types, eg either mesh or individual_bars
 - If you find both reinforecement types, create two individual entries for each with the correct 
@@ -154,173 +205,18 @@ Analyze this construction document and extract ALL available information about:
 - Timber sizes: "50x25", "50x50", "75x50", "100x50", "100x75", "150x50", "200x50"
 - Underlayment: "felt-30", "felt-40", "synthetic", "rubberized", "breathable"
 - Insulation: "glass-wool", "rock-wool", "eps", "xps", "polyurethane", "reflective-foil"
-- Accessories: Use exact types (e.g., gutterType: "PVC", "Galvanized Steel", etc.)
-- TIMBER_GRADES = [
-  { value: "standard", label: "Standard Grade" },
-  { value: "structural", label: "Structural Grade" },
-  { value: "premium", label: "Premium Grade" },
-];
-
-- TIMBER_TREATMENTS = [
-  { value: "untreated", label: "Untreated" },
-  { value: "pressure-treated", label: "Pressure Treated" },
-  { value: "fire-retardant", label: "Fire Retardant" },
-];
-
-- TIMBER_TYPES = [
-  { value: "rafter", label: "Rafter" },
-  { value: "wall-plate", label: "Wall Plate" },
-  { value: "ridge-board", label: "Ridge Board" },
-  { value: "purlin", label: "Purlin" },
-  { value: "battens", label: "Battens" },
-  { value: "truss", label: "Truss" },
-  { value: "joist", label: "Joist" },
-];
-
-- UNDERLAYMENT_TYPES = [
-  { value: "felt-30", label: "30# Felt Underlayment" },
-  { value: "felt-40", label: "40# Felt Underlayment" },
-  { value: "synthetic", label: "Synthetic Underlayment" },
-  { value: "rubberized", label: "Rubberized Asphalt" },
-  { value: "breathable", label: "Breathable Membrane" },
-];
-
-- INSULATION_TYPES = [
-  { value: "glass-wool", label: "Glass Wool Batts" },
-  { value: "rock-wool", label: "Rock Wool" },
-  { value: "eps", label: "Expanded Polystyrene" },
-  { value: "xps", label: "Extruded Polystyrene" },
-  { value: "polyurethane", label: "Polyurethane Foam" },
-  { value: "reflective-foil", label: "Reflective Foil" },
-];
-
-- GUTTER_TYPES = [
-  { value: "PVC", label: "PVC Gutter" },
-  { value: "Galvanized Steel", label: "Galvanized Steel Gutter" },
-  { value: "Aluminum", label: "Aluminum Gutter" },
-  { value: "Copper", label: "Copper Gutter" },
-];
-
-- DOWNPIPE_TYPES = [
-  { value: "PVC", label: "PVC Downpipe" },
-  { value: "Galvanized Steel", label: "Galvanized Steel Downpipe" },
-  { value: "Aluminum", label: "Aluminum Downpipe" },
-  { value: "Copper", label: "Copper Downpipe" },
-];
-
-- FLASHING_TYPES = [
-  { value: "PVC", label: "PVC Flashing" },
-  { value: "Galvanized Steel", label: "Galvanized Steel Flashing" },
-  { value: "Aluminum", label: "Aluminum Flashing" },
-  { value: "Copper", label: "Copper Flashing" },
-];
-
-- FASCIA_TYPES = [
-  { value: "PVC", label: "PVC Fascia" },
-  { value: "Painted Wood", label: "Painted Wood Fascia" },
-  { value: "Aluminum", label: "Aluminum Fascia" },
-  { value: "Composite", label: "Composite Fascia" },
-];
-
-- SOFFIT_TYPES = [
-  { value: "PVC", label: "PVC Soffit" },
-  { value: "Aluminum", label: "Aluminum Soffit" },
-  { value: "Composite", label: "Composite Soffit" },
-  { value: "Metal", label: "Metal Soffit" },
-];
-
-- ROOF_TYPES: { value: RoofType; label: string }[] = [
-  { value: "flat", label: "Flat Roof" },
-  { value: "pitched", label: "Pitched Roof" },
-  { value: "gable", label: "Gable Roof" },
-  { value: "hip", label: "Hip Roof" },
-  { value: "mansard", label: "Mansard Roof" },
-  { value: "butterfly", label: "Butterfly Roof" },
-  { value: "skillion", label: "Skillion Roof" },
-];
-
-- ROOF_MATERIALS: { value: RoofMaterial; label: string }[] = [
-  { value: "concrete-tiles", label: "Concrete Tiles" },
-  { value: "clay-tiles", label: "Clay Tiles" },
-  { value: "metal-sheets", label: "Metal Sheets" },
-  { value: "box-profile", label: "Box Profile" },
-  { value: "thatch", label: "Thatch" },
-  { value: "slate", label: "Slate" },
-  { value: "asphalt-shingles", label: "Asphalt Shingles" },
-  { value: "green-roof", label: "Green Roof" },
-  { value: "membrane", label: "Membrane" },
-];
-
-- TIMBER_SIZES: { value: TimberSize; label: string }[] = [
-  { value: "50x25", label: "50mm x 25mm" },
-  { value: "50x50", label: "50mm x 50mm" },
-  { value: "75x50", label: "75mm x 50mm" },
-  { value: "100x50", label: "100mm x 50mm" },
-  { value: "100x75", label: "100mm x 75mm" },
-  { value: "150x50", label: "150mm x 50mm" },
-  { value: "200x50", label: "200mm x 50mm" },
-];
+- Timber: type (e.g., "rafter", "wall-plate", "purlin", "battens", "truss"), grade ("standard", "structural", "premium"), treatment ("untreated", "pressure-treated", "fire-retardant")
+- Accessories: gutter, downpipe, flashing, fascia and soffit materials by name (e.g., "PVC", "Galvanized Steel", "Aluminum")
 
 
 **Finishes:**
 - Categories: "flooring", "ceiling", "wall-finishes", "paint", "joinery"
 - Only use these specified categories: skip glass, blocks, anyting to do with masonry or glass etc that are not in this list
-- Materials must match common options per category (e.g., flooring: "Ceramic Tiles", "Hardwood", etc.)
-- COMMON_MATERIALS = {
-  flooring: [
-    "Ceramic Tiles",
-    "Porcelain Tiles",
-    "Hardwood",
-    "Laminate",
-    "Vinyl",
-    "Carpet",
-    "Polished Concrete",
-    "Terrazzo",
-  ],
-  ceiling: [
-    "Gypsum Board",
-    "PVC",
-    "Acoustic Tiles",
-    "Exposed Concrete",
-    "Suspended Grid",
-    "Wood Panels",
-  ],
-  "wall-finishes": [
-    "Wallpaper",
-    "Stone Cladding",
-    "Tile Cladding",
-    "Wood Paneling",
-  ],
-  paint: ["Emulsion", "Enamel", "Weatherproof", "Textured", "Metallic"],
-  joinery: ["Solid Wood", "Plywood", "MDF", "Melamine", "Laminate"],
-};
+- Materials: use the common trade name per category (e.g., flooring: "Ceramic Tiles", "Hardwood"; ceiling: "Gypsum Board"; paint: "Emulsion"; joinery: "MDF")
 
 **Concrete & Structure:**
 - Category = "substructure" | "superstructure";
-- ElementType =
-  | "slab"
-  | "beam"
-  | "column"
-  | "foundation"
-  | "septic-tank"
-  | "underground-tank"
-  | "staircase"
-  | "ring-beam"
-  | "strip-footing"
-  | "raft-foundation"
-  | "pile-cap"
-  | "water-tank"
-  | "ramp"
-  | "retaining-wall"
-  | "culvert"
-  | "swimming-pool"
-  | "paving"
-  | "kerb"
-  | "drainage-channel"
-  | "manhole"
-  | "inspection-chamber"
-  | "soak-pit"
-  | "soakaway";
+- ElementType = "slab" | "beam" | "column" | "foundation" | "septic-tank" | "underground-tank" | "staircase" | "ring-beam" | "strip-footing" | "raft-foundation" | "pile-cap" | "water-tank" | "ramp" | "retaining-wall" | "culvert" | "swimming-pool" | "paving" | "kerb" | "drainage-channel" | "manhole" | "inspection-chamber" | "soak-pit" | "soakaway";
 
 - FoundationStep {
   id: string;
@@ -423,6 +319,8 @@ Analyze this construction document and extract ALL available information about:
 ### 🏗️ CONSTRUCTION DETAILS:
 - Note wall thicknesses if specified
 - Identify floor levels (single story, multi-story)
+- Give every room and wall its "floor" level: 0 = ground floor, 1 = first floor, -1 = basement
+- List columns, staircases, service risers and lift shafts that run between floors in "verticalElements", with their floor and position in the same coordinates as the rooms
 - Look for any construction notes or specifications
 - Note any special features like fireplaces, built-in cabinets, etc.
 - If a room cannot be plasters for whatever reason, mark as "None"
@@ -442,6 +340,7 @@ Return ONLY valid JSON with this structure. Use reasonable estimates if exact di
     {
       "roomType": "Living Room",
       "room_name": "Main Living",
+      "floor": 0,
       "length": "5.0",
       "width": "4.0",
       "height": "2.7",
@@ -516,7 +415,6 @@ Return ONLY valid JSON with this structure. Use reasonable estimates if exact di
             "type": "shared",
             "sharedWith": "room_2",
             "sharedLength": 5.0,
-            "sharedArea": 13.5,
             "openings": [
               {
                 "id": "door_1",
@@ -529,14 +427,11 @@ Return ONLY valid JSON with this structure. Use reasonable estimates if exact di
                 "position": {
                   "fromStart": 2.0,
                   "fromFloor": 0.0
-                },
-                "area": 1.89
+                }
               }
             ],
             "length": 5.0,
-            "height": 2.7,
-            "netArea": 11.61,
-            "grossArea": 13.5
+            "height": 2.7
           },
           "south": {
             "id": "wall_living_south",
@@ -552,40 +447,30 @@ Return ONLY valid JSON with this structure. Use reasonable estimates if exact di
                 "position": {
                   "fromStart": 1.5,
                   "fromFloor": 1.0
-                },
-                "area": 1.44
+                }
               }
             ],
             "length": 5.0,
-            "height": 2.7,
-            "netArea": 12.06,
-            "grossArea": 13.5
+            "height": 2.7
           },
           "east": {
             "id": "wall_living_east",
             "type": "shared",
             "sharedWith": "room_3",
             "sharedLength": 4.0,
-            "sharedArea": 10.8,
             "openings": [],
             "length": 4.0,
-            "height": 2.7,
-            "netArea": 10.8,
-            "grossArea": 10.8
+            "height": 2.7
           },
           "west": {
             "id": "wall_living_west",
             "type": "external",
             "openings": [],
             "length": 4.0,
-            "height": 2.7,
-            "netArea": 10.8,
-            "grossArea": 10.8
+            "height": 2.7
           }
         },
-        "connectedRooms": ["room_2", "room_3"],
-        "sharedArea": 24.3,
-        "externalWallArea": 24.3
+        "connectedRooms": ["room_2", "room_3"]
       }
     },
     {
@@ -665,7 +550,6 @@ Return ONLY valid JSON with this structure. Use reasonable estimates if exact di
             "type": "shared",
             "sharedWith": "room_1",
             "sharedLength": 4.0,
-            "sharedArea": 10.8,
             "openings": [
               {
                 "id": "door_1",
@@ -678,14 +562,11 @@ Return ONLY valid JSON with this structure. Use reasonable estimates if exact di
                 "position": {
                   "fromStart": 1.5,
                   "fromFloor": 0.0
-                },
-                "area": 1.89
+                }
               }
             ],
             "length": 4.0,
-            "height": 2.7,
-            "netArea": 8.91,
-            "grossArea": 10.8
+            "height": 2.7
           },
           "north": {
             "id": "wall_bedroom_north",
@@ -701,50 +582,41 @@ Return ONLY valid JSON with this structure. Use reasonable estimates if exact di
                 "position": {
                   "fromStart": 1.0,
                   "fromFloor": 1.0
-                },
-                "area": 1.44
+                }
               }
             ],
             "length": 4.0,
-            "height": 2.7,
-            "netArea": 9.36,
-            "grossArea": 10.8
+            "height": 2.7
           },
           "east": {
             "id": "wall_bedroom_east",
             "type": "external",
             "openings": [],
             "length": 3.5,
-            "height": 2.7,
-            "netArea": 9.45,
-            "grossArea": 9.45
+            "height": 2.7
           },
           "west": {
             "id": "wall_bedroom_west",
             "type": "external",
             "openings": [],
             "length": 3.5,
-            "height": 2.7,
-            "netArea": 9.45,
-            "grossArea": 9.45
+            "height": 2.7
           }
         },
-        "connectedRooms": ["room_1"],
-        "sharedArea": 10.8,
-        "externalWallArea": 40.5
+        "connectedRooms": ["room_1"]
       }
     }
   ],
   "walls": [
     {
       "id": "wall_living_north",
+      "floor": 0,
       "start": [0, 4],
       "end": [5, 4],
       "thickness": "0.2",
       "height": "2.7",
       "blockType": "Standard Block",
       "connectedRooms": ["room_1", "room_2"],
-      "area": "13.5",
       "isShared": true,
       "sharedWith": ["room_2"]
     },
@@ -756,56 +628,26 @@ Return ONLY valid JSON with this structure. Use reasonable estimates if exact di
       "height": "2.7",
       "blockType": "Standard Block",
       "connectedRooms": ["room_1", "room_3"],
-      "area": "10.8",
       "isShared": true,
       "sharedWith": ["room_3"]
     }
   ],
-  "floors": 1,
-  "connectivity": {
-    "sharedWalls": [
-      {
-        "id": "shared_living_bedroom",
-        "room1Id": "room_1",
-        "room2Id": "room_2",
-        "wall1Id": "wall_living_north",
-        "wall2Id": "wall_bedroom_south",
-        "sharedLength": 5.0,
-        "sharedArea": 13.5,
-        "openings": ["door_1"]
-      },
-      {
-        "id": "shared_living_kitchen",
-        "room1Id": "room_1",
-        "room2Id": "room_3",
-        "wall1Id": "wall_living_east",
-        "wall2Id": "wall_kitchen_west",
-        "sharedLength": 4.0,
-        "sharedArea": 10.8,
-        "openings": []
-      }
-    ],
-    "roomPositions": {
-      "room_1": {
-        "x": 0,
-        "y": 0
-      },
-      "room_2": {
-        "x": 0,
-        "y": 4
+  "verticalElements": [
+    {
+      "id": "stair_1",
+      "type": "column" | "staircase" | "riser" | "lift-shaft",
+      "floor": 0,
+      "position": {
+        "x": 4.2,
+        "y": 1.0
       },
-      "room_3": {
-        "x": 5,
-        "y": 0
+      "size": {
+        "length": 2.5,
+        "width": 1.0
       }
-    },
-    "totalSharedArea": 24.3,
-    "efficiency": {
-      "spaceUtilization": 0.85,
-      "wallEfficiency": 0.78,
-      "connectivityScore": 0.92
     }
-  },
+  ],
+  "floors": 1,
   ],
   "floors": 1
   "foundationDetails": { 
@@ -1168,10 +1010,11 @@ IMPORTANT:
    - Electrical voltage → 230V
    - Fixture quality → "standard"
    - Timber grade/treatment → "structural" / "pressure-treated" for structural elements
-3. **Map extracted names to closest enum** (e.g., "toilet" → "water-closet", "LED light" → "led-downlight")
+3. **Prefer the listed enum values**; close names (e.g., "toilet", "LED light") are mapped to canonical values after extraction
 4. **If a section has no data, return empty array** (`[]`) or omit optional objects.
 5. **All numeric measurements in meters or as specified** (e.g., diameter in mm, area in m²).
 6. **Be consistent with your type system** — no arbitrary strings.
+7. **Do NOT calculate derived areas** (netArea, grossArea, sharedArea, externalWallArea, totalSharedArea, opening area). Only report raw geometry (lengths, heights, coordinates, opening sizes); areas are computed after extraction.
 - Base your analysis on what you can actually see in the drawing
 - External works should be in the concreteStructures section
 - Use reasonable architectural standards for missing information
@@ -1189,12 +1032,17 @@ IMPORTANT:
 - Do not leave any null items. If empty use resonable estimates based on the plan and what would be expected
 """
 
-    result = call_gemini(file_path, GEMINI_PROMPT)
+    # Cheapest model first, escalating only when the answer fails validation
+    result = run_cascade(lambda model_name: call_gemini(file_data, mime_type, GEMINI_PROMPT + hints, model_name),
+                         len(file_data), mime_type, required=required)
     
     # Validate the result structure
     if not isinstance(result, dict):
         raise RuntimeError("Gemini returned invalid response format")
     
+    if raw:
+        return result
+    
     if "error" in result:
         return result
     
@@ -1204,30 +1052,147 @@ IMPORTANT:
     if not result["rooms"]:
         return {"error": "No rooms found in analysis"}
     
-    return result
+    return postprocess(result)
+
+def _analyze_pages(source: Buffer, mime_type: str, pages: List[Dict[str, Any]],
+                   previous_pages: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any], List]:
+    """Raw per-sheet results, calling the model only for new or edited sheets.
+
+    Sheets labelled with several floors are analysed one floor region at a
+    time; all sheets and regions share the same pool of concurrent calls.
+    Also returns each sheet's scale calibration (None where not found).
+    """
+    matches, todo = plan_work(previous_pages, pages)
+    data = [previous_pages[m["previous"]]["data"] if m["previous"] is not None else None for m in matches]
+    # A revised sheet keeps the scale found on the sheet it revises (same project only)
+    content_hash = raster.content_key(source)
+    with profiling.span("calibrate"):
+        calibrations = calibrate(source, mime_type, [
+            [(content_hash, i)] + ([previous_pages[m["previous"]]["origin"]]
+                                   if m["previous"] is not None and previous_pages[m["previous"]].get("origin") else [])
+            for i, m in enumerate(matches)
+        ])
+    if todo:
+        with profiling.span("detect_floors"):
+            floors = detect_floors(source, todo) if mime_type == "application/pdf" else {}
+        with profiling.span("split_pdf"):
+            sheets = split_pdf(source, todo) if len(pages) > 1 else [source]
+        required = () if len(pages) > 1 else None
+        # (page index, floor region, document, required sections) per model call
+        units = []
+        for index, sheet in zip(todo, sheets):
+            regions = floors.get(index) or [None]
+            if len(regions) > 1:
+                crops = crop_pdf(source, index, [region["clip"] for region in regions])
+                units.extend((index, region, crop, None) for region, crop in zip(regions, crops))
+            else:
+                units.append((index, regions[0], sheet, required))
+        print(f"📄 Analysing {len(todo)} of {len(pages)} pages in {len(units)} parts", file=sys.stderr)
+        analyze = profiling.traced("model_call", analyze_with_gemini)
+        detect = profiling.traced("cv_detect", cv_detect.detect_document)
+
+        def analyze_unit(unit):
+            index, region, document, required_sections = unit
+            calibration, clip = calibrations[index], region["clip"] if region else None
+            detections = detect(document, mime_type) if cv_detect.CV_MODE != "off" else []
+            if calibration:
+                for detection in detections:
+                    cv_detect.to_metres(detection, metres_per_pixel(calibration, detection["size"], clip))
+            hints = scale_hint(calibration, clip)
+            if cv_detect.CV_MODE == "hints":
+                hints += cv_detect.layout_hints(detections)
+            result = analyze(document, mime_type, raw=True, required=required_sections, hints=hints)
+            result = check_units(result, calibration, clip)
+            cv_detect.record_agreement(detections, result)
+            return result
+
+        with ThreadPoolExecutor(max_workers=PAGE_CONCURRENCY) as pool:
+            results = list(pool.map(profiling.bind(analyze_unit), units))
+        for index in todo:
+            parts = [tag_floor(result, region["level"]) if region else result
+                     for (i, region, _, _), result in zip(units, results) if i == index]
+            data[index] = parts[0] if len(parts) == 1 else merge_pages(parts, prefix="f")
+    revision = {
+        "analyzedPages": [i + 1 for i in todo],
+        "reusedPages": [i + 1 for i in range(len(pages)) if i not in todo],
+        "changedRegions": changed_regions(matches),
+    }
+    return [{**page, "data": data[i]} for i, page in enumerate(pages)], revision, calibrations
 
-def parse_file(file_path: str) -> Dict[str, Any]:
-    """Parse file using Gemini only - no fallbacks"""
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"File not found: {file_path}")
+def resolve_mime_type(filename: Optional[str], mime_type: Optional[str] = None) -> str:
+    """Content type to analyse a file as; a sniffed type wins over the extension"""
+    ext = os.path.splitext(filename or "")[1].lower()
     
-    # Validate file type
-    ext = os.path.splitext(file_path)[1].lower()
-    supported_extensions = ['.pdf', '.jpg', '.jpeg', '.png']
+    if ext not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Unsupported file type: {ext}. Supported types: {', '.join(SUPPORTED_EXTENSIONS)}")
     
-    if ext not in supported_extensions:
-        raise ValueError(f"Unsupported file type: {ext}. Supported types: {', '.join(supported_extensions)}")
+    # e.g. a JPEG saved as .png
+    if mime_type not in MIME_TYPES.values():
+        mime_type = MIME_TYPES[ext]
+    return mime_type
+
+def parse_document(source: Buffer, filename: Optional[str] = None, mime_type: Optional[str] = None,
+                   previous_pages: Optional[List[Dict[str, Any]]] = None,
+                   pages: Optional[List[Dict[str, Any]]] = None) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Parse an in-memory document sheet by sheet.
+
+    Sheets whose fingerprints match previous_pages (the last revision of the
+    same set) reuse that revision's page results. pages are the document's
+    fingerprints if already computed. Returns the result and the page
+    records to store for the next revision.
+    """
+    if is_schedule(filename):
+        # Spreadsheets are read, not drawn: no model call
+        return ingest_schedule(source, filename), []
+    mime_type = resolve_mime_type(filename, mime_type)
     
-    print(f"🔍 Beginning Gemini analysis: {file_path}", file=sys.stderr)
+    print(f"🔍 Beginning Gemini analysis: {filename} ({len(source)} bytes)", file=sys.stderr)
     
     try:
-        result = analyze_with_gemini(file_path)
+        if pages is None:
+            with profiling.span("fingerprint"):
+                pages = fingerprint_document(source, mime_type)
+        if not pages:
+            with profiling.span("model_call"):
+                result = analyze_with_gemini(source, mime_type)
+            result["analysis_method"] = "gemini_ai"
+            return result, []
+        
+        with profiling.span("analyze_pages"):
+            pages, revision, calibrations = _analyze_pages(source, mime_type, pages, previous_pages or [])
+        data = [page["data"] for page in pages]
+        if len(data) == 1 and "error" in data[0]:
+            return data[0], pages
+        with profiling.span("merge_pages"):
+            result = merge_pages(data)
+        if not result.get("rooms"):
+            return {"error": "No rooms found in analysis"}, pages
+        
+        result = postprocess(result)
         result["analysis_method"] = "gemini_ai"
-        return result
+        if any(calibrations):
+            result["calibration"] = page_scales(calibrations)
+        if previous_pages:
+            result["revision"] = revision
+        return result, pages
+    except OverloadedError:
+        raise
     except Exception as e:
         # Re-raise with clear error message
         raise RuntimeError(f"Gemini analysis failed: {str(e)}")
 
+def parse_file(source: Union[str, os.PathLike, Buffer], filename: Optional[str] = None,
+               mime_type: Optional[str] = None) -> Dict[str, Any]:
+    """Parse a file path or an in-memory buffer: drawings with Gemini only (no fallbacks), schedules directly"""
+    if isinstance(source, (str, os.PathLike)):
+        file_path = os.fspath(source)
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"File not found: {file_path}")
+        with open(file_path, 'rb') as f, map_file(f) as view:
+            return parse_file(view, filename or os.path.basename(file_path))
+    
+    return parse_document(source, filename, mime_type)[0]
+
 # CLI Entrypoint
 if __name__ == "__main__":
     if len(sys.argv) != 2:
@@ -0,0 +1,249 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import itertools
+import os
+import sys
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+import store
+from fingerprint import cell_similarity, changed_tiles, hamming, tile_count
+
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_CACHE", "1") == "1"
+# Page hashes this many bits apart can be the same drawing
+NEAR_DUP_BITS = int(os.getenv("NEAR_DUP_BITS", "6"))
+# Confirmation: blurred ink-cell similarity of every page
+NEAR_DUP_MIN_SIMILARITY = float(os.getenv("NEAR_DUP_MIN_SIMILARITY", "0.9"))
+# Re-scans and re-exports change cells all over the sheet; an edit changes a
+# few tiles. Below this share of changed tiles the upload is a revision.
+NEAR_DUP_MIN_DIFFUSE = float(os.getenv("NEAR_DUP_MIN_DIFFUSE", "0.25"))
+# Stored analyses checked per upload, nearest first
+NEAR_DUP_MAX_CANDIDATES = 8
+# Pending entries are searched linearly and folded into the sorted index in batches
+REBUILD_EVERY = 4096
+# Analyses stored by other worker processes are picked up this often
+REFRESH_SECONDS = float(os.getenv("NEAR_DUP_REFRESH_SECONDS", "2"))
+
+
+class HashIndex:
+    """Multi-index hashing over 64-bit hashes for Hamming-radius queries.
+
+    Each hash is cut into `chunks` chunks with a sorted copy per chunk. Two
+    hashes within `radius` bits agree to within radius // chunks bits on at
+    least one chunk (pigeonhole), so probing every chunk value that close
+    finds all candidates, which are then checked with a popcount.
+    """
+
+    def __init__(self, radius: int = NEAR_DUP_BITS, chunks: int = 4):
+        self.radius = radius
+        self.chunks = chunks
+        self.chunk_bits = 64 // chunks
+        self.chunk_mask = np.uint64((1 << self.chunk_bits) - 1)
+        chunk_radius = radius // chunks
+        self.probes = np.array(sorted(
+            sum(1 << b for b in bits)
+            for r in range(chunk_radius + 1)
+            for bits in itertools.combinations(range(self.chunk_bits), r)
+        ), dtype=np.uint64)
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.sorted_chunks: List[Tuple[np.ndarray, np.ndarray]] = []
+        self.pending_hashes: List[int] = []
+        self.pending_ids: List[int] = []
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.hashes) + len(self.pending_hashes)
+
+    def _chunk(self, hashes: np.ndarray, k: int) -> np.ndarray:
+        return (hashes >> np.uint64(k * self.chunk_bits)) & self.chunk_mask
+
+    def _rebuild(self) -> None:
+        if self.pending_hashes:
+            self.hashes = np.concatenate([self.hashes, np.array(self.pending_hashes, dtype=np.uint64)])
+            self.ids = np.concatenate([self.ids, np.array(self.pending_ids, dtype=np.int64)])
+            self.pending_hashes, self.pending_ids = [], []
+        self.sorted_chunks = []
+        for k in range(self.chunks):
+            keys = self._chunk(self.hashes, k)
+            order = np.argsort(keys, kind="stable")
+            self.sorted_chunks.append((keys[order], order.astype(np.int64)))
+
+    def add_many(self, ids, hashes) -> None:
+        with self.lock:
+            self.pending_ids.extend(int(i) for i in ids)
+            self.pending_hashes.extend(int(h) for h in hashes)
+            self._rebuild()
+
+    def add(self, id_: int, value: int) -> None:
+        with self.lock:
+            self.pending_ids.append(int(id_))
+            self.pending_hashes.append(int(value))
+            if len(self.pending_hashes) >= REBUILD_EVERY:
+                self._rebuild()
+
+    def query(self, value: int, radius: Optional[int] = None) -> List[Tuple[int, int]]:
+        """(id, distance) of stored hashes within radius bits, nearest first"""
+        radius = self.radius if radius is None else min(radius, self.radius)
+        target = np.uint64(value)
+        with self.lock:
+            hashes, ids, sorted_chunks = self.hashes, self.ids, self.sorted_chunks
+            pending_hashes = np.array(self.pending_hashes, dtype=np.uint64)
+            pending_ids = np.array(self.pending_ids, dtype=np.int64)
+
+        ranges = []
+        for k, (keys, order) in enumerate(sorted_chunks):
+            probes = self._chunk(target, k) ^ self.probes
+            lo = np.searchsorted(keys, probes, side="left")
+            hi = np.searchsorted(keys, probes, side="right")
+            ranges.extend(order[l:h] for l, h in zip(lo.tolist(), hi.tolist()) if h > l)
+        found_ids, found_dist = [], []
+        if ranges:
+            candidates = np.unique(np.concatenate(ranges))
+            distances = np.bitwise_count(hashes[candidates] ^ target)
+            keep = distances <= radius
+            found_ids.append(ids[candidates[keep]])
+            found_dist.append(distances[keep])
+        if len(pending_hashes):
+            distances = np.bitwise_count(pending_hashes ^ target)
+            keep = distances <= radius
+            found_ids.append(pending_ids[keep])
+            found_dist.append(distances[keep])
+        if not found_ids:
+            return []
+        all_ids, all_dist = np.concatenate(found_ids), np.concatenate(found_dist)
+        order = np.argsort(all_dist, kind="stable")
+        return list(zip(all_ids[order].tolist(), all_dist[order].tolist()))
+
+
+_index: Optional[HashIndex] = None
+_index_lock = threading.Lock()
+# Highest analysis rowid read from the store, and rowids this process registered past it
+_loaded_rowid = 0
+_registered = set()
+_refreshed = 0.0
+
+
+def get_index() -> HashIndex:
+    """Process-wide index of first-page hashes, loaded from the store on first use.
+
+    Other workers write to the same store, so analyses stored since the last
+    load are read in every REFRESH_SECONDS.
+    """
+    global _index, _loaded_rowid, _refreshed
+    with _index_lock:
+        if _index is not None and time.monotonic() - _refreshed < REFRESH_SECONDS:
+            return _index
+        start = time.perf_counter()
+        rowids, hashes = store.first_page_hashes(after_rowid=_loaded_rowid)
+        if _index is None:
+            _index = HashIndex()
+            _index.add_many(rowids, hashes)
+            print(f"🗂️ Loaded {len(_index)} page hashes in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+        else:
+            for rowid, value in zip(rowids, hashes):
+                if rowid not in _registered:
+                    _index.add(rowid, value)
+        if rowids:
+            _loaded_rowid = max(_loaded_rowid, max(rowids))
+            _registered.difference_update([r for r in _registered if r <= _loaded_rowid])
+        _refreshed = time.monotonic()
+        return _index
+
+
+def compare_documents(stored: List[Dict[str, Any]], pages: List[Dict[str, Any]]) -> Tuple[str, float]:
+    """("same" | "edited" | "different", similarity) of a stored document and an upload"""
+    if len(stored) != len(pages) or not pages:
+        return "different", 0.0
+    similarity = 1.0
+    for old, new in zip(stored, pages):
+        if hamming(old["hash"], new["hash"]) > NEAR_DUP_BITS or old.get("data") is None:
+            return "different", 0.0
+        regions = changed_tiles(old["cells"], new["cells"])
+        if not regions:
+            continue
+        if len(regions) < NEAR_DUP_MIN_DIFFUSE * tile_count(new["cells"]):
+            return "edited", 0.0
+        page_similarity = cell_similarity(old["cells"], new["cells"])
+        if page_similarity < NEAR_DUP_MIN_SIMILARITY:
+            return "different", page_similarity
+        similarity = min(similarity, page_similarity)
+    return "same", similarity
+
+
+def find_near_duplicate(pages: List[Dict[str, Any]]) -> Optional[Tuple[str, float, List[Dict[str, Any]]]]:
+    """(analysis_id, similarity, stored pages) of a confirmed near-identical analysis.
+
+    A localised edit against any candidate means the upload is a revision,
+    even if it also resembles a re-scan of the same sheet.
+    """
+    if not NEAR_DUP_ENABLED or not pages:
+        return None
+    best = None
+    for rowid, _ in get_index().query(pages[0]["hash"])[:NEAR_DUP_MAX_CANDIDATES]:
+        analysis_id = store.analysis_id_for_rowid(rowid)
+        if analysis_id is None:
+            continue
+        stored = store.get_pages(analysis_id)
+        verdict, similarity = compare_documents(stored, pages)
+        if verdict == "edited":
+            return None
+        if verdict == "same" and (best is None or similarity > best[1]):
+            best = (analysis_id, similarity, stored)
+    return best
+
+
+def register(analysis_id: str, pages: List[Dict[str, Any]]) -> None:
+    """Make a freshly analysed document findable (copies served as near-duplicates are not indexed)"""
+    if NEAR_DUP_ENABLED and pages and _index is not None:
+        rowid = store.rowid_for_analysis(analysis_id)
+        with _index_lock:
+            if rowid is not None and rowid > _loaded_rowid:
+                _registered.add(rowid)
+                _index.add(rowid, pages[0]["hash"])
+
+
+# Benchmark: python phash_index.py [n_hashes] [queries]
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    rng = np.random.default_rng(0)
+    stored = rng.integers(0, 2 ** 64, size=n, dtype=np.uint64)
+
+    start = time.perf_counter()
+    index = HashIndex(radius=NEAR_DUP_BITS)
+    index.add_many(np.arange(n), stored)
+    print(f"⏱️ Built index of {n} hashes in {time.perf_counter() - start:.2f}s")
+
+    # Half the queries are stored hashes with up to `radius` flipped bits, half are random
+    targets, expected = [], []
+    for i in range(queries):
+        if i % 2 == 0:
+            j = int(rng.integers(n))
+            flips = rng.choice(64, size=int(rng.integers(0, NEAR_DUP_BITS + 1)), replace=False)
+            targets.append(int(stored[j]) ^ sum(1 << int(b) for b in flips))
+            expected.append(j)
+        else:
+            targets.append(int(rng.integers(0, 2 ** 63)))
+            expected.append(None)
+
+    timings = []
+    hits = 0
+    for target, j in zip(targets, expected):
+        t0 = time.perf_counter()
+        found = index.query(target)
+        timings.append(time.perf_counter() - t0)
+        if j is not None and any(i == j for i, _ in found):
+            hits += 1
+    timings.sort()
+    print(f"⏱️ query mean {np.mean(timings) * 1e6:.0f} µs, p50 {timings[len(timings) // 2] * 1e6:.0f} µs, "
+          f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.0f} µs; recall {hits}/{queries // 2 + queries % 2}")
+
+    start = time.perf_counter()
+    for target in targets[:20]:
+        np.flatnonzero(np.bitwise_count(stored ^ np.uint64(target)) <= NEAR_DUP_BITS)
+    print(f"⏱️ brute-force scan {(time.perf_counter() - start) / 20 * 1e3:.1f} ms/query")
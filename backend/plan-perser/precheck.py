@@ -0,0 +1,235 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import io
+import os
+import sys
+import time
+from typing import Dict, Any, Optional
+
+import numpy as np
+from PIL import Image
+
+import metrics
+import raster
+from parser import MIME_TYPES
+from upload_buffer import Buffer
+
+try:
+    import magic
+except ImportError:  # python-magic missing or libmagic not installed
+    magic = None
+
+# enforce: reject failures; shadow: only record what would be rejected; off: skip
+PRECHECK_MODE = os.getenv("PRECHECK_MODE", "enforce")
+# Side of the downscaled image the features are computed on
+ANALYSIS_SIZE = int(os.getenv("PRECHECK_SIZE", "512"))
+# Pages of a PDF that are looked at; one passing page is enough
+PDF_PAGES = int(os.getenv("PRECHECK_PDF_PAGES", "3"))
+# Share of the image that must be close to the paper colour (photos fail this)
+MIN_BACKGROUND = float(os.getenv("PRECHECK_MIN_BACKGROUND", "0.45"))
+# Share of ink pixels below which the page is considered blank
+MIN_INK = float(os.getenv("PRECHECK_MIN_INK", "0.003"))
+# Share of ink lying on long horizontal/vertical strokes
+MIN_LINE_RATIO = float(os.getenv("PRECHECK_MIN_LINE_RATIO", "0.15"))
+# Vertical vs horizontal stroke balance; text lines only run one way
+MIN_ORTHOGONALITY = float(os.getenv("PRECHECK_MIN_ORTHOGONALITY", "0.1"))
+MAX_ASPECT = float(os.getenv("PRECHECK_MAX_ASPECT", "4.0"))
+# Grey levels between paper and ink
+INK_CONTRAST = 40
+BACKGROUND_SPREAD = 30
+# Minimum stroke length, relative to ANALYSIS_SIZE, that counts as a drawn line
+MIN_RUN_RATIO = 0.03
+TEXT_TILE = 16
+SNIFF_BYTES = 2048
+
+_SIGNATURES = (
+    (b"%PDF-", "application/pdf"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+)
+
+
+def sniff_mime(buffer: Buffer) -> str:
+    """Real content type from the leading bytes, ignoring the client's claims"""
+    head = bytes(buffer[:SNIFF_BYTES])
+    if magic is not None:
+        return magic.from_buffer(head, mime=True)
+    for signature, mime_type in _SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    return "application/octet-stream"
+
+
+def _long_runs(mask: np.ndarray, min_run: int) -> np.ndarray:
+    """Pixels of mask that belong to a run of at least min_run along each row"""
+    h, w = mask.shape
+    flat = np.pad(mask, ((0, 0), (0, 1))).ravel().view(np.int8)
+    edges = np.diff(np.concatenate(([0], flat, [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    keep = ends - starts >= min_run
+    marker = np.zeros(flat.size + 1, dtype=np.int32)
+    np.add.at(marker, starts[keep], 1)
+    np.add.at(marker, ends[keep], -1)
+    return (np.cumsum(marker)[:-1] > 0).reshape(h, w + 1)[:, :w]
+
+
+def _block_min(gray: np.ndarray, size: int) -> np.ndarray:
+    """Downscale keeping the darkest pixel of each block, so thin lines survive"""
+    factor = max(1, int(np.ceil(max(gray.shape) / size)))
+    if factor == 1:
+        return gray
+    h, w = gray.shape[0] // factor * factor, gray.shape[1] // factor * factor
+    return gray[:h, :w].reshape(h // factor, factor, w // factor, factor).min(axis=(1, 3))
+
+
+def image_features(gray: np.ndarray) -> Dict[str, float]:
+    """Background, ink, line and text density of a greyscale page"""
+    gray = _block_min(gray, ANALYSIS_SIZE).astype(np.int16)
+    h, w = gray.shape
+    if np.median(gray) < 128:
+        gray = 255 - gray  # dark-background CAD export
+    paper = np.percentile(gray, 90)
+    background = gray >= paper - BACKGROUND_SPREAD
+    ink = gray < paper - INK_CONTRAST
+    ink_count = int(ink.sum())
+
+    min_run = max(4, int(ANALYSIS_SIZE * MIN_RUN_RATIO))
+    horizontal = _long_runs(ink, min_run)
+    vertical = _long_runs(ink.T, min_run).T
+    lines = horizontal | vertical
+    h_count, v_count = int(horizontal.sum()), int(vertical.sum())
+    # Ink left after removing the lines is mostly labels and dimensions
+    residue = ink & ~lines
+    th, tw = h // TEXT_TILE, w // TEXT_TILE
+    if th and tw:
+        tiles = residue[:th * TEXT_TILE, :tw * TEXT_TILE].reshape(th, TEXT_TILE, tw, TEXT_TILE).mean(axis=(1, 3))
+        text_density = float((tiles > 0.02).mean())
+    else:
+        text_density = 0.0
+    return {
+        "background": round(float(background.mean()), 4),
+        "ink": round(ink_count / ink.size, 4),
+        "line_ratio": round(float(lines.sum()) / max(ink_count, 1), 4),
+        "orthogonality": round(min(h_count, v_count) / max(h_count, v_count, 1), 4),
+        "text_density": round(text_density, 4),
+        "aspect": round(max(h, w) / max(min(h, w), 1), 3),
+    }
+
+
+def classify(features: Dict[str, float]) -> Optional[str]:
+    """Rejection reason for a page, or None if it looks like a drawing"""
+    if features["aspect"] > MAX_ASPECT:
+        return "aspect"
+    if features["background"] < MIN_BACKGROUND:
+        return "photo"
+    if features["ink"] < MIN_INK:
+        return "blank"
+    if features["line_ratio"] < MIN_LINE_RATIO or features["orthogonality"] < MIN_ORTHOGONALITY:
+        return "text_page" if features["text_density"] > 0.3 else "no_lines"
+    return None
+
+
+def check_upload(buffer: Buffer, filename: Optional[str]) -> Dict[str, Any]:
+    """Decide whether an upload is likely a construction drawing"""
+    start = time.perf_counter()
+    mime_type = sniff_mime(buffer)
+    decision = {"ok": True, "mime_type": mime_type, "reason": None, "features": None}
+
+    if mime_type not in MIME_TYPES.values():
+        decision.update(ok=False, reason=f"type:{mime_type}")
+    else:
+        try:
+            # 2x headroom so thin lines survive the block-min downscale
+            for gray in raster.pages(buffer, mime_type, ANALYSIS_SIZE * 2, PDF_PAGES):
+                features = image_features(gray)
+                reason = classify(features)
+                decision.update(ok=reason is None, reason=reason, features=features)
+                if reason is None:
+                    break
+        except ImportError:
+            print("⚠️ PyMuPDF not installed, skipping PDF page check", file=sys.stderr)
+        except Image.DecompressionBombError:
+            pass  # very large sheets are plans far more often than not
+        except Exception as e:
+            decision.update(ok=False, reason="unreadable")
+            print(f"⚠️ Precheck could not read {filename}: {e}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    decision["elapsed_ms"] = round(elapsed * 1000, 2)
+    metrics.observe("precheck_seconds", elapsed)
+    if decision["ok"]:
+        metrics.increment("precheck_decisions", result="pass")
+    else:
+        metrics.increment("precheck_decisions", result="reject", reason=decision["reason"].split(":")[0])
+    return decision
+
+
+def record_outcome(decision: Dict[str, Any], result: Any) -> None:
+    """Compare a precheck decision with what the model found (shadow mode or forced uploads)"""
+    found_rooms = isinstance(result, dict) and "error" not in result and bool(result.get("rooms"))
+    if not decision["ok"] and found_rooms:
+        metrics.increment("precheck_false_reject", reason=decision["reason"].split(":")[0])
+        print(f"⚠️ Precheck would have rejected a plan ({decision['reason']}): {decision['features']}",
+              file=sys.stderr)
+    elif decision["ok"] and not found_rooms:
+        metrics.increment("precheck_false_accept")
+
+
+def _synthetic_plan(rng: np.random.Generator, size=(1400, 2000)) -> np.ndarray:
+    page = np.full(size, 250, np.uint8)
+    for _ in range(rng.integers(8, 20)):
+        y, x = rng.integers(50, size[0] - 300), rng.integers(50, size[1] - 400)
+        h, w = rng.integers(150, 300), rng.integers(200, 400)
+        page[y:y + 3, x:x + w] = page[y + h:y + h + 3, x:x + w] = 20
+        page[y:y + h, x:x + 3] = page[y:y + h, x + w:x + w + 3] = 20
+        for i in range(rng.integers(3, 10)):  # label glyphs
+            gx, gy = x + 20 + i * 12, y + h // 2
+            page[gy:gy + 9, gx:gx + 6] = np.where(rng.random((9, 6)) < 0.4, 30, 250)
+    return page
+
+
+def _synthetic_photo(rng: np.random.Generator, size=(1400, 2000)) -> np.ndarray:
+    yy, xx = np.mgrid[0:size[0], 0:size[1]]
+    base = 90 + 60 * np.sin(xx / rng.uniform(80, 300)) * np.cos(yy / rng.uniform(80, 300))
+    return np.clip(base + rng.normal(0, 25, size), 0, 255).astype(np.uint8)
+
+
+def _evaluate(paths, expect_plan: bool):
+    outcomes = []
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        decision = check_upload(data, path)
+        outcomes.append((decision["ok"] == expect_plan, decision["elapsed_ms"], path, decision))
+    return outcomes
+
+
+# Evaluation: python precheck.py [plans_dir non_plans_dir]
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        groups = {}
+        for label, folder, expect in (("plans", sys.argv[1], True), ("non-plans", sys.argv[2], False)):
+            paths = [os.path.join(folder, name) for name in sorted(os.listdir(folder))]
+            groups[label] = _evaluate(paths, expect)
+            for correct, _, path, decision in groups[label]:
+                if not correct:
+                    print(f"❌ {label}: {path} -> {decision['reason']} {decision['features']}", file=sys.stderr)
+    else:
+        rng = np.random.default_rng(0)
+        groups = {}
+        for label, make, expect in (("plans", _synthetic_plan, True), ("non-plans", _synthetic_photo, False)):
+            outcomes = []
+            for i in range(50):
+                out = io.BytesIO()
+                Image.fromarray(make(rng)).save(out, format="JPEG" if i % 2 else "PNG", quality=85)
+                decision = check_upload(out.getvalue(), None)
+                outcomes.append((decision["ok"] == expect, decision["elapsed_ms"], None, decision))
+            groups[label] = outcomes
+
+    for label, outcomes in groups.items():
+        wrong = sum(not correct for correct, *_ in outcomes)
+        times = sorted(ms for _, ms, *_ in outcomes)
+        rate_name = "false-reject" if label == "plans" else "false-accept"
+        print(f"⏱️ {label:10s} {len(outcomes)} files, {rate_name} rate {wrong / max(len(outcomes), 1):.1%}, "
+              f"p50 {times[len(times) // 2]:.1f} ms, p95 {times[int(len(times) * 0.95)]:.1f} ms")
@@ -0,0 +1,247 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import contextvars
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterator, List, Optional
+
+# Per-request profiling needs this token in the X-Admin-Token header; never in the URL, where logs keep it
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Share of uploads profiled without being asked, e.g. 0.01
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Stack sampling period
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+MAX_STACK_DEPTH = 64
+
+_active: contextvars.ContextVar = contextvars.ContextVar("profile", default=None)
+
+
+class Profile:
+    """Stage spans and sampled call stacks of one request, across the threads it uses"""
+
+    def __init__(self, request_id: str, reason: str):
+        self.request_id = request_id
+        self.reason = reason
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self.stacks: Dict[int, List[str]] = {}  # thread id -> open span names
+        self.samples: Counter = Counter()
+        self.attributes: Dict[str, Any] = {}
+        self.lock = threading.Lock()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requestId": self.request_id,
+            "reason": self.reason,
+            "startedAt": self.started_at,
+            "durationMs": round((time.perf_counter() - self.start) * 1000, 2),
+            "intervalMs": PROFILE_INTERVAL * 1000,
+            "attributes": self.attributes,
+            "spans": self.spans,
+            "samples": [[";".join(stack), n] for stack, n in self.samples.most_common()],
+        }
+
+
+class _Sampler:
+    """One background thread sampling the threads of every active profile"""
+
+    def __init__(self):
+        self.profiles: List[Profile] = []
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+
+    def add(self, profile: Profile) -> None:
+        with self.lock:
+            self.profiles.append(profile)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self.thread.start()
+
+    def remove(self, profile: Profile) -> None:
+        with self.lock:
+            if profile in self.profiles:
+                self.profiles.remove(profile)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(PROFILE_INTERVAL)
+            with self.lock:
+                profiles = list(self.profiles)
+                if not profiles:
+                    self.thread = None
+                    return
+            frames = sys._current_frames()
+            for profile in profiles:
+                with profile.lock:
+                    threads = {tid: list(spans) for tid, spans in profile.stacks.items() if spans}
+                for tid, spans in threads.items():
+                    frame = frames.get(tid)
+                    if frame is not None:
+                        profile.samples[tuple(spans) + _frames(frame)] += 1
+
+
+def _frames(frame) -> tuple:
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return tuple(reversed(names))
+
+
+_sampler = _Sampler()
+
+
+def authorized(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and bool(token) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def should_profile(requested: bool, token: Optional[str], sampled: bool = True) -> Optional[str]:
+    """Why this request is profiled ("requested" or "sampled"), or None"""
+    if requested and authorized(token):
+        return "requested"
+    if sampled and PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+def start(request_id: str, reason: str) -> Profile:
+    """Profile the rest of the current context (and threads it hands work to)"""
+    profile = Profile(request_id, reason)
+    _active.set(profile)
+    _sampler.add(profile)
+    return profile
+
+
+def finish(profile: Profile) -> Dict[str, Any]:
+    _sampler.remove(profile)
+    return profile.to_dict()
+
+
+def current() -> Optional[Profile]:
+    return _active.get()
+
+
+def annotate(**attributes) -> None:
+    profile = _active.get()
+    if profile is not None:
+        profile.attributes.update(attributes)
+
+
+@contextmanager
+def _span(profile: Profile, name: str, sample: bool) -> Iterator[None]:
+    tid = threading.get_ident()
+    start = time.perf_counter()
+    if sample:
+        with profile.lock:
+            profile.stacks.setdefault(tid, []).append(name)
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        with profile.lock:
+            if sample:
+                stack = profile.stacks[tid]
+                stack.pop()
+                if not stack:
+                    del profile.stacks[tid]
+            profile.spans.append({
+                "name": name,
+                "startMs": round((start - profile.start) * 1000, 3),
+                "durationMs": round((end - start) * 1000, 3),
+                "thread": tid,
+            })
+
+
+class _NoSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, sample: bool = True):
+    """Time a pipeline stage; with sample its thread's stacks are collected meanwhile.
+
+    Costs one context-variable lookup when the request is not profiled.
+    Async code should pass sample=False: the event loop thread runs other
+    requests too.
+    """
+    profile = _active.get()
+    if profile is None:
+        return _NO_SPAN
+    return _span(profile, name, sample)
+
+
+def traced(name: str, fn: Callable) -> Callable:
+    """fn run inside span(name), for handing to a threadpool"""
+    def run(*args, **kwargs):
+        with span(name):
+            return fn(*args, **kwargs)
+    return run
+
+
+def bind(fn: Callable) -> Callable:
+    """fn carrying the caller's profile into executor threads (which do not copy contextvars)"""
+    profile = _active.get()
+    if profile is None:
+        return fn
+
+    def run(*args, **kwargs):
+        token = _active.set(profile)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _active.reset(token)
+    return run
+
+
+def collapsed(data: Dict[str, Any]) -> str:
+    """Stored profile as folded stacks ("a;b;c count" lines), for flamegraph.pl and speedscope"""
+    return "".join(f"{stack} {n}\n" for stack, n in data.get("samples") or [])
+
+
+# Benchmark: python profiling.py [iterations]
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    def work():
+        with span("stage"):
+            pass
+
+    start_t = time.perf_counter()
+    for _ in range(n):
+        work()
+    disabled = (time.perf_counter() - start_t) / n
+
+    profile = start("bench", "requested")
+    start_t = time.perf_counter()
+    for _ in range(n // 10):
+        work()
+    enabled = (time.perf_counter() - start_t) / (n // 10)
+    profile.spans.clear()
+
+    def busy(limit: float):
+        with span("busy"):
+            deadline = time.perf_counter() + limit
+            x = 0
+            while time.perf_counter() < deadline:
+                x += 1
+
+    busy(0.5)
+    data = finish(profile)
+    print(f"⏱️ span() disabled {disabled * 1e9:.0f} ns, enabled {enabled * 1e9:.0f} ns; "
+          f"{sum(n for _, n in data['samples'])} samples in 0.5 s of busy work")
+    print(collapsed(data).splitlines()[0])
@@ -0,0 +1,204 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import sys
+import time
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+DEFAULT_HEIGHT = 2.7
+WALL_SIDES = ("north", "south", "east", "west")
+
+
+def _to_float(value: Any, default: float = 0.0) -> float:
+    """Parse numbers the model emits as either strings or numbers"""
+    if value is None or value == "":
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _round(values: np.ndarray) -> List[float]:
+    return np.round(values, 2).tolist()
+
+
+def _room_walls(result: Dict[str, Any]):
+    """Flatten rooms[].wallConnectivity.walls into (room index, wall dict, room height)"""
+    for room_idx, room in enumerate(result.get("rooms") or []):
+        if not isinstance(room, dict):
+            continue
+        walls = (room.get("wallConnectivity") or {}).get("walls") or {}
+        room_height = _to_float(room.get("height"), DEFAULT_HEIGHT)
+        for side in WALL_SIDES:
+            wall = walls.get(side)
+            if isinstance(wall, dict):
+                yield room_idx, wall, room_height
+
+
+def _recompute_room_walls(result: Dict[str, Any]) -> Dict[str, float]:
+    """Recompute opening, wall and per-room areas; returns wall id -> height"""
+    rooms = result.get("rooms") or []
+    entries = list(_room_walls(result))
+    if not entries:
+        return {}
+
+    n_walls = len(entries)
+    room_idx = np.fromiter((e[0] for e in entries), dtype=np.int64, count=n_walls)
+    length = np.fromiter((_to_float(e[1].get("length")) for e in entries), dtype=np.float64, count=n_walls)
+    height = np.fromiter((_to_float(e[1].get("height"), e[2]) for e in entries), dtype=np.float64, count=n_walls)
+    shared = np.fromiter((e[1].get("type") == "shared" for e in entries), dtype=bool, count=n_walls)
+    shared_length = np.fromiter(
+        (_to_float(e[1].get("sharedLength"), _to_float(e[1].get("length"))) for e in entries),
+        dtype=np.float64, count=n_walls,
+    )
+
+    # Openings across all walls in one flat batch
+    openings = []
+    opening_wall = []
+    for wall_idx, (_, wall, _) in enumerate(entries):
+        for opening in wall.get("openings") or []:
+            if isinstance(opening, dict):
+                openings.append(opening)
+                opening_wall.append(wall_idx)
+    n_openings = len(openings)
+    op_width = np.fromiter((_to_float((o.get("size") or {}).get("width")) for o in openings), dtype=np.float64, count=n_openings)
+    op_height = np.fromiter((_to_float((o.get("size") or {}).get("height")) for o in openings), dtype=np.float64, count=n_openings)
+    op_area = op_width * op_height
+    opening_total = np.bincount(np.asarray(opening_wall, dtype=np.int64), weights=op_area, minlength=n_walls)
+
+    gross = length * height
+    net = np.maximum(gross - opening_total, 0.0)
+    shared_length = np.where(shared, np.minimum(shared_length, length), 0.0)
+    shared_area = shared_length * height
+    external_area = np.where(shared, 0.0, gross)
+
+    room_shared = np.bincount(room_idx, weights=shared_area, minlength=len(rooms))
+    room_external = np.bincount(room_idx, weights=external_area, minlength=len(rooms))
+
+    for opening, area in zip(openings, _round(op_area)):
+        opening["area"] = area
+
+    wall_heights: Dict[str, float] = {}
+    for (_, wall, _), g, n, h, sl, sa, is_shared in zip(
+        entries, _round(gross), _round(net), height.tolist(),
+        _round(shared_length), _round(shared_area), shared.tolist(),
+    ):
+        wall["height"] = h
+        wall["grossArea"] = g
+        wall["netArea"] = n
+        if is_shared:
+            wall["sharedLength"] = sl
+            wall["sharedArea"] = sa
+        if wall.get("id"):
+            wall_heights[wall["id"]] = h
+
+    for idx in np.unique(room_idx).tolist():
+        connectivity = rooms[idx]["wallConnectivity"]
+        connectivity["sharedArea"] = round(float(room_shared[idx]), 2)
+        connectivity["externalWallArea"] = round(float(room_external[idx]), 2)
+
+    return wall_heights
+
+
+def _endpoints(wall: Dict[str, Any]) -> Optional[List[float]]:
+    """[x1, y1, x2, y2] of a wall, or None when it lacks either endpoint (missing coordinates are NaN)"""
+    try:
+        (x1, y1), (x2, y2) = wall.get("start"), wall.get("end")
+    except (TypeError, ValueError):
+        return None
+    nan = float("nan")
+    return [_to_float(x1, nan), _to_float(y1, nan), _to_float(x2, nan), _to_float(y2, nan)]
+
+
+def _recompute_walls(result: Dict[str, Any], wall_heights: Dict[str, float]) -> None:
+    """Recompute top-level wall areas from their start/end coordinates.
+
+    Walls without both endpoints keep whatever area they were given.
+    """
+    walls = [w for w in result.get("walls") or [] if isinstance(w, dict)]
+    for wall in walls:
+        if wall.get("id") and wall["id"] not in wall_heights:
+            wall_heights[wall["id"]] = _to_float(wall.get("height"), DEFAULT_HEIGHT)
+    placed = [(w, e) for w, e in ((w, _endpoints(w)) for w in walls) if e is not None and np.isfinite(e).all()]
+    if not placed:
+        return
+
+    n = len(placed)
+    walls = [w for w, _ in placed]
+    coords = np.array([e for _, e in placed], dtype=np.float64).reshape(n, 4)
+    height = np.fromiter(
+        (_to_float(w.get("height"), wall_heights.get(w.get("id"), DEFAULT_HEIGHT)) for w in walls),
+        dtype=np.float64, count=n,
+    )
+    length = np.hypot(coords[:, 2] - coords[:, 0], coords[:, 3] - coords[:, 1])
+    area = length * height
+
+    for wall, a in zip(walls, _round(area)):
+        # Schema keeps top-level wall area as a string
+        wall["area"] = str(a)
+
+
+def _recompute_connectivity(result: Dict[str, Any], wall_heights: Dict[str, float]) -> None:
+    """Recompute connectivity.sharedWalls areas and totalSharedArea"""
+    connectivity = result.get("connectivity")
+    if not isinstance(connectivity, dict):
+        return
+    shared_walls = [s for s in connectivity.get("sharedWalls") or [] if isinstance(s, dict)]
+
+    n = len(shared_walls)
+    length = np.fromiter((_to_float(s.get("sharedLength")) for s in shared_walls), dtype=np.float64, count=n)
+    height = np.fromiter(
+        (wall_heights.get(s.get("wall1Id"), wall_heights.get(s.get("wall2Id"), DEFAULT_HEIGHT)) for s in shared_walls),
+        dtype=np.float64, count=n,
+    )
+    area = length * height
+    for shared_wall, a in zip(shared_walls, _round(area)):
+        shared_wall["sharedArea"] = a
+    connectivity["totalSharedArea"] = round(float(area.sum()), 2)
+
+
+def recompute_quantities(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Recompute all derived wall/opening areas from raw geometry, in place"""
+    if not isinstance(result, dict):
+        return result
+    wall_heights = _recompute_room_walls(result)
+    _recompute_walls(result, wall_heights)
+    _recompute_connectivity(result, wall_heights)
+    return result
+
+
+def _synthetic_plan(n_walls: int) -> Dict[str, Any]:
+    rooms = []
+    for r in range(n_walls // 4):
+        walls = {}
+        for side in WALL_SIDES:
+            walls[side] = {
+                "id": f"wall_{r}_{side}",
+                "type": "shared" if side in ("north", "east") else "external",
+                "length": 4.0,
+                "height": 2.7,
+                "openings": [{"id": f"door_{r}_{side}", "type": "door", "size": {"width": 0.9, "height": 2.1}}],
+            }
+        rooms.append({"height": "2.7", "wallConnectivity": {"walls": walls}})
+    walls = [
+        {"id": f"wall_{i}", "start": [0, i], "end": [4, i], "height": "2.7"}
+        for i in range(n_walls)
+    ]
+    shared = [
+        {"wall1Id": f"wall_{r}_north", "sharedLength": 4.0}
+        for r in range(n_walls // 4)
+    ]
+    return {"rooms": rooms, "walls": walls, "connectivity": {"sharedWalls": shared}}
+
+
+# Benchmark: python quantities.py [n_walls]
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    plan = _synthetic_plan(n)
+    start = time.perf_counter()
+    recompute_quantities(plan)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"⏱️ Recomputed quantities for {n} room walls + {n} plan walls in {elapsed:.1f} ms")
@@ -0,0 +1,323 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import concurrent.futures
+import hashlib
+import io
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import weakref
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+import metrics
+from limiter import WORKERS
+from upload_buffer import Buffer
+
+# Rendered pages, shared by every stage and worker process; 0 disables the cache
+CACHE_DIR = Path(os.getenv("RASTER_CACHE_DIR", "data/rasters"))
+CACHE_BYTES = int(float(os.getenv("RASTER_CACHE_MB", "1024")) * (1 << 20))
+# Eviction trims the cache to this share of its size, so it does not run on every write
+EVICT_TO = 0.8
+# Render processes per worker; the instance's cores are split between workers
+PROCESSES = int(os.getenv("RASTER_PROCESSES", str(max((os.cpu_count() or 1) // WORKERS, 1))))
+# Long side of the upload preview thumbnails
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "256"))
+THUMBNAIL_MAX_PAGES = int(os.getenv("THUMBNAIL_MAX_PAGES", "50"))
+
+MODES = {"L": "csGRAY", "RGB": "csRGB"}
+HEX_DIGITS = set("0123456789abcdef")
+
+_digests: Dict[int, Tuple[weakref.ref, str]] = {}
+_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_evict_lock = threading.Lock()
+
+
+def content_key(buffer: Buffer) -> str:
+    """SHA-256 of an upload, hashed once per buffer however many stages ask"""
+    entry = _digests.get(id(buffer))
+    if entry is not None and entry[0]() is buffer:
+        return entry[1]
+    digest = hashlib.sha256(buffer).hexdigest()
+    try:
+        ref = weakref.ref(buffer, lambda _, key=id(buffer): _digests.pop(key, None))
+    except TypeError:  # bytes cannot be weakly referenced
+        return digest
+    _digests[id(buffer)] = (ref, digest)
+    return digest
+
+
+def _path(key: str, page: int, size: int, mode: str) -> Path:
+    return CACHE_DIR / f"{key[:32]}-{page}-{size}-{mode}.npy"
+
+
+def _count_path(key: str) -> Path:
+    return CACHE_DIR / f"{key[:32]}.pages"
+
+
+def _save(path: Path, array: np.ndarray) -> None:
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, np.ascontiguousarray(array))
+    os.replace(tmp, path)
+
+
+def _load(path: Path) -> Optional[np.ndarray]:
+    """Memory-mapped cached raster, marked as recently used; None on a miss"""
+    try:
+        array = np.load(path, mmap_mode="r")
+        os.utime(path)
+        return array
+    except (OSError, ValueError):
+        return None
+
+
+def _render_page(doc, index: int, size: int, mode: str) -> np.ndarray:
+    import fitz
+
+    page = doc[index]
+    zoom = size / max(page.rect.width, page.rect.height, 1)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=getattr(fitz, MODES[mode]), alpha=False)
+    samples = np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.stride)[:, :pix.width * pix.n]
+    return samples if mode == "L" else samples.reshape(pix.height, pix.width, pix.n)
+
+
+def _render_pdf(data: bytes, indices: Sequence[int], size: int, mode: str,
+                paths: Optional[Sequence[str]] = None) -> List[Optional[np.ndarray]]:
+    """Render PDF pages; with paths, write them to the cache and return None for each"""
+    import fitz
+
+    out = []
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for i, index in enumerate(indices):
+            array = _render_page(doc, index, size, mode)
+            if paths is None:
+                out.append(array)
+            else:
+                _save(Path(paths[i]), array)
+                out.append(None)
+    return out
+
+
+def _render_image(buffer: Buffer, size: int, mode: str) -> np.ndarray:
+    with Image.open(io.BytesIO(buffer)) as image:
+        width, height = image.size
+        zoom = size / max(width, height, 1)
+        target = (max(round(width * zoom), 1), max(round(height * zoom), 1))
+        # JPEG decodes at a reduced power-of-two scale directly; the resize does the rest
+        image.draft(mode, target)
+        image = image.convert(mode)
+        if image.size != target:
+            # Area averaging when shrinking, as the fingerprint and calibration resizes do
+            image = image.resize(target, Image.BOX if zoom < 1 else Image.BICUBIC)
+        return np.asarray(image)
+
+
+def _get_pool() -> concurrent.futures.ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked: the parent runs event loop and threadpool threads
+            _pool = concurrent.futures.ProcessPoolExecutor(PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(broken: concurrent.futures.ProcessPoolExecutor) -> None:
+    """Drop a pool whose worker died, unless another caller has replaced it already"""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _render_on_pool(data: bytes, chunks: List[List[int]], size: int, mode: str, paths: Dict[int, str]) -> None:
+    """Render chunks of pages on the process pool, on a new pool once if a worker dies"""
+    for attempt in range(2):
+        pool = _get_pool()
+        try:
+            futures = [pool.submit(_render_pdf, data, chunk, size, mode, [paths[i] for i in chunk]) for chunk in chunks]
+            for future in futures:
+                future.result()
+            return
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            metrics.increment("raster_pool_restarts")
+            if attempt:
+                raise
+            print("⚠️ Raster worker died; restarting the process pool", file=sys.stderr)
+
+
+def _chunks(indices: List[int], n: int) -> List[List[int]]:
+    """n contiguous runs of pages; neighbouring pages share fonts and images in the PDF"""
+    step = -(-len(indices) // n)
+    return [indices[i:i + step] for i in range(0, len(indices), step)]
+
+
+def _page_count(buffer: Buffer, key: str, cached: bool) -> int:
+    if cached:
+        try:
+            return int(_count_path(key).read_text())
+        except (OSError, ValueError):
+            pass
+    import fitz
+
+    with fitz.open(stream=bytes(buffer), filetype="pdf") as doc:
+        count = doc.page_count
+    if cached:
+        _count_path(key).write_text(str(count))
+    return count
+
+
+def pages(buffer: Buffer, mime_type: str, size: int, max_pages: Optional[int] = None,
+          mode: str = "L") -> List[np.ndarray]:
+    """Pages of an image or PDF as arrays `size` px on the long side.
+
+    Served memory-mapped from the shared cache when another stage, request or
+    worker rendered them already; missing PDF pages are rendered on the
+    process pool. Arrays from the cache are read-only.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unsupported colour mode {mode}")
+    cached = CACHE_BYTES > 0
+    if cached:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    key = content_key(buffer) if cached else ""
+
+    if mime_type != "application/pdf":
+        path = _path(key, 0, size, mode)
+        array = _load(path) if cached else None
+        metrics.increment("raster_hits" if array is not None else "raster_misses")
+        if array is None:
+            array = _render_image(buffer, size, mode)
+            if cached:
+                _save(path, array)
+                _evict()
+        return [array]
+
+    count = _page_count(buffer, key, cached)
+    last = count if max_pages is None else min(max_pages, count)
+    found = [_load(_path(key, i, size, mode)) if cached else None for i in range(last)]
+    missing = [i for i, array in enumerate(found) if array is None]
+    metrics.increment("raster_hits", last - len(missing))
+    if not missing:
+        return found
+    metrics.increment("raster_misses", len(missing))
+
+    start = time.perf_counter()
+    data = bytes(buffer)
+    if not cached:
+        for i, array in zip(missing, _render_pdf(data, missing, size, mode)):
+            found[i] = array
+    else:
+        paths = {i: str(_path(key, i, size, mode)) for i in missing}
+        if PROCESSES > 1 and len(missing) > 1:
+            _render_on_pool(data, _chunks(missing, PROCESSES), size, mode, paths)
+        else:
+            _render_pdf(data, missing, size, mode, [paths[i] for i in missing])
+        for i in missing:
+            found[i] = np.load(paths[i], mmap_mode="r")
+        _evict()
+    metrics.observe("raster_seconds", time.perf_counter() - start)
+    return found
+
+
+def thumbnails(buffer: Buffer, mime_type: str) -> Tuple[str, int]:
+    """(content key, page count) after rendering the colour preview of every page"""
+    rendered = pages(buffer, mime_type, THUMBNAIL_SIZE, THUMBNAIL_MAX_PAGES, mode="RGB")
+    return content_key(buffer), len(rendered)
+
+
+def thumbnail(key: str, page: int) -> Optional[bytes]:
+    """PNG of a cached preview page, or None once evicted (or never rendered)"""
+    if len(key) < 32 or not set(key) <= HEX_DIGITS:
+        return None
+    array = _load(_path(key, page, THUMBNAIL_SIZE, "RGB"))
+    if array is None:
+        return None
+    out = io.BytesIO()
+    Image.fromarray(np.asarray(array)).save(out, format="PNG")
+    return out.getvalue()
+
+
+def _evict() -> None:
+    """Delete least recently used rasters while the cache is over CACHE_BYTES"""
+    if not _evict_lock.acquire(blocking=False):
+        return  # another thread is already trimming
+    try:
+        entries = []
+        total = 0
+        for entry in os.scandir(CACHE_DIR):
+            if entry.name.endswith((".npy", ".pages")):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:  # evicted by another worker meanwhile
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= CACHE_BYTES:
+            return
+        entries.sort()
+        removed = 0
+        for _, size, path in entries:
+            if total <= CACHE_BYTES * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            removed += 1
+        metrics.increment("raster_evictions", removed)
+    finally:
+        _evict_lock.release()
+
+
+# Benchmark: python raster.py [pages]
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+
+    from admission import _synthetic_pdf
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    data = memoryview(_synthetic_pdf(n))
+    CACHE_DIR = Path(tempfile.mkdtemp())
+    print(f"🖥️ {PROCESSES} render processes, {n}-page A1 PDF ({len(data) / 1024:.0f} KB)")
+
+    for label, processes in (("serial", 1), ("pool", PROCESSES)):
+        PROCESSES = processes
+        shutil.rmtree(CACHE_DIR)
+        if processes > 1:
+            list(_get_pool().map(time.sleep, [0.2] * processes))  # start-up is paid once per worker, not per upload
+        start = time.perf_counter()
+        pages(data, "application/pdf", 1024)
+        print(f"⏱️ cold {label:6s} 1024 px: {(time.perf_counter() - start) / n * 1e3:6.1f} ms/page")
+
+    start = time.perf_counter()
+    rasters = pages(data, "application/pdf", 1024)
+    print(f"⏱️ cached      1024 px: {(time.perf_counter() - start) / n * 1e3:6.2f} ms/page (memory-mapped)")
+    start = time.perf_counter()
+    preview = pages(data, "application/pdf", 2000, max_pages=1)
+    print(f"⏱️ cold 2000 px first page: {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+    start = time.perf_counter()
+    key, count = thumbnails(data, "application/pdf")
+    png = [thumbnail(key, i) for i in range(count)]
+    print(f"⏱️ {count} thumbnails in {(time.perf_counter() - start) * 1e3:.0f} ms, "
+          f"{sum(map(len, png)) / count / 1024:.1f} KB PNG each")
+
+    CACHE_BYTES = int(sum(os.path.getsize(CACHE_DIR / f) for f in os.listdir(CACHE_DIR)) * 0.5)
+    _evict()
+    kept = [_path(key, i, 1024, "L").exists() for i in range(n)]
+    print(f"🧹 Evicted to {CACHE_BYTES * EVICT_TO / 1e6:.1f} MB: {sum(kept)}/{n} 1024 px pages kept, "
+          f"thumbnails kept: {all(_path(key, i, THUMBNAIL_SIZE, 'RGB').exists() for i in range(count))}")
+    shutil.rmtree(CACHE_DIR)
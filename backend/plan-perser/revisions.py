@@ -0,0 +1,167 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import os
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+from fingerprint import changed_tiles, hamming
+from upload_buffer import Buffer
+
+# Bits a whole-page hash may move and still be the same sheet (re-export, edits)
+PAGE_MATCH_BITS = int(os.getenv("REVISION_PAGE_MATCH_BITS", "10"))
+
+LIST_SECTIONS = (
+    "rooms", "walls", "earthworks", "concreteStructures", "reinforcement",
+    "roofing", "plumbing", "electrical", "finishes", "verticalElements",
+)
+DIFF_SECTIONS = ("rooms", "plumbing", "electrical")
+# Fields computed after extraction, ignored when comparing revisions
+DERIVED_FIELDS = {
+    "netArea", "grossArea", "sharedArea", "externalWallArea", "area", "canonicalWallId",
+    "mergedFrom", "sourcePage", "stackId",
+}
+# Fields referring to other items by id, compared without merge_pages' page prefixes
+REFERENCE_FIELDS = {"roomId", "sharedWith", "connectedRooms", "connectsTo"}
+_PAGE_PREFIX = re.compile(r"^(?:[pf]\d+_)+")
+
+
+def match_pages(previous: List[Dict[str, Any]], pages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Pair each new page with the previous page it most likely revises.
+
+    Sheets are matched on the whole-page hash, so inserted or reordered sheets
+    still find their predecessor. A matched page is unchanged when none of
+    its ink cells moved; otherwise the edited tiles are reported as regions.
+    """
+    available = dict(enumerate(previous))
+    matches = []
+    for page in pages:
+        best, best_distance = None, PAGE_MATCH_BITS + 1
+        for index, old in available.items():
+            distance = hamming(old["hash"], page["hash"])
+            if distance < best_distance:
+                best, best_distance = index, distance
+        if best is None:
+            matches.append({"previous": None, "changed": True, "regions": []})
+            continue
+        regions = changed_tiles(available.pop(best)["cells"], page["cells"])
+        matches.append({"previous": best, "changed": bool(regions), "regions": regions})
+    return matches
+
+
+def split_pdf(buffer: Buffer, indices: List[int]) -> List[bytes]:
+    """Single-page PDFs for the given page indices"""
+    import fitz
+
+    out = []
+    with fitz.open(stream=bytes(buffer), filetype="pdf") as doc:
+        for index in indices:
+            with fitz.open() as single:
+                single.insert_pdf(doc, from_page=index, to_page=index)
+                out.append(single.tobytes(garbage=1, deflate=True, no_new_id=True))
+    return out
+
+
+def _namespace(value: Any, ids: Dict[str, str]) -> Any:
+    if isinstance(value, dict):
+        return {k: _namespace(v, ids) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_namespace(v, ids) for v in value]
+    if isinstance(value, str):
+        return ids.get(value, value)
+    return value
+
+
+def _page_ids(result: Dict[str, Any]) -> List[str]:
+    ids = [item.get("id") for section in ("walls", "verticalElements")
+           for item in result.get(section) or [] if isinstance(item, dict)]
+    for room in result.get("rooms") or []:
+        if not isinstance(room, dict):
+            continue
+        connectivity = room.get("wallConnectivity") or {}
+        ids.append(connectivity.get("roomId"))
+        ids.extend((w or {}).get("id") for w in (connectivity.get("walls") or {}).values() if isinstance(w, dict))
+    return [i for i in ids if isinstance(i, str) and i]
+
+
+def merge_pages(page_results: List[Optional[Dict[str, Any]]], prefix: str = "p") -> Dict[str, Any]:
+    """Combine raw per-page model results into one document result.
+
+    Room and wall ids are prefixed with the page number so references stay
+    unique across sheets; list items carry sourcePage. Floor regions of one
+    sheet are combined the same way with prefix "f".
+    """
+    merged: Dict[str, Any] = {section: [] for section in LIST_SECTIONS}
+    multi = len(page_results) > 1
+    for number, result in enumerate(page_results, start=1):
+        if not isinstance(result, dict) or "error" in result:
+            continue
+        if multi:
+            result = _namespace(result, {i: f"{prefix}{number}_{i}" for i in _page_ids(result)})
+        for key, value in result.items():
+            if key in LIST_SECTIONS and isinstance(value, list):
+                merged[key].extend({**item, "sourcePage": number} if isinstance(item, dict) else item
+                                   for item in value)
+            elif key == "floors" and isinstance(value, int) and isinstance(merged.get("floors"), int):
+                merged["floors"] = max(merged["floors"], value)
+            elif merged.get(key) in (None, "", [], {}):
+                merged[key] = value
+    return merged
+
+
+def _item_key(section: str, item: Dict[str, Any], seen: Dict[str, int]) -> str:
+    if section == "rooms":
+        base = str(item.get("room_name") or item.get("roomType") or "room")
+        if item.get("floor") not in (None, ""):
+            base = f"{item['floor']}/{base}"
+    else:
+        base = str(item.get("name") or item.get("id") or item.get("systemType") or section)
+    # Repeated names (three "Bedroom"s) are told apart by order of appearance
+    seen[base] = seen.get(base, 0) + 1
+    return base if seen[base] == 1 else f"{base} #{seen[base]}"
+
+
+def _signature(value: Any, field: Optional[str] = None) -> Any:
+    """Comparable form of an item: no derived fields or ids, references without page
+    prefixes (which shift when a sheet is inserted or a one-page set gains one)"""
+    if isinstance(value, dict):
+        return {k: _signature(v, k) for k, v in value.items() if k not in DERIVED_FIELDS and k != "id"}
+    if isinstance(value, list):
+        return [_signature(v, field) for v in value]
+    if isinstance(value, str) and field in REFERENCE_FIELDS:
+        return _PAGE_PREFIX.sub("", value)
+    return value
+
+
+def _keyed(section: str, items: Any) -> Dict[str, Any]:
+    seen: Dict[str, int] = {}
+    return {_item_key(section, item, seen): _signature(item) for item in items or [] if isinstance(item, dict)}
+
+
+def diff_results(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Dict[str, List[str]]]:
+    """Rooms and services added, removed or changed between two revisions"""
+    diff = {}
+    for section in DIFF_SECTIONS:
+        old, new = _keyed(section, previous.get(section)), _keyed(section, current.get(section))
+        diff[section] = {
+            "added": [k for k in new if k not in old],
+            "removed": [k for k in old if k not in new],
+            "changed": [k for k in new if k in old and new[k] != old[k]],
+        }
+    return diff
+
+
+def changed_regions(matches: List[Dict[str, Any]]) -> Dict[str, List[List[float]]]:
+    """Edited tile boxes per (1-based) page, for pages that revise an earlier sheet"""
+    return {
+        str(number): match["regions"]
+        for number, match in enumerate(matches, start=1)
+        if match["changed"] and match["previous"] is not None
+    }
+
+
+def plan_work(previous: List[Dict[str, Any]], pages: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """Page matches and the indices of pages that need a model call"""
+    matches = match_pages(previous, pages)
+    todo = [i for i, m in enumerate(matches) if m["changed"] or previous[m["previous"]].get("data") is None]
+    return matches, todo
@@ -0,0 +1,271 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import asyncio
+import os
+import sys
+import time
+from collections import deque
+from typing import Dict, Any, Deque, List, Optional
+
+import metrics
+from limiter import OverloadedError
+
+# Subscription tiers as named in the app's profiles table
+DEFAULT_TIER = "Free"
+
+
+def _parse_tiers(value: str, cast=float) -> Dict[str, Any]:
+    """"Free=1,Intermediate=4" as {"Free": 1.0, "Intermediate": 4.0}"""
+    pairs = (item.split("=", 1) for item in value.split(",") if "=" in item)
+    return {name.strip(): cast(number) for name, number in pairs}
+
+
+# Share of parser slots each tier gets while every tier has work queued
+TIER_WEIGHTS = _parse_tiers(os.getenv("SCHEDULER_TIER_WEIGHTS", "Free=1,Intermediate=4,Professional=8"))
+# Jobs one tenant may have running at once
+TENANT_MAX_RUNNING = _parse_tiers(os.getenv("SCHEDULER_TENANT_MAX_RUNNING", "Free=1,Intermediate=2,Professional=4"), int)
+# A tier with work queued is served at least once per this many seconds
+STARVATION_SECONDS = float(os.getenv("SCHEDULER_STARVATION_SECONDS", "45"))
+
+
+class QueueFull(OverloadedError):
+    """The tenant or its tier has too many jobs waiting"""
+
+
+class _Job:
+    __slots__ = ("tenant", "tier", "enqueued", "future")
+
+    def __init__(self, tenant: str, tier: str, future: asyncio.Future):
+        self.tenant = tenant
+        self.tier = tier
+        self.enqueued = time.monotonic()
+        self.future = future
+
+
+class _Tier:
+    """Tenants of one tier, served round-robin; `finish` is the tier's virtual time"""
+
+    def __init__(self, name: str, weight: float, max_running: int):
+        self.name = name
+        self.weight = weight
+        self.max_running = max_running
+        self.finish = 0.0
+        self.last_served = time.monotonic()
+        self.tenants: Dict[str, Deque[_Job]] = {}
+        self.order: Deque[str] = deque()
+
+    def backlog(self) -> int:
+        return sum(len(jobs) for jobs in self.tenants.values())
+
+
+class Scheduler:
+    """Weighted fair queuing of parse jobs across tiers, then tenants.
+
+    `slots` jobs run at once. When one finishes, the next job comes from
+    the backlogged tier with the smallest virtual finish time, which grows
+    by 1 / weight per job served, so each tier gets slots in proportion
+    to its weight and an idle tier cannot bank credit. Within a tier,
+    tenants take turns, skipping any tenant already at its running cap.
+    A tier left unserved for STARVATION_SECONDS with work queued (weights
+    misconfigured, or its tenants all at their caps until now) goes first.
+
+    Runs on the event loop: acquire and release must be called from it.
+    """
+
+    def __init__(self, slots: int, max_queue: int = 32, max_queue_per_tenant: int = 8,
+                 weights: Optional[Dict[str, float]] = None, max_running: Optional[Dict[str, int]] = None,
+                 starvation: float = STARVATION_SECONDS):
+        self.slots = slots
+        self.max_queue = max_queue
+        self.max_queue_per_tenant = max_queue_per_tenant
+        self.starvation = starvation
+        weights = weights or TIER_WEIGHTS
+        max_running = max_running or TENANT_MAX_RUNNING
+        self.tiers = {name: _Tier(name, weight, max_running.get(name, 1)) for name, weight in weights.items()}
+        self.virtual_time = 0.0
+        self.running = 0
+        self.running_by_tenant: Dict[str, int] = {}
+        self.stats = {"served": 0, "rejected": 0, "starvation_boosts": 0}
+
+    @classmethod
+    def from_env(cls) -> "Scheduler":
+        return cls(
+            slots=int(os.getenv("SCHEDULER_SLOTS", "4")),
+            max_queue=int(os.getenv("SCHEDULER_MAX_QUEUE_PER_TIER", "32")),
+            max_queue_per_tenant=int(os.getenv("SCHEDULER_MAX_QUEUE_PER_TENANT", "8")),
+        )
+
+    def tier_of(self, tier: Optional[str]) -> str:
+        """Known tier name for a header value, case-insensitively; unknown tiers are Free"""
+        for name in self.tiers:
+            if tier and name.lower() == tier.strip().lower():
+                return name
+        return DEFAULT_TIER if DEFAULT_TIER in self.tiers else next(iter(self.tiers))
+
+    async def acquire(self, tenant: str, tier: Optional[str]) -> _Job:
+        """Wait for a parser slot; raise QueueFull when the job cannot even be queued"""
+        group = self.tiers[self.tier_of(tier)]
+        waiting = group.tenants.get(tenant)
+        # Bounded per tier, so a free-tier burst cannot fill the queue for paying tenants
+        if group.backlog() >= self.max_queue or (waiting and len(waiting) >= self.max_queue_per_tenant):
+            self.stats["rejected"] += 1
+            metrics.increment("scheduler_rejected", tier=group.name)
+            raise QueueFull(f"Too many {group.name} jobs queued", retry_after=self.retry_after(group.name))
+
+        job = _Job(tenant, group.name, asyncio.get_running_loop().create_future())
+        if not group.backlog():
+            # Returning from idle: no credit for the time spent without work
+            group.finish = max(group.finish, self.virtual_time)
+            group.last_served = time.monotonic()
+        if waiting is None:
+            waiting = group.tenants[tenant] = deque()
+            group.order.append(tenant)
+        waiting.append(job)
+        self._dispatch()
+        try:
+            await job.future
+        except asyncio.CancelledError:
+            # Client went away: drop the job, or hand back a slot it was just given
+            if job.future.done() and not job.future.cancelled():
+                self.release(job)
+            else:
+                self._discard(job)
+            raise
+        return job
+
+    def release(self, job: _Job) -> None:
+        self.running -= 1
+        self.running_by_tenant[job.tenant] -= 1
+        if not self.running_by_tenant[job.tenant]:
+            del self.running_by_tenant[job.tenant]
+        self._dispatch()
+
+    def _discard(self, job: _Job) -> None:
+        group = self.tiers[job.tier]
+        waiting = group.tenants.get(job.tenant)
+        if waiting and job in waiting:
+            waiting.remove(job)
+            if not waiting:
+                del group.tenants[job.tenant]
+                group.order.remove(job.tenant)
+
+    def _eligible(self, group: _Tier) -> Optional[str]:
+        """Next tenant of the tier in round-robin order that is under its running cap"""
+        for _ in range(len(group.order)):
+            tenant = group.order[0]
+            group.order.rotate(-1)
+            if self.running_by_tenant.get(tenant, 0) < group.max_running:
+                return tenant
+        return None
+
+    def _starved(self) -> Optional[_Job]:
+        now = time.monotonic()
+        for group in sorted(self.tiers.values(), key=lambda g: g.last_served):
+            if now - group.last_served < self.starvation:
+                break
+            if group.tenants:
+                tenant = self._eligible(group)
+                if tenant is not None:
+                    return group.tenants[tenant][0]
+        return None
+
+    def _next(self) -> Optional[_Job]:
+        job = self._starved()
+        if job is not None:
+            self.stats["starvation_boosts"] += 1
+            return job
+        for group in sorted(self.tiers.values(), key=lambda g: g.finish):
+            if not group.tenants:
+                continue
+            tenant = self._eligible(group)
+            if tenant is not None:
+                return group.tenants[tenant][0]
+        return None
+
+    def _dispatch(self) -> None:
+        while self.running < self.slots:
+            job = self._next()
+            if job is None:
+                return
+            group = self.tiers[job.tier]
+            self._discard(job)
+            # Virtual start is the later of the tier's last finish and system virtual time
+            self.virtual_time = max(self.virtual_time, group.finish)
+            group.finish = max(group.finish, self.virtual_time) + 1.0 / group.weight
+            group.last_served = time.monotonic()
+            self.running += 1
+            self.running_by_tenant[job.tenant] = self.running_by_tenant.get(job.tenant, 0) + 1
+            self.stats["served"] += 1
+            metrics.observe("queue_wait_seconds", time.monotonic() - job.enqueued, tier=job.tier)
+            job.future.set_result(None)
+
+    def retry_after(self, tier: str) -> float:
+        """Time for the tier's backlog to clear at its share of the slots"""
+        group = self.tiers[tier]
+        share = group.weight / sum(g.weight for g in self.tiers.values())
+        return max(group.backlog() / max(self.slots * share, 1e-6) * 10.0, 1.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "slots": self.slots,
+            "running": self.running,
+            "queued": {name: group.backlog() for name, group in self.tiers.items()},
+        }
+
+
+# Shared by every upload in the process
+SCHEDULER = Scheduler.from_env()
+
+
+# Simulation: python scheduler.py [seconds]
+if __name__ == "__main__":
+    import random
+
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 20
+    metrics.reset()
+
+    async def simulate():
+        scheduler = Scheduler(slots=4, max_queue=32, max_queue_per_tenant=8, starvation=10.0)
+        stop = time.monotonic() + duration
+        outcomes: Dict[str, List[float]] = {}
+
+        async def tenant(name: str, tier: str, interval: float, burst: int = 1):
+            rng = random.Random(name)
+            jobs = []
+            while time.monotonic() < stop:
+                for _ in range(burst):
+                    jobs.append(asyncio.create_task(job(name, tier, rng.uniform(0.2, 0.6))))
+                await asyncio.sleep(rng.expovariate(1 / interval))
+            await asyncio.gather(*jobs, return_exceptions=True)
+
+        async def job(name: str, tier: str, seconds: float):
+            start = time.monotonic()
+            try:
+                ticket = await scheduler.acquire(name, tier)
+            except QueueFull:
+                outcomes.setdefault(f"{tier} rejected", []).append(0)
+                return
+            outcomes.setdefault(tier, []).append(time.monotonic() - start)
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                scheduler.release(ticket)
+
+        # A free-tier burst (20 tenants uploading several plans at once) against steady paying traffic
+        clients = [tenant(f"free_{i}", "Free", 4.0, burst=3) for i in range(20)]
+        clients += [tenant(f"pro_{i}", "Professional", 2.0) for i in range(3)]
+        clients += [tenant(f"mid_{i}", "Intermediate", 2.0) for i in range(3)]
+        await asyncio.gather(*clients)
+        return scheduler, outcomes
+
+    scheduler, outcomes = asyncio.run(simulate())
+    for tier, waits in sorted(outcomes.items()):
+        if tier.endswith("rejected"):
+            print(f"🚦 {tier}: {len(waits)}")
+            continue
+        waits.sort()
+        print(f"⏱️ {tier:13s} {len(waits):4d} jobs, wait p50 {waits[len(waits) // 2]:.2f}s, "
+              f"p99 {waits[int(len(waits) * 0.99)]:.2f}s, max {waits[-1]:.2f}s")
+    print(f"📊 {scheduler.snapshot()}")
@@ -0,0 +1,514 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import zlib
+from pathlib import Path
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+import orjson
+
+from fingerprint import decode_cells, encode_cells, from_signed, to_signed
+
+DB_PATH = Path(os.getenv("ANALYSIS_DB", "data/analyses.db"))
+COMPRESSION_LEVEL = 6
+# Request profiles kept; older ones are dropped on insert
+PROFILES_KEPT = int(os.getenv("PROFILES_KEPT", "500"))
+# Finished job records kept for status queries
+JOBS_KEPT_SECONDS = 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    project_id TEXT,
+    filename TEXT,
+    created_at REAL NOT NULL,
+    owner TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_hash ON analyses (content_hash);
+CREATE INDEX IF NOT EXISTS idx_analyses_project ON analyses (project_id, created_at);
+
+-- A project belongs to the verified tenant that first uploaded to it
+CREATE TABLE IF NOT EXISTS projects (
+    project_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    created_at REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sections (
+    analysis_id TEXT NOT NULL REFERENCES analyses (id) ON DELETE CASCADE,
+    section TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (analysis_id, section)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_sections_section ON sections (section);
+
+CREATE TABLE IF NOT EXISTS pages (
+    analysis_id TEXT NOT NULL REFERENCES analyses (id) ON DELETE CASCADE,
+    page INTEGER NOT NULL,
+    phash INTEGER NOT NULL,
+    cells BLOB NOT NULL,
+    data BLOB,
+    PRIMARY KEY (analysis_id, page)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS profiles (
+    request_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_profiles_created ON profiles (created_at);
+
+-- Scales were once keyed by page fingerprint alone, which unrelated sheets can share
+DROP TABLE IF EXISTS calibrations;
+CREATE TABLE IF NOT EXISTS page_calibrations (
+    content_hash TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (content_hash, page)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS jobs (
+    content_hash TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    filename TEXT,
+    stage TEXT,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    analysis_id TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, updated_at);
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+
+_JOB_COLUMNS = "content_hash, status, owner, filename, stage, started_at, updated_at, expires_at, analysis_id, error"
+
+
+def _pack(value: Any) -> bytes:
+    return zlib.compress(orjson.dumps(value), COMPRESSION_LEVEL)
+
+
+def _unpack(blob: bytes) -> Any:
+    return orjson.loads(zlib.decompress(blob))
+
+
+def connect(db_path: Optional[Path] = None) -> sqlite3.Connection:
+    """Per-thread connection to the analysis store (WAL mode)"""
+    path = Path(db_path or DB_PATH)
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is not None:
+        return conn
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    with _init_lock:
+        if path not in _initialized:
+            # Stores created before analyses had owners: their rows stay unowned
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(analyses)")}
+            if columns and "owner" not in columns:
+                conn.execute("ALTER TABLE analyses ADD COLUMN owner TEXT")
+            conn.executescript(SCHEMA)
+            _initialized.add(path)
+    connections[path] = conn
+    return conn
+
+
+def save_analysis(result: Dict[str, Any], content_hash: str, project_id: Optional[str] = None,
+                  filename: Optional[str] = None, pages: Optional[List[Dict[str, Any]]] = None,
+                  owner: Optional[str] = None, db_path: Optional[Path] = None) -> str:
+    """Store a parse result, one compressed blob per top-level section.
+
+    pages are the per-page fingerprints and raw page results that let the
+    next revision of the same set reuse unchanged sheets. owner is the
+    verified tenant that uploaded it (None for anonymous uploads).
+    """
+    conn = connect(db_path)
+    analysis_id = str(uuid.uuid4())
+    rows = [(analysis_id, section, _pack(value)) for section, value in result.items()]
+    page_rows = [
+        (analysis_id, i, to_signed(p["hash"]), encode_cells(p["cells"]),
+         _pack(p["data"]) if p.get("data") is not None else None)
+        for i, p in enumerate(pages or [])
+    ]
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "INSERT INTO analyses (id, content_hash, project_id, filename, created_at, owner) VALUES (?, ?, ?, ?, ?, ?)",
+            (analysis_id, content_hash, project_id, filename, time.time(), owner),
+        )
+        conn.executemany("INSERT INTO sections (analysis_id, section, data) VALUES (?, ?, ?)", rows)
+        if page_rows:
+            conn.executemany(
+                "INSERT INTO pages (analysis_id, page, phash, cells, data) VALUES (?, ?, ?, ?, ?)", page_rows
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return analysis_id
+
+
+def update_analysis(analysis_id: str, edit: Callable[[Dict[str, Any]], Dict[str, Any]],
+                    db_path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    """Apply edit to a stored result and write back only the sections it reports.
+
+    edit mutates the result and returns {"changed": [...], "removed": [...], ...};
+    the read and the write share one transaction so concurrent edits serialise.
+    Returns edit's report, or None if the analysis does not exist.
+    """
+    conn = connect(db_path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute("SELECT section, data FROM sections WHERE analysis_id = ?", (analysis_id,)).fetchall()
+        if not rows:
+            conn.execute("ROLLBACK")
+            return None
+        result = {section: _unpack(data) for section, data in rows}
+        report = edit(result)
+        conn.executemany(
+            "INSERT OR REPLACE INTO sections (analysis_id, section, data) VALUES (?, ?, ?)",
+            [(analysis_id, section, _pack(result[section])) for section in report["changed"]],
+        )
+        conn.executemany(
+            "DELETE FROM sections WHERE analysis_id = ? AND section = ?",
+            [(analysis_id, section) for section in report["removed"]],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return report
+
+
+def save_profile(request_id: str, data: Dict[str, Any], db_path: Optional[Path] = None) -> None:
+    conn = connect(db_path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("INSERT OR REPLACE INTO profiles (request_id, created_at, data) VALUES (?, ?, ?)",
+                     (request_id, time.time(), _pack(data)))
+        conn.execute(
+            "DELETE FROM profiles WHERE created_at < "
+            "(SELECT created_at FROM profiles ORDER BY created_at DESC LIMIT 1 OFFSET ?)",
+            (PROFILES_KEPT - 1,),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def get_profile(request_id: str, db_path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    conn = connect(db_path)
+    row = conn.execute("SELECT data FROM profiles WHERE request_id = ?", (request_id,)).fetchone()
+    return _unpack(row[0]) if row else None
+
+
+def list_profiles(limit: int = 50, db_path: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """Most recent profiles, without their samples"""
+    conn = connect(db_path)
+    rows = conn.execute("SELECT data FROM profiles ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+    return [
+        {k: v for k, v in _unpack(data).items() if k not in ("samples", "spans")}
+        for (data,) in rows
+    ]
+
+
+def save_calibration(content_hash: str, page: int, data: Dict[str, Any], db_path: Optional[Path] = None) -> None:
+    """Scale found on a page of an upload"""
+    connect(db_path).execute(
+        "INSERT OR REPLACE INTO page_calibrations (content_hash, page, created_at, data) VALUES (?, ?, ?, ?)",
+        (content_hash, page, time.time(), _pack(data)),
+    )
+
+
+def get_calibration(content_hash: str, page: int, db_path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    row = connect(db_path).execute(
+        "SELECT data FROM page_calibrations WHERE content_hash = ? AND page = ?", (content_hash, page)
+    ).fetchone()
+    return _unpack(row[0]) if row else None
+
+
+def claim_job(content_hash: str, owner: str, expires_at: float, filename: Optional[str] = None,
+              db_path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    """Take the analysis of an upload for owner, or return the job that holds it.
+
+    Finished jobs and running ones whose lease expired (their worker died)
+    are taken over; a running job with a live lease, or a done one, is
+    returned as is.
+    """
+    conn = connect(db_path)
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE content_hash = ?", (content_hash,)).fetchone()
+        if row is not None and (row[1] == "done" or (row[1] == "running" and row[7] > now)):
+            conn.execute("COMMIT")
+            return _job(row)
+        conn.execute(
+            "INSERT OR REPLACE INTO jobs (content_hash, status, owner, filename, stage, started_at, updated_at, "
+            "expires_at) VALUES (?, 'running', ?, ?, 'queued', ?, ?, ?)",
+            (content_hash, owner, filename, now, now, expires_at),
+        )
+        conn.execute("DELETE FROM jobs WHERE status != 'running' AND updated_at < ?", (now - JOBS_KEPT_SECONDS,))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return None
+
+
+def renew_jobs(leases: List[Tuple[str, str]], expires_at: float, db_path: Optional[Path] = None) -> None:
+    """Extend the leases of running jobs, given as (content_hash, owner) pairs"""
+    conn = connect(db_path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "UPDATE jobs SET expires_at = ? WHERE content_hash = ? AND owner = ? AND status = 'running'",
+            [(expires_at, content_hash, owner) for content_hash, owner in leases],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def update_job(content_hash: str, owner: str, stage: str, db_path: Optional[Path] = None) -> None:
+    connect(db_path).execute(
+        "UPDATE jobs SET stage = ?, updated_at = ? WHERE content_hash = ? AND owner = ? AND status = 'running'",
+        (stage, time.time(), content_hash, owner),
+    )
+
+
+def finish_job(content_hash: str, owner: str, analysis_id: Optional[str] = None, error: Optional[str] = None,
+               db_path: Optional[Path] = None) -> None:
+    """Mark owner's job done (with the stored analysis) or failed"""
+    connect(db_path).execute(
+        "UPDATE jobs SET status = ?, stage = NULL, updated_at = ?, analysis_id = ?, error = ? "
+        "WHERE content_hash = ? AND owner = ? AND status = 'running'",
+        ("done" if analysis_id else "failed", time.time(), analysis_id, error, content_hash, owner),
+    )
+
+
+def get_job(content_hash: str, db_path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    row = connect(db_path).execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE content_hash = ?",
+                                   (content_hash,)).fetchone()
+    return _job(row) if row else None
+
+
+def list_jobs(status: str = "running", limit: int = 50, db_path: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """Jobs in a status across all workers, most recently updated first"""
+    rows = connect(db_path).execute(
+        f"SELECT {_JOB_COLUMNS} FROM jobs WHERE status = ? ORDER BY updated_at DESC LIMIT ?", (status, limit)
+    ).fetchall()
+    return [_job(row) for row in rows]
+
+
+def _job(row) -> Dict[str, Any]:
+    return dict(zip(_JOB_COLUMNS.split(", "), row))
+
+
+def get_analysis(analysis_id: str, db_path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    """Full stored result, or None"""
+    conn = connect(db_path)
+    rows = conn.execute("SELECT section, data FROM sections WHERE analysis_id = ?", (analysis_id,)).fetchall()
+    if not rows:
+        return None
+    return {section: _unpack(data) for section, data in rows}
+
+
+def digest(analysis_id: str, section: Optional[str] = None, db_path: Optional[Path] = None) -> Optional[str]:
+    """Content hash of a stored analysis (or one section) for ETags, without decoding it"""
+    conn = connect(db_path)
+    query = "SELECT section, data FROM sections WHERE analysis_id = ?"
+    params: tuple = (analysis_id,)
+    if section is not None:
+        query += " AND section = ?"
+        params += (section,)
+    rows = conn.execute(query + " ORDER BY section", params).fetchall()
+    if not rows:
+        return None
+    h = hashlib.blake2b(digest_size=12)
+    for name, data in rows:
+        h.update(name.encode())
+        h.update(data)
+    return h.hexdigest()
+
+
+def get_section(analysis_id: str, section: str, db_path: Optional[Path] = None) -> Optional[Any]:
+    """A single stored section (e.g. "rooms"), without decoding the rest"""
+    conn = connect(db_path)
+    row = conn.execute(
+        "SELECT data FROM sections WHERE analysis_id = ? AND section = ?", (analysis_id, section)
+    ).fetchone()
+    return _unpack(row[0]) if row else None
+
+
+def get_pages(analysis_id: str, db_path: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """Page fingerprints and raw page results of an analysis, in page order.
+
+    origin is the (content hash, page) the page was read from, which its
+    calibration is stored under.
+    """
+    conn = connect(db_path)
+    rows = conn.execute(
+        "SELECT p.phash, p.cells, p.data, a.content_hash, p.page FROM pages p JOIN analyses a ON a.id = p.analysis_id "
+        "WHERE p.analysis_id = ? ORDER BY p.page", (analysis_id,)
+    ).fetchall()
+    return [
+        {"hash": from_signed(phash), "cells": decode_cells(cells), "data": _unpack(data) if data is not None else None,
+         "origin": (content_hash, page)}
+        for phash, cells, data, content_hash, page in rows
+    ]
+
+
+def latest_with_pages(project_id: str, owner: str, db_path: Optional[Path] = None) -> Optional[str]:
+    """Most recent analysis of owner's project that has page fingerprints"""
+    conn = connect(db_path)
+    row = conn.execute(
+        "SELECT a.id FROM analyses a WHERE a.project_id = ? AND a.owner = ? "
+        "AND EXISTS (SELECT 1 FROM pages p WHERE p.analysis_id = a.id) "
+        "ORDER BY a.created_at DESC LIMIT 1",
+        (project_id, owner),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def first_page_hashes(after_rowid: int = 0, db_path: Optional[Path] = None):
+    """(rowids, hashes) of every analysis' first page, for the near-duplicate index.
+
+    Copies served as near-duplicates of another analysis are left out; only
+    analyses stored after after_rowid are read when it is given.
+    """
+    conn = connect(db_path)
+    rows = conn.execute(
+        "SELECT a.rowid, p.phash FROM pages p JOIN analyses a ON a.id = p.analysis_id WHERE p.page = 0 "
+        "AND a.rowid > ? "
+        "AND NOT EXISTS (SELECT 1 FROM sections s WHERE s.analysis_id = a.id AND s.section = 'near_duplicate')",
+        (after_rowid,),
+    ).fetchall()
+    return [r[0] for r in rows], [from_signed(r[1]) for r in rows]
+
+
+def rowid_for_analysis(analysis_id: str, db_path: Optional[Path] = None) -> Optional[int]:
+    row = connect(db_path).execute("SELECT rowid FROM analyses WHERE id = ?", (analysis_id,)).fetchone()
+    return row[0] if row else None
+
+
+def analysis_id_for_rowid(rowid: int, db_path: Optional[Path] = None) -> Optional[str]:
+    row = connect(db_path).execute("SELECT id FROM analyses WHERE rowid = ?", (rowid,)).fetchone()
+    return row[0] if row else None
+
+
+def get_metadata(analysis_id: str, db_path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    conn = connect(db_path)
+    row = conn.execute(
+        "SELECT id, content_hash, project_id, filename, created_at FROM analyses WHERE id = ?", (analysis_id,)
+    ).fetchone()
+    return _metadata(row) if row else None
+
+
+def find_by_hash(content_hash: str, project_id: Optional[str] = None, owner: Optional[str] = None,
+                 db_path: Optional[Path] = None) -> Optional[str]:
+    """Most recent analysis id for identical file content, preferring one of owner's project_id"""
+    conn = connect(db_path)
+    row = conn.execute(
+        "SELECT id FROM analyses WHERE content_hash = ? "
+        "ORDER BY (project_id IS ? AND owner IS ?) DESC, created_at DESC LIMIT 1",
+        (content_hash, project_id, owner),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def list_project(project_id: str, owner: str, limit: int = 50, db_path: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """Analyses of owner's project, newest first"""
+    conn = connect(db_path)
+    rows = conn.execute(
+        "SELECT id, content_hash, project_id, filename, created_at FROM analyses "
+        "WHERE project_id = ? AND owner = ? ORDER BY created_at DESC LIMIT ?",
+        (project_id, owner, limit),
+    ).fetchall()
+    return [_metadata(row) for row in rows]
+
+
+def get_owner(analysis_id: str, db_path: Optional[Path] = None) -> Tuple[bool, Optional[str]]:
+    """(exists, owning tenant) of an analysis"""
+    row = connect(db_path).execute("SELECT owner FROM analyses WHERE id = ?", (analysis_id,)).fetchone()
+    return (True, row[0]) if row else (False, None)
+
+
+def claim_project(project_id: str, owner: str, db_path: Optional[Path] = None) -> bool:
+    """Whether owner owns the project, registering it to them if it is new"""
+    conn = connect(db_path)
+    conn.execute(
+        "INSERT OR IGNORE INTO projects (project_id, owner, created_at) VALUES (?, ?, ?)",
+        (project_id, owner, time.time()),
+    )
+    row = conn.execute("SELECT owner FROM projects WHERE project_id = ?", (project_id,)).fetchone()
+    return row is not None and row[0] == owner
+
+
+def project_owner(project_id: str, db_path: Optional[Path] = None) -> Optional[str]:
+    row = connect(db_path).execute("SELECT owner FROM projects WHERE project_id = ?", (project_id,)).fetchone()
+    return row[0] if row else None
+
+
+def _metadata(row) -> Dict[str, Any]:
+    return {
+        "analysis_id": row[0],
+        "content_hash": row[1],
+        "project_id": row[2],
+        "filename": row[3],
+        "created_at": row[4],
+    }
+
+
+# Benchmark: python store.py [n_analyses] [db_path]
+if __name__ == "__main__":
+    import random
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    path = Path(sys.argv[2]) if len(sys.argv) > 2 else Path("data/bench_analyses.db")
+    sample = {
+        "rooms": [{"roomType": "Bedroom", "length": "4.0", "width": "3.5", "height": "2.7"}] * 8,
+        "walls": [{"id": f"wall_{i}", "start": [0, i], "end": [4, i], "area": "10.8"} for i in range(16)],
+        "plumbing": [], "electrical": [], "finishes": [], "floors": 1, "analysis_method": "gemini_ai",
+    }
+
+    start = time.perf_counter()
+    ids = []
+    for i in range(n):
+        ids.append(save_analysis(sample, f"{i:064x}", project_id=f"project_{i % 1000}", owner="bench", db_path=path))
+    print(f"⏱️ Stored {n} analyses in {time.perf_counter() - start:.1f} s "
+          f"({path.stat().st_size / 1e6:.1f} MB on disk)")
+
+    probes = random.sample(range(n), min(n, 1000))
+    for label, fn in (
+        ("find_by_hash", lambda i: find_by_hash(f"{i:064x}", db_path=path)),
+        ("get_section(rooms)", lambda i: get_section(ids[i], "rooms", db_path=path)),
+        ("get_analysis", lambda i: get_analysis(ids[i], db_path=path)),
+        ("list_project", lambda i: list_project(f"project_{i % 1000}", "bench", db_path=path)),
+    ):
+        start = time.perf_counter()
+        for i in probes:
+            fn(i)
+        print(f"⏱️ {label:20s} {(time.perf_counter() - start) / len(probes) * 1e6:8.1f} µs/lookup")
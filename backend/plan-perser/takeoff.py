@@ -0,0 +1,473 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import json
+import math
+import sys
+import time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from geometry import room_id
+from quantities import DEFAULT_HEIGHT, _to_float
+
+# Defaults and formulas follow the browser calculators (QSSettings,
+# useMasonryCalculator, useConcreteCalculator, useRebarCalculator,
+# useRoofingCalculator) so server and client quantities agree.
+DEFAULT_SETTINGS = {
+    "mortarJointThicknessM": 0.01,
+    "mortarRatio": "1:4",
+    "plasterRatio": "1:4",
+    "wastageMasonry": 3,
+    "wastageConcrete": 5,
+    "wastageReinforcement": 4,
+    "wastageRoofing": 7,
+    "standardBarLength": 12,
+    "lapLengthFactor": 50,
+    "developmentLengthFactor": 40,
+    "slabCover": 0.02,
+    "beamCover": 0.025,
+    "columnCover": 0.025,
+    "foundationCover": 0.04,
+    "beamMainReinforcementRatio": 0.01,
+    "beamDistributionReinforcementRatio": 0.005,
+    "columnReinforcementRatio": 0.02,
+    "minSlabBars": 1,
+    "minBeamMainBars": 2,
+    "minBeamDistributionBars": 2,
+    "minColumnBars": 4,
+}
+PLASTER_THICKNESS = 0.015
+MORTAR_PER_SQM = 0.017
+CEMENT_BAG_M3 = 0.035
+CEMENT_BAG_KG = 50
+BLOCK_SIZES = {"Standard Block": (0.4, 0.2), "Half Block": (0.4, 0.2), "Brick": (0.225, 0.075)}
+DEFAULT_MIX = (1.0, 2.0, 4.0)
+GRADE_MIXES = {"C15": "1:3:6", "C20": "1:2:4", "C25": "1:1.5:3", "C30": "1:1:2"}
+
+REBAR_SIZES = ("Y8", "Y10", "Y12", "Y16", "Y20", "Y25")
+REBAR_DIAMETER_M = np.array([8, 10, 12, 16, 20, 25], dtype=np.float64) / 1000
+REBAR_KG_PER_M = np.array([0.395, 0.617, 0.888, 1.58, 2.47, 3.85])
+REBAR_AREA_MM2 = np.array([50.27, 78.54, 113.1, 201.06, 314.16, 490.87])
+MESH_KG_PER_M2 = {"A142": 2.22, "A193": 3.02, "A252": 3.95, "A393": 6.16, "C283": 4.34, "C385": 6.0}
+# Pitched covers grow by 1/cos(pitch); the others by a fixed allowance
+ROOF_FACTORS = {"hip": 1.1, "mansard": 1.2, "butterfly": 1.15}
+PITCHED_ROOFS = ("pitched", "gable", "skillion")
+# Pitches (degrees) outside this range are misreadings; the default pitch is used instead
+DEFAULT_PITCH = 30.0
+MAX_PITCH = 75.0
+
+# Per-element lines are serialised in batches of this many rows
+STREAM_BATCH = 500
+
+
+def _items(result: Dict[str, Any], section: str) -> List[Dict[str, Any]]:
+    return [item for item in result.get(section) or [] if isinstance(item, dict)]
+
+
+def _floats(items: List[Dict[str, Any]], key: str, default: float = 0.0) -> np.ndarray:
+    return np.fromiter((_to_float(item.get(key), default) for item in items), dtype=np.float64, count=len(items))
+
+
+def _ratio(text: Any, default: Tuple[float, ...]) -> Tuple[float, ...]:
+    """Parts of a "1:2:4" style mix, or default if it does not parse"""
+    text = GRADE_MIXES.get(str(text or "").strip().upper(), text)
+    try:
+        parts = tuple(float(p) for p in str(text).split(":"))
+    except ValueError:
+        return default
+    return parts if len(parts) == len(default) and all(p > 0 for p in parts) else default
+
+
+def _gross(value: float, wastage: float) -> float:
+    return value * (1 + wastage / 100)
+
+
+def _rows(columns: Dict[str, Any], decimals: int = 3) -> Iterator[Dict[str, Any]]:
+    """Column arrays as one dict per element"""
+    lists = {k: (np.round(v, decimals).tolist() if isinstance(v, np.ndarray) and v.dtype.kind == "f"
+                 else v.tolist() if isinstance(v, np.ndarray) else v)
+             for k, v in columns.items()}
+    keys = list(lists)
+    for values in zip(*(lists[k] for k in keys)):
+        yield dict(zip(keys, values))
+
+
+def masonry(rooms: List[Dict[str, Any]], settings: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Blocks, mortar and plaster per room, from its connectivity walls where present"""
+    n = len(rooms)
+    joint = float(settings["mortarJointThicknessM"])
+    length, width = _floats(rooms, "length"), _floats(rooms, "width")
+    height = _floats(rooms, "height", DEFAULT_HEIGHT)
+    sizes = []
+    for room in rooms:
+        custom = room.get("customBlock") or {}
+        if room.get("blockType") == "Custom" and _to_float(custom.get("length")) and _to_float(custom.get("height")):
+            sizes.append((_to_float(custom["length"]), _to_float(custom["height"])))
+        else:
+            sizes.append(BLOCK_SIZES.get(room.get("blockType"), BLOCK_SIZES["Brick"]))
+    block = np.array(sizes, dtype=np.float64).reshape(n, 2) + joint
+
+    owner, wall_length, wall_height, wall_net, shared = [], [], [], [], []
+    for index, room in enumerate(rooms):
+        for wall in ((room.get("wallConnectivity") or {}).get("walls") or {}).values():
+            if isinstance(wall, dict):
+                owner.append(index)
+                wall_length.append(_to_float(wall.get("length")))
+                wall_height.append(_to_float(wall.get("height"), height[index]))
+                wall_net.append(_to_float(wall.get("netArea"), wall_length[-1] * wall_height[-1]))
+                shared.append(wall.get("type") == "shared")
+    owner = np.array(owner, dtype=np.int64)
+    wall_length, wall_height = np.array(wall_length), np.array(wall_height)
+    wall_net, shared = np.array(wall_net), np.array(shared, dtype=bool)
+
+    # Shared walls are built once, so each side counts half the blocks
+    wall_blocks = np.ceil(wall_length / block[owner, 0]) * np.ceil(wall_height / block[owner, 1])
+    wall_blocks = np.where(shared, np.ceil(wall_blocks * 0.5), wall_blocks)
+    has_walls = np.bincount(owner, minlength=n) > 0
+    perimeter = 2 * (length + width)
+    valid = (length > 0) & (width > 0) & (height > 0)
+    blocks = np.where(has_walls, np.bincount(owner, wall_blocks, minlength=n),
+                      np.ceil(perimeter / block[:, 0]) * np.ceil(height / block[:, 1]))
+    net_area = np.where(has_walls, np.bincount(owner, wall_net, minlength=n), perimeter * height)
+    shared_area = np.bincount(owner, wall_net * shared, minlength=n)
+    blocks, net_area, shared_area = blocks * valid, net_area * valid, shared_area * valid
+
+    # Both-sides plaster covers shared walls once (the neighbour plasters its own side)
+    plaster = np.array([str(room.get("plaster") or "") for room in rooms], dtype=str)
+    plaster_area = np.select([plaster == "One Side", plaster == "Both Sides"],
+                             [net_area, (net_area - shared_area) * 2 + shared_area], 0.0)
+
+    mortar_cement, mortar_sand = _ratio(settings["mortarRatio"], (1.0, 4.0))
+    plaster_cement, plaster_sand = _ratio(settings["plasterRatio"], (1.0, 4.0))
+    mortar_m3 = net_area * MORTAR_PER_SQM
+    plaster_m3 = plaster_area * PLASTER_THICKNESS
+    columns = {
+        "id": [room_id(room, i) for i, room in enumerate(rooms)],
+        "name": [room.get("room_name") or room.get("roomType") for room in rooms],
+        "floor": [room.get("floor") for room in rooms],
+        "blocks": blocks.astype(np.int64),
+        "netWallArea": net_area,
+        "mortarM3": mortar_m3,
+        "mortarCementKg": mortar_m3 * mortar_cement / (mortar_cement + mortar_sand) / CEMENT_BAG_M3 * CEMENT_BAG_KG,
+        "mortarSandM3": mortar_m3 * mortar_sand / (mortar_cement + mortar_sand),
+        "plasterArea": plaster_area,
+        "plasterCementKg": plaster_m3 * plaster_cement / (plaster_cement + plaster_sand) / CEMENT_BAG_M3 * CEMENT_BAG_KG,
+        "plasterSandM3": plaster_m3 * plaster_sand / (plaster_cement + plaster_sand),
+    }
+    wastage = float(settings["wastageMasonry"])
+    cement_kg = float(columns["mortarCementKg"].sum() + columns["plasterCementKg"].sum())
+    totals = {
+        "netBlocks": int(blocks.sum()),
+        "grossBlocks": int(math.ceil(_gross(float(blocks.sum()), wastage))),
+        "netWallArea": round(float(net_area.sum()), 2),
+        "plasterArea": round(float(plaster_area.sum()), 2),
+        "cementKg": round(_gross(cement_kg, wastage), 1),
+        "cementBags": math.ceil(_gross(cement_kg, wastage) / CEMENT_BAG_KG),
+        "sandM3": round(_gross(float(columns["mortarSandM3"].sum() + columns["plasterSandM3"].sum()), wastage), 3),
+    }
+    return columns, totals
+
+
+def concrete(items: List[Dict[str, Any]], settings: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Volume per structure and cement/sand/ballast per mix"""
+    length, width, height = _floats(items, "length"), _floats(items, "width"), _floats(items, "height")
+    number = np.maximum(_floats(items, "number", 1.0), 1.0)
+    element = np.array([str(item.get("element") or "") for item in items], dtype=str)
+    steps = np.ceil(height / 0.15)
+    volume = np.select(
+        [element == "staircase", element == "soak-pit"],
+        [0.3 * 0.15 * width / 2 * steps, np.pi * (length / 2) ** 2 * height],
+        length * width * height,
+    ) * number
+
+    mixes = [str(item.get("mix") or "1:2:4") for item in items]
+    names, inverse = np.unique(np.array(mixes, dtype=str), return_inverse=True)
+    parts = np.array([_ratio(name, DEFAULT_MIX) for name in names], dtype=np.float64).reshape(-1, 3)
+    share = (parts / parts.sum(axis=1, keepdims=True))[inverse]
+    cement_m3, sand_m3, ballast_m3 = (volume[:, None] * share).T
+    columns = {
+        "id": [item.get("id") for item in items],
+        "name": [item.get("name") for item in items],
+        "element": element,
+        "mix": mixes,
+        "volumeM3": volume,
+        "cementBags": cement_m3 / CEMENT_BAG_M3,
+        "sandM3": sand_m3,
+        "ballastM3": ballast_m3,
+    }
+    wastage = float(settings["wastageConcrete"])
+    by_mix = {}
+    for k, name in enumerate(names):
+        mask = inverse == k
+        by_mix[str(name)] = {
+            "volumeM3": round(float(volume[mask].sum()), 3),
+            "cementBags": math.ceil(_gross(float(columns["cementBags"][mask].sum()), wastage)),
+            "sandM3": round(_gross(float(sand_m3[mask].sum()), wastage), 3),
+            "ballastM3": round(_gross(float(ballast_m3[mask].sum()), wastage), 3),
+        }
+    return columns, {"volumeM3": round(float(volume.sum()), 3), "byMix": by_mix}
+
+
+def _size_index(items: List[Dict[str, Any]], key: str, default: np.ndarray) -> np.ndarray:
+    lookup = {size: i for i, size in enumerate(REBAR_SIZES)}
+    values = np.fromiter((lookup.get(str(item.get(key) or "").upper(), -1) for item in items),
+                         dtype=np.int64, count=len(items))
+    return np.where(values >= 0, values, default)
+
+
+def _bars_by_ratio(cross: np.ndarray, size: np.ndarray, ratio: float, minimum: int, given: np.ndarray) -> np.ndarray:
+    required = np.ceil(cross * ratio * 1e6 / REBAR_AREA_MM2[size])
+    return np.where(given > 0, given, np.maximum(minimum, required))
+
+
+def _stock_length(required: np.ndarray, stock: float, lap: np.ndarray) -> np.ndarray:
+    """Bought length of one run: whole stock bars, lapped when longer than a bar"""
+    bars = np.where(required <= 0, 0, np.where(required <= stock, 1, np.ceil(required / np.maximum(stock - lap, 0.1))))
+    return bars * stock
+
+
+def rebar(items: List[Dict[str, Any]], settings: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Bar weights per element and per size; mesh slabs by sheet and weight.
+
+    Slabs and foundations use a bar grid at the given spacings, beams and
+    columns a bar count from the reinforcement ratio plus stirrups or ties.
+    Other elements (strip footings, tanks, retaining walls) are approximated
+    with the slab grid over their plan area and flagged as such.
+    """
+    n = len(items)
+    element = np.array([str(item.get("element") or "") for item in items], dtype=str)
+    length, width, depth = _floats(items, "length"), _floats(items, "width"), _floats(items, "depth")
+    column_height = np.where(_floats(items, "columnHeight") > 0, _floats(items, "columnHeight"), length)
+    count = np.maximum(_floats(items, "number", 1.0), 1.0)
+    layers = np.maximum(_floats(items, "slabLayers", 1.0), 1.0)
+    main_spacing = _floats(items, "mainBarSpacing", 200.0) / 1000
+    dist_spacing = _floats(items, "distributionBarSpacing", 200.0) / 1000
+    stirrup_spacing = _floats(items, "stirrupSpacing", 200.0) / 1000
+    tie_spacing = _floats(items, "tieSpacing", 250.0) / 1000
+    main = _size_index(items, "mainBarSize", np.full(n, REBAR_SIZES.index("Y12")))
+    dist = _size_index(items, "distributionBarSize", main)
+    stirrup = _size_index(items, "stirrupSize", np.full(n, 0))
+    tie = _size_index(items, "tieSize", np.full(n, 0))
+    mesh = np.array([item.get("reinforcementType") == "mesh" for item in items], dtype=bool) \
+        & np.isin(element, ("slab", "foundation"))
+
+    is_beam, is_column = element == "beam", element == "column"
+    is_grid = ~is_beam & ~is_column & ~mesh
+    cover = np.select([element == "slab", is_beam, is_column],
+                      [settings["slabCover"], settings["beamCover"], settings["columnCover"]],
+                      settings["foundationCover"])
+    valid = (length > 0) & (width > 0) & (depth > 0) & (~is_column | (column_height > 0))
+    dev_main = settings["developmentLengthFactor"] * REBAR_DIAMETER_M[main]
+    dev_dist = settings["developmentLengthFactor"] * REBAR_DIAMETER_M[dist]
+    lap = settings["lapLengthFactor"] * REBAR_DIAMETER_M[main]
+    stock = float(settings["standardBarLength"])
+
+    # Slab grid: bars at spacing each way, anchored at both ends
+    grid_main = np.maximum(settings["minSlabBars"], np.ceil(length / np.maximum(main_spacing, 0.001)) + 1)
+    grid_dist = np.maximum(settings["minSlabBars"], np.ceil(width / np.maximum(dist_spacing, 0.001)) + 1)
+
+    # Beams and columns: bar count from the section area and steel ratio
+    cross = width * depth
+    given_main, given_dist = _floats(items, "mainBarsCount"), _floats(items, "distributionBarsCount")
+    beam_main = _bars_by_ratio(cross, main, settings["beamMainReinforcementRatio"],
+                               settings["minBeamMainBars"], given_main)
+    beam_dist = _bars_by_ratio(cross, dist, settings["beamDistributionReinforcementRatio"],
+                               settings["minBeamDistributionBars"], given_dist)
+    column_main = _bars_by_ratio(cross, main, settings["columnReinforcementRatio"],
+                                 settings["minColumnBars"], given_main)
+    clear = np.maximum(0.0, np.where(is_column, column_height, length) - 2 * cover)
+
+    main_bars = np.select([is_grid, is_beam, is_column], [grid_main, beam_main, column_main], 0.0)
+    dist_bars = np.select([is_grid, is_beam], [grid_dist, beam_dist], 0.0)
+    main_length = np.select(
+        [is_grid, is_beam | is_column],
+        [grid_main * (width + 2 * dev_main) * layers, main_bars * _stock_length(clear + 2 * dev_main, stock, lap)],
+        0.0,
+    ) * count
+    dist_length = np.select(
+        [is_grid, is_beam],
+        [grid_dist * (length + 2 * dev_dist) * layers, beam_dist * _stock_length(clear + 2 * dev_dist, stock, lap)],
+        0.0,
+    ) * count
+
+    # Links round the section inside the cover, with two hooks less the bends
+    link_diameter = REBAR_DIAMETER_M[np.where(is_column, tie, stirrup)]
+    link_spacing = np.where(is_column, tie_spacing, stirrup_spacing)
+    links = np.where(is_beam | is_column, np.maximum(2, np.floor(clear / np.maximum(link_spacing, 0.001)) + 1), 0)
+    link_length = np.maximum(0.0, 2 * (np.maximum(0, width - 2 * cover) + np.maximum(0, depth - 2 * cover))
+                             + 2 * np.maximum(0.075, 10 * link_diameter) - 2 * link_diameter)
+    links_length = links * link_length * count
+
+    main_length, dist_length, links_length = main_length * valid, dist_length * valid, links_length * valid
+    link_size = np.where(is_column, tie, stirrup)
+    main_kg = main_length * REBAR_KG_PER_M[main]
+    dist_kg = dist_length * REBAR_KG_PER_M[dist]
+    links_kg = links_length * REBAR_KG_PER_M[link_size]
+
+    # Mesh: sheets with laps each way, weight on the net area
+    sheet_length = _floats(items, "meshSheetLength", 4.8)
+    sheet_width = _floats(items, "meshSheetWidth", 2.4)
+    mesh_lap = _floats(items, "meshLapLength", 0.3)
+    grades = [str(item.get("meshGrade") or "A142") for item in items]
+    mesh_sheets = np.where(mesh & (length > 0) & (width > 0),
+                           np.ceil(length / np.maximum(sheet_length - mesh_lap, 0.1))
+                           * np.ceil(width / np.maximum(sheet_width - mesh_lap, 0.1)) * count, 0)
+    mesh_kg = np.where(mesh_sheets > 0, length * width * count
+                       * np.array([MESH_KG_PER_M2.get(g, MESH_KG_PER_M2["A142"]) for g in grades]), 0.0)
+
+    columns = {
+        "id": [item.get("id") for item in items],
+        "name": [item.get("name") for item in items],
+        "element": element,
+        "mainBarSize": [REBAR_SIZES[i] for i in main.tolist()],
+        "mainBars": (main_bars * count * valid).astype(np.int64),
+        "mainKg": main_kg,
+        "distributionBarSize": [REBAR_SIZES[i] for i in dist.tolist()],
+        "distributionBars": (dist_bars * count * valid).astype(np.int64),
+        "distributionKg": dist_kg,
+        "linkSize": [REBAR_SIZES[i] for i in link_size.tolist()],
+        "links": (links * count * valid).astype(np.int64),
+        "linksKg": links_kg,
+        "meshSheets": mesh_sheets.astype(np.int64),
+        "meshKg": mesh_kg,
+        "totalKg": main_kg + dist_kg + links_kg + mesh_kg,
+        "approximate": is_grid & ~np.isin(element, ("slab", "foundation")),
+    }
+    wastage = float(settings["wastageReinforcement"])
+    by_size = (np.bincount(main, main_kg, minlength=len(REBAR_SIZES))
+               + np.bincount(dist, dist_kg, minlength=len(REBAR_SIZES))
+               + np.bincount(link_size, links_kg, minlength=len(REBAR_SIZES)))
+    totals = {
+        "bySizeKg": {size: round(_gross(float(kg), wastage), 1) for size, kg in zip(REBAR_SIZES, by_size) if kg > 0},
+        "meshSheets": int(mesh_sheets.sum()),
+        "meshKg": round(_gross(float(mesh_kg.sum()), wastage), 1),
+        "totalKg": round(_gross(float(columns["totalKg"].sum()), wastage), 1),
+    }
+    return columns, totals
+
+
+def roofing(items: List[Dict[str, Any]], settings: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Roof and covering area per roof, from the stated area or length x width with eaves"""
+    stated = _floats(items, "area")
+    pitch = _floats(items, "pitch", DEFAULT_PITCH)
+    pitch = np.radians(np.where((pitch >= 0) & (pitch <= MAX_PITCH), pitch, DEFAULT_PITCH))
+    overhang = _floats(items, "eavesOverhang", 0.5)
+    plan_area = (_floats(items, "length") + 2 * overhang) * (_floats(items, "width") + 2 * overhang)
+    kind = np.array([str(item.get("type") or "") for item in items], dtype=str)
+    factor = np.select(
+        [np.isin(kind, PITCHED_ROOFS)] + [kind == k for k in ROOF_FACTORS],
+        [1 / np.cos(pitch)] + list(ROOF_FACTORS.values()),
+        1.0,
+    )
+    area = np.where(stated > 0, stated, plan_area * factor)
+    covering = area * (1 + float(settings["wastageRoofing"]) / 100)
+    material = [str(item.get("material") or "unspecified") for item in items]
+    columns = {
+        "id": [item.get("id") for item in items],
+        "name": [item.get("name") for item in items],
+        "type": kind,
+        "material": material,
+        "areaM2": area,
+        "coveringAreaM2": covering,
+    }
+    by_material: Dict[str, float] = {}
+    for name, value in zip(material, covering.tolist()):
+        by_material[name] = by_material.get(name, 0.0) + value
+    return columns, {
+        "areaM2": round(float(area.sum()), 2),
+        "coveringAreaM2": round(float(covering.sum()), 2),
+        "coveringByMaterial": {k: round(v, 2) for k, v in by_material.items()},
+    }
+
+
+SECTIONS = (
+    ("masonry", "rooms", masonry),
+    ("concrete", "concreteStructures", concrete),
+    ("rebar", "reinforcement", rebar),
+    ("roofing", "roofing", roofing),
+)
+
+
+def _settings(overrides: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    settings = dict(DEFAULT_SETTINGS)
+    for key, value in (overrides or {}).items():
+        if key in settings:
+            settings[key] = value if isinstance(DEFAULT_SETTINGS[key], str) else _to_float(value, DEFAULT_SETTINGS[key])
+    return settings
+
+
+def takeoff(result: Dict[str, Any], overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Quantities of a parsed plan: per-element rows and totals for each trade"""
+    settings = _settings(overrides)
+    out = {}
+    for name, section, compute in SECTIONS:
+        columns, totals = compute(_items(result, section), settings)
+        out[name] = {"items": list(_rows(columns)), "totals": totals}
+    return out
+
+
+def stream_takeoff(result: Dict[str, Any], overrides: Optional[Dict[str, Any]] = None) -> Iterator[bytes]:
+    """The take-off as NDJSON: one line per element, then one totals line per trade.
+
+    Each trade is computed as a batch before its rows go out, so the client
+    starts receiving rows after the first trade rather than the whole plan.
+    """
+    settings = _settings(overrides)
+    for name, section, compute in SECTIONS:
+        columns, totals = compute(_items(result, section), settings)
+        batch = []
+        for row in _rows(columns):
+            batch.append(json.dumps({"section": name, **row}, separators=(",", ":")))
+            if len(batch) >= STREAM_BATCH:
+                yield ("\n".join(batch) + "\n").encode()
+                batch = []
+        batch.append(json.dumps({"section": name, "totals": totals}, separators=(",", ":")))
+        yield ("\n".join(batch) + "\n").encode()
+
+
+def _synthetic_project(n: int, seed: int = 3) -> Dict[str, Any]:
+    rng = np.random.default_rng(seed)
+    elements = ("slab", "beam", "column", "foundation", "strip-footing", "staircase")
+    rooms, structures, bars, roofs = [], [], [], []
+    for k in range(n):
+        walls = {side: {"id": f"w{k}{side}", "length": float(rng.uniform(2, 6)), "height": 2.7,
+                        "type": "shared" if side in ("north", "east") else "external",
+                        "netArea": float(rng.uniform(4, 15))} for side in ("north", "south", "east", "west")}
+        rooms.append({"room_name": f"Room {k}", "length": "4.0", "width": "3.5", "height": "2.7",
+                      "blockType": ("Standard Block", "Brick", "Half Block")[k % 3],
+                      "plaster": ("Both Sides", "One Side", "None")[k % 3],
+                      "wallConnectivity": {"roomId": f"room_{k}", "walls": walls} if k % 5 else {}})
+        element = elements[k % len(elements)]
+        structures.append({"id": f"c{k}", "element": element, "length": str(rng.uniform(0.3, 8)),
+                           "width": str(rng.uniform(0.2, 5)), "height": str(rng.uniform(0.15, 3)),
+                           "mix": ("1:2:4", "1:1.5:3", "C25")[k % 3], "number": str(k % 4 + 1)})
+        bars.append({"id": f"r{k}", "element": element, "length": str(rng.uniform(1, 8)),
+                     "width": str(rng.uniform(0.2, 5)), "depth": str(rng.uniform(0.15, 0.6)),
+                     "columnHeight": "3.0", "mainBarSize": REBAR_SIZES[k % 6], "number": "2",
+                     "reinforcementType": "mesh" if k % 11 == 0 else "individual_bars"})
+        if k % 10 == 0:
+            roofs.append({"id": f"roof{k}", "type": ("pitched", "hip", "flat")[k % 3], "pitch": 25,
+                          "length": 12, "width": 9, "material": "box-profile"})
+    return {"rooms": rooms, "concreteStructures": structures, "reinforcement": bars, "roofing": roofs}
+
+
+# Benchmark: python takeoff.py [elements_per_section]
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    project = _synthetic_project(n)
+    settings = _settings(None)
+    for name, section, compute in SECTIONS:
+        start = time.perf_counter()
+        compute(_items(project, section), settings)
+        print(f"⏱️ {name:9s} {len(_items(project, section)):6d} elements in "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms")
+    start = time.perf_counter()
+    first = None
+    size = 0
+    for chunk in stream_takeoff(project):
+        first = first or time.perf_counter() - start
+        size += len(chunk)
+    print(f"⏱️ streamed {size / 1e6:.1f} MB of NDJSON in {(time.perf_counter() - start) * 1000:.0f} ms "
+          f"(first rows after {first * 1000:.0f} ms)")
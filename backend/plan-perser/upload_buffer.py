@@ -0,0 +1,101 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import io
+import mmap
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator, Union
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+
+@contextmanager
+def map_file(fileobj) -> Iterator[memoryview]:
+    """Read-only memoryview over a real file, memory-mapped rather than read"""
+    fileobj.flush()
+    fileno = fileobj.fileno()
+    if os.fstat(fileno).st_size == 0:
+        yield memoryview(b"")
+        return
+    mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    try:
+        yield view
+    finally:
+        view.release()
+        mapped.close()
+
+
+@contextmanager
+def open_upload(fileobj) -> Iterator[memoryview]:
+    """Zero-copy view of an uploaded file.
+
+    Starlette spools uploads in memory up to 1 MB and rolls larger ones to a
+    single temp file. Small uploads are exposed through the BytesIO buffer,
+    large ones are memory-mapped; neither path copies the payload.
+    """
+    inner = getattr(fileobj, "_file", fileobj)  # SpooledTemporaryFile internals
+    if isinstance(inner, io.BytesIO):
+        view = inner.getbuffer()
+        try:
+            yield view
+        finally:
+            view.release()
+        return
+    try:
+        inner.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        # Unknown file-like object: fall back to a single read
+        fileobj.seek(0)
+        yield memoryview(fileobj.read())
+        return
+    with map_file(inner) as view:
+        yield view
+
+
+def _legacy_handoff(payload: bytes, upload_dir: str) -> int:
+    """Old path: read() into bytes, write to uploads/, re-read in the parser"""
+    contents = bytes(payload)  # await file.read()
+    path = os.path.join(upload_dir, "bench_upload.bin")
+    with open(path, "wb") as f:
+        f.write(contents)
+    with open(path, "rb") as f:
+        data = f.read()
+    os.remove(path)
+    return len(data)
+
+
+def _spooled(payload: bytes) -> tempfile.SpooledTemporaryFile:
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(payload)
+    spooled.seek(0)
+    return spooled
+
+
+# Benchmark: python upload_buffer.py
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as upload_dir:
+        for size in (200 * 1024, 5 * 1024 * 1024, 50 * 1024 * 1024):
+            payload = os.urandom(size)
+            spooled = _spooled(payload)
+            runs = 20
+
+            start = time.perf_counter()
+            for _ in range(runs):
+                spooled.seek(0)
+                _legacy_handoff(spooled.read(), upload_dir)
+            legacy = (time.perf_counter() - start) / runs * 1000
+
+            start = time.perf_counter()
+            for _ in range(runs):
+                with open_upload(spooled) as view:
+                    len(view)
+            zero_copy = (time.perf_counter() - start) / runs * 1000
+
+            print(f"⏱️ {size / 1024 / 1024:6.1f} MB: legacy 3 copies + disk round trip {legacy:8.2f} ms | "
+                  f"zero-copy {'memoryview' if size <= 1024 * 1024 else 'mmap':10s} {zero_copy:6.3f} ms",
+                  file=sys.stderr)
@@ -0,0 +1,288 @@
+# © 2025 Jeff. All rights reserved.
+# Unauthorized copying, distribution, or modification of this file is strictly prohibited.
+
+import sys
+import time
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+from geometry import _room_segments, SNAP_TOLERANCE
+from quantities import _to_float, _endpoints
+
+# Walls whose direction differs by less than this are treated as parallel
+ANGLE_TOLERANCE_DEG = 2.0
+MIN_WALL_LENGTH = 0.01
+
+
+def _clusters(keys: np.ndarray, values: np.ndarray, gap: float) -> np.ndarray:
+    """Label runs of sorted values that are within `gap` of the run's first value.
+
+    keys and values must already be sorted by (keys, values); a new cluster
+    starts when the key changes or the value is more than `gap` past the
+    cluster's first value, so jittered offsets cannot chain across a plan.
+    """
+    n = len(values)
+    labels = np.empty(n, dtype=np.int64)
+    if n == 0:
+        return labels
+    # Offset every key into its own band so one searchsorted covers all keys
+    span = float(values.max() - values.min()) + 2 * gap + 1.0
+    band = (np.cumsum(np.r_[True, keys[1:] != keys[:-1]]) - 1) * span
+    position = values - values.min() + band
+    start, label = 0, 0
+    while start < n:
+        stop = int(np.searchsorted(position, position[start] + gap, side="right"))
+        labels[start:stop] = label
+        start, label = stop, label + 1
+    return labels
+
+
+def _interval_clusters(keys: np.ndarray, lo: np.ndarray, hi: np.ndarray, gap: float) -> np.ndarray:
+    """Label overlapping (lo, hi) intervals within each key, sorted by (keys, lo)"""
+    n = len(lo)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    # Offset every key into its own band so one running max covers all keys
+    span = float(max(hi.max() - lo.min(), 1.0)) + 2 * gap + 1.0
+    band = (np.cumsum(np.r_[True, keys[1:] != keys[:-1]]) - 1) * span
+    reach = np.maximum.accumulate(hi - lo.min() + band)
+    new = np.ones(n, dtype=bool)
+    new[1:] = (lo[1:] - lo.min() + band[1:]) > reach[:-1] + gap
+    return np.cumsum(new) - 1
+
+
+def _groups(coords: np.ndarray, floors: np.ndarray, orientation: np.ndarray, tolerance: float) -> np.ndarray:
+    """Group label per segment: collinear and overlapping within one orientation bucket"""
+    n = len(coords)
+    theta = np.radians(orientation * ANGLE_TOLERANCE_DEG)
+    cos, sin = np.cos(theta), np.sin(theta)
+    across = -sin * (coords[:, 0] + coords[:, 2]) / 2 + cos * (coords[:, 1] + coords[:, 3]) / 2
+    along_a = cos * coords[:, 0] + sin * coords[:, 1]
+    along_b = cos * coords[:, 2] + sin * coords[:, 3]
+    lo, hi = np.minimum(along_a, along_b), np.maximum(along_a, along_b)
+
+    # Stage 1: snap parallel walls onto shared lines
+    order = np.lexsort((across, orientation, floors))
+    line_key = floors[order] * 1000 + orientation[order]
+    line = np.empty(n, dtype=np.int64)
+    line[order] = _clusters(line_key, across[order], tolerance)
+
+    # Stage 2: merge overlapping or touching intervals along each line
+    order = np.lexsort((lo, line))
+    group = np.empty(n, dtype=np.int64)
+    group[order] = _interval_clusters(line[order], lo[order], hi[order], tolerance)
+    return group
+
+
+def merge_segments(coords: np.ndarray, floors: np.ndarray, tolerance: float = SNAP_TOLERANCE) -> np.ndarray:
+    """Group collinear overlapping segments; returns a canonical index per segment.
+
+    Segments are indexed by (floor, orientation bucket, snapped offset) and
+    swept along their axis, so the pass is a handful of sorts over the batch.
+    Each segment is also tried in the bucket next to its own on the side its
+    angle leans, so near-parallel walls either side of a bucket edge still merge.
+    """
+    n = len(coords)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    dx = coords[:, 2] - coords[:, 0]
+    dy = coords[:, 3] - coords[:, 1]
+    buckets = int(round(180 / ANGLE_TOLERANCE_DEG))
+    scaled = (np.degrees(np.arctan2(dy, dx)) % 180.0) / ANGLE_TOLERANCE_DEG
+    orientation = np.round(scaled).astype(np.int64) % buckets
+    neighbour = (orientation + np.where(scaled >= np.round(scaled), 1, -1)) % buckets
+    group = _groups(np.vstack([coords, coords]), np.r_[floors, floors], np.r_[orientation, neighbour], tolerance)
+
+    # Segments grouped together in either bucket are one wall: spread the
+    # lowest index through shared groups until it settles. The canonical
+    # member is the first segment (input order) of each connected group.
+    canonical = np.arange(n)
+    while True:
+        lowest = np.full(group.max() + 1, n, dtype=np.int64)
+        np.minimum.at(lowest, group, np.r_[canonical, canonical])
+        spread = np.minimum(lowest[group[:n]], lowest[group[n:]])
+        if np.array_equal(spread, canonical):
+            return canonical
+        canonical = spread
+
+
+def _union(values) -> List[Any]:
+    return list(dict.fromkeys(v for vs in values for v in (vs or [])))
+
+
+def merge_walls(result: Dict[str, Any], tolerance: float = SNAP_TOLERANCE) -> Dict[str, Any]:
+    """Collapse duplicated, overlapping and split top-level walls in place.
+
+    Each group of collinear overlapping segments becomes one canonical wall
+    (keeping the first member's id), listing the ids it replaced in
+    `mergedFrom`; link_room_walls then points room walls at it. Walls
+    without usable coordinates are passed through unchanged.
+    """
+    walls = result.get("walls")
+    if not isinstance(walls, list):
+        return result
+    valid = [w for w in walls if isinstance(w, dict) and _endpoints(w) is not None]
+    if not valid:
+        return result
+
+    coords = np.array([_endpoints(w) for w in valid], dtype=np.float64).reshape(-1, 4)
+    floors = np.fromiter((_to_float(w.get("floor"), 0.0) for w in valid), dtype=np.float64, count=len(valid))
+    keep = (np.hypot(coords[:, 2] - coords[:, 0], coords[:, 3] - coords[:, 1]) >= MIN_WALL_LENGTH) \
+        & np.isfinite(coords).all(axis=1)
+    idx = np.flatnonzero(keep)
+    if not len(idx):
+        return result
+    canonical = merge_segments(coords[idx], floors[idx], tolerance)
+
+    # Sort once so every group's members are contiguous
+    order = np.argsort(canonical, kind="stable")
+    starts = np.flatnonzero(np.r_[True, canonical[order][1:] != canonical[order][:-1]])
+    bounds = np.r_[starts, len(order)]
+
+    # Merged geometry: project every member onto its group head's direction
+    # and take the extent along it at the length-weighted mean offset.
+    kept = coords[idx]
+    delta = kept[:, 2:] - kept[:, :2]
+    length = np.hypot(delta[:, 0], delta[:, 1])
+    ref = (delta / length[:, None])[canonical]
+    normal = np.stack([-ref[:, 1], ref[:, 0]], axis=1)
+    along_a = (kept[:, :2] * ref).sum(axis=1)
+    along_b = (kept[:, 2:] * ref).sum(axis=1)
+    offset = (kept[:, :2] * normal).sum(axis=1)
+    lo = np.minimum.reduceat(np.minimum(along_a, along_b)[order], starts)
+    hi = np.maximum.reduceat(np.maximum(along_a, along_b)[order], starts)
+    mean_offset = np.add.reduceat((offset * length)[order], starts) / np.add.reduceat(length[order], starts)
+    head_ref, head_normal = ref[order][starts], normal[order][starts]
+    merged_start = np.round(head_ref * lo[:, None] + head_normal * mean_offset[:, None], 3).tolist()
+    merged_end = np.round(head_ref * hi[:, None] + head_normal * mean_offset[:, None], 3).tolist()
+
+    merged = []
+    for g, (start, stop) in enumerate(zip(bounds[:-1].tolist(), bounds[1:].tolist())):
+        members = order[start:stop].tolist()
+        head = valid[idx[members[0]]]
+        if len(members) == 1:
+            merged.append(head)
+            continue
+        group = [valid[idx[m]] for m in members]
+        wall = dict(head)
+        wall["start"], wall["end"] = merged_start[g], merged_end[g]
+        if any(w.get("thickness") for w in group):
+            wall["thickness"] = str(max(_to_float(w.get("thickness")) for w in group))
+        if any(w.get("height") for w in group):
+            wall["height"] = str(max(_to_float(w.get("height")) for w in group))
+        wall["connectedRooms"] = _union(w.get("connectedRooms") for w in group)
+        wall["sharedWith"] = _union(w.get("sharedWith") for w in group)
+        wall["isShared"] = len(wall["connectedRooms"]) > 1 or bool(wall["sharedWith"])
+        # Walls merged on an earlier run keep the ids they replaced then
+        wall["mergedFrom"] = [i for i in _union([w.get("id")] + (w.get("mergedFrom") or []) for w in group) if i]
+        merged.append(wall)
+
+    # Walls without usable coordinates cannot be compared; they are kept as written
+    skipped = {id(valid[i]) for i in np.flatnonzero(~keep).tolist()}
+    untouched = [w for w in walls if id(w) in skipped or not (isinstance(w, dict) and _endpoints(w) is not None)]
+    result["walls"] = merged + untouched
+    if skipped:
+        print(f"⚠️ Kept {len(skipped)} zero-length or unplaced walls unmerged", file=sys.stderr)
+    return result
+
+
+def link_room_walls(result: Dict[str, Any], tolerance: float = SNAP_TOLERANCE) -> Dict[str, Any]:
+    """Point every room wall at its canonical top-level wall, by id or geometry, in place.
+
+    Runs after build_connectivity, which creates the walls of positioned
+    rooms. Links are rebuilt from scratch, so a re-run leaves no stale ones.
+    """
+    rooms = result.get("rooms") or []
+    walls = [w for w in result.get("walls") or [] if isinstance(w, dict)]
+    alias = {m: w["id"] for w in walls if w.get("id") for m in w.get("mergedFrom") or []}
+    ids = {w.get("id") for w in walls if w.get("id")}
+    unresolved = []
+    for idx, room in enumerate(rooms):
+        if not isinstance(room, dict):
+            continue
+        for side, wall in ((room.get("wallConnectivity") or {}).get("walls") or {}).items():
+            if not isinstance(wall, dict):
+                continue
+            wall.pop("canonicalWallId", None)
+            wall_id = wall.get("id")
+            if wall_id in alias:
+                wall["canonicalWallId"] = alias[wall_id]
+            elif wall_id in ids:
+                wall["canonicalWallId"] = wall_id
+            else:
+                unresolved.append((idx, side, wall))
+    merged = [w for w in walls if _endpoints(w) is not None]
+    if merged:
+        wall_coords = np.array([_endpoints(w) for w in merged], dtype=np.float64).reshape(-1, 4)
+        placed = (np.hypot(wall_coords[:, 2] - wall_coords[:, 0], wall_coords[:, 3] - wall_coords[:, 1])
+                  >= MIN_WALL_LENGTH) & np.isfinite(wall_coords).all(axis=1)
+        merged = [w for w, ok in zip(merged, placed.tolist()) if ok]
+    if unresolved and merged:
+        _link_by_geometry(rooms, unresolved, merged, tolerance)
+    return result
+
+
+def _link_by_geometry(rooms: List[Dict[str, Any]], unresolved: List[Tuple[int, str, Dict[str, Any]]],
+                      merged: List[Dict[str, Any]], tolerance: float) -> None:
+    """Geometric fallback for positioned rooms: nearest parallel canonical wall"""
+    segments = {(s[0], s[1]): s[3:] for s in _room_segments(rooms)}
+    queries = [(w, segments[(i, s)]) for i, s, w in unresolved if (i, s) in segments]
+    if not queries:
+        return
+    wall_coords = np.array([_endpoints(w) for w in merged], dtype=np.float64).reshape(-1, 4)
+    tree = STRtree(shapely.linestrings(wall_coords.reshape(-1, 2, 2)))
+    q = np.array([c for _, c in queries], dtype=np.float64)
+    slack = tolerance + max((_to_float(w.get("thickness")) for w in merged), default=0.0)
+    boxes = shapely.box(np.minimum(q[:, 0], q[:, 2]) - slack, np.minimum(q[:, 1], q[:, 3]) - slack,
+                        np.maximum(q[:, 0], q[:, 2]) + slack, np.maximum(q[:, 1], q[:, 3]) + slack)
+    qi, wi = tree.query(boxes)
+
+    qd = q[qi, 2:] - q[qi, :2]
+    wd = wall_coords[wi, 2:] - wall_coords[wi, :2]
+    q_len = np.hypot(qd[:, 0], qd[:, 1])
+    w_len = np.hypot(wd[:, 0], wd[:, 1])
+    parallel = np.abs(qd[:, 0] * wd[:, 1] - qd[:, 1] * wd[:, 0]) <= 0.05 * q_len * w_len
+    unit = wd / np.maximum(w_len, 1e-9)[:, None]
+    a = ((q[qi, :2] - wall_coords[wi, :2]) * unit).sum(axis=1)
+    b = ((q[qi, 2:] - wall_coords[wi, :2]) * unit).sum(axis=1)
+    overlap = np.minimum(np.maximum(a, b), w_len) - np.maximum(np.minimum(a, b), 0.0)
+    score = np.where(parallel, overlap, -np.inf)
+
+    best: Dict[int, int] = {}
+    best_score: Dict[int, float] = {}
+    for i, w, s in zip(qi.tolist(), wi.tolist(), score.tolist()):
+        if s > 0 and s > best_score.get(i, 0.0):
+            best[i], best_score[i] = w, s
+    for i, w in best.items():
+        if merged[w].get("id"):
+            queries[i][0]["canonicalWallId"] = merged[w]["id"]
+
+
+def _synthetic_segments(n_segments: int, seed: int = 7) -> Dict[str, Any]:
+    """Grid plan whose walls are split, duplicated and jittered like model output"""
+    rng = np.random.default_rng(seed)
+    walls = []
+    n_lines = max(n_segments // 10, 1)
+    for k in range(n_segments):
+        line = k % n_lines
+        horizontal = line % 2 == 0
+        offset = (line // 2) * 3.0 + rng.normal(0, 0.02)
+        a = rng.uniform(0, 40)
+        b = a + rng.uniform(1, 6)
+        start, end = ([a, offset], [b, offset]) if horizontal else ([offset, a], [offset, b])
+        walls.append({"id": f"wall_{k}", "start": start, "end": end, "thickness": "0.2", "height": "2.7",
+                      "connectedRooms": [f"room_{k % 97}"], "floor": (line // 500)})
+    return {"walls": walls, "rooms": []}
+
+
+# Benchmark: python walls.py [n_segments]
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    plan = _synthetic_segments(n)
+    start = time.perf_counter()
+    merge_walls(plan)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"⏱️ Merged {n} wall segments into {len(plan['walls'])} canonical walls in {elapsed:.1f} ms")
@@ -293,11 +293,18 @@ const UploadPlan = () => {
   ): Promise<ParsedPlan> => {
     const formData = new FormData();
     formData.append("file", file);
+    const {
+      data: { session },
+    } = await supabase.auth.getSession();
     const res = await fetch(
       "https://constructly-backend.onrender.com/api/plan/upload",
       {
         method: "POST",
         body: formData,
+        // The API verifies the token and reads the tier from the profile to queue paying tiers first
+        headers: session?.access_token
+          ? { Authorization: `Bearer ${session.access_token}` }
+          : {},
       }
     );
 